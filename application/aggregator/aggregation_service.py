@@ -0,0 +1,80 @@
+"""
+Headless aggregation process for API_LAYOUT=split: merges worker results,
+stores vehicles and publishes dashboard messages on VEHICLE_UPDATES_CHANNEL,
+which every API worker (aggregator/api_server.py) relays to its WebSocket
+clients. Also runs the HLS transcoder, so it is started once rather than
+per API worker. AGGREGATOR_MODE picks the asyncio or threaded aggregator,
+as in the combined layout.
+
+Usage (from application/):
+    API_LAYOUT=split python3 aggregator/aggregation_service.py
+"""
+import os
+# Set timezone to IST
+os.environ["TZ"] = "Asia/Kolkata"
+import time
+time.tzset()
+import asyncio
+import threading
+
+import asyncpg
+from psycopg2.pool import ThreadedConnectionPool
+
+from db_redis.sentinel_redis_config import *
+from common.cpu_budget import apply_cpu_budget
+from common.readiness import mark_ready
+from common.log import setup_logging
+from common.metrics import start_metrics
+from common.messages import WEB_ROOT
+from modules.aggregator_engine import ResultAggregator
+from modules.async_aggregator import AsyncResultAggregator
+from modules.fanout import RedisFanout
+from modules.hls import start_hls_conversion
+
+log = setup_logging("aggregator")
+
+apply_cpu_budget("aggregator")
+
+RTSP_URL = os.getenv("RTSP_STREAM")
+HLS_OUTPUT_DIR = WEB_ROOT / "static" / "hls_stream"
+
+DB_SETTINGS = {
+    "host": os.getenv("DB_HOST"),
+    "port": os.getenv("DB_PORT", "5432"),
+    "database": os.getenv("DB_NAME"),
+    "user": os.getenv("DB_USER"),
+    "password": os.getenv("DB_PASS")
+}
+
+
+async def main():
+    fanout = RedisFanout(get_async_redis_connection())
+
+    if AGGREGATOR_MODE == "asyncio":
+        db_pool = await asyncpg.create_pool(**{**DB_SETTINGS, "port": int(DB_SETTINGS["port"])}, min_size=0, max_size=DB_POOL_SIZE)
+        aggregator = AsyncResultAggregator(fanout, db_pool)
+        running = asyncio.create_task(aggregator.run(), name="aggregator")
+    elif AGGREGATOR_MODE == "thread":
+        # Broadcasts are handed back to this loop, which publishes them
+        aggregator = ResultAggregator(fanout, asyncio.get_running_loop(), ThreadedConnectionPool(0, DB_POOL_SIZE, **DB_SETTINGS))
+        threading.Thread(target=aggregator.process_results, daemon=True).start()
+        running = asyncio.get_running_loop().create_future()
+    else:
+        raise ValueError(f"Unknown AGGREGATOR_MODE {AGGREGATOR_MODE!r} (expected asyncio or thread)")
+    log.info("Aggregation running headless (%s), publishing to %s", AGGREGATOR_MODE, VEHICLE_UPDATES_CHANNEL)
+
+    # TEMP - REMOVE LATER Start HLS conversion
+    if RTSP_URL:
+        HLS_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+        threading.Thread(target=start_hls_conversion, args=(RTSP_URL, HLS_OUTPUT_DIR), daemon=True).start()
+
+    start_metrics("aggregator")
+    mark_ready("aggregator")
+    await running
+
+
+if __name__ == "__main__":
+    if not all(DB_SETTINGS[name] for name in ("host", "database", "user", "password")):
+        log.error("Database environment variables missing.")
+        exit(1)
+    asyncio.run(main())
@@ -3,37 +3,49 @@ import os
 os.environ["TZ"] = "Asia/Kolkata"
 import time
 time.tzset()
-import subprocess
 import threading
 import datetime
 from pathlib import Path
 import asyncio
-from typing import List
 
+import asyncpg
 import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
 import cv2
-from fastapi import FastAPI, WebSocket
+from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware  
 
 from db_redis.sentinel_redis_config import *
+from common.cpu_budget import apply_cpu_budget
+from common.readiness import mark_ready, PROCESS_NAME_ENV
+from common.log import setup_logging
+from common.metrics import start_metrics, histogram
 from modules.aggregator_engine import ResultAggregator
+from modules.async_aggregator import AsyncResultAggregator
+from modules.hls import start_hls_conversion
+from modules.fanout import relay_updates
+from modules.broadcast_hub import BroadcastHub
 
 # Import all route modules
-from routes import websocket_routes, vehicle_routes, stream_routes, file_browser_routes, filter_routes
+from routes import websocket_routes, vehicle_routes, stream_routes, file_browser_routes, filter_routes, pipeline_routes, metrics_routes, latency_routes
+
+log = setup_logging("aggregator")
+
+apply_cpu_budget("aggregator")
 
 # Global ready flag (using dict to allow mutation in routes)
 SYSTEM_READY = {"ready": False}
 
 # Location
 LOCATION = os.getenv("LOCATION", "DEFAULT_LOCATION")
-print("Location: " + LOCATION)
+log.info("Location: %s", LOCATION)
 
 # RTSP url
 RTSP_URL = os.getenv("RTSP_STREAM")
 if not RTSP_URL:
-    print("Error: RTSP_STREAM not set in environment variables.")
+    log.error("RTSP_STREAM not set in environment variables.")
     exit(1)
 
 # Database Connection
@@ -44,7 +56,7 @@ DB_USER = os.getenv("DB_USER")
 DB_PASS = os.getenv("DB_PASS")
 
 if not all([DB_HOST, DB_NAME, DB_USER, DB_PASS]):
-    print("Error: Database environment variables missing.")
+    log.error("Database environment variables missing.")
     exit(1)
 
 def get_db_connection():
@@ -55,31 +67,26 @@ def get_db_connection():
         user=DB_USER,
         password=DB_PASS
     )
-    
-# WebSocket Connection Manager 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            await connection.send_text(message)
 
-# A global instance of the manager 
-manager = ConnectionManager()
+# Persistent connections for the threaded aggregator's batched writes (opened on first use);
+# the asyncio aggregator opens an asyncpg pool on the event loop at startup instead
+db_pool = ThreadedConnectionPool(
+    0, DB_POOL_SIZE,
+    host=DB_HOST,
+    port=DB_PORT,
+    database=DB_NAME,
+    user=DB_USER,
+    password=DB_PASS
+)
+    
+# WebSocket clients, each with its own outbound queue and writer
+manager = BroadcastHub()
 
 # RTSP viewer
 def generate_frames():
     cap = cv2.VideoCapture(RTSP_URL)
     if not cap.isOpened():
-        print("Could not connect to RTSP stream")
+        log.error("Could not connect to RTSP stream")
         return
 
     while True:
@@ -94,58 +101,6 @@ def generate_frames():
             b"Content-Type: image/jpeg\r\n\r\n" + frame_bytes + b"\r\n"
         )
 
-# TEMP RTSP TO HLS CONVERSION - REMOVE
-def start_hls_conversion():
-    """Convert RTSP to HLS using FFmpeg with browser-compatible settings"""
-    output_file = HLS_OUTPUT_DIR / "stream.m3u8"
-    
-    ffmpeg_cmd = [
-        "ffmpeg",
-        "-rtsp_transport", "tcp",  # Use TCP for more reliable RTSP
-        "-i", RTSP_URL,
-        
-        # Video encoding - Re-encode to H.264 (browser compatible)
-        "-c:v", "libx264",
-        "-preset", "veryfast",  # Fast encoding
-        "-tune", "zerolatency",  # Low latency for live streaming
-        "-profile:v", "baseline",  # Maximum browser compatibility
-        "-level", "3.0",
-        "-g", "30",  # GOP size (keyframe interval)
-        "-sc_threshold", "0",  # Disable scene change detection
-        
-        # Video quality
-        "-b:v", "2000k",  # 2 Mbps bitrate
-        "-maxrate", "2000k",
-        "-bufsize", "4000k",
-        
-        # Audio encoding
-        "-c:a", "aac",
-        "-b:a", "128k",
-        "-ar", "44100",  # Sample rate
-        
-        # HLS settings
-        "-f", "hls",
-        "-hls_time", "2",  # 2-second segments
-        "-hls_list_size", "5",  # Keep 5 segments in playlist
-        "-hls_flags", "delete_segments+append_list",  # Delete old segments
-        "-hls_segment_type", "mpegts",  # Use MPEG-TS container
-        "-start_number", "1",
-        
-        # Output
-        str(output_file)
-    ]
-    
-    print(f"Starting HLS conversion: {output_file}")
-    
-    process = subprocess.Popen(
-        ffmpeg_cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        universal_newlines=True
-    )
-    
-    return process
-
 # File Browser Integration
 BASE_DIR = Path(__file__).resolve().parent
 WEB_ROOT = BASE_DIR / "web"
@@ -166,11 +121,15 @@ TEMPLATES_PATH.mkdir(exist_ok=True)
 templates = Jinja2Templates(directory=str(TEMPLATES_PATH))
 
 # Initialize route modules with dependencies
-websocket_routes.init_globals(SYSTEM_READY, manager)
+websocket_routes.init_globals(SYSTEM_READY, manager, get_async_redis_connection())
 vehicle_routes.init_db(get_db_connection)
 filter_routes.init_db(get_db_connection)
+latency_routes.init_db(get_db_connection)
 stream_routes.init_stream(generate_frames, templates, LOCATION, HLS_OUTPUT_DIR)
 file_browser_routes.init_file_browser(STATIC_PATH, templates, LOCATION)
+pipeline_routes.init_redis(get_redis_connection())
+# Split layout: every API worker publishes itself as "api", so it must label its local snapshot the same way
+metrics_routes.init_metrics(get_redis_connection(), "api" if API_LAYOUT == "split" else "aggregator")
 
 # FastAPI Setup
 app = FastAPI(title="Sentinel Vehicle API")
@@ -187,6 +146,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency per route template (not per raw path, to keep label cardinality bounded)
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    histogram(
+        "sentinel_http_request_seconds", "API request latency",
+        method=request.method,
+        route=getattr(route, "path", "unmatched"),
+        status=str(response.status_code)
+    ).observe(time.perf_counter() - started)
+    return response
+
 # Mount static files
 app.mount("/static", StaticFiles(directory=STATIC_PATH), name="static")
 
@@ -196,27 +169,61 @@ app.include_router(vehicle_routes.router)
 app.include_router(filter_routes.router)
 app.include_router(stream_routes.router)
 app.include_router(file_browser_routes.router)
+app.include_router(pipeline_routes.router)
+app.include_router(metrics_routes.router)
+app.include_router(latency_routes.router)
+
+# Keeps the asyncio aggregator's (or update relay's) task referenced while it runs
+aggregator_tasks = set()
 
 # Startup event
 @app.on_event("startup")
 async def startup_event():
     loop = asyncio.get_running_loop()
-    
-    # Pass db connection function to aggregator
-    aggregator = ResultAggregator(manager, loop, get_db_connection)
-    
-    # Start aggregator in background thread
-    aggregator_thread = threading.Thread(target=aggregator.process_results, daemon=True)
-    aggregator_thread.start()
-    
+
+    if API_LAYOUT == "split":
+        # One of API_WORKERS processes (aggregator/api_server.py); aggregator/aggregation_service.py
+        # aggregates and publishes dashboard messages, which each worker relays to its own clients
+        aggregator_tasks.add(asyncio.create_task(relay_updates(manager), name="update_relay"))
+        start_metrics("api", name=f"{os.getenv(PROCESS_NAME_ENV, 'API')}:{os.getpid()}")
+        mark_ready("api")
+        return
+
+    if AGGREGATOR_MODE == "asyncio":
+        # Aggregator tasks share the API's event loop, on asyncio Redis and Postgres clients
+        async_db_pool = await asyncpg.create_pool(
+            host=DB_HOST,
+            port=int(DB_PORT),
+            database=DB_NAME,
+            user=DB_USER,
+            password=DB_PASS,
+            min_size=0,
+            max_size=DB_POOL_SIZE
+        )
+        aggregator = AsyncResultAggregator(manager, async_db_pool)
+        aggregator_tasks.add(asyncio.create_task(aggregator.run(), name="aggregator"))
+        log.info("Aggregator tasks have been scheduled on the event loop.")
+    elif AGGREGATOR_MODE == "thread":
+        # Pass the db connection pool to aggregator
+        aggregator = ResultAggregator(manager, loop, db_pool)
+
+        # Start aggregator in background thread
+        aggregator_thread = threading.Thread(target=aggregator.process_results, daemon=True)
+        aggregator_thread.start()
+        log.info("Aggregator background thread has been scheduled.")
+    else:
+        raise ValueError(f"Unknown AGGREGATOR_MODE {AGGREGATOR_MODE!r} (expected asyncio or thread)")
+
     # TEMP - REMOVE LATER Start HLS conversion
-    hls_thread = threading.Thread(target=start_hls_conversion, daemon=True)
+    hls_thread = threading.Thread(target=start_hls_conversion, args=(RTSP_URL, HLS_OUTPUT_DIR), daemon=True)
     hls_thread.start()
 
-    print("Aggregator background thread has been scheduled.")
+    start_metrics("aggregator")
+    mark_ready("aggregator")
 
 # Entrypoint 
 if __name__ == "__main__":
     import uvicorn
-    print("Starting Sentinel Aggregator Server on http://localhost:8000")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    log.info("Starting Sentinel Aggregator Server on http://localhost:8000")
+    # log_config=None leaves uvicorn's loggers on the shared non-blocking handler
+    uvicorn.run(app, host="0.0.0.0", port=8000, log_config=None)
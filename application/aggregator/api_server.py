@@ -0,0 +1,31 @@
+"""
+Read API for API_LAYOUT=split: aggregator.py's app under API_WORKERS
+uvicorn worker processes on uvloop and httptools, without the aggregation
+loop (aggregator/aggregation_service.py runs that). Each worker relays
+dashboard messages from Redis pub/sub to its own WebSocket clients.
+
+Usage (from application/):
+    python3 aggregator/api_server.py
+"""
+import os
+# Read by the config in every worker (and in this process when API_WORKERS=1): serve the API and relay updates, never aggregate
+os.environ["API_LAYOUT"] = "split"
+
+import uvicorn
+
+from db_redis.sentinel_redis_config import API_WORKERS
+from common.log import setup_logging
+
+if __name__ == "__main__":
+    log = setup_logging("api")
+    log.info("Starting Sentinel API with %d workers on http://localhost:8000", API_WORKERS)
+    # log_config=None leaves uvicorn's loggers on the shared non-blocking handler
+    uvicorn.run(
+        "aggregator:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=API_WORKERS,
+        loop="uvloop",
+        http="httptools",
+        log_config=None
+    )
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Aggregator throughput and API latency under load: publishes synthetic worker
+results (OCR, color and logo for each vehicle) straight to vehicle_results
+while client threads keep requesting an API endpoint, and reports vehicles
+stored per second (from the aggregator's completion acks) and the API's
+p50/p99 latency over the same window.
+
+Run it against a dev stack once with AGGREGATOR_MODE=thread and once with
+AGGREGATOR_MODE=asyncio (restart the aggregator in between); the benchmark
+vehicles are stored like real ones.
+
+Usage (from application/):
+    python3 aggregator/benchmark_aggregator.py [--vehicles 2000] [--rate 200] [--clients 8]
+"""
+import time
+import uuid
+import argparse
+import datetime
+import threading
+
+import requests
+
+from db_redis.sentinel_redis_config import *
+from common.messages import encode_result
+
+WORKER_RESULTS = {"ocr": "BENCH{}", "color": "white|#ffffff", "logo": "bench"}
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def hammer(url, stop, latencies, errors):
+    """Request `url` back to back until `stop` is set, recording ms per request"""
+    session = requests.Session()
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            session.get(url, timeout=10).raise_for_status()
+            latencies.append((time.perf_counter() - started) * 1000)
+        except requests.RequestException:
+            errors.append(1)
+
+
+def publish(r, run_id, vehicles, rate):
+    """Publish every worker result of `vehicles` vehicles at `rate` vehicles/s"""
+    next_publish = time.monotonic()
+    for i in range(vehicles):
+        now = datetime.datetime.now().astimezone()
+        vehicle_id = f"bench{run_id}{i:05d}_{now:%Y%m%d_%H%M%S}_car_BENCH"
+        job_id = f"car_{i}_bench{run_id}{i:05d}"
+        pipe = r.pipeline(transaction=False)
+        for worker, result in WORKER_RESULTS.items():
+            pipe.xadd(VEHICLE_RESULTS_STREAM, encode_result({
+                "job_id": job_id,
+                "vehicle_id": vehicle_id,
+                "vehicle_type": "car",
+                "workers": encode_worker_manifest(WORKER_RESULTS),
+                "location": "BENCH",
+                "timestamp": now,
+                "worker": worker,
+                "result": result.format(i),
+                "status": "ok"
+            }))
+        pipe.execute()
+
+        next_publish += 1 / rate
+        delay = next_publish - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure aggregator throughput and API latency while it runs")
+    parser.add_argument("--vehicles", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=200.0, help="Vehicles published per second")
+    parser.add_argument("--clients", type=int, default=8, help="Threads requesting the API")
+    parser.add_argument("--url", default="http://localhost:8000/api/vehicles", help="Endpoint to time")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    r = get_redis_connection()
+    run_id = uuid.uuid4().hex[:6]
+    # Completion acks from here on are the benchmark's (or unrelated live traffic, filtered by job_id)
+    ack_cursor = r.xinfo_stream(VEHICLE_ACK_STREAM)["last-generated-id"] if r.exists(VEHICLE_ACK_STREAM) else "0"
+
+    stop = threading.Event()
+    latencies, errors = [], []
+    clients = [threading.Thread(target=hammer, args=(args.url, stop, latencies, errors), daemon=True)
+               for _ in range(args.clients)]
+    for client in clients:
+        client.start()
+
+    started = time.monotonic()
+    publisher = threading.Thread(target=publish, args=(r, run_id, args.vehicles, args.rate))
+    publisher.start()
+
+    stored = 0
+    last_stored = started
+    deadline = started + args.timeout
+    prefix = f"bench{run_id}"
+    while stored < args.vehicles and time.monotonic() < deadline:
+        for _, entries in r.xread({VEHICLE_ACK_STREAM: ack_cursor}, count=1000, block=500) or []:
+            for entry_id, fields in entries:
+                ack_cursor = entry_id
+                if prefix in fields.get("job_id", "") and fields.get("status") in ("completed", "partial"):
+                    stored += 1
+                    last_stored = time.monotonic()
+
+    stop.set()
+    publisher.join()
+    for client in clients:
+        client.join()
+
+    elapsed = last_stored - started
+    print("=" * 60)
+    print(f"Published {args.vehicles} vehicles at {args.rate:.0f}/s with {args.clients} API clients on {args.url}")
+    print(f"Stored: {stored}/{args.vehicles} in {elapsed:.1f}s ({stored / elapsed if elapsed > 0 else 0:.1f} vehicles/s)")
+    print(f"API requests: {len(latencies)} ({len(errors)} failed)")
+    if latencies:
+        print(f"  p50: {percentile(latencies, 50):8.1f} ms")
+        print(f"  p99: {percentile(latencies, 99):8.1f} ms")
+        print(f"  max: {max(latencies):8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
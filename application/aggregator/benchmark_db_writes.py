@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Vehicle insert throughput: connect-per-row vs pooled batches.
+
+Writes synthetic completed vehicles into a scratch copy of the vehicles table
+(vehicles_bench, dropped afterwards) and reports rows/s for:
+
+    single     new connection, one INSERT and a commit per row (the previous
+               save_to_database)
+    pooled     one pooled connection, one INSERT and a commit per row
+    values     VehicleWriter batches with execute_values
+    copy       VehicleWriter batches with COPY through a temp table
+
+Uses the DB_* settings from the environment (.env values by default).
+
+Usage (from application/):
+    python3 aggregator/benchmark_db_writes.py [--rows 5000] [--batch 100]
+"""
+import os
+import time
+import uuid
+import argparse
+import datetime
+
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+
+from modules.db_writer import VehicleWriter, VEHICLE_COLUMNS, vehicle_row, pooled_connection
+
+BENCH_TABLE = "vehicles_bench"
+
+DB_SETTINGS = {
+    "host": os.getenv("DB_HOST", "localhost"),
+    "port": os.getenv("DB_PORT", "5432"),
+    "database": os.getenv("DB_NAME", "sentinel"),
+    "user": os.getenv("DB_USER", "sentinel_user"),
+    "password": os.getenv("DB_PASS", "admin")
+}
+
+INSERT_ONE = f"""
+    INSERT INTO {BENCH_TABLE} ({", ".join(VEHICLE_COLUMNS)})
+    VALUES ({", ".join(["%s"] * len(VEHICLE_COLUMNS))})
+    ON CONFLICT (vehicle_id) DO NOTHING
+"""
+
+
+def synthetic_vehicles(count):
+    now = datetime.datetime.now()
+    for i in range(count):
+        vehicle_id = f"{uuid.uuid4().hex[:8]}_{now:%Y%m%d_%H%M%S}_car_BENCH"
+        yield {
+            "vehicle_id": vehicle_id,
+            "vehicle_type": "car",
+            "keyframe_url": f"http://localhost:8000/static/BENCH/{now:%Y-%m-%d}/keyframes/{vehicle_id}.jpg",
+            "plate_url": f"http://localhost:8000/static/BENCH/{now:%Y-%m-%d}/plates/{vehicle_id}_plate.jpg",
+            "color": "white",
+            "color_hex": "#f4f4f2",
+            "vehicle_number": f"KL11AB{i % 10000:04d}",
+            "model": "Maruti Suzuki",
+            "location": "BENCH",
+            "timestamp": (now + datetime.timedelta(milliseconds=i)).isoformat()
+        }
+
+
+def run_single(db_pool, vehicles, batch):
+    for job_data in vehicles:
+        conn = psycopg2.connect(**DB_SETTINGS)
+        cursor = conn.cursor()
+        cursor.execute(INSERT_ONE, vehicle_row(job_data))
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+
+def run_pooled(db_pool, vehicles, batch):
+    for job_data in vehicles:
+        with pooled_connection(db_pool) as conn, conn.cursor() as cursor:
+            cursor.execute(INSERT_ONE, vehicle_row(job_data))
+
+
+def run_writer(mode):
+    def run(db_pool, vehicles, batch):
+        writer = VehicleWriter(db_pool, mode=mode, batch_rows=batch, table=BENCH_TABLE)
+        for job_data in vehicles:
+            writer.add(job_data)
+            if len(writer) >= batch:
+                writer.flush()
+        writer.flush()
+    return run
+
+
+MODES = {
+    "single": run_single,
+    "pooled": run_pooled,
+    "values": run_writer("values"),
+    "copy": run_writer("copy")
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vehicle insert throughput per write mode")
+    parser.add_argument("--rows", type=int, default=5000, help="Rows written per mode")
+    parser.add_argument("--batch", type=int, default=100, help="Rows per batch for values/copy")
+    parser.add_argument("--modes", default=",".join(MODES), help="Comma-separated modes to run")
+    args = parser.parse_args()
+
+    db_pool = ThreadedConnectionPool(1, 2, **DB_SETTINGS)
+    with pooled_connection(db_pool) as conn, conn.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+        # Own id sequence, so the benchmark doesn't advance the real table's
+        cursor.execute(f"CREATE TABLE {BENCH_TABLE} (LIKE vehicles INCLUDING ALL EXCLUDING DEFAULTS)")
+        cursor.execute(f"ALTER TABLE {BENCH_TABLE} ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY")
+
+    try:
+        print(f"{args.rows} rows per mode, batches of {args.batch}")
+        print(f"{'mode':<8} {'seconds':>8} {'rows/s':>10}")
+        for mode in args.modes.split(","):
+            vehicles = list(synthetic_vehicles(args.rows))
+            started = time.perf_counter()
+            MODES[mode](db_pool, vehicles, args.batch)
+            elapsed = time.perf_counter() - started
+
+            with pooled_connection(db_pool) as conn, conn.cursor() as cursor:
+                cursor.execute(f"SELECT COUNT(*) FROM {BENCH_TABLE}")
+                stored = cursor.fetchone()[0]
+                cursor.execute(f"TRUNCATE {BENCH_TABLE}")
+            if stored != args.rows:
+                print(f"{mode:<8} stored {stored} of {args.rows} rows")
+            print(f"{mode:<8} {elapsed:>8.2f} {args.rows / elapsed:>10.0f}")
+    finally:
+        with pooled_connection(db_pool) as conn, conn.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+        db_pool.closeall()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Dashboard latency: time from XADD of a job until the vehicle first shows up
+on /ws/updates (time to first display) and until it shows up complete (time
+to complete), as a dashboard client sees it.
+
+With PROGRESSIVE_RESULTS=1 the first display comes with the first worker
+result (usually OCR) and later results arrive as vehicle_patch messages;
+with PROGRESSIVE_RESULTS=0 both times are the same. Run it against a dev
+stack once with each setting (the aggregator will store the benchmark
+vehicles).
+
+Usage (from application/):
+    python3 aggregator/benchmark_first_display.py --frame KEYFRAME.jpg --plate PLATE.jpg [--jobs 50] [--interval 0.2]
+"""
+import argparse
+import datetime
+import json
+import time
+import uuid
+
+from websockets.sync.client import connect
+
+from db_redis.sentinel_redis_config import *
+from common.messages import encode_job
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def report(name, latencies):
+    print(f"{name} ({len(latencies)} vehicles)")
+    if latencies:
+        print(f"  p50: {percentile(latencies, 50):8.1f} ms")
+        print(f"  p95: {percentile(latencies, 95):8.1f} ms")
+        print(f"  p99: {percentile(latencies, 99):8.1f} ms")
+        print(f"  max: {max(latencies):8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure time to first display vs time to complete on the dashboard")
+    parser.add_argument("--frame", required=True, help="Keyframe image path")
+    parser.add_argument("--plate", default="None", help="Plate image path")
+    parser.add_argument("--url", default="ws://localhost:8000/ws/updates", help="Dashboard WebSocket")
+    parser.add_argument("--jobs", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=0.2, help="Seconds between published jobs")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    r = get_redis_connection()
+    workers = get_expected_workers("car")
+
+    # Route jobs the same way ingress does for whichever layout is running
+    try:
+        groups = [g["name"] for g in r.xinfo_groups(VEHICLE_JOBS_STREAM)]
+    except Exception:
+        groups = []
+    mode = "fused" if FUSED_GROUP in groups else "split"
+    streams = [VEHICLE_JOBS_STREAM] if mode == "fused" else [JOB_STREAMS[w] for w in workers]
+
+    published = {}      # vehicle_id -> publish time
+    first = {}          # vehicle_id -> ms to first display
+    complete = {}       # vehicle_id -> ms to complete
+    run_id = uuid.uuid4().hex[:6]
+    next_publish = time.monotonic()
+    deadline = None
+
+    with connect(args.url) as ws:
+        while len(complete) < args.jobs:
+            now = time.monotonic()
+            if len(published) < args.jobs and now >= next_publish:
+                i = len(published)
+                vehicle_id = f"bench{run_id}{i:04d}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}_car_BENCH"
+                payload = encode_job({
+                    "job_id": f"car_{i}_bench{run_id}{i:04d}",
+                    "vehicle_id": vehicle_id,
+                    "vehicle_type": "car",
+                    "frame_path": args.frame,
+                    "plate_path": args.plate,
+                    "frame_url": None,
+                    "plate_url": None,
+                    "timestamp": datetime.datetime.now().astimezone(),
+                    "location": "BENCH",
+                    "workers": encode_worker_manifest(workers)
+                })
+                pipe = r.pipeline(transaction=False)
+                for stream in streams:
+                    pipe.xadd(stream, payload)
+                pipe.execute()
+                published[vehicle_id] = time.monotonic()
+                next_publish += args.interval
+                if len(published) == args.jobs:
+                    deadline = time.monotonic() + args.timeout
+
+            if deadline and time.monotonic() > deadline:
+                print(f"Timed out with {args.jobs - len(complete)} vehicles incomplete")
+                break
+
+            try:
+                message = json.loads(ws.recv(timeout=0.05))
+            except TimeoutError:
+                continue
+            vehicle_id = message.get("vehicle_id")
+            if vehicle_id not in published:
+                continue
+            elapsed = (time.monotonic() - published[vehicle_id]) * 1000
+            first.setdefault(vehicle_id, elapsed)
+            if message.get("status", "processing") != "processing":
+                complete.setdefault(vehicle_id, elapsed)
+
+    print("=" * 60)
+    print(f"Mode: {mode}  PROGRESSIVE_RESULTS={'1' if PROGRESSIVE_RESULTS else '0'} (this host's setting)")
+    report("Time to first display", list(first.values()))
+    report("Time to complete", list(complete.values()))
+
+
+if __name__ == "__main__":
+    main()
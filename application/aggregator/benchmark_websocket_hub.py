@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+WebSocket fan-out under load: broadcasts synthetic dashboard messages (a
+vehicle, then patches with its remaining results) through BroadcastHub to
+simulated in-process clients, one of which stalls on its first send and
+never returns, and reports how long broadcast() takes, the healthy clients'
+delivery lag and what happened to the stalled client, for each
+WS_SLOW_CLIENT_POLICY. --compare runs the same load through the previous
+sequential broadcast loop for reference.
+
+Simulated clients stand in for sockets, so this measures the hub and the
+event loop, not the network; no Redis or API process is needed.
+
+Usage (from application/):
+    python3 aggregator/benchmark_websocket_hub.py [--clients 1000] [--messages 300] [--rate 30] [--compare]
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+
+from common.metrics import counter
+from modules.broadcast_hub import BroadcastHub, SLOW_CLIENT_POLICIES
+
+DROP_REASONS = ("drop_oldest", "coalesced", "disconnected")
+
+
+def dropped():
+    """The hub's sentinel_ws_dropped_total by reason, so far in this process"""
+    return {reason: counter("sentinel_ws_dropped_total", reason=reason).value for reason in DROP_REASONS}
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class SimulatedClient:
+    """Enough of a WebSocket for the hub; each send takes up to `send_ms`, or forever if `stalled`"""
+
+    def __init__(self, send_ms, lags, broadcast_at, stalled=False):
+        self.send_ms = send_ms
+        self.lags = lags
+        self.broadcast_at = broadcast_at
+        self.stalled = stalled
+        self.received = 0
+        self.closed = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message):
+        if self.stalled:
+            await asyncio.get_running_loop().create_future()
+        await asyncio.sleep(random.uniform(0, self.send_ms) / 1000)
+        self.received += 1
+        self.lags.append((time.monotonic() - self.broadcast_at[message]) * 1000)
+
+    async def close(self, code=1000, reason=""):
+        self.closed = code
+
+
+class SequentialManager:
+    """The broadcast loop BroadcastHub replaced: awaits each client's send in turn"""
+
+    def __init__(self):
+        self.active_connections = []
+
+    async def connect(self, websocket):
+        await websocket.accept()
+        self.active_connections.append(websocket)
+
+    async def broadcast(self, message):
+        for connection in self.active_connections:
+            await connection.send_text(message)
+
+
+def messages(count):
+    """Dashboard messages in arrival order: each vehicle whole, then two patches"""
+    for i in range(count):
+        vehicle_id = f"bench{i // 3:05d}_car"
+        if i % 3 == 0:
+            yield {"type": "vehicle", "vehicle_id": vehicle_id, "vehicle_type": "car", "status": "in_progress", "seq": i}
+        else:
+            yield {"type": "vehicle_patch", "vehicle_id": vehicle_id, "seq": i, "status": "in_progress" if i % 3 == 1 else "completed"}
+
+
+async def run(manager, args):
+    lags, broadcast_at = [], {}
+    clients = [SimulatedClient(args.send_ms, lags, broadcast_at) for _ in range(args.clients - 1)]
+    stalled = SimulatedClient(args.send_ms, [], broadcast_at, stalled=True)
+    for client in [stalled] + clients:
+        await manager.connect(client)
+
+    broadcast_ms, sent = [], 0
+    drops_before = dropped()
+    started = time.monotonic()
+    next_broadcast = started
+    deadline = started + args.messages / args.rate + args.timeout
+    for message in messages(args.messages):
+        text = json.dumps(message)
+        broadcast_at[text] = time.monotonic()
+        try:
+            call_started = time.perf_counter()
+            await asyncio.wait_for(manager.broadcast(text), max(0.001, deadline - time.monotonic()))
+            broadcast_ms.append((time.perf_counter() - call_started) * 1000)
+        except asyncio.TimeoutError:
+            break
+        sent += 1
+        next_broadcast += 1 / args.rate
+        await asyncio.sleep(max(0, next_broadcast - time.monotonic()))
+
+    # Let healthy clients drain what is still queued
+    expected = sent * len(clients)
+    while len(lags) < expected and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    drops = {reason: value - drops_before[reason] for reason, value in dropped().items()}
+    return sent, broadcast_ms, lags, clients, stalled, drops, time.monotonic() - started
+
+
+def report(name, args, result):
+    sent, broadcast_ms, lags, clients, stalled, drops, elapsed = result
+    healthy = len(clients)
+    print(f"--- {name}")
+    print(f"Broadcast {sent}/{args.messages} messages in {elapsed:.1f}s")
+    if broadcast_ms:
+        print(f"  broadcast() p50: {percentile(broadcast_ms, 50):8.2f} ms  p99: {percentile(broadcast_ms, 99):8.2f} ms  max: {max(broadcast_ms):8.2f} ms")
+    print(f"Healthy clients: {len(lags)}/{sent * healthy} messages delivered to {healthy} clients")
+    if lags:
+        print(f"  lag p50: {percentile(lags, 50):8.1f} ms  p99: {percentile(lags, 99):8.1f} ms  max: {max(lags):8.1f} ms")
+    outcome = f"closed with code {stalled.closed}" if stalled.closed is not None else "still connected"
+    print(f"Stalled client: {outcome}, {stalled.received} received")
+    if any(drops.values()):
+        print("  not sent: " + ", ".join(f"{count} {reason}" for reason, count in drops.items() if count))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Broadcast to simulated WebSocket clients while one of them stalls")
+    parser.add_argument("--clients", type=int, default=1000, help="Simulated clients, including the stalled one")
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--rate", type=float, default=30.0, help="Messages broadcast per second")
+    parser.add_argument("--send-ms", type=float, default=0.5, help="Upper bound of a healthy client's (uniformly random) send time")
+    parser.add_argument("--queue-size", type=int, default=64, help="WS_QUEUE_SIZE for the run")
+    parser.add_argument("--send-timeout", type=float, default=5.0, help="WS_SEND_TIMEOUT for the run")
+    parser.add_argument("--policy", choices=SLOW_CLIENT_POLICIES, action="append", help="Policies to run (default: all)")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Seconds past the last scheduled broadcast before giving up")
+    parser.add_argument("--compare", action="store_true", help="Also run the sequential broadcast loop")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"{args.clients} clients (1 stalled), {args.messages} messages at {args.rate:.0f}/s, "
+          f"queue {args.queue_size}, send timeout {args.send_timeout:.0f}s")
+    for policy in args.policy or SLOW_CLIENT_POLICIES:
+        hub = BroadcastHub(queue_size=args.queue_size, policy=policy, send_timeout=args.send_timeout)
+        report(f"BroadcastHub, {policy}", args, await run(hub, args))
+        for client in list(hub.clients):
+            hub.disconnect(client)
+
+    if args.compare:
+        report("Sequential broadcast", args, await run(SequentialManager(), args))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
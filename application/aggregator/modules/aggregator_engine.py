@@ -1,26 +1,57 @@
+import os
 import time
+import queue
 import asyncio
 import json
 import datetime
-from collections import defaultdict
+import logging
+from psycopg2.extras import execute_values
 from db_redis.sentinel_redis_config import *
+from common.metrics import counter, gauge, histogram
+from common.messages import decode_result, encode_job, WEB_ROOT
+from common.tracing import JOB_STAGES, WORKER_STAGES, JOB_SPANS, WORKER_SPANS, read_stamps, durations, wall_time
+from modules.db_writer import VehicleWriter, pooled_connection, IN_PROGRESS
+from modules.spool import Spool, SpoolDrainer
+from modules.job_state import JobStore, JOB_PENDING, JOB_COMPLETED, JOB_STORED, JOB_CLAIMED
+
+log = logging.getLogger(__name__)
+
+BATCH_TIME = histogram("sentinel_aggregator_batch_seconds", "Aggregator time per result batch read")
+PENDING_JOBS = gauge("sentinel_aggregator_pending_jobs", "Vehicles waiting for more worker results (all consumers)")
+TRACES_STORED = counter("sentinel_job_traces_stored_total", "Job latency traces written to processing_jobs")
+PENDING_EVICTED = counter("sentinel_aggregator_pending_evicted_total", "Vehicles stored as partial because MAX_PENDING_JOBS was reached")
+
+# Vehicle fields each worker's result fills in
+WORKER_FIELDS = {"ocr": ("vehicle_number",), "color": ("color", "color_hex"), "logo": ("model",)}
 
 
 class ResultAggregator:
     """Aggregates results from multiple workers and saves to database"""
     
-    def __init__(self, manager, loop, db_connection_func):
+    def __init__(self, manager, loop, db_pool):
         """
         Args:
-            manager: WebSocket ConnectionManager instance
+            manager: WebSocket BroadcastHub instance
             loop: asyncio event loop for broadcasting
-            db_connection_func: Function to get database connection
+            db_pool: psycopg2 connection pool for the aggregator's writes
         """
-        self.pending_jobs = defaultdict(dict)
         self.r = get_redis_connection()
+        self.consumer = AGGREGATOR_CONSUMER
+        # Partial results of in-flight vehicles, shared with every other aggregator consumer
+        self.jobs = JobStore(self.r, self.consumer)
         self.manager = manager
         self.loop = loop
-        self.get_db_connection = db_connection_func
+        self.db_pool = db_pool
+        # Completed vehicles waiting for the next batched insert
+        self.writer = VehicleWriter(db_pool)
+        # Where batches go while Postgres is down or slow, replayed in the background
+        self.spool = Spool(os.path.join(SPOOL_DIR, self.consumer))
+        self.spooling = False
+        SpoolDrainer(self.spool, db_pool, name=self.consumer).start()
+        # Traces of broadcast vehicles, handed back from the event loop to be written by this thread
+        self.finished_traces = queue.SimpleQueue()
+        # (job_id, stamp) of vehicles first shown while still collecting results, likewise
+        self.first_displays = queue.SimpleQueue()
 
 
     def construct_keyframe_url(self, vehicle_id, location):
@@ -30,7 +61,7 @@ class ResultAggregator:
             keyframe_url = f"http://localhost:8000/static/{location}/{current_date}/keyframes/{vehicle_id}.jpg"
             return keyframe_url
         except Exception as e:
-            print(f"Error constructing keyframe URL for {vehicle_id}: {e}")
+            log.error("Error constructing keyframe URL for %s: %s", vehicle_id, e)
             return None
 
 
@@ -41,7 +72,7 @@ class ResultAggregator:
             plate_url = f"http://localhost:8000/static/{location}/{current_date}/plates/{vehicle_id}_plate.jpg"
             return plate_url
         except Exception as e:
-            print(f"Error constructing plate URL for {vehicle_id}: {e}")
+            log.error("Error constructing plate URL for %s: %s", vehicle_id, e)
             return None
 
 
@@ -85,125 +116,536 @@ class ResultAggregator:
                 return dt.isoformat()
             return None
         except Exception as e:
-            print(f"Error extracting timestamp from vehicle_id {vehicle_id}: {e}")
+            log.error("Error extracting timestamp from vehicle_id %s: %s", vehicle_id, e)
             return None
 
 
-    def save_to_database(self, job_data):
-        """Save completed job to database"""
-        conn = self.get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            INSERT INTO vehicles (vehicle_id, vehicle_type, keyframe_url, plate_url,
-                                  color, color_hex, vehicle_number, model, location, timestamp, status)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
-            job_data.get("vehicle_id"),
-            job_data.get("vehicle_type"),
-            job_data.get("keyframe_url"),
-            job_data.get("plate_url"),
-            job_data.get("color", ""),
-            job_data.get("color_hex", "#000000"),
-            job_data.get("vehicle_number", ""),
-            job_data.get("model", ""),
-            job_data.get("location", "UNKNOWN"),
-            job_data.get("timestamp"), 
-            "completed"
-        ))
-
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return job_data
+    async def broadcast_progress(self, message, job_id):
+        """Broadcast a vehicle that is still collecting results, and hand back when it was shown"""
+        try:
+            await self.manager.broadcast(message)
+        finally:
+            self.first_displays.put((job_id, time.monotonic()))
+
+
+    async def broadcast_traced(self, message, trace):
+        """Broadcast a completed vehicle, then stamp its trace and queue it for storage"""
+        try:
+            await self.manager.broadcast(message)
+        finally:
+            broadcast = time.monotonic()
+            trace["stamps"]["broadcast"] = broadcast
+            trace["stamps"].setdefault("first_display", broadcast)
+            self.finished_traces.put(trace)
+
+
+    def trace_rows(self, trace):
+        """processing_jobs rows for one vehicle: a 'job' row with the end-to-end stages plus one row per worker"""
+        stamps = trace["stamps"]
+        vehicle_type = trace["vehicle_type"]
+        job_stages = durations(stamps, JOB_SPANS)
+        for stage, ms in job_stages.items():
+            histogram("sentinel_job_stage_seconds", "Per-job latency by pipeline stage", stage=stage).observe(ms / 1000)
+
+        rows = [(
+            trace["job_id"], trace["vehicle_id"], "job", vehicle_type,
+            "failed" if trace.get("status") == "partial" else "completed",
+            json.dumps(trace["results"]), json.dumps(job_stages),
+            wall_time(stamps["detect"]) if "detect" in stamps else None,
+            wall_time(stamps["broadcast"])
+        )]
+
+        job = {stage: stamps[stage] for stage in JOB_STAGES if stage in stamps}
+        for worker, worker_stamps in trace["workers"].items():
+            # A copy: the stamps belong to the caller's job state
+            worker_stamps = dict(worker_stamps)
+            status = worker_stamps.pop("status", "ok")
+            worker_stages = durations({**job, **worker_stamps}, WORKER_SPANS)
+            for stage, ms in worker_stages.items():
+                histogram("sentinel_job_stage_seconds", "Per-job latency by pipeline stage",
+                          stage=f"{worker}.{stage}").observe(ms / 1000)
+            rows.append((
+                trace["job_id"], trace["vehicle_id"], worker, vehicle_type,
+                "failed" if status == "error" else "completed",
+                json.dumps(trace["results"] if worker == "fused" else trace["results"].get(worker)),
+                json.dumps(worker_stages),
+                wall_time(worker_stamps["dequeued"]) if "dequeued" in worker_stamps else None,
+                wall_time(worker_stamps.get("done", worker_stamps["received"]))
+            ))
+        return rows
+
+
+    def collect_trace_rows(self):
+        """processing_jobs rows of every vehicle broadcast since the last call"""
+        rows = []
+        while True:
+            try:
+                rows += self.trace_rows(self.finished_traces.get_nowait())
+            except queue.Empty:
+                return rows
+
+
+    def store_traces(self):
+        """Write the traces of every vehicle broadcast since the last call, in one transaction"""
+        rows = self.collect_trace_rows()
+        if not rows:
+            return
+
+        try:
+            with pooled_connection(self.db_pool) as conn, conn.cursor() as cursor:
+                execute_values(cursor, """
+                    INSERT INTO processing_jobs (job_id, vehicle_id, worker_type, vehicle_type, status,
+                                                 result, stages, started_at, completed_at)
+                    VALUES %s
+                    ON CONFLICT (job_id, worker_type) DO NOTHING
+                """, rows)
+            TRACES_STORED.inc(len(rows))
+        except Exception as e:
+            log.warning("Could not store %d job trace rows: %s", len(rows), e)
+
+
+    def vehicle_data(self, job, status):
+        """The vehicle's row from the results it has so far; a finished one gets the defaults for anything missing"""
+        results = job["results"]
+        color_name, color_hex = "", ""
+        if "color" in results or status != IN_PROGRESS:
+            color_name, color_hex = self.parse_color_result(results.get("color", "unknown|#000000"))
+
+        return {
+            "vehicle_id": job["vehicle_id"],
+            "vehicle_type": job["vehicle_type"],
+            "keyframe_url": job["keyframe_url"],
+            "plate_url": job["plate_url"],
+            "color": color_name,
+            "color_hex": color_hex,
+            "vehicle_number": results.get("ocr", ""),
+            "model": results.get("logo", ""),
+            "location": job["location"],
+            "timestamp": job["timestamp"],
+            "status": status
+        }
+
+
+    def display_message(self, job_data, first, workers=None):
+        """
+        Dashboard message for the vehicle's latest row: the whole vehicle
+        the first time it is shown, then a patch with the fields of the
+        results that just arrived (`workers`), or of every result and the
+        status once it is finished.
+        """
+        if first:
+            return {"type": "vehicle", **job_data}
+        if job_data["status"] == IN_PROGRESS:
+            fields = [field for worker in workers for field in WORKER_FIELDS.get(worker, ())]
+        else:
+            fields = [field for worker_fields in WORKER_FIELDS.values() for field in worker_fields] + ["status"]
+        return {"type": "vehicle_patch", "vehicle_id": job_data["vehicle_id"], **{field: job_data[field] for field in fields}}
+
+
+    def publish_progress(self, job_id, job, first, workers):
+        """
+        Queue the row of a vehicle that is still missing results, so it is
+        upserted and shown as soon as its first result (usually OCR) is in,
+        and patched as each later one arrives.
+        """
+        job_data = self.vehicle_data(job, IN_PROGRESS)
+        self.writer.add(job_data, {
+            "job_id": job_id,
+            "msg_id": None,
+            "status": IN_PROGRESS,
+            "message": self.display_message(job_data, first, workers)
+        })
+
+
+    def finalize_job(self, job_id, job, msg_id=None, status="completed", first=False):
+        """
+        Queue a vehicle this consumer owns finalizing for the next batched
+        insert. A "partial" vehicle gets the dead-letter placeholder
+        (WORKER_FAILED_RESULTS) for every result that never arrived. With
+        `first` the whole vehicle is broadcast rather than a patch.
+        """
+        results = job["results"]
+        if status == "partial":
+            missing = [worker for worker in job["expected_workers"] if worker not in results]
+            for worker in missing:
+                results[worker] = WORKER_FAILED_RESULTS.get(worker, "")
+            counter("sentinel_aggregator_partial_total", "Vehicles stored without every worker result").inc()
+            log.warning("Storing %s as partial, missing %s after %d retries", job_id, ", ".join(missing), job["retries"],
+                        extra={"job_id": job_id})
+
+        stamps = job["stamps"]
+        stamps["aggregated"] = time.monotonic()
+
+        job_data = self.vehicle_data(job, status)
+        self.writer.add(job_data, {
+            "job_id": job_id,
+            "msg_id": msg_id,
+            "status": status,
+            "message": self.display_message(job_data, first or not PROGRESSIVE_RESULTS),
+            "trace": {
+                "job_id": job_id,
+                "vehicle_id": job["vehicle_id"],
+                "vehicle_type": job["vehicle_type"],
+                "status": status,
+                "results": results,
+                "stamps": stamps,
+                "workers": job["worker_stamps"]
+            }
+        })
+
+
+    def first_deadline(self, published_at):
+        """
+        PENDING_TIMEOUT_MS after the job was published, so missing results
+        are retried before ingress re-publishes the whole job at ACK_TIMEOUT,
+        but never less than half of it after the first result arrived.
+        """
+        now = time.time()
+        timeout = PENDING_TIMEOUT_MS / 1000
+        published = published_at.timestamp() if published_at else now
+        return max(published + timeout, now + timeout / 2)
+
+
+    def retry_job(self, job_id, job, missing):
+        """
+        Re-publish the job to the streams of the workers whose results are
+        missing, and tell ingress the job is being retried so it holds off
+        re-publishing all of it.
+        """
+        with pipelined(self.r) as pipe:
+            for stream, fields in self.retry_messages(job_id, job, missing):
+                pipe.xadd(stream, fields, **trim_args(stream))
+        self.log_retry(job_id, job, missing)
+
+
+    def retry_messages(self, job_id, job, missing):
+        """
+        [(stream, fields)] for retry_job(). The keyframe and plate URLs are
+        rebuilt from the job's location, date and vehicle_id, the way
+        ingress lays them out.
+        """
+        vehicle_id = job["vehicle_id"]
+        published_at = job["published_at"] or datetime.datetime.now().astimezone()
+        folder = f"static/{job['location']}/{published_at.astimezone():%Y-%m-%d}"
+        plate_url = f"{folder}/plates/{vehicle_id}_plate.jpg"
+
+        payload = encode_job({
+            "job_id": job_id,
+            "vehicle_id": vehicle_id,
+            "vehicle_type": job["vehicle_type"],
+            "frame_url": f"{folder}/keyframes/{vehicle_id}.jpg",
+            "plate_url": plate_url if (WEB_ROOT / plate_url).exists() else None,
+            "timestamp": published_at,
+            "location": job["location"],
+            "workers": encode_worker_manifest(missing)
+        })
+        payload["retry"] = job["retries"]
+
+        messages = [(stream, payload) for stream in get_job_streams(missing)]
+        messages.append((VEHICLE_ACK_STREAM, {
+            "job_id": job_id,
+            "status": "retrying",
+            "workers": encode_worker_manifest(missing)
+        }))
+        return messages
+
+
+    def log_retry(self, job_id, job, missing):
+        for worker in missing:
+            counter("sentinel_aggregator_retries_total", "Missing worker results re-requested", worker=worker).inc()
+        log.info("Retrying %s for %s (%d/%d)", job_id, ", ".join(missing), job["retries"], MAX_RETRIES, extra={"job_id": job_id})
+
+
+    def evict_excess(self):
+        """Keep in-flight vehicles under MAX_PENDING_JOBS by storing those with the nearest deadlines as partial"""
+        for job_id in self.jobs.evict(MAX_PENDING_JOBS):
+            job, _, _ = self.jobs.load(job_id)
+            if job is None:
+                self.jobs.drop_deadline(job_id)
+                continue
+            PENDING_EVICTED.inc()
+            log.warning("Pending vehicles at MAX_PENDING_JOBS (%d), evicting %s", MAX_PENDING_JOBS, job_id, extra={"job_id": job_id})
+            self.finalize_job(job_id, job, status="partial")
+
+
+    def sweep_deadlines(self):
+        """
+        Handle the vehicles whose deadline passed, claimed from the deadlines
+        every consumer shares: retry missing results, store as partial after
+        MAX_RETRIES, or finish a vehicle whose finalizing consumer never
+        stored it (it died or stalled past its deadline).
+        """
+        now = time.time()
+        for job_id in self.jobs.claim_due(now, now + PENDING_TIMEOUT_MS / 1000):
+            job, finalized_by, stored = self.jobs.load(job_id)
+            if job is None or stored:
+                self.jobs.drop_deadline(job_id)
+                continue
+
+            if finalized_by is not None:
+                log.warning("Taking over %s from %s, which has not stored it", job_id, finalized_by, extra={"job_id": job_id})
+                self.jobs.take_over(job_id)
+                # Sent whole, since the progress of the consumer that died may never have been shown
+                self.finalize_job(job_id, job, status=self.final_status(job), first=True)
+                continue
+
+            if job["retries"] >= MAX_RETRIES:
+                if self.jobs.claim_final(job_id):
+                    self.finalize_job(job_id, job, status="partial")
+                continue
+
+            job["retries"] = self.jobs.retried(job_id)
+            missing = [worker for worker in job["expected_workers"] if worker not in job["results"]]
+            try:
+                self.retry_job(job_id, job, missing)
+            except Exception as e:
+                log.error("Could not retry %s: %s", job_id, e, extra={"job_id": job_id})
+
+
+    def write_vehicles(self):
+        """
+        Commit the waiting vehicles to Postgres, or append them to the local
+        spool while it is unavailable or slow (a flush failed or took longer
+        than SPOOL_SLOW_FLUSH_MS). Batches keep going to the spool until the
+        drainer has replayed all of it.
+        """
+        if self.spooling and not self.spool.depth():
+            self.spooling = False
+            log.info("Spool drained, writing to the database again")
+
+        if self.spooling:
+            return self.writer.spool(self.spool)
+
+        started = time.monotonic()
+        try:
+            flushed = self.writer.flush()
+        except Exception as e:
+            log.warning("Database unavailable, spooling %d vehicles locally: %s", len(self.writer), e)
+            self.spooling = True
+            return self.writer.spool(self.spool)
+
+        elapsed_ms = (time.monotonic() - started) * 1000
+        if elapsed_ms > SPOOL_SLOW_FLUSH_MS:
+            log.warning("Database falling behind (%.0f ms for %d vehicles), spooling locally", elapsed_ms, len(flushed))
+            self.spooling = True
+        return flushed
+
+
+    def flush_vehicles(self):
+        """
+        Store the waiting rows, then broadcast each one that was written.
+        Rows of vehicles still collecting results are only broadcast; a
+        finished vehicle is also marked stored in its Redis state, acked to
+        ingress and the result that completed it XACKed. Nothing is
+        acknowledged before its row is committed or fsynced to the spool.
+        Vehicles that were already stored (a re-published job) are
+        acknowledged without a second broadcast.
+        """
+        flushed = self.write_vehicles()
+        committed = time.monotonic()
+
+        with pipelined(self.r) as pipe:
+            for done, written in flushed:
+                broadcast = self.stored_vehicle(pipe, done, written, committed)
+                if broadcast is not None:
+                    asyncio.run_coroutine_threadsafe(broadcast, self.loop)
+
+
+    def stored_vehicle(self, pipe, done, written, committed):
+        """
+        Queue the Redis side of one flushed row on `pipe` (stored mark,
+        ingress ack, XACK, for finished vehicles only) and return the
+        coroutine that broadcasts it, or None if it is not to be shown.
+        """
+        job_id = done["job_id"]
+        if done["status"] == IN_PROGRESS:
+            if not written:
+                return None
+            return self.broadcast_progress(json.dumps(done["message"], default=str), job_id)
+
+        trace = done["trace"]
+        vehicle_type = trace["vehicle_type"]
+        trace["stamps"]["committed"] = committed
+
+        broadcast = None
+        if written:
+            counter("sentinel_vehicles_completed_total", "Vehicles stored", vehicle_type=vehicle_type, status=done["status"]).inc()
+            log.info("Stored %s: vehicle_id: %s", job_id, trace["vehicle_id"], extra={"job_id": job_id})
+            # The trace is stored once the broadcast has gone out
+            broadcast = self.broadcast_traced(json.dumps(done["message"], default=str), trace)
+        else:
+            log.info("Already stored %s: vehicle_id: %s", job_id, trace["vehicle_id"], extra={"job_id": job_id})
+
+        self.jobs.mark_stored(pipe, job_id)
+        pipe.xadd(VEHICLE_ACK_STREAM, {
+            "job_id": job_id,
+            "status": done["status"]
+        }, **trim_args(VEHICLE_ACK_STREAM))
+        if done["msg_id"]:
+            pipe.xack(VEHICLE_RESULTS_STREAM, AGGREGATOR_GROUP, done["msg_id"])
+        return broadcast
+
+
+    def record_first_displays(self):
+        """Stamp when each vehicle was first shown into its shared state, for whichever consumer finalizes it"""
+        with pipelined(self.r) as pipe:
+            self.queue_first_displays(pipe)
+
+
+    def queue_first_displays(self, pipe):
+        while True:
+            try:
+                job_id, shown = self.first_displays.get_nowait()
+            except queue.Empty:
+                return
+            self.jobs.first_displayed(pipe, job_id, shown)
+
+
+    def parse_result(self, fields):
+        """
+        Decode one vehicle_results entry into (job_id, worker, results, merge
+        arguments), the job's fields filled in from the vehicle_id for
+        results from before they were carried on the message.
+        """
+        received = time.monotonic()
+        fields = decode_result(fields)
+        job_id = fields.get("job_id")
+        worker = fields.get("worker")
+        result = fields.get("result")
+        vehicle_id = fields.get("vehicle_id")
+        counter("sentinel_aggregator_results_total", "Worker results consumed", worker=worker).inc()
+
+        log.debug("Received result: %s from %s -> %s", job_id, worker, result, extra={"job_id": job_id})
+
+        # Results carry the job's location and typed timestamp; older ones only have the vehicle_id to go on
+        location = fields.get("location") or self.extract_location_from_vehicle_id(vehicle_id)
+        if fields.get("timestamp"):
+            timestamp = fields["timestamp"].astimezone().replace(tzinfo=None).isoformat()
+        else:
+            timestamp = self.extract_timestamp_from_vehicle_id(vehicle_id)
+
+        # Expected workers come from the job's manifest; older results fall back to the job_id prefix
+        vehicle_type = fields.get("vehicle_type") or job_id.split("_")[0]
+        expected_workers = parse_worker_manifest(fields.get("workers")) or get_expected_workers(vehicle_type)
+
+        # Fused worker sends every analysis for the job in one message
+        results = (fields.get("results") or {}) if worker == "fused" else {worker: result}
+        return job_id, worker, results, (
+            job_id,
+            {
+                "vehicle_type": vehicle_type,
+                "expected": encode_worker_manifest(expected_workers),
+                "vehicle_id": vehicle_id,
+                "location": location,
+                "timestamp": timestamp,
+                "published_at": fields["timestamp"].isoformat() if fields.get("timestamp") else None,
+                "keyframe_url": self.construct_keyframe_url(vehicle_id, location),
+                "plate_url": self.construct_plate_url(vehicle_id, location)
+            },
+            results,
+            # Ingress stamps ride on every result; the first one to arrive sets them
+            read_stamps(fields, JOB_STAGES),
+            worker,
+            {**read_stamps(fields, WORKER_STAGES), "received": received, "status": fields.get("status", "ok")},
+            self.first_deadline(fields.get("timestamp"))
+        )
+
+
+    def final_status(self, job):
+        return "completed" if set(job["results"]) >= set(job["expected_workers"]) else "partial"
+
+
+    def merged(self, pipe, msg_id, job_id, worker, results, merge):
+        """
+        Act on what merging a result found: finalize the vehicle it
+        completed (its result is XACKed once the row is stored), or queue a
+        progress row and XACK it right away, since its part of the state is
+        already in Redis.
+        """
+        state, first, claimed_by, job = merge
+        if state == JOB_COMPLETED:
+            log.debug("All results received for %s: %s", job_id, list(job["results"]), extra={"job_id": job_id})
+            # Written with the next batch; this result is acknowledged once that commits
+            self.finalize_job(job_id, job, msg_id, first=first)
+            return
+
+        if state == JOB_PENDING and PROGRESSIVE_RESULTS:
+            self.publish_progress(job_id, job, first, list(results))
+        elif state != JOB_PENDING:
+            log.debug("Late result for %s from %s, job already %s", job_id, worker,
+                      "stored" if state == JOB_STORED else f"finalized by {claimed_by}", extra={"job_id": job_id})
+        pipe.xack(VEHICLE_RESULTS_STREAM, AGGREGATOR_GROUP, msg_id)
+
+
+    def handle_result(self, pipe, msg_id, fields, recovering=False):
+        """
+        Merge one result into its vehicle's shared state. The consumer whose
+        result completes the vehicle finalizes it, and that result is XACKed
+        once the row is stored; every other result is XACKed right away.
+        """
+        job_id, worker, results, args = self.parse_result(fields)
+        merge = self.jobs.merge(*args)
+
+        state, _, claimed_by, _ = merge
+        if state == JOB_CLAIMED and claimed_by == self.consumer and recovering:
+            # This consumer completed the job before a restart but never stored it
+            job, _, _ = self.jobs.load(job_id)
+            if job is not None:
+                self.finalize_job(job_id, job, msg_id, status=self.final_status(job), first=True)
+                return
+
+        self.merged(pipe, msg_id, job_id, worker, results, merge)
+
 
-    
     def process_results(self):
         """Main aggregator loop - runs in background thread"""
-        print("Aggregator started")
+        log.info("Aggregator started: consumer %s", self.consumer)
 
+        # Results delivered to this consumer before a restart and never acknowledged first, then new ones
+        cursor = "0"
         while True:
             try:
+                # Don't block past the next batched insert or pending-vehicle deadline
+                waits = [wait for wait in (self.writer.seconds_until_due(), self.jobs.seconds_until_deadline()) if wait is not None]
+                wait = min(waits) if waits else None
                 messages = self.r.xreadgroup(
-                    AGGREGATOR_GROUP, "aggregator_1",
-                    {VEHICLE_RESULTS_STREAM: ">"}, 
-                    count=10, block=1000
+                    AGGREGATOR_GROUP, self.consumer,
+                    {VEHICLE_RESULTS_STREAM: cursor},
+                    count=10, block=1000 if wait is None else max(1, min(1000, int(wait * 1000)))
                 )
-
-                for stream, msgs in messages:
-                    for msg_id, fields in msgs:
-                        job_id = fields.get("job_id")
-                        worker = fields.get("worker")
-                        result = fields.get("result")
-                        vehicle_id = fields.get("vehicle_id")
-
-                        print(f"Received result: {job_id} from {worker} -> {result}")
-
-                        if job_id not in self.pending_jobs:
-                            location = fields.get("location", self.extract_location_from_vehicle_id(vehicle_id))
-                            timestamp = self.extract_timestamp_from_vehicle_id(vehicle_id)
-                            keyframe_url = self.construct_keyframe_url(vehicle_id, location)
-                            plate_url = self.construct_plate_url(vehicle_id, location)
-                            
-                            self.pending_jobs[job_id] = {
-                                "results": {},
-                                "vehicle_id": vehicle_id,
-                                "location": location,
-                                "timestamp": timestamp,
-                                "keyframe_url": keyframe_url,
-                                "plate_url": plate_url
-                            }
-
-                        self.pending_jobs[job_id]["results"][worker] = result
-                        vehicle_type = job_id.split("_")[0]
-                        expected_workers = get_expected_workers(vehicle_type)
-
-                        received_workers = list(self.pending_jobs[job_id]["results"].keys())
-                        if set(received_workers) >= set(expected_workers):
-                            print(f"All results received for {job_id}: {received_workers}")
-
-                            results = self.pending_jobs[job_id]["results"]
-                            stored_vehicle_id = self.pending_jobs[job_id]["vehicle_id"]
-                            location = self.pending_jobs[job_id]["location"]
-                            timestamp = self.pending_jobs[job_id]["timestamp"]
-                            keyframe_url = self.pending_jobs[job_id]["keyframe_url"]
-                            plate_url = self.pending_jobs[job_id]["plate_url"]
-
-                            color_result = results.get("color", "unknown|#000000")
-                            color_name, color_hex = self.parse_color_result(color_result)
-
-                            job_data = {
-                                "vehicle_id": stored_vehicle_id,
-                                "vehicle_type": vehicle_type,
-                                "keyframe_url": keyframe_url,
-                                "plate_url": plate_url,
-                                "color": color_name,
-                                "color_hex": color_hex,
-                                "vehicle_number": results.get("ocr", ""),
-                                "model": results.get("logo", ""),
-                                "location": location,
-                                "timestamp": timestamp
-                            }
-
-                            saved_data = self.save_to_database(job_data)
-                            print(f"Saved {job_id} to database: vehicle_id: {stored_vehicle_id}")
-
-                            # Broadcast the update
-                            asyncio.run_coroutine_threadsafe(
-                                self.manager.broadcast(json.dumps(saved_data, default=str)),
-                                self.loop
-                            )
-                            print(f"Scheduled broadcast for {job_id}")
-
-                            self.r.xadd(VEHICLE_ACK_STREAM, {
-                                "job_id": job_id,
-                                "status": "completed"
-                            })
-
-                            del self.pending_jobs[job_id]
-
-                        self.r.xack(VEHICLE_RESULTS_STREAM, AGGREGATOR_GROUP, msg_id)
+                recovering = cursor != ">"
+                if recovering and not any(msgs for _, msgs in messages or []):
+                    log.info("Recovered unacknowledged results, reading new ones")
+                    cursor = ">"
+
+                batch_started = time.perf_counter()
+                # XACKs for results that did not complete a vehicle go out in one round trip after the read
+                with pipelined(self.r) as pipe:
+                    for stream, msgs in messages or []:
+                        for msg_id, fields in msgs:
+                            if recovering:
+                                cursor = msg_id
+                            if not fields:
+                                # Deleted while pending (trimmed, or re-published by the reclaimer)
+                                pipe.xack(VEHICLE_RESULTS_STREAM, AGGREGATOR_GROUP, msg_id)
+                                continue
+                            self.handle_result(pipe, msg_id, fields, recovering)
+
+                self.evict_excess()
+                self.sweep_deadlines()
+
+                if self.writer.due():
+                    try:
+                        self.flush_vehicles()
+                    except Exception as e:
+                        log.warning("Could not write %d vehicles, retrying in %ss: %s", len(self.writer), DB_RETRY_SECONDS, e)
+
+                if messages:
+                    BATCH_TIME.observe(time.perf_counter() - batch_started)
+                PENDING_JOBS.set(self.jobs.in_flight())
+                self.record_first_displays()
+                self.store_traces()
 
             except Exception as e:
-                print(f"Aggregator error: {e}")
+                log.error("Aggregator error: %s", e)
                 time.sleep(1)
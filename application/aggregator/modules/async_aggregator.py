@@ -0,0 +1,239 @@
+import os
+import time
+import queue
+import asyncio
+import logging
+from db_redis.sentinel_redis_config import *
+from modules.aggregator_engine import ResultAggregator, BATCH_TIME, PENDING_JOBS, PENDING_EVICTED, TRACES_STORED
+from modules.db_writer import AsyncVehicleWriter
+from modules.spool import Spool, AsyncSpoolDrainer
+from modules.job_state import AsyncJobStore, JOB_CLAIMED
+
+log = logging.getLogger(__name__)
+
+# Committed batches waiting to be broadcast; when full, writing the next batch waits for broadcasting to catch up
+FLUSHED_BATCHES = 2
+
+
+class AsyncResultAggregator(ResultAggregator):
+    """
+    The aggregator as tasks on the API's event loop, on redis.asyncio and
+    asyncpg instead of a thread of blocking clients. Three tasks run as a
+    pipeline: one reads and merges results, one writes the batches they
+    queue, and one broadcasts and acknowledges each committed batch, so
+    merging continues while a batch commits and the previous one goes out.
+    Nothing is acknowledged before its row is committed or spooled, as in
+    the threaded aggregator (AGGREGATOR_MODE=thread).
+    """
+
+    def __init__(self, manager, db_pool):
+        """
+        Args:
+            manager: WebSocket BroadcastHub instance
+            db_pool: asyncpg connection pool for the aggregator's writes
+        """
+        self.r = get_async_redis_connection()
+        self.consumer = AGGREGATOR_CONSUMER
+        self.jobs = AsyncJobStore(self.r, self.consumer)
+        self.manager = manager
+        self.db_pool = db_pool
+        self.writer = AsyncVehicleWriter(db_pool)
+        self.spool = Spool(os.path.join(SPOOL_DIR, self.consumer))
+        self.spooling = False
+        self.drainer = AsyncSpoolDrainer(self.spool, db_pool, name=self.consumer)
+        self.finished_traces = queue.SimpleQueue()
+        self.first_displays = queue.SimpleQueue()
+        # (flushed, committed) from the writing task to the broadcasting one
+        self.flushed = asyncio.Queue(maxsize=FLUSHED_BATCHES)
+
+
+    async def run(self):
+        log.info("Aggregator started on the event loop: consumer %s", self.consumer)
+        await asyncio.gather(self.read_results(), self.write_batches(), self.publish_batches(), self.drainer.run())
+
+
+    async def handle_results(self, pipe, entries, recovering):
+        """Merge a read's results concurrently, then act on each in stream order"""
+        parsed = [self.parse_result(fields) for _, fields in entries]
+        merges = await asyncio.gather(*(self.jobs.merge(*args) for _, _, _, args in parsed))
+
+        for (msg_id, _), (job_id, worker, results, _), merge in zip(entries, parsed, merges):
+            state, _, claimed_by, _ = merge
+            if state == JOB_CLAIMED and claimed_by == self.consumer and recovering:
+                # This consumer completed the job before a restart but never stored it
+                job, _, _ = await self.jobs.load(job_id)
+                if job is not None:
+                    self.finalize_job(job_id, job, msg_id, status=self.final_status(job), first=True)
+                    continue
+            self.merged(pipe, msg_id, job_id, worker, results, merge)
+
+
+    async def retry_job(self, job_id, job, missing):
+        pipe = self.r.pipeline(transaction=False)
+        for stream, fields in self.retry_messages(job_id, job, missing):
+            pipe.xadd(stream, fields, **trim_args(stream))
+        await pipe.execute()
+        self.log_retry(job_id, job, missing)
+
+
+    async def evict_excess(self):
+        for job_id in await self.jobs.evict(MAX_PENDING_JOBS):
+            job, _, _ = await self.jobs.load(job_id)
+            if job is None:
+                await self.jobs.drop_deadline(job_id)
+                continue
+            PENDING_EVICTED.inc()
+            log.warning("Pending vehicles at MAX_PENDING_JOBS (%d), evicting %s", MAX_PENDING_JOBS, job_id, extra={"job_id": job_id})
+            self.finalize_job(job_id, job, status="partial")
+
+
+    async def sweep_deadlines(self):
+        now = time.time()
+        for job_id in await self.jobs.claim_due(now, now + PENDING_TIMEOUT_MS / 1000):
+            job, finalized_by, stored = await self.jobs.load(job_id)
+            if job is None or stored:
+                await self.jobs.drop_deadline(job_id)
+                continue
+
+            if finalized_by is not None:
+                log.warning("Taking over %s from %s, which has not stored it", job_id, finalized_by, extra={"job_id": job_id})
+                await self.jobs.take_over(job_id)
+                self.finalize_job(job_id, job, status=self.final_status(job), first=True)
+                continue
+
+            if job["retries"] >= MAX_RETRIES:
+                if await self.jobs.claim_final(job_id):
+                    self.finalize_job(job_id, job, status="partial")
+                continue
+
+            job["retries"] = await self.jobs.retried(job_id)
+            missing = [worker for worker in job["expected_workers"] if worker not in job["results"]]
+            try:
+                await self.retry_job(job_id, job, missing)
+            except Exception as e:
+                log.error("Could not retry %s: %s", job_id, e, extra={"job_id": job_id})
+
+
+    async def read_results(self):
+        """Read, merge and queue results; also sweeps deadlines and evicts past MAX_PENDING_JOBS"""
+        # Results delivered to this consumer before a restart and never acknowledged first, then new ones
+        cursor = "0"
+        while True:
+            try:
+                wait = await self.jobs.seconds_until_deadline()
+                messages = await self.r.xreadgroup(
+                    AGGREGATOR_GROUP, self.consumer,
+                    {VEHICLE_RESULTS_STREAM: cursor},
+                    count=10, block=1000 if wait is None else max(1, min(1000, int(wait * 1000)))
+                )
+                recovering = cursor != ">"
+                if recovering and not any(msgs for _, msgs in messages or []):
+                    log.info("Recovered unacknowledged results, reading new ones")
+                    cursor = ">"
+
+                batch_started = time.perf_counter()
+                pipe = self.r.pipeline(transaction=False)
+                for stream, msgs in messages or []:
+                    if recovering and msgs:
+                        cursor = msgs[-1][0]
+                    # Deleted while pending (trimmed, or re-published by the reclaimer)
+                    for msg_id, fields in msgs:
+                        if not fields:
+                            pipe.xack(VEHICLE_RESULTS_STREAM, AGGREGATOR_GROUP, msg_id)
+                    await self.handle_results(pipe, [(msg_id, fields) for msg_id, fields in msgs if fields], recovering)
+                await pipe.execute()
+
+                await self.evict_excess()
+                await self.sweep_deadlines()
+
+                if messages:
+                    BATCH_TIME.observe(time.perf_counter() - batch_started)
+                PENDING_JOBS.set(await self.jobs.in_flight())
+
+            except Exception as e:
+                log.error("Aggregator error: %s", e)
+                await asyncio.sleep(1)
+
+
+    async def write_vehicles(self):
+        """ResultAggregator.write_vehicles() on the asyncpg writer"""
+        if self.spooling and not self.spool.depth():
+            self.spooling = False
+            log.info("Spool drained, writing to the database again")
+
+        if self.spooling:
+            return await self.writer.spool(self.spool)
+
+        started = time.monotonic()
+        try:
+            flushed = await self.writer.flush()
+        except Exception as e:
+            log.warning("Database unavailable, spooling %d vehicles locally: %s", len(self.writer), e)
+            self.spooling = True
+            return await self.writer.spool(self.spool)
+
+        elapsed_ms = (time.monotonic() - started) * 1000
+        if elapsed_ms > SPOOL_SLOW_FLUSH_MS:
+            log.warning("Database falling behind (%.0f ms for %d vehicles), spooling locally", elapsed_ms, len(flushed))
+            self.spooling = True
+        return flushed
+
+
+    async def write_batches(self):
+        """Write each batch once it is due and hand it to publish_batches(); rows queued meanwhile wait for the next"""
+        while True:
+            wait = self.writer.seconds_until_due()
+            if wait != 0:
+                self.writer.ready.clear()
+                try:
+                    await asyncio.wait_for(self.writer.ready.wait(), timeout=1 if wait is None else wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                flushed = await self.write_vehicles()
+            except Exception as e:
+                log.warning("Could not write %d vehicles, retrying in %ss: %s", len(self.writer), DB_RETRY_SECONDS, e)
+                await asyncio.sleep(DB_RETRY_SECONDS)
+                continue
+            await self.flushed.put((flushed, time.monotonic()))
+
+
+    async def publish_batches(self):
+        """Broadcast each committed batch, then acknowledge it and store the traces of its vehicles"""
+        while True:
+            flushed, committed = await self.flushed.get()
+            try:
+                pipe = self.r.pipeline(transaction=False)
+                for done, written in flushed:
+                    broadcast = self.stored_vehicle(pipe, done, written, committed)
+                    if broadcast is None:
+                        continue
+                    try:
+                        await broadcast
+                    except Exception as e:
+                        log.warning("Could not broadcast %s: %s", done["job_id"], e, extra={"job_id": done["job_id"]})
+                self.queue_first_displays(pipe)
+                await pipe.execute()
+            except Exception as e:
+                log.error("Could not acknowledge %d stored vehicles: %s", len(flushed), e)
+            await self.store_traces()
+
+
+    async def store_traces(self):
+        rows = self.collect_trace_rows()
+        if not rows:
+            return
+
+        try:
+            async with self.db_pool.acquire() as conn:
+                await conn.executemany("""
+                    INSERT INTO processing_jobs (job_id, vehicle_id, worker_type, vehicle_type, status,
+                                                 result, stages, started_at, completed_at)
+                    VALUES ($1, $2, $3, $4, $5, $6::jsonb, $7::jsonb, $8, $9)
+                    ON CONFLICT (job_id, worker_type) DO NOTHING
+                """, rows)
+            TRACES_STORED.inc(len(rows))
+        except Exception as e:
+            log.warning("Could not store %d job trace rows: %s", len(rows), e)
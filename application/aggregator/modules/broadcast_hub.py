@@ -0,0 +1,173 @@
+import json
+import time
+import asyncio
+import logging
+from collections import deque
+from db_redis.sentinel_redis_config import *
+from common.metrics import counter, gauge, histogram
+
+log = logging.getLogger(__name__)
+
+SLOW_CLIENT_POLICIES = ("drop_oldest", "coalesce", "disconnect")
+
+# Close code for clients disconnected for falling behind ("try again later"; the dashboard reconnects)
+SLOW_CLIENT_CLOSE_CODE = 1013
+
+CLIENTS = gauge("sentinel_ws_clients", "Connected WebSocket clients (this API process)")
+SEND_LAG = histogram("sentinel_ws_send_lag_seconds", "Time from broadcast to the message being sent to a client")
+
+
+def count_dropped(reason, n=1):
+    counter("sentinel_ws_dropped_total", "Messages not sent to slow WebSocket clients", reason=reason).inc(n)
+
+
+class Client:
+    """One WebSocket client: its outbound messages as (queued_at, message) and the task sending them"""
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.queue = deque()
+        self.ready = asyncio.Event()
+        self.writer = None
+        # When the send in progress started, None between sends
+        self.sending_since = None
+
+
+class BroadcastHub:
+    """
+    WebSocket connection manager that never waits on a client while
+    broadcasting: broadcast() appends the message to every client's bounded
+    queue and a writer task per client sends it. A client whose queue is
+    full (WS_QUEUE_SIZE) is handled by WS_SLOW_CLIENT_POLICY:
+
+        drop_oldest  drop the client's oldest queued message
+        coalesce     fold the message into one queued for the same vehicle,
+                     dropping the oldest if there is none
+        disconnect   close the client; the dashboard reconnects and reloads
+
+    A client whose current send has taken longer than WS_SEND_TIMEOUT is
+    disconnected at the next broadcast, whatever the policy.
+    """
+
+    def __init__(self, queue_size=WS_QUEUE_SIZE, policy=WS_SLOW_CLIENT_POLICY, send_timeout=WS_SEND_TIMEOUT):
+        if policy not in SLOW_CLIENT_POLICIES:
+            raise ValueError(f"Unknown WS_SLOW_CLIENT_POLICY {policy!r} (expected one of {', '.join(SLOW_CLIENT_POLICIES)})")
+        self.queue_size = queue_size
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.clients = {}
+        # Closes in progress, referenced until they finish
+        self.closing = set()
+
+
+    async def connect(self, websocket):
+        await websocket.accept()
+        client = Client(websocket)
+        client.writer = asyncio.create_task(self.write(client))
+        self.clients[websocket] = client
+        CLIENTS.set(len(self.clients))
+
+
+    def disconnect(self, websocket):
+        """Forget the client and stop its writer; safe to call more than once"""
+        client = self.clients.pop(websocket, None)
+        if client is None:
+            return
+        CLIENTS.set(len(self.clients))
+        if client.writer is not asyncio.current_task():
+            client.writer.cancel()
+
+
+    async def broadcast(self, message: str):
+        """Queue `message` for every client; returns without waiting for any send"""
+        queued_at = time.monotonic()
+        for client in list(self.clients.values()):
+            if client.sending_since is not None and queued_at - client.sending_since > self.send_timeout:
+                self.close_slow(client, f"send stalled for {queued_at - client.sending_since:.0f}s")
+                continue
+            if len(client.queue) >= self.queue_size and not self.make_room(client, message):
+                continue
+            client.queue.append((queued_at, message))
+            client.ready.set()
+
+
+    def make_room(self, client, message):
+        """Apply the slow-client policy to a full queue; True if `message` should still be appended"""
+        if self.policy == "disconnect":
+            self.close_slow(client, f"{len(client.queue)} messages behind")
+            return False
+
+        if self.policy == "coalesce" and self.coalesce(client, message):
+            count_dropped("coalesced")
+            return False
+
+        client.queue.popleft()
+        count_dropped("drop_oldest")
+        return True
+
+
+    def coalesce(self, client, message):
+        """
+        Fold `message` into the newest queued message for the same vehicle:
+        a whole vehicle replaces it, a patch updates its fields. Keeps the
+        queued message's place and broadcast time. False if there is none.
+        """
+        update = json.loads(message)
+        vehicle_id = update.get("vehicle_id")
+        if vehicle_id is None:
+            return False
+
+        for index in range(len(client.queue) - 1, -1, -1):
+            queued_at, queued = client.queue[index]
+            pending = json.loads(queued)
+            if pending.get("vehicle_id") != vehicle_id:
+                continue
+            if update.get("type") != "vehicle_patch":
+                client.queue[index] = (queued_at, message)
+            else:
+                pending.update({field: value for field, value in update.items() if field != "type"})
+                client.queue[index] = (queued_at, json.dumps(pending))
+            return True
+        return False
+
+
+    def close_slow(self, client, reason):
+        """Disconnect a client that fell behind, dropping its queue and the message being broadcast, and close its socket in the background"""
+        self.disconnect(client.websocket)
+        count_dropped("disconnected", len(client.queue) + 1)
+        client.queue.clear()
+        counter("sentinel_ws_slow_disconnects_total", "WebSocket clients disconnected for falling behind").inc()
+        log.warning("Disconnecting slow WebSocket client (%s)", reason)
+
+        closing = asyncio.create_task(self.close(client.websocket))
+        self.closing.add(closing)
+        closing.add_done_callback(self.closing.discard)
+
+
+    async def close(self, websocket):
+        try:
+            await asyncio.wait_for(websocket.close(code=SLOW_CLIENT_CLOSE_CODE, reason="Client too slow"), self.send_timeout)
+        except Exception:
+            # Already gone, or stalled too; the receive loop sees the disconnect eventually
+            pass
+
+
+    async def write(self, client):
+        """Send the client's queued messages in order until it disconnects"""
+        try:
+            while True:
+                if not client.queue:
+                    client.ready.clear()
+                    await client.ready.wait()
+                    continue
+
+                queued_at, message = client.queue.popleft()
+                client.sending_since = time.monotonic()
+                await client.websocket.send_text(message)
+                client.sending_since = None
+                SEND_LAG.observe(time.monotonic() - queued_at)
+
+        except Exception as e:
+            log.info("WebSocket send failed, dropping client: %s", e)
+            counter("sentinel_ws_send_failures_total", "WebSocket clients dropped after a failed send").inc()
+            self.disconnect(client.websocket)
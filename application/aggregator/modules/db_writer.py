@@ -0,0 +1,349 @@
+import io
+import time
+import asyncio
+import datetime
+import logging
+from contextlib import contextmanager
+from psycopg2.extras import execute_values
+from db_redis.sentinel_redis_config import *
+from common.metrics import counter, histogram
+
+log = logging.getLogger(__name__)
+
+VEHICLE_COLUMNS = ("vehicle_id", "vehicle_type", "keyframe_url", "plate_url", "color", "color_hex",
+                   "vehicle_number", "model", "location", "timestamp", "status")
+# Status of a row that is still collecting worker results; every other status is final
+IN_PROGRESS = "processing"
+# Columns filled in by worker results
+RESULT_COLUMNS = ("color", "color_hex", "vehicle_number", "model")
+# A re-written row takes every column but the key, unless it already reached a final status. Result
+# columns never go back to empty, so rows from aggregators that saw fewer results can land in any order
+UPSERT = ", ".join(
+    f"{column} = COALESCE(NULLIF(EXCLUDED.{column}, ''), {{table}}.{column})" if column in RESULT_COLUMNS
+    else f"{column} = EXCLUDED.{column}"
+    for column in VEHICLE_COLUMNS[1:]
+)
+
+FLUSH_TIME = histogram("sentinel_db_flush_seconds", "Time to write and commit one batch of vehicles")
+FLUSHES = counter("sentinel_db_flushes_total", "Committed vehicle batches")
+FLUSHED_ROWS = counter("sentinel_db_flushed_rows_total", "Vehicles in committed batches")
+DUPLICATES = counter("sentinel_db_duplicate_vehicles_total", "Vehicle rows already final (re-published jobs), skipped")
+FLUSH_FAILURES = counter("sentinel_db_flush_failures_total", "Batches that failed to commit and were kept for retry")
+
+
+@contextmanager
+def pooled_connection(db_pool):
+    """
+    Connection from a psycopg2 pool for one transaction: committed on
+    success, rolled back on error. Connections that broke are closed
+    instead of going back to the pool.
+    """
+    conn = db_pool.getconn()
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        if not conn.closed:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+        raise
+    finally:
+        db_pool.putconn(conn, close=bool(conn.closed))
+
+
+def vehicle_row(job_data):
+    return (
+        job_data.get("vehicle_id"),
+        job_data.get("vehicle_type"),
+        job_data.get("keyframe_url"),
+        job_data.get("plate_url"),
+        job_data.get("color", ""),
+        job_data.get("color_hex", "#000000"),
+        job_data.get("vehicle_number", ""),
+        job_data.get("model", ""),
+        job_data.get("location", "UNKNOWN"),
+        job_data.get("timestamp"),
+        job_data.get("status", "completed")
+    )
+
+
+def latest_rows(rows):
+    """
+    One row per vehicle_id, since a single ON CONFLICT DO UPDATE statement
+    may not touch a row twice: a final row wins over a "processing" one,
+    otherwise the later row (it has more of the results) wins.
+    """
+    latest = {}
+    for row in rows:
+        current = latest.get(row[0])
+        if current is None or row[-1] != IN_PROGRESS or current[-1] == IN_PROGRESS:
+            latest[row[0]] = row
+    return list(latest.values())
+
+
+def copy_value(value):
+    """A field in COPY's text format"""
+    if value is None:
+        return "\\N"
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def insert_values(cursor, rows, table="vehicles"):
+    """Multi-row upsert; returns the vehicle_ids that were inserted or updated"""
+    rows = latest_rows(rows)
+    written = execute_values(cursor, f"""
+        INSERT INTO {table} ({", ".join(VEHICLE_COLUMNS)})
+        VALUES %s
+        ON CONFLICT (vehicle_id) DO UPDATE SET {UPSERT.format(table=table)}
+        WHERE {table}.status = '{IN_PROGRESS}'
+        RETURNING vehicle_id
+    """, rows, page_size=len(rows), fetch=True)
+    return {vehicle_id for vehicle_id, in written}
+
+
+def insert_copy(cursor, rows, table="vehicles"):
+    """COPY into a session temp table, then one upserting INSERT ... SELECT; returns the vehicle_ids that were written"""
+    rows = latest_rows(rows)
+    columns = ", ".join(VEHICLE_COLUMNS)
+    staging = f"{table}_incoming"
+    cursor.execute(f"""
+        CREATE TEMP TABLE IF NOT EXISTS {staging} ON COMMIT DELETE ROWS
+        AS SELECT {columns} FROM {table} WITH NO DATA
+    """)
+    data = io.StringIO("".join("\t".join(copy_value(value) for value in row) + "\n" for row in rows))
+    cursor.copy_expert(f"COPY {staging} ({columns}) FROM STDIN", data)
+    cursor.execute(f"""
+        INSERT INTO {table} ({columns})
+        SELECT {columns} FROM {staging}
+        ON CONFLICT (vehicle_id) DO UPDATE SET {UPSERT.format(table=table)}
+        WHERE {table}.status = '{IN_PROGRESS}'
+        RETURNING vehicle_id
+    """)
+    return {vehicle_id for vehicle_id, in cursor.fetchall()}
+
+
+WRITERS = {"values": insert_values, "copy": insert_copy}
+
+
+async def insert_unnest(conn, rows, table="vehicles"):
+    """asyncpg multi-row upsert from one text[] parameter per column; returns the vehicle_ids that were written"""
+    rows = latest_rows(rows)
+    columns = ", ".join(VEHICLE_COLUMNS)
+    arrays = ", ".join(f"${i}::text[]" for i in range(1, len(VEHICLE_COLUMNS) + 1))
+    incoming = ", ".join(f"incoming.{column}::timestamp" if column == "timestamp" else f"incoming.{column}"
+                         for column in VEHICLE_COLUMNS)
+    values = [[None if value is None else str(value) for value in column] for column in zip(*rows)]
+    written = await conn.fetch(f"""
+        INSERT INTO {table} ({columns})
+        SELECT {incoming}
+        FROM unnest({arrays}) AS incoming ({columns})
+        ON CONFLICT (vehicle_id) DO UPDATE SET {UPSERT.format(table=table)}
+        WHERE {table}.status = '{IN_PROGRESS}'
+        RETURNING vehicle_id
+    """, *values)
+    return {record["vehicle_id"] for record in written}
+
+
+async def insert_copy_records(conn, rows, table="vehicles"):
+    """asyncpg binary COPY into a session temp table, then one upserting INSERT ... SELECT"""
+    rows = latest_rows(rows)
+    columns = ", ".join(VEHICLE_COLUMNS)
+    staging = f"{table}_incoming"
+    await conn.execute(f"""
+        CREATE TEMP TABLE IF NOT EXISTS {staging} ON COMMIT DELETE ROWS
+        AS SELECT {columns} FROM {table} WITH NO DATA
+    """)
+    # Binary COPY takes typed values: the timestamp column needs a datetime, not its ISO string
+    timestamp = VEHICLE_COLUMNS.index("timestamp")
+    records = [
+        tuple(datetime.datetime.fromisoformat(value) if i == timestamp and isinstance(value, str) else value
+              for i, value in enumerate(row))
+        for row in rows
+    ]
+    await conn.copy_records_to_table(staging, records=records, columns=VEHICLE_COLUMNS)
+    written = await conn.fetch(f"""
+        INSERT INTO {table} ({columns})
+        SELECT {columns} FROM {staging}
+        ON CONFLICT (vehicle_id) DO UPDATE SET {UPSERT.format(table=table)}
+        WHERE {table}.status = '{IN_PROGRESS}'
+        RETURNING vehicle_id
+    """)
+    return {record["vehicle_id"] for record in written}
+
+
+ASYNC_WRITERS = {"values": insert_unnest, "copy": insert_copy_records}
+
+
+class VehicleWriter:
+    """
+    Write-behind batcher for vehicle rows. The aggregator add()s a row each
+    time a vehicle changes (first result, each later one, completion) with
+    whatever it needs to do once the row is stored (broadcast, completion
+    ack, XACK); flush() writes everything waiting in one transaction on a
+    pooled connection, with execute_values or COPY, once DB_BATCH_ROWS rows
+    are waiting or the oldest has waited DB_FLUSH_MS.
+
+    Rows are upserted on vehicle_id, but only over a row still "processing":
+    a re-published job never creates a second row or rewrites a finished
+    one, and flush() reports which rows were written. A batch that fails to
+    commit is kept and retried after DB_RETRY_SECONDS, unless the caller
+    moves it to the local spool with spool().
+    """
+
+    def __init__(self, db_pool, mode=DB_WRITE_MODE, batch_rows=DB_BATCH_ROWS, flush_ms=DB_FLUSH_MS, table="vehicles"):
+        """
+        Args:
+            db_pool: psycopg2 connection pool
+            mode: "values" or "copy"
+            batch_rows: Vehicles that trigger a flush
+            flush_ms: Longest a vehicle waits for a flush
+            table: Table to write to (the benchmark uses a scratch copy)
+        """
+        if mode not in WRITERS:
+            raise ValueError(f"Unknown DB_WRITE_MODE {mode!r} (expected {' or '.join(WRITERS)})")
+        self.db_pool = db_pool
+        self.write = WRITERS[mode]
+        self.batch_rows = batch_rows
+        self.flush_seconds = flush_ms / 1000
+        self.table = table
+        self.pending = []           # (row, context)
+        self.oldest = None          # time.monotonic() of the first vehicle waiting
+        self.retry_at = 0
+
+    def __len__(self):
+        return len(self.pending)
+
+    def add(self, job_data, context=None):
+        if not self.pending:
+            self.oldest = time.monotonic()
+        self.pending.append((vehicle_row(job_data), context))
+
+    def seconds_until_due(self):
+        """0 when a flush is due, None when nothing is waiting"""
+        if not self.pending:
+            return None
+        now = time.monotonic()
+        if len(self.pending) >= self.batch_rows:
+            return max(0, self.retry_at - now)
+        return max(0, self.oldest + self.flush_seconds - now, self.retry_at - now)
+
+    def due(self):
+        return self.seconds_until_due() == 0
+
+    def take(self):
+        """Remove and return every waiting (row, context)"""
+        batch = self.pending
+        self.pending = []
+        self.oldest = None
+        return batch
+
+    def put_back(self, batch):
+        """Return a batch that failed to commit, ahead of anything added since, to retry after DB_RETRY_SECONDS"""
+        FLUSH_FAILURES.inc()
+        self.pending = batch + self.pending
+        self.oldest = self.oldest or time.monotonic()
+        self.retry_at = time.monotonic() + DB_RETRY_SECONDS
+
+    def written(self, batch, stored):
+        """[(context, written)] for a committed batch, given the vehicle_ids the upsert wrote"""
+        FLUSHES.inc()
+        FLUSHED_ROWS.inc(len(batch))
+
+        # Every update of a written vehicle counts, but only the first final one (a job completed twice)
+        results = []
+        finished = set()
+        for row, context in batch:
+            vehicle_id = row[0]
+            written = vehicle_id in stored and vehicle_id not in finished
+            if row[-1] != IN_PROGRESS:
+                finished.add(vehicle_id)
+            if not written:
+                DUPLICATES.inc()
+            results.append((context, written))
+        return results
+
+    def spool(self, spool):
+        """Append every waiting vehicle to the local spool instead of Postgres; returns [(context, True)]"""
+        if not self.pending:
+            return []
+        batch = self.take()
+        try:
+            spool.append([row for row, _ in batch])
+        except Exception:
+            self.put_back(batch)
+            raise
+        self.retry_at = 0
+        return [(context, True) for _, context in batch]
+
+    def flush(self):
+        """Write and commit every waiting vehicle; returns [(context, written)] in the order added"""
+        if not self.pending:
+            return []
+        batch = self.take()
+        try:
+            with FLUSH_TIME.time(), pooled_connection(self.db_pool) as conn:
+                with conn.cursor() as cursor:
+                    stored = self.write(cursor, [row for row, _ in batch], self.table)
+        except Exception:
+            self.put_back(batch)
+            raise
+        return self.written(batch, stored)
+
+
+class AsyncVehicleWriter(VehicleWriter):
+    """
+    VehicleWriter for the asyncio aggregator, on an asyncpg pool: rows are
+    upserted with unnest() arrays ("values") or binary COPY ("copy"), and
+    spooled from a worker thread so the fsync never blocks the event loop.
+    Rows added while a batch is being written wait for the next one;
+    `ready` is set whenever a row is added, so the flushing task can wake
+    for a full batch instead of polling.
+    """
+
+    def __init__(self, db_pool, mode=DB_WRITE_MODE, batch_rows=DB_BATCH_ROWS, flush_ms=DB_FLUSH_MS, table="vehicles"):
+        """
+        Args:
+            db_pool: asyncpg connection pool
+            mode: "values" or "copy"
+            batch_rows: Vehicles that trigger a flush
+            flush_ms: Longest a vehicle waits for a flush
+            table: Table to write to
+        """
+        if mode not in ASYNC_WRITERS:
+            raise ValueError(f"Unknown DB_WRITE_MODE {mode!r} (expected {' or '.join(ASYNC_WRITERS)})")
+        super().__init__(db_pool, "values", batch_rows, flush_ms, table)
+        self.write = ASYNC_WRITERS[mode]
+        self.ready = asyncio.Event()
+
+    def add(self, job_data, context=None):
+        super().add(job_data, context)
+        self.ready.set()
+
+    async def spool(self, spool):
+        """Append every waiting vehicle to the local spool instead of Postgres; returns [(context, True)]"""
+        if not self.pending:
+            return []
+        batch = self.take()
+        try:
+            await asyncio.to_thread(spool.append, [row for row, _ in batch])
+        except Exception:
+            self.put_back(batch)
+            raise
+        self.retry_at = 0
+        return [(context, True) for _, context in batch]
+
+    async def flush(self):
+        """Write and commit every waiting vehicle; returns [(context, written)] in the order added"""
+        if not self.pending:
+            return []
+        batch = self.take()
+        try:
+            with FLUSH_TIME.time():
+                async with self.db_pool.acquire() as conn, conn.transaction():
+                    stored = await self.write(conn, [row for row, _ in batch], self.table)
+        except Exception:
+            self.put_back(batch)
+            raise
+        return self.written(batch, stored)
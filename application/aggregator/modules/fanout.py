@@ -0,0 +1,47 @@
+import asyncio
+import logging
+from db_redis.sentinel_redis_config import *
+
+log = logging.getLogger(__name__)
+
+
+class RedisFanout:
+    """
+    Stands in for the WebSocket BroadcastHub in the headless
+    aggregation process (API_LAYOUT=split): broadcast() publishes each
+    dashboard message on VEHICLE_UPDATES_CHANNEL, and every API worker
+    relays it to its own clients with relay_updates().
+    """
+
+    def __init__(self, r):
+        """
+        Args:
+            r: redis.asyncio connection, on the loop broadcast() is awaited from
+        """
+        self.r = r
+
+    async def broadcast(self, message: str):
+        await self.r.publish(VEHICLE_UPDATES_CHANNEL, message)
+
+
+async def relay_updates(manager):
+    """
+    Forward every message published on VEHICLE_UPDATES_CHANNEL to this
+    API worker's WebSocket clients; resubscribes after a Redis error.
+    Messages published while the subscription is down are not replayed;
+    the vehicles are in the database for the next page load.
+    """
+    r = get_async_redis_connection()
+    while True:
+        try:
+            async with r.pubsub(ignore_subscribe_messages=True) as pubsub:
+                await pubsub.subscribe(VEHICLE_UPDATES_CHANNEL)
+                log.info("Relaying dashboard updates from %s", VEHICLE_UPDATES_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        await manager.broadcast(message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("Dashboard update relay lost its subscription, retrying: %s", e)
+            await asyncio.sleep(1)
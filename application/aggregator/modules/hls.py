@@ -0,0 +1,57 @@
+import subprocess
+import logging
+
+log = logging.getLogger(__name__)
+
+
+# TEMP RTSP TO HLS CONVERSION - REMOVE
+def start_hls_conversion(rtsp_url, output_dir):
+    """Convert RTSP to HLS using FFmpeg with browser-compatible settings"""
+    output_file = output_dir / "stream.m3u8"
+    
+    ffmpeg_cmd = [
+        "ffmpeg",
+        "-rtsp_transport", "tcp",  # Use TCP for more reliable RTSP
+        "-i", rtsp_url,
+        
+        # Video encoding - Re-encode to H.264 (browser compatible)
+        "-c:v", "libx264",
+        "-preset", "veryfast",  # Fast encoding
+        "-tune", "zerolatency",  # Low latency for live streaming
+        "-profile:v", "baseline",  # Maximum browser compatibility
+        "-level", "3.0",
+        "-g", "30",  # GOP size (keyframe interval)
+        "-sc_threshold", "0",  # Disable scene change detection
+        
+        # Video quality
+        "-b:v", "2000k",  # 2 Mbps bitrate
+        "-maxrate", "2000k",
+        "-bufsize", "4000k",
+        
+        # Audio encoding
+        "-c:a", "aac",
+        "-b:a", "128k",
+        "-ar", "44100",  # Sample rate
+        
+        # HLS settings
+        "-f", "hls",
+        "-hls_time", "2",  # 2-second segments
+        "-hls_list_size", "5",  # Keep 5 segments in playlist
+        "-hls_flags", "delete_segments+append_list",  # Delete old segments
+        "-hls_segment_type", "mpegts",  # Use MPEG-TS container
+        "-start_number", "1",
+        
+        # Output
+        str(output_file)
+    ]
+    
+    log.info("Starting HLS conversion: %s", output_file)
+    
+    process = subprocess.Popen(
+        ffmpeg_cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True
+    )
+    
+    return process
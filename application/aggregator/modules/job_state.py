@@ -0,0 +1,304 @@
+import json
+import time
+import datetime
+import logging
+from db_redis.sentinel_redis_config import *
+
+log = logging.getLogger(__name__)
+
+# What merge() found, see MERGE_RESULT
+JOB_PENDING, JOB_COMPLETED, JOB_STORED, JOB_CLAIMED = 0, 1, 2, 3
+
+# Merge one result into a job's state and report what the caller should do with it.
+# KEYS: job hash, deadlines zset
+# ARGV: ttl ms, first deadline, job_id, consumer, #fields set once, name/value..., #fields set always, name/value...
+# Returns {state, first, claimed_by, hash as a flat list}:
+#   0 still missing results (first = 1 when this was the job's first result)
+#   1 this result completed the job and the caller now owns finalizing it (its deadline
+#     stays as a lease, so another consumer takes over if the job is not stored by then)
+#   2 the job is already stored, 3 another consumer is finalizing it (nothing merged)
+MERGE_RESULT = """
+local key, deadlines = KEYS[1], KEYS[2]
+if redis.call('HEXISTS', key, 'stored') == 1 then
+    return {2, 0, '', {}}
+end
+local claimed_by = redis.call('HGET', key, 'finalized')
+if claimed_by then
+    return {3, 0, claimed_by, {}}
+end
+
+local i = 6
+for _ = 1, tonumber(ARGV[5]) do
+    redis.call('HSETNX', key, ARGV[i], ARGV[i + 1])
+    i = i + 2
+end
+
+local expected = {}
+for worker in string.gmatch(redis.call('HGET', key, 'expected') or '', '[^,]+') do
+    table.insert(expected, worker)
+end
+local first = 1
+for _, worker in ipairs(expected) do
+    if redis.call('HEXISTS', key, 'r:' .. worker) == 1 then
+        first = 0
+    end
+end
+
+local count = tonumber(ARGV[i])
+i = i + 1
+for _ = 1, count do
+    redis.call('HSET', key, ARGV[i], ARGV[i + 1])
+    i = i + 2
+end
+
+local complete = 1
+for _, worker in ipairs(expected) do
+    if redis.call('HEXISTS', key, 'r:' .. worker) == 0 then
+        complete = 0
+    end
+end
+
+redis.call('PEXPIRE', key, ARGV[1])
+if complete == 1 then
+    redis.call('HSET', key, 'finalized', ARGV[4])
+    redis.call('ZADD', deadlines, ARGV[2], ARGV[3])
+    return {1, first, ARGV[4], redis.call('HGETALL', key)}
+end
+redis.call('ZADD', deadlines, 'NX', ARGV[2], ARGV[3])
+return {0, first, '', redis.call('HGETALL', key)}
+"""
+
+# Become the consumer that finalizes a job, unless one already is or its state expired.
+# KEYS: job hash. ARGV: consumer
+CLAIM_FINAL = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+return redis.call('HSETNX', KEYS[1], 'finalized', ARGV[1])
+"""
+
+# Claim jobs whose deadline has passed by moving it to the next one, so each is
+# handled by exactly one consumer and comes due again if that consumer dies.
+# KEYS: deadlines zset. ARGV: now, next deadline, limit
+CLAIM_DUE = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[3])
+for _, job_id in ipairs(due) do
+    redis.call('ZADD', KEYS[1], ARGV[2], job_id)
+end
+return due
+"""
+
+# Claim the jobs with the nearest deadlines for eviction until at most `limit` are in
+# flight. Jobs another consumer is finalizing keep their lease deadline in the zset and
+# are walked past; deadlines of expired jobs are dropped. Job hashes are
+# ARGV[1] .. job_id, so this needs every key on one node.
+# KEYS: deadlines zset. ARGV: job key prefix, limit, consumer
+CLAIM_EXCESS = """
+local deadlines = KEYS[1]
+local excess = redis.call('ZCARD', deadlines) - tonumber(ARGV[2])
+local claimed = {}
+local start = 0
+while excess > 0 do
+    local due = redis.call('ZRANGE', deadlines, start, start + 99)
+    if #due == 0 then
+        break
+    end
+    start = start + #due
+    for _, job_id in ipairs(due) do
+        if excess == 0 then
+            break
+        end
+        local key = ARGV[1] .. job_id
+        if redis.call('EXISTS', key) == 0 then
+            redis.call('ZREM', deadlines, job_id)
+            start = start - 1
+            excess = excess - 1
+        elseif redis.call('HSETNX', key, 'finalized', ARGV[3]) == 1 then
+            table.insert(claimed, job_id)
+            excess = excess - 1
+        end
+    end
+end
+return claimed
+"""
+
+
+def job_key(job_id):
+    return f"{JOB_STATE_PREFIX}{job_id}"
+
+
+def decode_state(flat):
+    """
+    The job dict the aggregator works with, from the hash's flat field list.
+    Results are r:<worker>, ingress stamps t:<stage>, per-worker stamps
+    w:<worker> (JSON); the rest are the job's fields.
+    """
+    state = dict(zip(flat[::2], flat[1::2]))
+    published_at = state.get("published_at")
+    return {
+        "vehicle_id": state.get("vehicle_id"),
+        "vehicle_type": state.get("vehicle_type"),
+        "expected_workers": parse_worker_manifest(state.get("expected")),
+        "location": state.get("location"),
+        "timestamp": state.get("timestamp") or None,
+        "published_at": datetime.datetime.fromisoformat(published_at) if published_at else None,
+        "keyframe_url": state.get("keyframe_url") or None,
+        "plate_url": state.get("plate_url") or None,
+        "retries": int(state.get("retries", 0)),
+        "results": {name[2:]: value for name, value in state.items() if name.startswith("r:")},
+        "stamps": {name[2:]: float(value) for name, value in state.items() if name.startswith("t:")},
+        "worker_stamps": {name[2:]: json.loads(value) for name, value in state.items() if name.startswith("w:")}
+    }
+
+
+def decode_hash(state):
+    """(job, finalized_by, stored) from HGETALL of a job, or (None, None, False) once its state expired"""
+    if not state:
+        return None, None, False
+    return decode_state([item for pair in state.items() for item in pair]), state.get("finalized"), "stored" in state
+
+
+def merge_args(job_id, consumer, job_fields, results, stamps, worker, worker_stamps, deadline):
+    """MERGE_RESULT's ARGV for JobStore.merge()"""
+    once = {
+        **{name: "" if value is None else str(value) for name, value in job_fields.items()},
+        **{f"t:{stage}": repr(value) for stage, value in stamps.items()}
+    }
+    always = {
+        **{f"r:{name}": "" if value is None else str(value) for name, value in results.items()},
+        f"w:{worker}": json.dumps(worker_stamps)
+    }
+    args = [JOB_STATE_TTL * 1000, deadline, job_id, consumer, len(once)]
+    for name, value in once.items():
+        args += [name, value]
+    args.append(len(always))
+    for name, value in always.items():
+        args += [name, value]
+    return args
+
+
+class JobStore:
+    """
+    Partial results of in-flight vehicles, kept in Redis instead of one
+    aggregator's memory so a restart loses nothing and several aggregator
+    consumers can share vehicle_results. Each job is a hash that expires
+    JOB_STATE_TTL seconds after its last result; merge() runs as one Lua
+    call that adds a result and tells the caller whether it completed the
+    job, so exactly one consumer finalizes each job. Retry deadlines live in
+    a sorted set that every consumer sweeps with claim_due().
+    """
+
+    def __init__(self, r, consumer=AGGREGATOR_CONSUMER):
+        """
+        Args:
+            r: Redis connection
+            consumer: This aggregator's consumer name, recorded on jobs it finalizes
+        """
+        self.r = r
+        self.consumer = consumer
+        self.merge_result = r.register_script(MERGE_RESULT)
+        self.claim_final_job = r.register_script(CLAIM_FINAL)
+        self.claim_due_jobs = r.register_script(CLAIM_DUE)
+        self.claim_excess_jobs = r.register_script(CLAIM_EXCESS)
+
+    def merge(self, job_id, job_fields, results, stamps, worker, worker_stamps, deadline):
+        """
+        Add one worker result (several for the fused worker).
+
+        Args:
+            job_fields: The job's own fields, only set by its first result
+            results: {worker: result}
+            stamps: Ingress stamps carried on the result
+            worker: Worker that sent it
+            worker_stamps: That worker's stamps for the trace
+            deadline: When to retry missing results, if this is the job's first result
+
+        Returns:
+            (state, first, claimed_by, job) - see MERGE_RESULT; job is None for states 2 and 3
+        """
+        state, first, claimed_by, flat = self.merge_result(keys=[job_key(job_id), JOB_DEADLINES_KEY], args=merge_args(
+            job_id, self.consumer, job_fields, results, stamps, worker, worker_stamps, deadline))
+        return int(state), bool(first), claimed_by, decode_state(flat) if flat else None
+
+    def load(self, job_id):
+        """(job, finalized_by, stored) for a job, or (None, None, False) once its state expired"""
+        return decode_hash(self.r.hgetall(job_key(job_id)))
+
+    def claim_final(self, job_id):
+        """Take over finalizing a job that timed out; False if another consumer already has"""
+        return bool(self.claim_final_job(keys=[job_key(job_id)], args=[self.consumer]))
+
+    def take_over(self, job_id):
+        """Finalize a job whose claim outlived its deadline (the consumer that claimed it died or stalled)"""
+        self.r.hset(job_key(job_id), "finalized", self.consumer)
+
+    def claim_due(self, now, next_deadline, limit=100):
+        """Job ids whose deadline passed, now held by this consumer until next_deadline"""
+        return self.claim_due_jobs(keys=[JOB_DEADLINES_KEY], args=[now, next_deadline, limit])
+
+    def evict(self, limit):
+        """Job ids beyond `limit` in-flight jobs, nearest deadline first, now claimed by this consumer to finalize"""
+        return self.claim_excess_jobs(keys=[JOB_DEADLINES_KEY], args=[JOB_STATE_PREFIX, limit, self.consumer])
+
+    def drop_deadline(self, job_id):
+        self.r.zrem(JOB_DEADLINES_KEY, job_id)
+
+    def retried(self, job_id):
+        return self.r.hincrby(job_key(job_id), "retries", 1)
+
+    def seconds_until_deadline(self):
+        first = self.r.zrange(JOB_DEADLINES_KEY, 0, 0, withscores=True)
+        if not first:
+            return None
+        return max(0, first[0][1] - time.time())
+
+    def in_flight(self):
+        return self.r.zcard(JOB_DEADLINES_KEY)
+
+    def mark_stored(self, pipe, job_id):
+        """After the job's row is committed: later duplicates of its results are dropped until the state expires"""
+        pipe.hset(job_key(job_id), "stored", 1)
+        pipe.expire(job_key(job_id), JOB_STATE_TTL)
+        pipe.zrem(JOB_DEADLINES_KEY, job_id)
+
+    def first_displayed(self, pipe, job_id, stamp):
+        pipe.hsetnx(job_key(job_id), "t:first_display", repr(stamp))
+
+
+class AsyncJobStore(JobStore):
+    """JobStore on a redis.asyncio connection, for the asyncio aggregator; the same calls, awaited"""
+
+    async def merge(self, job_id, job_fields, results, stamps, worker, worker_stamps, deadline):
+        state, first, claimed_by, flat = await self.merge_result(keys=[job_key(job_id), JOB_DEADLINES_KEY], args=merge_args(
+            job_id, self.consumer, job_fields, results, stamps, worker, worker_stamps, deadline))
+        return int(state), bool(first), claimed_by, decode_state(flat) if flat else None
+
+    async def load(self, job_id):
+        return decode_hash(await self.r.hgetall(job_key(job_id)))
+
+    async def claim_final(self, job_id):
+        return bool(await self.claim_final_job(keys=[job_key(job_id)], args=[self.consumer]))
+
+    async def take_over(self, job_id):
+        await self.r.hset(job_key(job_id), "finalized", self.consumer)
+
+    async def claim_due(self, now, next_deadline, limit=100):
+        return await self.claim_due_jobs(keys=[JOB_DEADLINES_KEY], args=[now, next_deadline, limit])
+
+    async def evict(self, limit):
+        return await self.claim_excess_jobs(keys=[JOB_DEADLINES_KEY], args=[JOB_STATE_PREFIX, limit, self.consumer])
+
+    async def drop_deadline(self, job_id):
+        await self.r.zrem(JOB_DEADLINES_KEY, job_id)
+
+    async def retried(self, job_id):
+        return await self.r.hincrby(job_key(job_id), "retries", 1)
+
+    async def seconds_until_deadline(self):
+        first = await self.r.zrange(JOB_DEADLINES_KEY, 0, 0, withscores=True)
+        if not first:
+            return None
+        return max(0, first[0][1] - time.time())
+
+    async def in_flight(self):
+        return await self.r.zcard(JOB_DEADLINES_KEY)
@@ -0,0 +1,280 @@
+import os
+import json
+import time
+import zlib
+import asyncio
+import logging
+import threading
+from pathlib import Path
+from db_redis.sentinel_redis_config import *
+from common.metrics import counter, gauge
+from modules.db_writer import WRITERS, ASYNC_WRITERS, pooled_connection
+
+log = logging.getLogger(__name__)
+
+SPOOL_DEPTH = gauge("sentinel_spool_depth", "Vehicles in the local spool waiting to be replayed")
+SPOOL_BYTES = gauge("sentinel_spool_bytes", "Size of the local spool on disk")
+SPOOL_REPLAY_RATE = gauge("sentinel_spool_replay_rate", "Vehicles replayed per second during the last drain")
+SPOOLED = counter("sentinel_spooled_vehicles_total", "Vehicles written to the local spool instead of Postgres")
+REPLAYED = counter("sentinel_spool_replayed_total", "Spooled vehicles replayed into Postgres")
+
+
+def encode_record(row):
+    """One spool line: CRC32 of the JSON row, then the row"""
+    data = json.dumps(row, default=str, separators=(",", ":"))
+    return f"{zlib.crc32(data.encode()):08x} {data}\n"
+
+
+def read_segment(path):
+    """Rows in a segment; a torn or corrupt line (crash mid-write) is skipped"""
+    rows = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            checksum, _, data = line.rstrip("\n").partition(" ")
+            if not line.endswith("\n") or checksum != f"{zlib.crc32(data.encode()):08x}":
+                log.warning("Skipping damaged spool record %s:%d", path.name, number)
+                continue
+            rows.append(tuple(json.loads(data)))
+    return rows
+
+
+class Spool:
+    """
+    Append-only segment log of vehicle rows on local disk, used while
+    Postgres is unavailable or too slow to keep up. Each append() is one
+    group of rows written and fsynced together (one fsync per batch, not per
+    vehicle). Segments roll over at SPOOL_SEGMENT_BYTES; the drainer seals the
+    active one before replaying it and deletes segments once their rows are
+    committed. Segments left by a previous run are picked up on start.
+    """
+
+    def __init__(self, directory=SPOOL_DIR, segment_bytes=SPOOL_SEGMENT_BYTES):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.lock = threading.Lock()
+        self.active = None          # File the next append goes to
+        self.active_path = None
+        # Segment path -> records, oldest first
+        self.segments = {path: len(read_segment(path)) for path in sorted(self.directory.glob("segment-*.log"))}
+        self.next_sequence = max((int(path.stem.split("-")[1]) for path in self.segments), default=0) + 1
+        if self.segments:
+            log.warning("Found %d spooled vehicles in %d segments from a previous run", self.depth(), len(self.segments))
+
+    def depth(self):
+        with self.lock:
+            return sum(self.segments.values())
+
+    def size(self):
+        # Under the lock: append() may roll a new segment and the drainer remove one meanwhile
+        with self.lock:
+            return sum(path.stat().st_size for path in self.segments if path.exists())
+
+    def fsync_directory(self):
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def roll(self):
+        if self.active:
+            self.active.close()
+        self.active_path = self.directory / f"segment-{self.next_sequence:012d}.log"
+        self.next_sequence += 1
+        self.active = open(self.active_path, "a", encoding="utf-8")
+        self.segments[self.active_path] = 0
+        # Make the new file's directory entry durable too
+        self.fsync_directory()
+
+    def append(self, rows):
+        """Write and fsync a group of rows; once this returns they survive a crash"""
+        data = "".join(encode_record(row) for row in rows)
+        with self.lock:
+            if self.active is None or self.active.tell() >= self.segment_bytes:
+                self.roll()
+            self.active.write(data)
+            self.active.flush()
+            os.fsync(self.active.fileno())
+            self.segments[self.active_path] += len(rows)
+        SPOOLED.inc(len(rows))
+
+    def seal(self):
+        """Close the active segment so it can be replayed; the next append starts a new one"""
+        with self.lock:
+            if self.active:
+                self.active.close()
+                self.active = None
+                self.active_path = None
+
+    def sealed(self):
+        with self.lock:
+            return [path for path in self.segments if path != self.active_path]
+
+    def remove(self, path):
+        with self.lock:
+            path.unlink(missing_ok=True)
+            self.segments.pop(path, None)
+
+
+class SpoolDrainer:
+    """
+    Background replay of the spool into Postgres. Every SPOOL_DRAIN_INTERVAL
+    seconds it replays sealed segments oldest first, in transactions of
+    SPOOL_REPLAY_BATCH rows, and deletes each segment after its last batch
+    commits. The active segment is sealed once nothing else is waiting, so
+    the spool empties while the aggregator is still appending to it.
+    Rows go through the same upsert as live writes: a vehicle whose row is
+    already final is left alone, while a row still "processing" is
+    overwritten by the spooled one (result columns never go back to empty).
+    A segment replayed again after a crash mid-replay therefore rewrites
+    the same values and adds no second row. Depth, size and replay rate are
+    published to sentinel:spool, per aggregator, for /api/pipeline/spool.
+    """
+
+    def __init__(self, spool, db_pool, mode=DB_WRITE_MODE, name=AGGREGATOR_CONSUMER):
+        """
+        Args:
+            spool: Spool to replay
+            db_pool: psycopg2 connection pool
+            mode: "values" or "copy", as for VehicleWriter
+            name: Aggregator the spool belongs to, for the stats
+        """
+        self.spool = spool
+        self.name = name
+        self.db_pool = db_pool
+        self.write = WRITERS[mode]
+        self.r = get_redis_connection()
+        self.replayed_total = 0
+        self.replay_rate = 0.0
+        self.last_error = None
+
+    def replay_segment(self, path):
+        rows = read_segment(path)
+        for start in range(0, len(rows), SPOOL_REPLAY_BATCH):
+            with pooled_connection(self.db_pool) as conn, conn.cursor() as cursor:
+                self.write(cursor, rows[start:start + SPOOL_REPLAY_BATCH])
+        self.spool.remove(path)
+        return len(rows)
+
+    def drain(self):
+        """Replay everything that is spooled; returns vehicles replayed"""
+        if not self.spool.sealed():
+            if not self.spool.depth():
+                return 0
+            self.spool.seal()
+
+        started = time.monotonic()
+        replayed = 0
+        for path in self.spool.sealed():
+            rows = self.replay_segment(path)
+            REPLAYED.inc(rows)
+            replayed += rows
+        elapsed = time.monotonic() - started
+        self.replay_rate = round(replayed / elapsed, 1) if elapsed > 0 else 0.0
+        self.replayed_total += replayed
+        return replayed
+
+    def stats(self):
+        """Update the spool gauges; returns this aggregator's fields for SPOOL_STATS_KEY"""
+        depth = self.spool.depth()
+        size = self.spool.size()
+        SPOOL_DEPTH.set(depth)
+        SPOOL_BYTES.set(size)
+        SPOOL_REPLAY_RATE.set(self.replay_rate)
+        return {f"{self.name}:{field}": json.dumps(value) for field, value in {
+            "depth": depth,
+            "bytes": size,
+            "segments": len(self.spool.segments),
+            "replayed_total": self.replayed_total,
+            "replay_rate": self.replay_rate,
+            "last_error": self.last_error,
+            "updated_at": time.time()
+        }.items()}
+
+    def report(self):
+        self.r.hset(SPOOL_STATS_KEY, mapping=self.stats())
+
+    def replayed(self, replayed):
+        if replayed:
+            log.info("Replayed %d spooled vehicles (%.0f/s), %d left", replayed, self.replay_rate, self.spool.depth())
+        self.last_error = None
+
+    def failed(self, e):
+        if self.last_error is None:
+            log.warning("Spool replay failed, %d vehicles waiting: %s", self.spool.depth(), e)
+        self.last_error = str(e)
+
+    def run(self):
+        while True:
+            try:
+                self.replayed(self.drain())
+            except Exception as e:
+                self.failed(e)
+            try:
+                self.report()
+            except Exception as e:
+                log.debug("Could not publish spool stats: %s", e)
+            time.sleep(SPOOL_DRAIN_INTERVAL)
+
+    def start(self):
+        thread = threading.Thread(target=self.run, name="spool_drainer", daemon=True)
+        thread.start()
+        return thread
+
+
+class AsyncSpoolDrainer(SpoolDrainer):
+    """
+    SpoolDrainer for the asyncio aggregator: run() is a task on the event
+    loop replaying through an asyncpg pool, and segments are read off disk
+    in a worker thread.
+    """
+
+    def __init__(self, spool, db_pool, mode=DB_WRITE_MODE, name=AGGREGATOR_CONSUMER):
+        """
+        Args:
+            spool: Spool to replay
+            db_pool: asyncpg connection pool
+            mode: "values" or "copy", as for AsyncVehicleWriter
+            name: Aggregator the spool belongs to, for the stats
+        """
+        super().__init__(spool, db_pool, mode, name)
+        self.write = ASYNC_WRITERS[mode]
+        self.r = get_async_redis_connection()
+
+    async def replay_segment(self, path):
+        rows = await asyncio.to_thread(read_segment, path)
+        for start in range(0, len(rows), SPOOL_REPLAY_BATCH):
+            async with self.db_pool.acquire() as conn, conn.transaction():
+                await self.write(conn, rows[start:start + SPOOL_REPLAY_BATCH])
+        self.spool.remove(path)
+        return len(rows)
+
+    async def drain(self):
+        if not self.spool.sealed():
+            if not self.spool.depth():
+                return 0
+            self.spool.seal()
+
+        started = time.monotonic()
+        replayed = 0
+        for path in self.spool.sealed():
+            rows = await self.replay_segment(path)
+            REPLAYED.inc(rows)
+            replayed += rows
+        elapsed = time.monotonic() - started
+        self.replay_rate = round(replayed / elapsed, 1) if elapsed > 0 else 0.0
+        self.replayed_total += replayed
+        return replayed
+
+    async def run(self):
+        while True:
+            try:
+                self.replayed(await self.drain())
+            except Exception as e:
+                self.failed(e)
+            try:
+                await self.r.hset(SPOOL_STATS_KEY, mapping=self.stats())
+            except Exception as e:
+                log.debug("Could not publish spool stats: %s", e)
+            await asyncio.sleep(SPOOL_DRAIN_INTERVAL)
@@ -1,6 +1,9 @@
 from fastapi import APIRouter, HTTPException
 from typing import Dict, List, Any, Callable, Optional
 from datetime import datetime
+import logging
+
+log = logging.getLogger(__name__)
 
 router = APIRouter()
 get_db_connection: Callable = None
@@ -122,7 +125,7 @@ async def search_vehicles(
         }
 
     except Exception as e:
-        print(f"Error during vehicle search: {e}")
+        log.error("Error during vehicle search: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error during search.")
     finally:
         if conn:
@@ -0,0 +1,71 @@
+from fastapi import APIRouter, Query
+from typing import Callable, Optional
+
+router = APIRouter()
+
+# This will be injected from main
+get_db_connection: Callable = None
+
+def init_db(db_connection_func: Callable):
+    global get_db_connection
+    get_db_connection = db_connection_func
+
+@router.get("/api/latency")
+async def get_stage_latency(
+    window_minutes: int = Query(default=60, ge=1, le=7 * 24 * 60),
+    vehicle_type: Optional[str] = None
+):
+    """
+    Latency percentiles (ms) per pipeline stage over the last `window_minutes`,
+    from the job traces in processing_jobs.
+
+    End-to-end stages (keyframe_save, plate_and_publish, workers, db_commit,
+    broadcast, total, first_display) come from the per-vehicle 'job' rows;
+    total is the time until a vehicle is shown complete and first_display
+    the time until it is first shown (progressive results); per-worker stages
+    are reported as '<worker>.<stage>' (queue_wait, service, result_delivery).
+    Results are grouped by vehicle type, with "all" covering every type.
+    """
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT CASE WHEN GROUPING(vehicle_type) = 1 THEN 'all' ELSE vehicle_type END,
+                   stage,
+                   COUNT(*),
+                   percentile_cont(0.5) WITHIN GROUP (ORDER BY ms),
+                   percentile_cont(0.95) WITHIN GROUP (ORDER BY ms),
+                   percentile_cont(0.99) WITHIN GROUP (ORDER BY ms),
+                   MAX(ms)
+            FROM (
+                SELECT pj.vehicle_type,
+                       CASE WHEN pj.worker_type = 'job' THEN s.key ELSE pj.worker_type || '.' || s.key END AS stage,
+                       s.value::float AS ms
+                FROM processing_jobs pj, jsonb_each_text(pj.stages) s
+                WHERE pj.completed_at >= NOW() - make_interval(mins => %s)
+                  AND (%s::text IS NULL OR pj.vehicle_type = %s)
+            ) samples
+            GROUP BY GROUPING SETS ((vehicle_type, stage), (stage))
+            ORDER BY 1, 2
+        """, (window_minutes, vehicle_type, vehicle_type))
+
+        stages = {}
+        for vtype, stage, samples, p50, p95, p99, max_ms in cursor.fetchall():
+            stages.setdefault(vtype, {})[stage] = {
+                "samples": samples,
+                "p50_ms": round(p50, 3),
+                "p95_ms": round(p95, 3),
+                "p99_ms": round(p99, 3),
+                "max_ms": round(max_ms, 3)
+            }
+        cursor.close()
+
+        return {
+            "window_minutes": window_minutes,
+            "vehicle_type": vehicle_type,
+            "stages": stages
+        }
+    finally:
+        if conn:
+            conn.close()
@@ -0,0 +1,43 @@
+import os
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from db_redis.sentinel_redis_config import *
+from common.metrics import collect_snapshots, render_prometheus, summarize
+
+router = APIRouter()
+
+# These will be injected from main
+redis_conn = None
+component = None
+
+def init_metrics(redis_ref, component_name):
+    global redis_conn, component
+    redis_conn = redis_ref
+    component = component_name
+
+def stream_gauges():
+    """Queue depth per stream and lag/pending per consumer group, sampled at scrape time"""
+    gauges = []
+    for stream, groups in get_consumer_groups(os.getenv("WORKER_MODE", WORKER_MODE)).items():
+        try:
+            gauges.append(("sentinel_stream_length", "Entries in the stream", {"stream": stream}, redis_conn.xlen(stream)))
+            for info in redis_conn.xinfo_groups(stream):
+                if info["name"] not in groups:
+                    continue
+                labels = {"stream": stream, "group": info["name"]}
+                gauges.append(("sentinel_group_lag", "Entries not yet delivered to the group", labels, info.get("lag") or 0))
+                gauges.append(("sentinel_group_pending", "Entries delivered but not acknowledged", labels, info.get("pending") or 0))
+        except Exception:
+            continue
+    return gauges
+
+@router.get("/metrics")
+def get_metrics():
+    """Prometheus text exposition for every Sentinel process plus stream depths"""
+    snapshots = collect_snapshots(redis_conn, local_component=component)
+    return PlainTextResponse(render_prometheus(snapshots, stream_gauges()), media_type="text/plain; version=0.0.4")
+
+@router.get("/api/metrics")
+def get_metrics_summary():
+    """Per-component totals and latency percentiles (ms)"""
+    return summarize(collect_snapshots(redis_conn, local_component=component))
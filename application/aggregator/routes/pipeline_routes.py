@@ -0,0 +1,56 @@
+from fastapi import APIRouter, Query
+from db_redis.sentinel_redis_config import get_reclaimer_stats, get_autoscaler_stats, get_startup_stats, get_stream_monitor_stats, get_retention_stats, get_ack_tracker_stats, get_spool_stats
+
+router = APIRouter()
+
+# This will be injected from main
+redis_conn = None
+
+def init_redis(redis_ref):
+    global redis_conn
+    redis_conn = redis_ref
+
+@router.get("/api/pipeline/reclaimer")
+async def get_reclaimer_status():
+    """Reclaimed and dead-lettered entry counts per stream/consumer group"""
+    return get_reclaimer_stats(redis_conn)
+
+@router.get("/api/pipeline/autoscaler")
+async def get_autoscaler_status():
+    """Worker replica counts, backlog and scaling decisions per worker type"""
+    return get_autoscaler_stats(redis_conn)
+
+
+@router.get("/api/pipeline/startup")
+async def get_startup_status():
+    """Time-to-ready per component for the last start and recent starts"""
+    return get_startup_stats(redis_conn)
+
+
+@router.get("/api/pipeline/jobs")
+async def get_job_tracker_status():
+    """Jobs ingress is still waiting on and its ack, re-publish and abandon counts"""
+    return get_ack_tracker_stats(redis_conn)
+
+
+@router.get("/api/pipeline/spool")
+async def get_spool_status():
+    """Vehicles spooled locally by each aggregator while Postgres was unavailable, and how fast they are replayed"""
+    return get_spool_stats(redis_conn)
+
+
+@router.get("/api/pipeline/retention")
+async def get_retention_status():
+    """Redis memory, length and acknowledged entries trimmed per stream, plus the retention policy"""
+    return get_retention_stats(redis_conn)
+
+@router.get("/api/pipeline/streams")
+async def get_stream_status():
+    """Latest stream monitor sample: ingest/consume rates, lag, lag age and consumer idle time per group"""
+    return get_stream_monitor_stats(redis_conn, alerts=0)["sample"]
+
+
+@router.get("/api/pipeline/streams/alerts")
+async def get_stream_alerts(limit: int = Query(default=20, ge=1, le=100)):
+    """Recent lag-age SLO alerts (firing and resolved), newest first"""
+    return get_stream_monitor_stats(redis_conn, alerts=limit)["alerts"]
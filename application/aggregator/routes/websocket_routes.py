@@ -1,54 +1,71 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 import asyncio
+import logging
+from db_redis.sentinel_redis_config import SYSTEM_READY_KEY
+
+log = logging.getLogger(__name__)
 
 router = APIRouter()
 
 # These will be injected from main
 SYSTEM_READY = None
 manager = None
+redis_conn = None
 
-def init_globals(system_ready_ref, manager_ref):
-    global SYSTEM_READY, manager
+def init_globals(system_ready_ref, manager_ref, redis_ref):
+    global SYSTEM_READY, manager, redis_conn
     SYSTEM_READY = system_ready_ref
     manager = manager_ref
+    redis_conn = redis_ref
+
+async def is_system_ready():
+    """Ready once the orchestrator has signalled any API worker (shared through SYSTEM_READY_KEY), cached from then on"""
+    if not SYSTEM_READY["ready"] and await redis_conn.exists(SYSTEM_READY_KEY):
+        SYSTEM_READY["ready"] = True
+    return SYSTEM_READY["ready"]
 
 @router.websocket("/ws/updates")
 async def websocket_endpoint(websocket: WebSocket):
     # Wait until system is ready before accepting connections
     max_wait = 60  # Maximum 60 seconds wait
     waited = 0
-    while not SYSTEM_READY["ready"] and waited < max_wait:
+    while not await is_system_ready() and waited < max_wait:
         await asyncio.sleep(0.5)
         waited += 0.5
     
     if not SYSTEM_READY["ready"]:
         await websocket.close(code=1008, reason="System not ready")
-        print("WebSocket connection rejected: System not ready")
+        log.warning("WebSocket connection rejected: System not ready")
         return
     
     await manager.connect(websocket)
-    print("WebSocket client connected successfully")
+    log.info("WebSocket client connected successfully")
     try:
         while True:
             # Keep connection alive
             await websocket.receive_text()
     except WebSocketDisconnect:
+        log.info("A client disconnected.")
+    finally:
+        # Also after the hub closed a slow client, or the receive failed
         manager.disconnect(websocket)
-        print("A client disconnected.")
 
 
 @router.post("/internal/system-ready")
 async def mark_system_ready():
     """Internal endpoint called by orchestrator when ingress is ready"""
     SYSTEM_READY["ready"] = True
-    print("✓ System marked as READY - WebSocket connections now allowed")
+    # Only one API worker gets this request; the others pick it up from Redis
+    await redis_conn.set(SYSTEM_READY_KEY, 1)
+    log.info("✓ System marked as READY - WebSocket connections now allowed")
     return {"status": "ready"}
 
 
 @router.get("/api/system/status")
 async def get_system_status():
     """Check if system is ready for WebSocket connections"""
+    ready = await is_system_ready()
     return {
-        "ready": SYSTEM_READY["ready"],
-        "websocket_enabled": SYSTEM_READY["ready"]
+        "ready": ready,
+        "websocket_enabled": ready
     }
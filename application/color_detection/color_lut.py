@@ -0,0 +1,212 @@
+import os
+import hashlib
+import json
+import logging
+from pathlib import Path
+
+import numpy as np
+import webcolors
+
+log = logging.getLogger(__name__)
+
+# Car color categories with the webcolors return
+CAR_COLOR_MAPPING = {
+    'red': [
+        'red', 'darkred', 'firebrick', 'crimson', 'indianred', 'lightcoral', 'brown',
+        'salmon', 'darksalmon', 'lightsalmon', 'tomato', 'orangered', 'coral', 'saddlebrown',
+        'sienna', 'chocolate', 'peru', 'rosybrown',
+        'burlywood', 'tan', 'wheat', 'goldenrod', 'darkgoldenrod'
+    ],
+    'blue': [
+        'blue', 'navy', 'darkblue', 'mediumblue', 'royalblue', 'steelblue',
+        'dodgerblue', 'deepskyblue', 'skyblue', 'lightskyblue', 'lightblue',
+        'powderblue', 'cadetblue', 'cornflowerblue', 'slateblue', 'mediumslateblue'
+    ],
+    'green': [
+        'green', 'darkgreen', 'forestgreen', 'limegreen', 'lime', 'seagreen',
+        'mediumseagreen', 'springgreen', 'mediumspringgreen', 'lightgreen',
+        'palegreen', 'darkseagreen', 'olive', 'olivedrab', 'darkolivegreen',
+        'yellowgreen', 'lawngreen', 'chartreuse', 'greenyellow'
+    ],
+    'yellow': [
+        'yellow', 'gold', 'orange', 'darkorange', 'khaki', 'darkkhaki',
+        'palegoldenrod', 'lightgoldenrodyellow', 'lightyellow', 'lemonchiffon',
+        'lightcyan', 'moccasin', 'navajowhite', 'peachpuff', 'sandybrown'
+    ],
+    'gray': [
+        'gray', 'grey', 'darkgray', 'darkgrey', 'dimgray', 'dimgrey',
+        'darkslategray', 'darkslategrey', 'slategray', 'slategrey',
+        'lightslategray', 'lightslategrey'
+    ],
+    'white': [
+        'white', 'whitesmoke', 'snow', 'ivory', 'floralwhite', 'ghostwhite',
+        'honeydew', 'mintcream', 'azure', 'aliceblue', 'lavenderblush',
+        'seashell', 'beige', 'oldlace', 'linen', 'antiquewhite', 'lightgray',
+        'lightgrey', 'gainsboro', 'silver'
+    ],
+    'black': [
+        'black', 'darkslategray', 'darkslategrey'
+    ]
+}
+
+# Index order of the categories stored in the lookup table
+CAR_COLORS = list(CAR_COLOR_MAPPING.keys())
+
+# Bits kept per RGB channel (6 -> 64 levels per channel, 262144 cells)
+LUT_BITS = int(os.getenv("COLOR_LUT_BITS", 6))
+LUT_CACHE_DIR = Path(os.getenv("COLOR_LUT_CACHE_DIR", Path(__file__).resolve().parent / "cache"))
+
+# Brightness thresholds for the black/white shortcut
+BLACK_BRIGHTNESS = 30
+WHITE_BRIGHTNESS = 220
+
+# Normalized CSS name -> car color, first category wins (darkslategray -> gray)
+_CSS_TO_CAR = {}
+for _car_color, _css_names in CAR_COLOR_MAPPING.items():
+    for _name in _css_names:
+        _CSS_TO_CAR.setdefault(_name.lower().replace(' ', ''), _car_color)
+
+
+def get_all_css_colors():
+    """Get all CSS color names and their RGB values"""
+    css_colors = {}
+    try:
+        for name in webcolors.names('css3'):
+            try:
+                rgb = webcolors.name_to_rgb(name, spec='css3')
+                css_colors[name] = tuple(rgb)
+            except ValueError:
+                continue
+    except AttributeError:
+        css_colors = {
+            'red': (255, 0, 0), 'blue': (0, 0, 255), 'green': (0, 128, 0),
+            'yellow': (255, 255, 0), 'orange': (255, 165, 0), 'purple': (128, 0, 128),
+            'black': (0, 0, 0), 'white': (255, 255, 255), 'gray': (128, 128, 128),
+            'brown': (165, 42, 42), 'pink': (255, 192, 203), 'navy': (0, 0, 128)
+        }
+    return css_colors
+
+
+def map_to_car_color(css_name):
+    """Map CSS color name to car color category"""
+    css_name_lower = css_name.lower().replace(' ', '')
+
+    car_color = _CSS_TO_CAR.get(css_name_lower)
+    if car_color:
+        return car_color
+
+    # Fallback mapping for unmapped colors
+    if 'pink' in css_name_lower or 'violet' in css_name_lower:
+        return 'red'
+    elif 'cyan' in css_name_lower or 'teal' in css_name_lower:
+        return 'blue'
+    elif 'magenta' in css_name_lower or 'fuchsia' in css_name_lower:
+        return 'red'
+
+    return 'gray'
+
+
+def build_color_lut(bits=LUT_BITS, css_colors=None):
+    """
+    Build a (2^bits)^3 uint8 table mapping quantized RGB to a CAR_COLORS index.
+
+    Each cell is classified at its bin center with the same rules the worker
+    used per image: brightness shortcut, nearest CSS color, category mapping
+    and the manual red/blue overrides for colors that land on gray.
+    """
+    css_colors = css_colors or get_all_css_colors()
+    names = list(css_colors.keys())
+    palette = np.array([css_colors[n] for n in names], dtype=np.float32)
+    palette_category = np.array([CAR_COLORS.index(map_to_car_color(n)) for n in names], dtype=np.uint8)
+
+    levels = 1 << bits
+    shift = 8 - bits
+    centers = (np.arange(levels, dtype=np.float32) * (1 << shift)) + ((1 << shift) - 1) / 2.0
+    r, g, b = np.meshgrid(centers, centers, centers, indexing='ij')
+    grid = np.stack([r.ravel(), g.ravel(), b.ravel()], axis=1)
+
+    # Nearest palette entry via |x|^2 - 2x.p + |p|^2, chunked to bound memory
+    palette_sq = np.sum(palette ** 2, axis=1)
+    nearest = np.empty(len(grid), dtype=np.int64)
+    chunk = 65536
+    for start in range(0, len(grid), chunk):
+        block = grid[start:start + chunk]
+        dist = palette_sq[None, :] - 2.0 * block @ palette.T
+        nearest[start:start + chunk] = np.argmin(dist, axis=1)
+
+    lut = palette_category[nearest]
+
+    # Manual overrides for dark/muted colors that get misclassified as gray
+    gray = lut == CAR_COLORS.index('gray')
+    red_dominance = grid[:, 0] - np.maximum(grid[:, 1], grid[:, 2])
+    blue_dominance = grid[:, 2] - np.maximum(grid[:, 0], grid[:, 1])
+    is_red = (red_dominance > 10) & (grid[:, 0] > 35)
+    is_blue = (blue_dominance > 10) & (grid[:, 2] > 35)
+    lut[gray & is_red] = CAR_COLORS.index('red')
+    lut[gray & ~is_red & is_blue] = CAR_COLORS.index('blue')
+
+    brightness = grid.mean(axis=1)
+    lut[brightness < BLACK_BRIGHTNESS] = CAR_COLORS.index('black')
+    lut[brightness > WHITE_BRIGHTNESS] = CAR_COLORS.index('white')
+
+    return lut.reshape(levels, levels, levels)
+
+
+def lut_cache_path(bits=LUT_BITS, css_colors=None):
+    """Cache file name keyed by the inputs, so mapping edits invalidate it"""
+    css_colors = css_colors or get_all_css_colors()
+    key = json.dumps({
+        "bits": bits,
+        "mapping": CAR_COLOR_MAPPING,
+        "css": sorted((k, list(v)) for k, v in css_colors.items()),
+        "thresholds": [BLACK_BRIGHTNESS, WHITE_BRIGHTNESS],
+    }, sort_keys=True)
+    digest = hashlib.sha1(key.encode()).hexdigest()[:10]
+    return LUT_CACHE_DIR / f"color_lut_b{bits}_{digest}.npy"
+
+
+_loaded_luts = {}
+
+def load_color_lut(bits=LUT_BITS):
+    """Load the lookup table, read-only and memoized per process (shared with children of a fork server)"""
+    if bits not in _loaded_luts:
+        lut = _load_color_lut(bits)
+        lut.flags.writeable = False
+        _loaded_luts[bits] = lut
+    return _loaded_luts[bits]
+
+
+def _load_color_lut(bits):
+    """Load the lookup table from the disk cache, building and saving it on a miss"""
+    css_colors = get_all_css_colors()
+    cache_path = lut_cache_path(bits, css_colors)
+    levels = 1 << bits
+
+    if cache_path.exists():
+        try:
+            lut = np.load(cache_path)
+            if lut.shape == (levels, levels, levels) and lut.dtype == np.uint8:
+                return lut
+        except Exception as e:
+            log.warning("Ignoring unreadable LUT cache %s: %s", cache_path, e)
+
+    lut = build_color_lut(bits, css_colors)
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(".tmp.npy")
+        np.save(tmp_path, lut)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        log.warning("Could not write LUT cache %s: %s", cache_path, e)
+    return lut
+
+
+def classify_rgb_batch(colors, lut):
+    """Classify an (N, 3) array of RGB colors in one vectorized lookup"""
+    colors = np.asarray(colors, dtype=np.float32).reshape(-1, 3)
+    if len(colors) == 0:
+        return []
+    shift = 8 - int(round(np.log2(lut.shape[0])))
+    q = np.clip(colors, 0, 255).astype(np.uint8) >> shift
+    indices = lut[q[:, 0], q[:, 1], q[:, 2]]
+    return [CAR_COLORS[i] for i in indices]
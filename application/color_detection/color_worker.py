@@ -4,118 +4,40 @@ import sys
 import threading
 import cv2
 import numpy as np
-import webcolors
 import os
 from collections import Counter
 from sklearn.cluster import KMeans
 from db_redis.sentinel_redis_config import *
+from color_detection.color_lut import load_color_lut, classify_rgb_batch
+from common.cpu_budget import apply_cpu_budget
+from common.readiness import mark_ready
+from common.log import setup_logging
+from common.metrics import start_metrics, counter, histogram
+from common.tracing import stamp, job_stamps
+from common.messages import decode_job, encode_result
+
+log = setup_logging("color")
 
 shutdown_event = threading.Event()
 
 def handle_shutdown(signum, frame):
-    print(f"\nReceived signal {signum}, shutting down Color Worker gracefully...")
+    log.info("Received signal %s, shutting down Color Worker gracefully...", signum)
     shutdown_event.set()
 
 signal.signal(signal.SIGINT, handle_shutdown)
 signal.signal(signal.SIGTERM, handle_shutdown)
 
-# Car color categories with the webcolors return 
-CAR_COLOR_MAPPING = {
-    'red': [
-        'red', 'darkred', 'firebrick', 'crimson', 'indianred', 'lightcoral', 'brown',
-        'salmon', 'darksalmon', 'lightsalmon', 'tomato', 'orangered', 'coral', 'saddlebrown',
-        'sienna', 'chocolate', 'peru', 'rosybrown',
-        'burlywood', 'tan', 'wheat', 'goldenrod', 'darkgoldenrod'
-    ],
-    'blue': [
-        'blue', 'navy', 'darkblue', 'mediumblue', 'royalblue', 'steelblue',
-        'dodgerblue', 'deepskyblue', 'skyblue', 'lightskyblue', 'lightblue',
-        'powderblue', 'cadetblue', 'cornflowerblue', 'slateblue', 'mediumslateblue'
-    ],
-    'green': [
-        'green', 'darkgreen', 'forestgreen', 'limegreen', 'lime', 'seagreen',
-        'mediumseagreen', 'springgreen', 'mediumspringgreen', 'lightgreen',
-        'palegreen', 'darkseagreen', 'olive', 'olivedrab', 'darkolivegreen',
-        'yellowgreen', 'lawngreen', 'chartreuse', 'greenyellow'
-    ],
-    'yellow': [
-        'yellow', 'gold', 'orange', 'darkorange', 'khaki', 'darkkhaki',
-        'palegoldenrod', 'lightgoldenrodyellow', 'lightyellow', 'lemonchiffon',
-        'lightcyan', 'moccasin', 'navajowhite', 'peachpuff', 'sandybrown'
-    ],
-    'gray': [
-        'gray', 'grey', 'darkgray', 'darkgrey', 'dimgray', 'dimgrey',
-        'darkslategray', 'darkslategrey', 'slategray', 'slategrey', 
-        'lightslategray', 'lightslategrey'
-    ],
-    'white': [
-        'white', 'whitesmoke', 'snow', 'ivory', 'floralwhite', 'ghostwhite',
-        'honeydew', 'mintcream', 'azure', 'aliceblue', 'lavenderblush',
-        'seashell', 'beige', 'oldlace', 'linen', 'antiquewhite', 'lightgray', 
-        'lightgrey', 'gainsboro', 'silver'
-    ],
-    'black': [
-        'black', 'darkslategray', 'darkslategrey'
-    ]
-}
+# OpenMP (KMeans) and OpenCV thread counts from the orchestrator's budget
+apply_cpu_budget("color")
+
+# Quantized RGB -> car color table, built once (or loaded from disk cache)
+COLOR_LUT = load_color_lut()
+log.info("Color lookup table ready: %d^3 cells", COLOR_LUT.shape[0])
 
 def rgb_to_hex(rgb):
     """Convert RGB to HEX"""
     return "#{:02x}{:02x}{:02x}".format(int(rgb[0]), int(rgb[1]), int(rgb[2]))
 
-def get_all_css_colors():
-    """Get all CSS color names and their RGB values"""
-    css_colors = {}
-    try:
-        for name in webcolors.names('css3'):
-            try:
-                rgb = webcolors.name_to_rgb(name, spec='css3')
-                css_colors[name] = rgb
-            except ValueError:
-                continue
-    except AttributeError:
-        css_colors = {
-            'red': (255, 0, 0), 'blue': (0, 0, 255), 'green': (0, 128, 0),
-            'yellow': (255, 255, 0), 'orange': (255, 165, 0), 'purple': (128, 0, 128),
-            'black': (0, 0, 0), 'white': (255, 255, 255), 'gray': (128, 128, 128),
-            'brown': (165, 42, 42), 'pink': (255, 192, 203), 'navy': (0, 0, 128)
-        }
-    return css_colors
-
-def closest_css_color(rgb):
-    """Find closest CSS color name using Euclidean distance"""
-    css_colors = get_all_css_colors()
-    min_distance = float('inf')
-    closest_name = 'gray'
-    target_rgb = np.array(rgb)
-    
-    for name, color_rgb in css_colors.items():
-        color_array = np.array(color_rgb)
-        distance = np.sqrt(np.sum((target_rgb - color_array) ** 2))
-        if distance < min_distance:
-            min_distance = distance
-            closest_name = name
-    
-    return closest_name
-
-def map_to_car_color(css_name):
-    """Map CSS color name to car color category"""
-    css_name_lower = css_name.lower().replace(' ', '')
-    
-    for car_color, css_names in CAR_COLOR_MAPPING.items():
-        if css_name_lower in [name.lower().replace(' ', '') for name in css_names]:
-            return car_color
-    
-    # Fallback mapping for unmapped colors
-    if 'pink' in css_name_lower or 'violet' in css_name_lower:
-        return 'red'
-    elif 'cyan' in css_name_lower or 'teal' in css_name_lower:
-        return 'blue'
-    elif 'magenta' in css_name_lower or 'fuchsia' in css_name_lower:
-        return 'red'
-    
-    return 'gray'
-
 def crop_car_body(image):
     """Crop car body region"""
     h, w = image.shape[:2]
@@ -148,129 +70,143 @@ def extract_dominant_colors(image, k=3):
     sorted_colors = [colors[i] for i in sorted(counts, key=counts.get, reverse=True)]
     return sorted_colors
 
-def detect_red_manually(rgb_color):
-    """Manual red detection for dark/muted reds"""
-    r, g, b = rgb_color
-    if r > g and r > b:
-        red_dominance = r - max(g, b)
-        if red_dominance > 10 and r > 35:
-            return True
-    return False
+def extract_primary_color(image):
+    """Return the dominant RGB color of the car body in a BGR keyframe"""
+    image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    cropped = crop_car_body(image_rgb)
+    dominant_colors = extract_dominant_colors(cropped, k=3)
+
+    if not dominant_colors:
+        return None
+    return dominant_colors[0]
+
+def process_color_images(images):
+    """Color detection for already-decoded keyframes (None entries -> unknown), classified in one LUT lookup"""
+    primary_colors = []
+    inference_time = histogram("sentinel_inference_seconds", "Model inference time per call", model="kmeans")
+    for image in images:
+        try:
+            with inference_time.time():
+                primary_colors.append(extract_primary_color(image) if image is not None else None)
+        except Exception as e:
+            log.warning("Error extracting color: %s", e)
+            primary_colors.append(None)
+
+    found = [c for c in primary_colors if c is not None]
+    car_colors = iter(classify_rgb_batch(np.array(found), COLOR_LUT))
+
+    results = []
+    for primary_color in primary_colors:
+        if primary_color is None:
+            results.append(("unknown", "#000000"))
+            continue
+        car_color = next(car_colors)
+        hex_value = rgb_to_hex(primary_color)
+        log.debug("Detected RGB: %s -> %s (%s)", primary_color.astype(int), car_color, hex_value)
+        results.append((car_color, hex_value))
 
-def detect_blue_manually(rgb_color):
-    """Manual blue detection for dark/muted blues"""
-    r, g, b = rgb_color
-    if b > r and b > g:
-        blue_dominance = b - max(r, g)
-        if blue_dominance > 10 and b > 35:
-            return True
-    return False
+    return results
+
+def process_color_batch(frame_paths):
+    """Real color detection for a batch of keyframes on disk"""
+    images = []
+    for frame_path in frame_paths:
+        image = cv2.imread(frame_path) if frame_path else None
+        if image is None:
+            log.warning("Could not load image: %s", frame_path)
+        images.append(image)
+    return process_color_images(images)
 
 def process_color(frame_path):
     """Real color detection using computer vision"""
-    try:
-        image = cv2.imread(frame_path)
-        if image is None:
-            print(f"[Color] Could not load image: {frame_path}")
-            return "unknown", "#000000"
-        
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        cropped = crop_car_body(image_rgb)
-        dominant_colors = extract_dominant_colors(cropped, k=3)
-        
-        if not dominant_colors:
-            return "unknown", "#000000"
-        
-        primary_color = dominant_colors[0]
-        brightness = np.mean(primary_color)
-        
-        if brightness < 30:
-            return "black", rgb_to_hex(primary_color)
-        elif brightness > 220:
-            return "white", rgb_to_hex(primary_color)
-        
-        css_name = closest_css_color(primary_color)
-        car_color = map_to_car_color(css_name)
-        hex_value = rgb_to_hex(primary_color)
-        
-        # Manual overrides for dark/muted colors that get misclassified as gray
-        if car_color == 'gray':
-            if detect_red_manually(primary_color):
-                print(f"[Color] Manual red override: RGB {primary_color.astype(int)} -> red")
-                car_color = 'red'
-            elif detect_blue_manually(primary_color):
-                print(f"[Color] Manual blue override: RGB {primary_color.astype(int)} -> blue")
-                car_color = 'blue'
-        
-        print(f"[Color] Detected RGB: {primary_color.astype(int)} -> {car_color} ({hex_value})")
-        
-        return car_color, hex_value
-        
-    except Exception as e:
-        print(f"[Color] Error processing image {frame_path}: {e}")
-        return "unknown", "#000000"
+    return process_color_batch([frame_path])[0]
 
 def color_worker():
     r = get_redis_connection()
     worker_id = os.environ.get('WORKER_ID', 'color_worker_1')
     
-    print(f"[Color] Worker started: {worker_id}")
+    start_metrics("color")
+    service_time = histogram("sentinel_worker_service_seconds", "Per-job worker service time", worker="color")
+    batch_time = histogram("sentinel_worker_batch_seconds", "Worker time per batch read", worker="color")
+    jobs_ok = counter("sentinel_worker_jobs_total", "Jobs processed by workers", worker="color", status="ok")
+    jobs_failed = counter("sentinel_worker_jobs_total", "Jobs processed by workers", worker="color", status="error")
+    
+    log.info("Worker started: %s (Redis %s)", worker_id, describe_redis_connection())
+    mark_ready("color", r)
     
     while not shutdown_event.is_set():
         try:
             messages = r.xreadgroup(
                 COLOR_GROUP, worker_id,
-                {VEHICLE_JOBS_STREAM: ">"}, 
-                count=1, block=BLOCK_TIME
+                {JOB_STREAMS["color"]: ">"}, 
+                count=BATCH_SIZE, block=BLOCK_TIME
             )
             
             if not messages:
                 continue
+            dequeued = stamp()
             
+            # Collect the jobs from this read so they are classified as one batch
+            batch = []
             for stream, msgs in messages:
                 for msg_id, fields in msgs:
+                    fields = decode_job(fields)
                     job_id = fields.get("job_id")
                     vehicle_type = fields.get("vehicle_type")
-                    frame_path = fields.get("frame_path")
                     
-                    print(f"[Color] Processing job: {job_id} ({vehicle_type})")
+                    log.debug("Processing job: %s (%s)", job_id, vehicle_type, extra={"job_id": job_id})
+                    
+                    batch.append((msg_id, fields))
+            
+            if not batch:
+                continue
+            
+            started = time.perf_counter()
+            try:
+                results = process_color_batch([fields.get("frame_path") for _, fields in batch])
+            except Exception as e:
+                # Left pending: the reclaimer retries them and dead-letters them after MAX_RETRIES
+                log.error("Batch of %d failed: %s", len(batch), e)
+                for msg_id, fields in batch:
+                    record_job_error(r, JOB_STREAMS["color"], COLOR_GROUP, msg_id, e)
+                jobs_failed.inc(len(batch))
+                continue
+            
+            # Results and acks for the whole batch go out in one round trip
+            with pipelined(r) as pipe:
+                for (msg_id, fields), (color_name, hex_code) in zip(batch, results):
+                    job_id = fields.get("job_id")
                     
-                    if should_worker_process("color", vehicle_type):
-                        try:
-                            color_name, hex_code = process_color(frame_path)
-                            
-                            # Return both color name and hex code
-                            result = f"{color_name}|{hex_code}"
-                            
-                            r.xadd(VEHICLE_RESULTS_STREAM, {
-                                "job_id": job_id,
-                                "vehicle_id": fields.get("vehicle_id"),
-                                "worker": "color",
-                                "result": result,
-                                "status": "ok"
-                            })
-                            print(f"[Color] Completed: {job_id} -> {color_name} ({hex_code})")
-                            r.xack(VEHICLE_JOBS_STREAM, COLOR_GROUP, msg_id)
-                        except Exception as e:
-                            print(f"[Color] Failed for {job_id}: {e}")
-                            r.xadd(VEHICLE_RESULTS_STREAM, {
-                                "job_id": job_id,
-                                "vehicle_id": fields.get("vehicle_id"),
-                                "worker": "color",
-                                "result": "unknown|#000000",
-                                "status": "error",
-                                "error": str(e)
-                            })
-                            r.xack(VEHICLE_JOBS_STREAM, COLOR_GROUP, msg_id)
-                    else:
-                        print(f"[Color] Skipping {vehicle_type} (cars only)")
-                        r.xack(VEHICLE_JOBS_STREAM, COLOR_GROUP, msg_id)
+                    # Return both color name and hex code
+                    pipe.xadd(VEHICLE_RESULTS_STREAM, encode_result({
+                        "job_id": job_id,
+                        "vehicle_id": fields.get("vehicle_id"),
+                        "vehicle_type": fields.get("vehicle_type"),
+                        "workers": fields.get("workers", ""),
+                        "location": fields.get("location"),
+                        "timestamp": fields.get("timestamp"),
+                        "worker": "color",
+                        "result": f"{color_name}|{hex_code}",
+                        "status": "ok",
+                        **job_stamps(fields),
+                        "t_dequeued": dequeued,
+                        "t_done": stamp()
+                    }), **trim_args(VEHICLE_RESULTS_STREAM))
+                    pipe.xack(JOB_STREAMS["color"], COLOR_GROUP, msg_id)
+                    log.info("Completed: %s -> %s (%s)", job_id, color_name, hex_code, extra={"job_id": job_id})
+            
+            # Jobs in a batch share its cost
+            elapsed = time.perf_counter() - started
+            batch_time.observe(elapsed)
+            for _ in batch:
+                service_time.observe(elapsed / len(batch))
+            jobs_ok.inc(len(batch))
         
         except Exception as e:
-            print(f"[Color] Worker error: {e}")
+            log.error("Worker error: %s", e)
             time.sleep(1)
     
-    print("[Color] Shutdown complete.")
+    log.info("Shutdown complete.")
 
 if __name__ == "__main__":
     color_worker()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Size and cost of the job/result message encodings.
+
+Compares the original field-per-value layout ("fields") with the versioned
+msgpack layout on representative jobs and fused/per-worker results, and
+reports per message: bytes on the wire (field names + values), Redis memory
+per 1M entries (XADD into a scratch stream, MEMORY USAGE, scaled) and
+encode/decode time in µs.
+
+Usage (from application/):
+    python3 common/benchmark_messages.py [--entries 20000] [--rounds 20000] [--no-redis]
+"""
+import argparse
+import os
+import datetime
+import time
+
+from db_redis.sentinel_redis_config import *
+from common.tracing import stamp
+from common.messages import encode_job, decode_job, encode_result, decode_result, WEB_ROOT
+
+ENCODINGS = ("fields", "msgpack")
+
+
+def sample_messages():
+    now = datetime.datetime.now().astimezone()
+    vehicle_id = f"3f9a1c2e_{now:%Y%m%d_%H%M%S}_car_CALICUT_JUNCTION"
+    frame_url = f"static/CALICUT_JUNCTION/{now:%Y-%m-%d}/keyframes/{vehicle_id}.jpg"
+    plate_url = f"static/CALICUT_JUNCTION/{now:%Y-%m-%d}/plates/{vehicle_id}_plate.jpg"
+    job = {
+        "job_id": f"car_{int(now.timestamp() * 1000)}_3f9a1c2e",
+        "vehicle_id": vehicle_id,
+        "vehicle_type": "car",
+        "frame_path": str(WEB_ROOT / frame_url),
+        "plate_path": str(WEB_ROOT / plate_url),
+        "frame_url": frame_url,
+        "plate_url": plate_url,
+        "timestamp": now,
+        "location": "CALICUT_JUNCTION",
+        "workers": "ocr,color,logo",
+        "t_detect": stamp(),
+        "t_keyframe": stamp(),
+        "t_published": stamp()
+    }
+    common = {name: job[name] for name in ("job_id", "vehicle_id", "vehicle_type", "workers", "location", "timestamp",
+                                           "t_detect", "t_keyframe", "t_published")}
+    ocr = {**common, "worker": "ocr", "result": "KL11AB1234", "confidence": 0.934, "status": "ok",
+           "t_dequeued": stamp(), "t_done": stamp()}
+    fused = {**common, "worker": "fused", "results": {"ocr": "KL11AB1234", "color": "white|#f4f4f2", "logo": "Maruti Suzuki"},
+             "status": "ok", "t_dequeued": stamp(), "t_done": stamp()}
+    return {
+        "job": (job, encode_job, decode_job),
+        "result (ocr)": (ocr, encode_result, decode_result),
+        "result (fused)": (fused, encode_result, decode_result)
+    }
+
+
+def wire_bytes(fields):
+    return sum(len(str(name).encode()) + len(value if isinstance(value, bytes) else str(value).encode("utf-8", "surrogateescape"))
+               for name, value in fields.items())
+
+
+def time_us(func, arg, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(arg)
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+def redis_bytes_per_million(r, fields, entries):
+    """Memory of a scratch stream holding `entries` copies of the message, scaled to 1M"""
+    key = f"sentinel:bench:messages:{os.getpid()}"
+    r.delete(key)
+    try:
+        pipe = r.pipeline(transaction=False)
+        for i in range(entries):
+            pipe.xadd(key, fields)
+            if i % 1000 == 999:
+                pipe.execute()
+        pipe.execute()
+        return r.memory_usage(key, samples=0) / entries * 1_000_000
+    finally:
+        r.delete(key)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare job/result message encodings")
+    parser.add_argument("--entries", type=int, default=20000, help="Stream entries written per message and encoding for the memory estimate")
+    parser.add_argument("--rounds", type=int, default=20000, help="Encode/decode iterations per measurement")
+    parser.add_argument("--no-redis", action="store_true", help="Skip the Redis memory measurement")
+    args = parser.parse_args()
+
+    r = None if args.no_redis else get_redis_connection()
+
+    print(f"{'message':<16} {'encoding':<9} {'bytes':>6} {'MB / 1M':>9} {'encode µs':>10} {'decode µs':>10}")
+    for name, (message, encode, decode) in sample_messages().items():
+        for encoding in ENCODINGS:
+            fields = encode(message, encoding)
+            # What a consumer reads back from a get_redis_connection() connection
+            read_back = {key: value.decode("utf-8", "surrogateescape") if isinstance(value, bytes) else value
+                         for key, value in fields.items()}
+            memory = f"{redis_bytes_per_million(r, fields, args.entries) / 1e6:.1f}" if r else "-"
+            print(f"{name:<16} {encoding:<9} {wire_bytes(fields):>6} {memory:>9} "
+                  f"{time_us(lambda m: encode(m, encoding), message, args.rounds):>10.2f} "
+                  f"{time_us(decode, read_back, args.rounds):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
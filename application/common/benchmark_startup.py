@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Cold vs warm (fork server) start time per worker type.
+
+Cold: `python3 <worker script>` as the orchestrator normally launches it.
+Warm: the same script forked from a fork server that has already preloaded the
+libraries and model data. Both are timed from launch until the worker reports
+ready over Redis. Run it against an idle dev stack: the workers join their
+consumer groups under a "<worker>_startup_bench" consumer name.
+
+Usage (from application/):
+    python3 common/benchmark_startup.py [--workers ocr,color,logo] [--runs 3]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import time
+
+from db_redis.sentinel_redis_config import *
+from common.readiness import PROCESS_NAME_ENV
+from common.fork_server import ForkServerClient, FORK_SERVER_PRELOAD_ENV
+
+SCRIPTS = {
+    "ocr": "ocr/ocr_worker.py",
+    "color": "color_detection/color_worker.py",
+    "logo": "logo_detection/logo_worker.py",
+    "fused": "fused/fused_worker.py",
+}
+
+
+def wait_ready(r, name, process, timeout):
+    """Seconds from now until `name` reports ready with this process's pid"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        report = r.hget(READINESS_KEY, name)
+        if report and json.loads(report).get("pid") == process.pid:
+            return json.loads(report)["ready_at"]
+        if process.poll() is not None:
+            raise RuntimeError(f"{name} exited with code {process.returncode}")
+        time.sleep(0.02)
+    raise TimeoutError(f"{name} not ready after {timeout:.0f}s")
+
+
+def stop(process):
+    process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait(timeout=5)
+
+
+def child_env(name, worker):
+    env = os.environ.copy()
+    env["PYTHONPATH"] = f"{env.get('PYTHONPATH', '')}:."
+    env["PYTHONUNBUFFERED"] = "1"
+    env[PROCESS_NAME_ENV] = name
+    env["WORKER_ID"] = f"{worker}_startup_bench"
+    return env
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare cold and fork-server worker start times")
+    parser.add_argument("--workers", default="ocr,color,logo", help="Comma-separated worker types")
+    parser.add_argument("--runs", type=int, default=3, help="Starts per worker type and mode")
+    parser.add_argument("--timeout", type=float, default=180.0)
+    args = parser.parse_args()
+
+    r = get_redis_connection()
+    workers = [w for w in args.workers.split(",") if w]
+    results = {w: {"cold": [], "warm": []} for w in workers}
+    devnull = open(os.devnull, "w")
+
+    for worker in workers:
+        for i in range(args.runs):
+            name = f"bench {worker} cold {i}"
+            launched = time.time()
+            process = subprocess.Popen(["python3", SCRIPTS[worker]], env=child_env(name, worker),
+                                       stdout=devnull, stderr=subprocess.STDOUT)
+            try:
+                results[worker]["cold"].append(wait_ready(r, name, process, args.timeout) - launched)
+            finally:
+                stop(process)
+            print(f"  {worker} cold #{i + 1}: {results[worker]['cold'][-1]:.2f}s")
+
+    socket_path = f"/tmp/sentinel_fork_server_bench_{os.getpid()}.sock"
+    server_env = child_env("bench fork server", "fork_server")
+    server_env.update({"FORK_SERVER_SOCKET": socket_path, FORK_SERVER_PRELOAD_ENV: ",".join(workers)})
+    launched = time.time()
+    server = subprocess.Popen(["python3", "common/fork_server.py"], env=server_env,
+                              stdout=devnull, stderr=subprocess.STDOUT)
+    try:
+        preload_time = wait_ready(r, "bench fork server", server, args.timeout) - launched
+        print(f"  fork server preload: {preload_time:.2f}s")
+        client = ForkServerClient(socket_path)
+
+        for worker in workers:
+            for i in range(args.runs):
+                name = f"bench {worker} warm {i}"
+                launched = time.time()
+                process = client.spawn(SCRIPTS[worker], child_env(name, worker), output_fd=devnull.fileno())
+                try:
+                    results[worker]["warm"].append(wait_ready(r, name, process, args.timeout) - launched)
+                finally:
+                    stop(process)
+                print(f"  {worker} warm #{i + 1}: {results[worker]['warm'][-1]:.2f}s")
+    finally:
+        stop(server)
+        bench_names = [name for name in r.hkeys(READINESS_KEY) if name.startswith("bench ")]
+        if bench_names:
+            r.hdel(READINESS_KEY, *bench_names)
+
+    print("=" * 60)
+    print(f"{'worker':<8} {'cold (s)':>10} {'warm (s)':>10} {'speedup':>10}")
+    for worker, times in results.items():
+        cold = statistics.median(times["cold"])
+        warm = statistics.median(times["warm"])
+        print(f"{worker:<8} {cold:>10.2f} {warm:>10.2f} {cold / warm:>9.1f}x")
+    print(f"(medians of {args.runs} starts; fork server preload {preload_time:.2f}s, paid once)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+import os
+import sys
+import json
+import logging
+
+log = logging.getLogger(__name__)
+
+# Environment variables the orchestrator hands to each child process
+THREADS_ENV = "SENTINEL_CPU_THREADS"
+AFFINITY_ENV = "SENTINEL_CPU_AFFINITY"
+COMPONENT_ENV = "SENTINEL_COMPONENT"
+
+# Relative CPU weight per component; the orchestrator splits the available cores by these
+CPU_PROFILES = {
+    "balanced": {"ingress": 3, "ocr": 2, "color": 1, "logo": 1, "fused": 3, "aggregator": 1, "api": 1},
+    "ingress_heavy": {"ingress": 5, "ocr": 1, "color": 1, "logo": 1, "fused": 2, "aggregator": 1, "api": 1},
+    "workers_heavy": {"ingress": 2, "ocr": 3, "color": 2, "logo": 2, "fused": 5, "aggregator": 1, "api": 1},
+}
+
+# Mostly idle helpers: one thread, no dedicated cores
+LIGHT_COMPONENTS = {"monitor", "reclaimer", "trimmer"}
+
+CPU_PROFILE = os.getenv("CPU_PROFILE", "balanced")
+CPU_BUDGET_FILE = os.getenv("CPU_BUDGET_FILE")
+
+
+def available_cpus():
+    """CPUs this process may run on"""
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+def format_cpus(cpus):
+    return ",".join(str(c) for c in cpus)
+
+
+def parse_cpus(value):
+    """Parse '0,1,2' or '0-3,6' into a list of CPU ids"""
+    cpus = []
+    for part in (value or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            cpus.extend(range(int(start), int(end) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def split_cores(weights, n_cores):
+    """Integer core shares proportional to weights, each at least 1, summing to n_cores"""
+    total = sum(weights.values())
+    shares = {c: max(1, int(n_cores * w / total)) for c, w in weights.items()}
+
+    # Hand out leftovers to the components furthest below their fair share
+    while sum(shares.values()) < n_cores:
+        c = max(weights, key=lambda k: n_cores * weights[k] / total - shares[k])
+        shares[c] += 1
+    while sum(shares.values()) > n_cores:
+        c = max((k for k in shares if shares[k] > 1), key=lambda k: shares[k] - n_cores * weights[k] / total)
+        shares[c] -= 1
+    return shares
+
+
+def compute_cpu_budget(components, profile=CPU_PROFILE, cpus=None, budget_file=CPU_BUDGET_FILE):
+    """
+    Per-component thread budget and CPU affinity.
+
+    Heavy components get disjoint core ranges sized by the profile weights;
+    when there are fewer cores than components they share cores round-robin
+    with one thread each. Light components get one thread on all cores.
+    Entries in budget_file (JSON: {"ingress": {"threads": 4, "cpus": "0-3"}})
+    override the computed values.
+
+    Returns:
+        {component: {"threads": int, "cpus": [int, ...]}}
+    """
+    cpus = sorted(cpus or available_cpus())
+    weights_by_name = CPU_PROFILES.get(profile, CPU_PROFILES["balanced"])
+    heavy = [c for c in components if c not in LIGHT_COMPONENTS]
+    budget = {}
+
+    if heavy and len(cpus) >= len(heavy):
+        shares = split_cores({c: weights_by_name.get(c, 1) for c in heavy}, len(cpus))
+        start = 0
+        for c in heavy:
+            budget[c] = {"threads": shares[c], "cpus": cpus[start:start + shares[c]]}
+            start += shares[c]
+    else:
+        for i, c in enumerate(heavy):
+            budget[c] = {"threads": 1, "cpus": [cpus[i % len(cpus)]]}
+
+    for c in components:
+        if c in LIGHT_COMPONENTS:
+            budget[c] = {"threads": 1, "cpus": cpus}
+
+    if budget_file:
+        with open(budget_file) as f:
+            overrides = json.load(f)
+        for c, override in overrides.items():
+            if c not in budget:
+                continue
+            if "cpus" in override:
+                cpu_list = override["cpus"]
+                budget[c]["cpus"] = parse_cpus(cpu_list) if isinstance(cpu_list, str) else list(cpu_list)
+            if "threads" in override:
+                budget[c]["threads"] = int(override["threads"])
+
+    return budget
+
+
+def budget_env(component, entry):
+    """Environment variables that carry one component's budget to its process"""
+    threads = str(entry["threads"])
+    return {
+        COMPONENT_ENV: component,
+        THREADS_ENV: threads,
+        AFFINITY_ENV: format_cpus(entry["cpus"]),
+        # Read by OpenMP/BLAS at library load, before the process can call anything
+        "OMP_NUM_THREADS": threads,
+        "MKL_NUM_THREADS": threads,
+        "OPENBLAS_NUM_THREADS": threads,
+    }
+
+
+def get_thread_budget():
+    """Thread count assigned by the orchestrator, or None when running standalone"""
+    value = os.getenv(THREADS_ENV)
+    return int(value) if value else None
+
+
+_threadpool_limits = None
+_effective = None
+
+def apply_cpu_budget(component):
+    """
+    Apply the orchestrator's budget inside a component process: CPU affinity,
+    torch intra-op threads, threadpoolctl (OpenMP/BLAS) limits and OpenCV
+    threads. Logs and returns the effective settings. Only the first call in a
+    process takes effect (the fused worker imports several worker modules).
+    """
+    global _threadpool_limits, _effective
+
+    if _effective is not None:
+        return _effective
+    component = os.getenv(COMPONENT_ENV, component)
+
+    threads = get_thread_budget()
+    cpus = parse_cpus(os.getenv(AFFINITY_ENV))
+    effective = {}
+
+    if cpus and hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, cpus)
+        except OSError as e:
+            log.warning("%s: could not set affinity %s: %s", component, cpus, e)
+    effective["cpus"] = format_cpus(available_cpus())
+
+    if threads:
+        if "torch" in sys.modules:
+            torch = sys.modules["torch"]
+            torch.set_num_threads(threads)
+            effective["torch_threads"] = torch.get_num_threads()
+
+        try:
+            from threadpoolctl import threadpool_limits
+            _threadpool_limits = threadpool_limits(limits=threads)
+            effective["threadpool_limit"] = threads
+        except ImportError:
+            pass
+
+        try:
+            import cv2
+            cv2.setNumThreads(threads)
+            effective["cv2_threads"] = cv2.getNumThreads()
+        except ImportError:
+            pass
+
+    effective["threads"] = threads if threads else "default"
+    log.info("%s: %s", component, ", ".join(f"{k}={v}" for k, v in effective.items()), extra={"cpu_budget": effective})
+    _effective = effective
+    return effective
+
+
+def ort_session_options(options=None):
+    """ONNX Runtime session options sized to this process's thread budget"""
+    import onnxruntime as ort
+
+    options = options or ort.SessionOptions()
+    threads = get_thread_budget()
+    if threads:
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+    return options
@@ -0,0 +1,308 @@
+"""
+Preloading fork server for worker processes.
+
+The server imports the heavy libraries (numpy, OpenCV, sklearn, ONNX Runtime,
+RapidOCR) and loads read-only model data (color LUT, logo model bytes) once,
+then forks a child per spawn request. Children share those pages copy-on-write
+and run the worker script as __main__, so everything per-process - Redis
+connections, ORT sessions and their thread pools, CPU affinity and thread
+limits - is still created in the child by the worker itself.
+
+Nothing that starts threads (ORT sessions, torch) may be loaded here: only the
+forking thread survives in the child.
+
+Protocol (unix socket, one connection per child): the client sends one JSON
+line {"script", "env", "cwd"} with the child's stdout/stderr descriptor
+attached (SCM_RIGHTS). The server replies {"pid": ...}, keeps the connection
+open and writes {"exit": code} when the child is reaped.
+
+Modules preloaded here were evaluated with the fork server's environment;
+per-child variables (WORKER_ID, CPU budget, process name) are read at run time.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import runpy
+import signal
+import socket
+import selectors
+import threading
+import traceback
+import subprocess
+
+from common.log import setup_logging, pause_logging, resume_logging
+
+log = logging.getLogger(__name__)
+
+FORK_SERVER_SOCKET = os.getenv("FORK_SERVER_SOCKET", "/tmp/sentinel_fork_server.sock")
+FORK_SERVER_PRELOAD_ENV = "FORK_SERVER_PRELOAD"
+
+# What each worker type needs before its script runs
+PRELOAD_MODULES = {
+    "ocr": ["numpy", "cv2", "onnxruntime", "rapidocr_onnxruntime"],
+    "color": ["numpy", "cv2", "sklearn.cluster", "color_detection.color_lut"],
+    "logo": ["numpy", "cv2", "onnxruntime", "logo_detection.logo_classifier"],
+}
+PRELOAD_MODULES["fused"] = sorted({m for modules in PRELOAD_MODULES.values() for m in modules})
+
+
+def fork_server_enabled():
+    return os.getenv("FORK_SERVER", "0").lower() in ("1", "true", "yes")
+
+
+def preload(workers):
+    """Import the libraries and load the read-only model data for the given worker types"""
+    modules = []
+    for worker in workers:
+        modules += [m for m in PRELOAD_MODULES.get(worker, []) if m not in modules]
+
+    for module in modules:
+        started = time.perf_counter()
+        try:
+            __import__(module)
+            log.info("Imported %s in %.2fs", module, time.perf_counter() - started)
+        except Exception as e:
+            log.warning("Could not preload %s: %s", module, e)
+
+    if "color_detection.color_lut" in sys.modules:
+        from color_detection.color_lut import load_color_lut
+        lut = load_color_lut()
+        log.info("Color LUT loaded: %d^3 cells", lut.shape[0])
+
+    if "logo_detection.logo_classifier" in sys.modules:
+        from logo_detection.logo_classifier import LOGO_MODEL_PATH, read_model_bytes
+        try:
+            size = len(read_model_bytes(LOGO_MODEL_PATH))
+            log.info("Logo model loaded: %.1f MB", size / 1e6)
+        except OSError as e:
+            log.warning("Could not read logo model %s: %s", LOGO_MODEL_PATH, e)
+
+
+def run_child(request, output_fd):
+    """Runs in the forked child: become the worker process and never return"""
+    code = 1
+    try:
+        for sig in (signal.SIGINT, signal.SIGTERM, signal.SIGCHLD):
+            signal.signal(sig, signal.SIG_DFL)
+
+        os.dup2(output_fd, 1)
+        os.dup2(output_fd, 2)
+        os.close(output_fd)
+
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["env"])
+
+        script = request["script"]
+        sys.argv = [script]
+        sys.path[0] = os.path.dirname(os.path.abspath(script))
+
+        runpy.run_path(script, run_name="__main__")
+        code = 0
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        # os._exit skips atexit, so flush the worker's log queue here
+        pause_logging()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)
+
+
+def serve(socket_path=FORK_SERVER_SOCKET):
+    setup_logging("fork_server")
+    shutdown_event = threading.Event()
+
+    def handle_shutdown(signum, frame):
+        log.info("Received signal %s, shutting down Fork Server...", signum)
+        shutdown_event.set()
+
+    signal.signal(signal.SIGINT, handle_shutdown)
+    signal.signal(signal.SIGTERM, handle_shutdown)
+
+    workers = [w for w in os.getenv(FORK_SERVER_PRELOAD_ENV, "ocr,color,logo").split(",") if w]
+    started = time.perf_counter()
+    preload(workers)
+    log.info("Preloaded %s in %.2fs", ", ".join(workers), time.perf_counter() - started)
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen(16)
+
+    selector = selectors.DefaultSelector()
+    selector.register(server, selectors.EVENT_READ)
+    children = {}
+
+    # Report ready with a throwaway connection so no Redis socket is inherited by children
+    from common.readiness import mark_ready
+    from db_redis.sentinel_redis_config import get_redis_connection
+    r = get_redis_connection()
+    mark_ready("fork_server", r)
+    r.close()
+    log.info("Listening on %s", socket_path)
+
+    while not shutdown_event.is_set():
+        for _ in selector.select(timeout=0.5):
+            conn, _ = server.accept()
+            try:
+                message, fds, _, _ = socket.recv_fds(conn, 1 << 20, 1)
+                request = json.loads(message)
+                if len(fds) != 1:
+                    raise ValueError("expected one output descriptor")
+
+                pause_logging()
+                pid = os.fork()
+                if pid == 0:
+                    server.close()
+                    conn.close()
+                    run_child(request, fds[0])
+                resume_logging()
+
+                os.close(fds[0])
+                conn.sendall(json.dumps({"pid": pid}).encode() + b"\n")
+                children[pid] = conn
+                log.info("Forked %s (PID: %d)", request["script"], pid)
+            except Exception as e:
+                resume_logging()
+                log.error("Spawn failed: %s", e)
+                try:
+                    conn.sendall(json.dumps({"error": str(e)}).encode() + b"\n")
+                except OSError:
+                    pass
+                conn.close()
+
+        # Reap exited children and report their exit codes
+        while children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            conn = children.pop(pid, None)
+            if conn:
+                try:
+                    conn.sendall(json.dumps({"exit": os.waitstatus_to_exitcode(status)}).encode() + b"\n")
+                except OSError:
+                    pass
+                conn.close()
+
+    for pid in children:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    server.close()
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    log.info("Shutdown complete.")
+
+
+class ForkedProcess:
+    """Popen-like handle (pid, stdout, poll/wait/terminate/kill) for a child of the fork server"""
+
+    def __init__(self, conn, reader, pid, stdout):
+        self.pid = pid
+        self.stdout = stdout
+        self.returncode = None
+        self._conn = conn
+        self._reader = reader
+        self._exited = threading.Event()
+        threading.Thread(target=self._wait_exit, daemon=True).start()
+
+    def _wait_exit(self):
+        try:
+            line = self._reader.readline()
+            if line:
+                self.returncode = json.loads(line)["exit"]
+                return
+
+            # Fork server went away: the child is reparented, so fall back to polling its pid
+            while True:
+                try:
+                    os.kill(self.pid, 0)
+                except ProcessLookupError:
+                    self.returncode = -1
+                    return
+                time.sleep(0.5)
+        finally:
+            self._conn.close()
+            self._exited.set()
+
+    def poll(self):
+        return self.returncode if self._exited.is_set() else None
+
+    def wait(self, timeout=None):
+        if not self._exited.wait(timeout):
+            raise subprocess.TimeoutExpired(f"forked pid {self.pid}", timeout)
+        return self.returncode
+
+    def send_signal(self, sig):
+        if self.poll() is None:
+            try:
+                os.kill(self.pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+
+class ForkServerClient:
+    def __init__(self, socket_path=FORK_SERVER_SOCKET):
+        self.socket_path = socket_path
+
+    def spawn(self, script, env, cwd=".", output_fd=None):
+        """
+        Fork a worker running `script` with `env`.
+
+        Args:
+            output_fd: Descriptor for the child's stdout/stderr; by default a
+                pipe is created and its read end returned as process.stdout
+
+        Returns:
+            ForkedProcess
+        """
+        stdout = None
+        if output_fd is None:
+            read_fd, write_fd = os.pipe()
+            stdout = os.fdopen(read_fd, "r", buffering=1)
+        else:
+            write_fd = output_fd
+
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            conn.connect(self.socket_path)
+            request = {"script": script, "env": dict(env), "cwd": os.path.abspath(cwd)}
+            socket.send_fds(conn, [json.dumps(request).encode() + b"\n"], [write_fd])
+            reader = conn.makefile("r")
+            reply = json.loads(reader.readline() or '{"error": "fork server closed the connection"}')
+        except Exception:
+            conn.close()
+            if stdout:
+                stdout.close()
+            raise
+        finally:
+            if output_fd is None:
+                os.close(write_fd)
+
+        if "error" in reply:
+            conn.close()
+            if stdout:
+                stdout.close()
+            raise RuntimeError(f"Fork server could not start {script}: {reply['error']}")
+
+        return ForkedProcess(conn, reader, reply["pid"], stdout)
+
+
+if __name__ == "__main__":
+    serve()
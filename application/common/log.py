@@ -0,0 +1,203 @@
+"""
+Structured, non-blocking logging shared by all Sentinel components.
+
+Records go through a bounded in-process queue to a listener thread that
+writes one JSON object per line to stdout, so a slow reader on the other end
+of the pipe can never stall the hot path: when the queue is full records are
+dropped and the count is reported on the next record that gets through.
+Repeated messages are rate limited per key (the `key` extra, or the logger
+name plus the unformatted message template - use %-style arguments rather
+than f-strings so similar messages share a key).
+
+Usage:
+    log = setup_logging("ocr")
+    log.info("Completed %s -> %s", job_id, plate, extra={"job_id": job_id})
+"""
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+LOG_RATE_LIMIT = int(os.getenv("LOG_RATE_LIMIT", 20))       # Records per key per window
+LOG_RATE_WINDOW = float(os.getenv("LOG_RATE_WINDOW", 10))   # Seconds
+LOG_DIR = os.getenv("LOG_DIR", "logs")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 5))
+
+# Attributes every LogRecord has; anything else came in through `extra`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, component, logger, msg, extras"""
+
+    def __init__(self, component):
+        super().__init__()
+        self.component = component
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "component": self.component,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRS:
+                entry[name] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """Pass at most `limit` records per key per `window` seconds, counting the rest"""
+
+    def __init__(self, limit=LOG_RATE_LIMIT, window=LOG_RATE_WINDOW):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self.windows = {}
+        self.lock = threading.RLock()    # Re-entrant: signal handlers log too
+
+    def filter(self, record):
+        key = getattr(record, "key", None) or f"{record.name}:{record.msg}"
+        now = time.monotonic()
+
+        with self.lock:
+            state = self.windows.get(key)
+            if state is None or now - state[0] >= self.window:
+                if len(self.windows) >= 10000:
+                    self.windows.clear()
+                suppressed = state[2] if state else 0
+                state = self.windows[key] = [now, 0, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+
+            if state[1] < self.limit:
+                state[1] += 1
+                return True
+            state[2] += 1
+            return False
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks: drops records on a full queue and reports how many"""
+
+    def __init__(self, log_queue, max_size=LOG_QUEUE_SIZE):
+        super().__init__(log_queue)
+        self.max_size = max_size
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Render now so later mutation of the arguments can't change the message
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        if self.dropped:
+            record.dropped = self.dropped
+        return record
+
+    def enqueue(self, record):
+        # SimpleQueue.put is re-entrant (safe from signal handlers); the bound is approximate
+        if self.queue.qsize() >= self.max_size:
+            self.dropped += 1
+            return
+        self.queue.put(record)
+        self.dropped = 0
+
+
+_configured_pid = None
+_listener = None
+
+def setup_logging(component, level=LOG_LEVEL):
+    """
+    Route the root logger through the non-blocking queue and return the
+    component's logger. Safe to call more than once; a process forked from an
+    already configured one (fork server) gets its own listener thread.
+    """
+    global _configured_pid, _listener
+
+    if _configured_pid == os.getpid():
+        return logging.getLogger(component)
+
+    log_queue = queue.SimpleQueue()
+    handler = DroppingQueueHandler(log_queue)
+    handler.addFilter(RateLimitFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter(component))
+    _listener = QueueListener(log_queue, stream_handler)
+    _listener.start()
+    atexit.register(pause_logging)
+
+    _configured_pid = os.getpid()
+    return logging.getLogger(component)
+
+
+def pause_logging():
+    """Drain and stop the listener thread, e.g. before os.fork() so no lock is held mid-write"""
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
+def resume_logging():
+    if _listener is not None and _listener._thread is None:
+        _listener.start()
+
+
+def parse_log_line(line):
+    """Structured record from a child's output line, or a raw INFO record for plain prints"""
+    if line.startswith("{"):
+        try:
+            record = json.loads(line)
+            if "msg" in record and "level" in record:
+                return record
+        except ValueError:
+            pass
+    return {"ts": time.time(), "level": "INFO", "msg": line, "raw": True}
+
+
+class RotatingLogFile:
+    """Append-only log file written in batches, rotated to .1 ... .N by size"""
+
+    def __init__(self, path, max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.file = open(path, "a", encoding="utf-8")
+
+    def write(self, lines):
+        self.file.write("".join(lines))
+        self.file.flush()
+        if self.file.tell() >= self.max_bytes:
+            self.rotate()
+
+    def rotate(self):
+        self.file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        self.file = open(self.path, "w", encoding="utf-8")
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,255 @@
+"""
+Versioned encoding of job and result stream messages.
+
+Messages travel as one msgpack field, "m", holding a positional array that
+starts with the schema version. Everything derivable is left out:
+
+    job v1:    [1, job_id, vehicle_id, vehicle_type, frame_url, plate, timestamp,
+                location, workers, stamps, overrides]
+    result v1: [1, job_id, vehicle_id, vehicle_type, workers, worker, status, result,
+                timestamp, location, stamps, extra]
+
+    frame_path     derived as WEB_ROOT/frame_url (overrides["frame_path"] otherwise)
+    plate          None (no plate), True (plates/<vehicle_id>_plate.jpg next to the
+                   keyframe's date folder) or the plate URL when it is elsewhere
+    timestamp      msgpack Timestamp (typed, timezone-aware)
+    workers        bitmask over WORKER_BITS
+    stamps         tracing stamps as floats, in STAMP_STAGES order (None when absent)
+    result         a string, or {worker: result} for the fused worker
+    extra          optional result fields (confidence, error)
+
+Fields added next to "m" (the reclaimer's retries/last_error) are kept on
+decode. Messages in the original field-per-value layout still decode, and
+MESSAGE_ENCODING=fields makes producers write that layout, for mixed-version
+deployments.
+
+decode_job/decode_result return the original field names with typed values:
+timestamp is a datetime, stamps (t_*) are floats, absent paths/URLs are None
+instead of "None", and a fused result's "results" is a dict.
+
+The connections returned by get_redis_connection decode with
+surrogateescape, so the binary field reads as a str that round-trips to the
+same bytes (including when the reclaimer re-publishes a message as is).
+"""
+import os
+import json
+import datetime
+from pathlib import Path
+
+import msgpack
+
+from db_redis.sentinel_redis_config import WORKER_TYPES
+from common.tracing import JOB_STAGES, WORKER_STAGES
+
+SCHEMA_VERSION = 1
+MESSAGE_FIELD = "m"
+MESSAGE_ENCODING = os.getenv("MESSAGE_ENCODING", "msgpack")   # msgpack | fields
+
+# Keyframes and plates are stored under the aggregator's web root; URLs are relative to it
+WEB_ROOT = Path(__file__).resolve().parent.parent / "aggregator" / "web"
+_WEB_ROOT_PREFIX = str(WEB_ROOT) + os.sep
+
+WORKER_BITS = {worker: 1 << i for i, worker in enumerate(WORKER_TYPES)}
+STAMP_STAGES = JOB_STAGES + WORKER_STAGES
+RESULT_EXTRA_FIELDS = ("confidence", "error", "retries", "last_error")
+
+
+def _blob(value):
+    return value.encode("utf-8", "surrogateescape") if isinstance(value, str) else value
+
+def _none(value):
+    return None if value in (None, "", "None") else value
+
+def _timestamp(value):
+    if value is None or isinstance(value, datetime.datetime):
+        return value
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+def _aware(value):
+    if value is not None and value.tzinfo is None:
+        return value.astimezone()
+    return value
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _workers_mask(manifest):
+    return sum(WORKER_BITS.get(worker, 0) for worker in (manifest or "").split(",") if worker)
+
+def _workers_manifest(mask):
+    return ",".join(worker for worker, bit in WORKER_BITS.items() if mask & bit)
+
+def _pack_stamps(message):
+    stamps = [_float(message.get(f"t_{stage}")) for stage in STAMP_STAGES]
+    while stamps and stamps[-1] is None:
+        stamps.pop()
+    return stamps
+
+def _unpack_stamps(stamps):
+    return {f"t_{stage}": value for stage, value in zip(STAMP_STAGES, stamps) if value is not None}
+
+def _plate_url(frame_url, vehicle_id):
+    """Where ingress puts the plate for a keyframe: the plates/ folder of the same date"""
+    keyframes = f"/keyframes/{vehicle_id}.jpg"
+    if frame_url and frame_url.endswith(keyframes):
+        return frame_url[:-len(keyframes)] + f"/plates/{vehicle_id}_plate.jpg"
+    return None
+
+def _path(url):
+    return _WEB_ROOT_PREFIX + url if url else None
+
+
+def _legacy_fields(message):
+    """Field-per-value layout: strings only, "None" for absent paths"""
+    fields = {}
+    for name, value in message.items():
+        if isinstance(value, datetime.datetime):
+            value = value.isoformat()
+        elif isinstance(value, dict):
+            value = json.dumps(value)
+        elif isinstance(value, float):
+            value = f"{value:.6f}" if name.startswith("t_") else f"{value:.3f}"
+        elif value is None:
+            if name not in ("frame_path", "plate_path", "frame_url", "plate_url"):
+                continue
+            value = "None"
+        fields[name] = value
+    return fields
+
+
+def encode_job(job, encoding=None):
+    """Stream fields for a job dict (original field names, typed or string values)"""
+    if (encoding or MESSAGE_ENCODING) == "fields":
+        return _legacy_fields(job)
+
+    vehicle_id = job["vehicle_id"]
+    frame_url = _none(job.get("frame_url"))
+    plate_url = _none(job.get("plate_url"))
+    plate = None
+    if plate_url:
+        plate = True if plate_url == _plate_url(frame_url, vehicle_id) else plate_url
+
+    overrides = {}
+    for name, url in (("frame_path", frame_url), ("plate_path", _plate_url(frame_url, vehicle_id) if plate is True else plate_url)):
+        path = _none(job.get(name))
+        if path and path != _path(url):
+            overrides[name] = path
+
+    return {MESSAGE_FIELD: msgpack.packb([
+        SCHEMA_VERSION,
+        job["job_id"],
+        vehicle_id,
+        job.get("vehicle_type"),
+        frame_url,
+        plate,
+        _aware(_timestamp(job.get("timestamp"))),
+        job.get("location"),
+        _workers_mask(job.get("workers")),
+        _pack_stamps(job),
+        overrides or None
+    ], datetime=True)}
+
+
+def decode_job(fields):
+    """Job dict from stream fields in either layout"""
+    if MESSAGE_FIELD not in fields:
+        job = dict(fields)
+        for name in ("frame_path", "plate_path", "frame_url", "plate_url"):
+            job[name] = _none(job.get(name))
+        job["timestamp"] = _timestamp(job.get("timestamp"))
+        for stage in STAMP_STAGES:
+            if f"t_{stage}" in job:
+                job[f"t_{stage}"] = _float(job[f"t_{stage}"])
+        return job
+
+    message = msgpack.unpackb(_blob(fields[MESSAGE_FIELD]), timestamp=3)
+    version = message[0]
+    if version != 1:
+        raise ValueError(f"Unsupported job schema version {version}")
+    _, job_id, vehicle_id, vehicle_type, frame_url, plate, timestamp, location, workers, stamps, overrides = message
+
+    plate_url = _plate_url(frame_url, vehicle_id) if plate is True else plate
+    overrides = overrides or {}
+    return {
+        **{name: field for name, field in fields.items() if name != MESSAGE_FIELD},
+        "job_id": job_id,
+        "vehicle_id": vehicle_id,
+        "vehicle_type": vehicle_type,
+        "frame_path": overrides.get("frame_path") or _path(frame_url),
+        "plate_path": overrides.get("plate_path") or _path(plate_url),
+        "frame_url": frame_url,
+        "plate_url": plate_url,
+        "timestamp": timestamp,
+        "location": location,
+        "workers": _workers_manifest(workers),
+        **_unpack_stamps(stamps)
+    }
+
+
+def encode_result(result, encoding=None):
+    """Stream fields for a worker result dict (original field names)"""
+    if (encoding or MESSAGE_ENCODING) == "fields":
+        return _legacy_fields(result)
+
+    value = result.get("results") if result.get("worker") == "fused" else result.get("result")
+    extra = {name: result[name] for name in RESULT_EXTRA_FIELDS if result.get(name) is not None}
+    if "confidence" in extra:
+        extra["confidence"] = _float(extra["confidence"])
+
+    return {MESSAGE_FIELD: msgpack.packb([
+        SCHEMA_VERSION,
+        result["job_id"],
+        result.get("vehicle_id"),
+        result.get("vehicle_type"),
+        _workers_mask(result.get("workers")),
+        result.get("worker"),
+        result.get("status", "ok"),
+        value,
+        _aware(_timestamp(result.get("timestamp"))),
+        result.get("location"),
+        _pack_stamps(result),
+        extra or None
+    ], datetime=True)}
+
+
+def decode_result(fields):
+    """Result dict from stream fields in either layout"""
+    if MESSAGE_FIELD not in fields:
+        result = dict(fields)
+        if result.get("worker") == "fused":
+            result["results"] = json.loads(result.get("results") or "{}")
+        result["timestamp"] = _timestamp(result.get("timestamp"))
+        if "confidence" in result:
+            result["confidence"] = _float(result["confidence"])
+        for stage in STAMP_STAGES:
+            if f"t_{stage}" in result:
+                result[f"t_{stage}"] = _float(result[f"t_{stage}"])
+        return result
+
+    message = msgpack.unpackb(_blob(fields[MESSAGE_FIELD]), timestamp=3)
+    version = message[0]
+    if version != 1:
+        raise ValueError(f"Unsupported result schema version {version}")
+    _, job_id, vehicle_id, vehicle_type, workers, worker, status, value, timestamp, location, stamps, extra = message
+
+    result = {
+        **{name: field for name, field in fields.items() if name != MESSAGE_FIELD},
+        "job_id": job_id,
+        "vehicle_id": vehicle_id,
+        "vehicle_type": vehicle_type,
+        "workers": _workers_manifest(workers),
+        "worker": worker,
+        "status": status,
+        "timestamp": timestamp,
+        "location": location,
+        **(extra or {}),
+        **_unpack_stamps(stamps)
+    }
+    result["results" if worker == "fused" else "result"] = value
+    return result
@@ -0,0 +1,327 @@
+"""
+Lightweight in-process metrics: counters, gauges and log-linear (HDR-style)
+histograms, published as periodic snapshots to Redis.
+
+Every process updates its own registry (a dict lookup and an add under a
+lock) and a daemon thread writes a JSON snapshot to
+sentinel:metrics:<process> every METRICS_INTERVAL seconds with a TTL, so
+stopped processes drop out on their own. The aggregator collects all
+snapshots and renders them in Prometheus text format at /metrics.
+
+Histograms record seconds into buckets that double from HIST_MIN with
+HIST_SUB_BUCKETS linear steps per doubling (at most ~6% relative error), so
+snapshots from any number of processes merge by adding bucket counts.
+
+Usage:
+    start_metrics("ocr")
+    JOBS = counter("sentinel_worker_jobs_total", "Jobs processed", worker="ocr", status="ok")
+    SERVICE = histogram("sentinel_worker_service_seconds", "Per-job service time", worker="ocr")
+    with SERVICE.time():
+        ...
+    JOBS.inc()
+"""
+import os
+import json
+import math
+import time
+import logging
+import threading
+
+from db_redis.sentinel_redis_config import (
+    get_redis_connection, METRICS_KEY_PREFIX, METRICS_INDEX_KEY, METRICS_INTERVAL
+)
+from common.readiness import PROCESS_NAME_ENV
+
+log = logging.getLogger(__name__)
+
+HIST_MIN = 1e-5             # 10 microseconds
+HIST_SUB_BUCKETS = 16
+HIST_DOUBLINGS = 26         # Up to ~670 s
+HIST_BUCKETS = HIST_SUB_BUCKETS * HIST_DOUBLINGS
+
+# Bucket bounds in the Prometheus exposition (seconds)
+EXPOSITION_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+
+
+def bucket_index(value):
+    if value <= HIST_MIN:
+        return 0
+    mantissa, exponent = math.frexp(value / HIST_MIN)
+    index = (exponent - 1) * HIST_SUB_BUCKETS + int((mantissa * 2 - 1) * HIST_SUB_BUCKETS)
+    return min(index, HIST_BUCKETS - 1)
+
+
+def bucket_upper(index):
+    doubling, sub = divmod(index, HIST_SUB_BUCKETS)
+    return HIST_MIN * (2 ** doubling) * (1 + (sub + 1) / HIST_SUB_BUCKETS)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, lock):
+        self.lock = lock
+        self.value = 0
+
+    def inc(self, n=1):
+        with self.lock:
+            self.value += n
+
+    def snapshot(self):
+        return {"value": self.value}
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, lock):
+        self.lock = lock
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, n=1):
+        with self.lock:
+            self.value += n
+
+    def dec(self, n=1):
+        self.inc(-n)
+
+    def snapshot(self):
+        return {"value": self.value}
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, lock):
+        self.lock = lock
+        self.counts = [0] * HIST_BUCKETS
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        index = bucket_index(seconds)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def time(self):
+        return _Timer(self)
+
+    def snapshot(self):
+        with self.lock:
+            buckets = {str(i): c for i, c in enumerate(self.counts) if c}
+            return {"buckets": buckets, "count": self.count, "sum": self.sum, "max": self.max}
+
+
+class _Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.help = {}
+
+    def get(self, cls, name, help_text, labels):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self.metrics.get(key)
+        if metric is None:
+            with self.lock:
+                metric = self.metrics.get(key)
+                if metric is None:
+                    metric = self.metrics[key] = cls(self.lock)
+                    self.help.setdefault(name, help_text)
+        return metric
+
+    def snapshot(self):
+        return [
+            {"name": name, "type": metric.kind, "help": self.help.get(name, ""),
+             "labels": dict(labels), **metric.snapshot()}
+            for (name, labels), metric in list(self.metrics.items())
+        ]
+
+
+registry = MetricsRegistry()
+
+def counter(name, help_text="", **labels):
+    return registry.get(Counter, name, help_text, labels)
+
+def gauge(name, help_text="", **labels):
+    return registry.get(Gauge, name, help_text, labels)
+
+def histogram(name, help_text="", **labels):
+    return registry.get(Histogram, name, help_text, labels)
+
+
+_publisher_pid = None
+_process_name = None
+
+def process_snapshot(component):
+    return {
+        "component": component,
+        "process": _process_name,
+        "pid": os.getpid(),
+        "ts": time.time(),
+        "metrics": registry.snapshot()
+    }
+
+
+def start_metrics(component, interval=METRICS_INTERVAL, name=None):
+    """
+    Publish this process's registry to Redis every `interval` seconds from a
+    daemon thread, under `name` (default: the orchestrator's process name).
+    Processes that share one name, like uvicorn workers, pass their own.
+    """
+    global _publisher_pid, _process_name
+
+    if _publisher_pid == os.getpid():
+        return
+    _publisher_pid = os.getpid()
+    _process_name = name or os.getenv(PROCESS_NAME_ENV, f"{component}:{os.getpid()}")
+
+    def publish():
+        r = get_redis_connection()
+        key = METRICS_KEY_PREFIX + _process_name
+        while True:
+            try:
+                pipe = r.pipeline(transaction=False)
+                pipe.set(key, json.dumps(process_snapshot(component)), ex=int(interval * 3) + 1)
+                pipe.sadd(METRICS_INDEX_KEY, _process_name)
+                pipe.execute()
+            except Exception as e:
+                log.warning("Could not publish metrics: %s", e)
+            time.sleep(interval)
+
+    threading.Thread(target=publish, name="metrics-publisher", daemon=True).start()
+
+
+def collect_snapshots(r, local_component=None):
+    """Live snapshots from every process; the calling process's own registry is read directly"""
+    names = sorted(r.smembers(METRICS_INDEX_KEY))
+    values = r.mget([METRICS_KEY_PREFIX + name for name in names]) if names else []
+
+    snapshots = []
+    expired = []
+    for name, value in zip(names, values):
+        if value is None:
+            expired.append(name)
+        elif local_component is None or name != _process_name:
+            snapshots.append(json.loads(value))
+    if expired:
+        r.srem(METRICS_INDEX_KEY, *expired)
+    if local_component is not None:
+        snapshots.append(process_snapshot(local_component))
+    return snapshots
+
+
+def merge_histograms(histograms):
+    merged = {"buckets": {}, "count": 0, "sum": 0.0, "max": 0.0}
+    for h in histograms:
+        for index, count in h["buckets"].items():
+            merged["buckets"][index] = merged["buckets"].get(index, 0) + count
+        merged["count"] += h["count"]
+        merged["sum"] += h["sum"]
+        merged["max"] = max(merged["max"], h["max"])
+    return merged
+
+
+def histogram_percentile(h, pct):
+    """Upper bound of the bucket holding the pct-th percentile"""
+    if not h["count"]:
+        return 0.0
+    target = h["count"] * pct / 100.0
+    seen = 0
+    for index in sorted(h["buckets"], key=int):
+        seen += h["buckets"][index]
+        if seen >= target:
+            return min(bucket_upper(int(index)), h["max"])
+    return h["max"]
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escape = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in sorted(labels.items())) + "}"
+
+
+def render_prometheus(snapshots, extra_gauges=()):
+    """
+    Prometheus text exposition. Each series carries component/process labels;
+    `extra_gauges` is an iterable of (name, help, labels, value) sampled at scrape time.
+    """
+    families = {}
+    for snapshot in snapshots:
+        base = {"component": snapshot["component"], "process": snapshot["process"]}
+        for metric in snapshot["metrics"]:
+            family = families.setdefault(metric["name"], {"type": metric["type"], "help": metric["help"], "series": []})
+            family["series"].append(({**base, **metric["labels"]}, metric))
+    for name, help_text, labels, value in extra_gauges:
+        family = families.setdefault(name, {"type": "gauge", "help": help_text, "series": []})
+        family["series"].append((labels, {"value": value}))
+
+    lines = []
+    for name in sorted(families):
+        family = families[name]
+        lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['type']}")
+        for labels, metric in family["series"]:
+            if family["type"] != "histogram":
+                lines.append(f"{name}{_labels(labels)} {metric['value']}")
+                continue
+
+            cumulative = 0
+            counts = sorted((int(i), c) for i, c in metric["buckets"].items())
+            position = 0
+            for le in EXPOSITION_BUCKETS:
+                while position < len(counts) and bucket_upper(counts[position][0]) <= le * 1.0001:
+                    cumulative += counts[position][1]
+                    position += 1
+                lines.append(f"{name}_bucket{_labels({**labels, 'le': le})} {cumulative}")
+            lines.append(f"{name}_bucket{_labels({**labels, 'le': '+Inf'})} {metric['count']}")
+            lines.append(f"{name}_sum{_labels(labels)} {metric['sum']}")
+            lines.append(f"{name}_count{_labels(labels)} {metric['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def summarize(snapshots):
+    """Per-component view: counters/gauges summed, histograms merged with percentiles (for humans, not scrapers)"""
+    summary = {}
+    for snapshot in snapshots:
+        for metric in snapshot["metrics"]:
+            labels = ",".join(f"{k}={v}" for k, v in sorted(metric["labels"].items()))
+            key = f"{metric['name']}{{{labels}}}" if labels else metric["name"]
+            entry = summary.setdefault(snapshot["component"], {})
+            if metric["type"] == "histogram":
+                entry.setdefault(key, []).append(metric)
+            else:
+                entry[key] = entry.get(key, 0) + metric["value"]
+
+    for component, entries in summary.items():
+        for key, value in entries.items():
+            if isinstance(value, list):
+                merged = merge_histograms(value)
+                entries[key] = {
+                    "count": merged["count"],
+                    "mean_ms": round(merged["sum"] / merged["count"] * 1000, 3) if merged["count"] else 0.0,
+                    **{f"p{p}_ms": round(histogram_percentile(merged, p) * 1000, 3) for p in (50, 95, 99)},
+                    "max_ms": round(merged["max"] * 1000, 3)
+                }
+    return summary
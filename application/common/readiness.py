@@ -0,0 +1,22 @@
+import os
+import json
+import time
+import logging
+
+from db_redis.sentinel_redis_config import get_redis_connection, READINESS_KEY
+
+log = logging.getLogger(__name__)
+
+# Set by the orchestrator to the process name it waits on ("OCR Worker 2")
+PROCESS_NAME_ENV = "SENTINEL_PROCESS_NAME"
+
+
+def mark_ready(component, r=None):
+    """
+    Report this process as ready. Call once models are loaded and connections
+    are established; the orchestrator matches the pid to ignore stale entries.
+    """
+    r = r or get_redis_connection()
+    name = os.getenv(PROCESS_NAME_ENV, component)
+    r.hset(READINESS_KEY, name, json.dumps({"pid": os.getpid(), "ready_at": time.time()}))
+    log.info("%s is ready", name, extra={"key": f"ready:{name}"})
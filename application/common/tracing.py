@@ -0,0 +1,77 @@
+"""
+Per-job stage timestamps for end-to-end latency tracing.
+
+Each stage adds a `t_<stage>` field to the messages it produces: ingress
+stamps detect/keyframe/published on the job, every worker copies those onto
+its result and adds dequeued/done, and the aggregator adds received (per
+result), aggregated, committed, first_display (when the vehicle was first
+shown, usually with only its first result) and broadcast (shown complete)
+before writing the trace to processing_jobs.
+
+Stamps are CLOCK_MONOTONIC seconds. The clock is shared by every process on
+the host (all Sentinel components run on one machine) and never steps with
+NTP, so differences between stamps taken in different processes are real
+durations.
+
+Usage:
+    payload["t_published"] = stamp()
+    stamps = read_stamps(fields, JOB_STAGES)
+    durations(stamps, JOB_SPANS)   # {"keyframe_save": 4.1, ...} in ms
+"""
+import time
+import datetime
+
+JOB_STAGES = ("detect", "keyframe", "published")                      # Ingress, carried on every message
+WORKER_STAGES = ("dequeued", "done")                                  # Each worker, on its result
+AGGREGATOR_STAGES = ("received", "aggregated", "committed", "first_display", "broadcast")
+
+# Reported stage -> (from stamp, to stamp)
+JOB_SPANS = {
+    "keyframe_save": ("detect", "keyframe"),
+    "plate_and_publish": ("keyframe", "published"),
+    "workers": ("published", "aggregated"),
+    "db_commit": ("aggregated", "committed"),
+    "broadcast": ("committed", "broadcast"),
+    "total": ("detect", "broadcast"),                 # Time to complete on the dashboard
+    "first_display": ("detect", "first_display"),     # Time to first show up on it
+}
+WORKER_SPANS = {
+    "queue_wait": ("published", "dequeued"),
+    "service": ("dequeued", "done"),
+    "result_delivery": ("done", "received"),
+}
+
+
+def stamp():
+    """Monotonic timestamp as a stream field value"""
+    return f"{time.monotonic():.6f}"
+
+
+def job_stamps(fields):
+    """The ingress stamps of a job, as fields to copy onto the next message"""
+    return {f"t_{stage}": fields[f"t_{stage}"] for stage in JOB_STAGES if fields.get(f"t_{stage}")}
+
+
+def read_stamps(fields, stages):
+    """{stage: seconds} for the stamps present in a message; malformed ones are skipped"""
+    stamps = {}
+    for stage in stages:
+        try:
+            stamps[stage] = float(fields[f"t_{stage}"])
+        except (KeyError, TypeError, ValueError):
+            pass
+    return stamps
+
+
+def durations(stamps, spans):
+    """Milliseconds per span for the spans whose both ends were stamped"""
+    return {
+        name: round((stamps[end] - stamps[start]) * 1000, 3)
+        for name, (start, end) in spans.items()
+        if start in stamps and end in stamps
+    }
+
+
+def wall_time(monotonic_seconds):
+    """Wall-clock datetime for a monotonic stamp taken on this host"""
+    return datetime.datetime.fromtimestamp(time.time() - time.monotonic() + monotonic_seconds)
@@ -0,0 +1,192 @@
+import heapq
+import time
+import logging
+import threading
+from db_redis.sentinel_redis_config import *
+from common.metrics import counter, gauge
+
+log = logging.getLogger("ingress")
+
+
+class OutstandingJob:
+    __slots__ = ("payload", "streams", "entry_ids", "deadline", "republished")
+
+    def __init__(self, payload, streams, entry_ids, deadline):
+        self.payload = payload          # Encoded job fields, re-published as is
+        self.streams = streams          # Job streams it went to, matching entry_ids
+        self.entry_ids = entry_ids
+        self.deadline = deadline        # time.monotonic() by which the aggregator should have acked it
+        self.republished = 0
+
+
+class AckConsumer:
+    """
+    Closes the loop on published jobs from inside ingress. publish_job()
+    registers every job with the entry IDs it got on each job stream; this
+    thread reads the aggregator's completion acks from vehicle_ack (group
+    "ingest"), XDELs the acknowledged job's entries and forgets it. A
+    "retrying" entry means the aggregator is re-requesting missing results
+    itself, and only pushes the job's deadline back.
+
+    Jobs not acknowledged within ACK_TIMEOUT (a lost result, an aggregator
+    restart that dropped its partial results) are re-published: the old
+    entries are XDEL'd and the same payload is added again with a
+    "republished" count, up to MAX_RETRIES times, after which the job is
+    abandoned and logged. Stuck entries inside a worker group are the
+    reclaimer's job; entries it re-publishes under new IDs are not tracked
+    here and are left to the trimmer.
+
+    The index only holds what is needed to re-publish: the encoded payload,
+    entry IDs and a deadline per job, with a heap of deadlines. It lives in
+    ingress memory, so jobs published before an ingress restart are not
+    re-published (their acks are still consumed).
+    """
+
+    def __init__(self, r, consumer):
+        """
+        Args:
+            r: Redis connection
+            consumer: Consumer name in the ingest group
+        """
+        self.r = r
+        self.consumer = consumer
+        self.timeout = ACK_TIMEOUT / 1000
+        self.jobs = {}              # job_id -> OutstandingJob
+        self.deadlines = []         # heap of (deadline, job_id); stale entries are skipped when popped
+        self.lock = threading.Lock()
+        self.totals = {"acked": 0, "unknown_acks": 0, "republished": 0, "abandoned": 0}
+        self.next_report = 0
+
+        self.outstanding = gauge("sentinel_ingress_outstanding_jobs", "Published jobs not yet acknowledged by the aggregator")
+        self.acked = counter("sentinel_ingress_jobs_acked_total", "Jobs acknowledged by the aggregator")
+        self.republished = counter("sentinel_ingress_jobs_republished_total", "Jobs re-published after ACK_TIMEOUT")
+        self.abandoned = counter("sentinel_ingress_jobs_abandoned_total", "Jobs given up on after MAX_RETRIES re-publishes")
+
+    def track(self, job_id, payload, streams, entry_ids):
+        """Register a job publish_job() just added to `streams`"""
+        deadline = time.monotonic() + self.timeout
+        with self.lock:
+            self.jobs[job_id] = OutstandingJob(payload, tuple(streams), tuple(entry_ids), deadline)
+            heapq.heappush(self.deadlines, (deadline, job_id))
+
+    def extend(self, job_id):
+        """Push a job's deadline back by ACK_TIMEOUT"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is not None:
+                job.deadline = time.monotonic() + self.timeout
+                heapq.heappush(self.deadlines, (job.deadline, job_id))
+
+    def handle_acks(self, acks):
+        with pipelined(self.r) as pipe:
+            for msg_id, fields in acks:
+                job_id = fields.get("job_id") if fields else None
+                if fields and fields.get("status") == "retrying":
+                    # The aggregator has part of the results and is retrying the rest itself
+                    self.extend(job_id)
+                    pipe.xack(VEHICLE_ACK_STREAM, INGEST_GROUP, msg_id)
+                    continue
+                with self.lock:
+                    job = self.jobs.pop(job_id, None)
+                    # Unknown: published before this ingress started, or already abandoned
+                    self.totals["unknown_acks" if job is None else "acked"] += 1
+                if job is not None:
+                    for stream, entry_id in zip(job.streams, job.entry_ids):
+                        pipe.xdel(stream, entry_id)
+                    self.acked.inc()
+                pipe.xack(VEHICLE_ACK_STREAM, INGEST_GROUP, msg_id)
+
+    def expire(self):
+        """Re-publish or abandon jobs past their deadline"""
+        now = time.monotonic()
+        while True:
+            with self.lock:
+                if not self.deadlines or self.deadlines[0][0] > now:
+                    return
+                deadline, job_id = heapq.heappop(self.deadlines)
+                job = self.jobs.get(job_id)
+                if job is None or job.deadline != deadline:
+                    continue
+                abandoned = job.republished >= MAX_RETRIES
+                if abandoned:
+                    del self.jobs[job_id]
+                    self.totals["abandoned"] += 1
+                else:
+                    job.republished += 1
+                    self.totals["republished"] += 1
+                republished, old_ids = job.republished, job.entry_ids
+
+            if abandoned:
+                self.abandoned.inc()
+                log.warning("Abandoned %s: not acknowledged after %d re-publishes", job_id, republished, extra={"job_id": job_id})
+                continue
+
+            payload = {**job.payload, "republished": republished}
+            with pipelined(self.r) as pipe:
+                for stream, entry_id in zip(job.streams, old_ids):
+                    pipe.xdel(stream, entry_id)
+                    pipe.xadd(stream, payload, **trim_args(stream))
+            new_ids = tuple(pipe.results[1::2])
+
+            with self.lock:
+                # Still outstanding, unless acknowledged while the new entries were being added
+                tracked = self.jobs.get(job_id) is job
+                if tracked:
+                    job.entry_ids = new_ids
+                    job.deadline = time.monotonic() + self.timeout
+                    heapq.heappush(self.deadlines, (job.deadline, job_id))
+            if not tracked:
+                with pipelined(self.r) as pipe:
+                    for stream, entry_id in zip(job.streams, new_ids):
+                        pipe.xdel(stream, entry_id)
+
+            self.republished.inc()
+            log.warning("Re-published %s (%d/%d): no ack within %d ms", job_id, republished, MAX_RETRIES, ACK_TIMEOUT,
+                        extra={"job_id": job_id})
+
+    def report(self):
+        with self.lock:
+            outstanding = len(self.jobs)
+            oldest = min((job.deadline for job in self.jobs.values()), default=None)
+            totals = dict(self.totals)
+        oldest_age_ms = int((time.monotonic() - oldest + self.timeout) * 1000) if oldest is not None else 0
+        self.outstanding.set(outstanding)
+        self.r.hset(ACK_TRACKER_STATS_KEY, mapping={
+            **totals,
+            "outstanding": outstanding,
+            "oldest_age_ms": oldest_age_ms,
+            "updated_at": time.time()
+        })
+
+    def block_ms(self):
+        """Read timeout: BLOCK_TIME, shortened so the next deadline is handled on time"""
+        with self.lock:
+            if not self.deadlines:
+                return BLOCK_TIME
+            wait = self.deadlines[0][0] - time.monotonic()
+        return max(1, min(BLOCK_TIME, int(wait * 1000) + 1))
+
+    def run(self):
+        # Acks delivered to this consumer before a restart first, then new ones
+        cursor = "0"
+        while True:
+            try:
+                messages = self.r.xreadgroup(INGEST_GROUP, self.consumer, {VEHICLE_ACK_STREAM: cursor},
+                                             count=BATCH_SIZE * 10, block=self.block_ms())
+                acks = [entry for _, entries in messages or [] for entry in entries]
+                if cursor == "0" and not acks:
+                    cursor = ">"
+                self.handle_acks(acks)
+                self.expire()
+
+                if time.monotonic() >= self.next_report:
+                    self.report()
+                    self.next_report = time.monotonic() + ACK_REPORT_INTERVAL
+            except Exception as e:
+                log.error("Ack consumer error: %s", e)
+                time.sleep(1)
+
+    def start(self):
+        thread = threading.Thread(target=self.run, name="ack_consumer", daemon=True)
+        thread.start()
+        return thread
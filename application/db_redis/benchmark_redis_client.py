@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+XADD, XREADGROUP and XACK throughput through the shared client layer.
+
+Runs each command against a scratch stream and consumer group over TCP and,
+when a socket path is given (--socket or REDIS_SOCKET), over the unix socket,
+issuing commands one round trip at a time and then through pipelined()
+batches of --batch commands. Reports ops/s per transport, command and mode.
+The Redis server needs `unixsocket` configured for the socket runs.
+
+Usage (from application/):
+    python3 db_redis/benchmark_redis_client.py [--ops 20000] [--batch 50] [--socket /var/run/redis/redis.sock]
+"""
+import argparse
+import os
+import time
+
+import redis
+
+from db_redis.sentinel_redis_config import *
+from common.messages import encode_result
+
+BENCH_GROUP = "bench"
+BENCH_CONSUMER = "bench_1"
+
+
+def sample_payload():
+    return encode_result({
+        "job_id": "car_1_3f9a1c2e",
+        "vehicle_id": "3f9a1c2e_20250101_120000_car_CALICUT_JUNCTION",
+        "vehicle_type": "car",
+        "workers": "ocr,color,logo",
+        "location": "CALICUT_JUNCTION",
+        "worker": "ocr",
+        "result": "KL11AB1234",
+        "status": "ok"
+    })
+
+
+def run_xadd(r, stream, payload, ops, batch):
+    if batch <= 1:
+        for _ in range(ops):
+            r.xadd(stream, payload)
+        return
+    for start in range(0, ops, batch):
+        with pipelined(r) as pipe:
+            for _ in range(min(batch, ops - start)):
+                pipe.xadd(stream, payload)
+
+
+def run_xreadgroup(r, stream, ops, batch):
+    """Reads every entry with count=1 per XREADGROUP; pipelined mode queues `batch` reads per round trip"""
+    ids = []
+    if batch <= 1:
+        for _ in range(ops):
+            for _, entries in r.xreadgroup(BENCH_GROUP, BENCH_CONSUMER, {stream: ">"}, count=1) or []:
+                ids.extend(msg_id for msg_id, _ in entries)
+        return ids
+    for start in range(0, ops, batch):
+        with pipelined(r) as pipe:
+            for _ in range(min(batch, ops - start)):
+                pipe.xreadgroup(BENCH_GROUP, BENCH_CONSUMER, {stream: ">"}, count=1)
+        for reply in pipe.results:
+            for _, entries in reply or []:
+                ids.extend(msg_id for msg_id, _ in entries)
+    return ids
+
+
+def run_xack(r, stream, ids, batch):
+    if batch <= 1:
+        for msg_id in ids:
+            r.xack(stream, BENCH_GROUP, msg_id)
+        return
+    for start in range(0, len(ids), batch):
+        with pipelined(r) as pipe:
+            for msg_id in ids[start:start + batch]:
+                pipe.xack(stream, BENCH_GROUP, msg_id)
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - started, result
+
+
+def bench(r, ops, batch):
+    """ops/s for each command; every command runs `ops` times against a fresh stream"""
+    stream = f"sentinel:bench:client:{os.getpid()}"
+    payload = sample_payload()
+    r.delete(stream)
+    r.xgroup_create(stream, BENCH_GROUP, id="0", mkstream=True)
+    try:
+        add_seconds, _ = timed(run_xadd, r, stream, payload, ops, batch)
+        read_seconds, ids = timed(run_xreadgroup, r, stream, ops, batch)
+        if len(ids) != ops:
+            raise RuntimeError(f"read {len(ids)} of {ops} entries")
+        ack_seconds, _ = timed(run_xack, r, stream, ids, batch)
+    finally:
+        r.delete(stream)
+    return {"xadd": ops / add_seconds, "xreadgroup": ops / read_seconds, "xack": ops / ack_seconds}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Redis stream command throughput over TCP / unix socket, with and without pipelining")
+    parser.add_argument("--ops", type=int, default=20000, help="Commands per measurement")
+    parser.add_argument("--batch", type=int, default=50, help="Commands per pipeline round trip in pipelined mode")
+    parser.add_argument("--socket", default=REDIS_SOCKET, help="Unix socket path (default: REDIS_SOCKET)")
+    args = parser.parse_args()
+
+    transports = [("tcp", "")]
+    if args.socket:
+        transports.append(("unix", args.socket))
+
+    print(f"Parser: {'hiredis' if HIREDIS_AVAILABLE else 'python'}, {args.ops} ops per measurement, pipeline batch {args.batch}")
+    print(f"{'transport':<10} {'mode':<10} {'xadd/s':>10} {'xreadgroup/s':>13} {'xack/s':>10}")
+    for transport, socket_path in transports:
+        r = get_redis_connection(socket_path=socket_path)
+        try:
+            r.ping()
+        except redis.ConnectionError as e:
+            print(f"{transport:<10} unavailable: {e}")
+            continue
+        for mode, batch in (("single", 1), ("pipelined", args.batch)):
+            rates = bench(r, args.ops, batch)
+            print(f"{transport:<10} {mode:<10} {rates['xadd']:>10.0f} {rates['xreadgroup']:>13.0f} {rates['xack']:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
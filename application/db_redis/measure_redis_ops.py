@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Measure Redis commands per vehicle while the pipeline is running.
+
+Samples INFO commandstats and the number of completed vehicles (entries added
+to vehicle_ack) over a window and prints the per-vehicle call counts. Run it
+before and after a routing change with the same traffic to compare.
+
+Usage (from application/):
+    python3 db_redis/measure_redis_ops.py [--window 60]
+"""
+import argparse
+import time
+
+import redis
+
+from db_redis.sentinel_redis_config import *
+
+STREAM_COMMANDS = ["xadd", "xreadgroup", "xack", "xread", "xdel", "xautoclaim", "xclaim"]
+
+
+def command_calls(r):
+    stats = r.info("commandstats")
+    return {name.replace("cmdstat_", ""): info["calls"] for name, info in stats.items()}
+
+
+def completed_vehicles(r):
+    try:
+        info = r.xinfo_stream(VEHICLE_ACK_STREAM)
+        return info.get("entries-added", info["length"])
+    except redis.ResponseError:
+        return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Redis operations per vehicle")
+    parser.add_argument("--window", type=float, default=60.0, help="Sampling window in seconds")
+    args = parser.parse_args()
+
+    r = get_redis_connection()
+
+    calls_before = command_calls(r)
+    vehicles_before = completed_vehicles(r)
+    print(f"Sampling for {args.window:.0f}s...")
+    time.sleep(args.window)
+    calls_after = command_calls(r)
+    vehicles_after = completed_vehicles(r)
+
+    vehicles = vehicles_after - vehicles_before
+    deltas = {cmd: calls_after.get(cmd, 0) - calls_before.get(cmd, 0) for cmd in calls_after}
+
+    print("=" * 50)
+    print(f"Completed vehicles: {vehicles}")
+    if vehicles <= 0:
+        print("No vehicles completed in the window")
+        return
+
+    print(f"{'command':<12} {'calls':>8} {'per vehicle':>12}")
+    for cmd in STREAM_COMMANDS:
+        if deltas.get(cmd):
+            print(f"{cmd:<12} {deltas[cmd]:>8} {deltas[cmd] / vehicles:>12.2f}")
+
+    # The measurement itself issues INFO/XINFO calls; leave them out of the total
+    total = sum(v for cmd, v in deltas.items() if cmd not in ("info", "xinfo|stream", "xinfo"))
+    print(f"{'all':<12} {total:>8} {total / vehicles:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,45 +1,310 @@
-import redis
+"""
+Stream throughput and lag monitor.
+
+Samples XINFO STREAM/GROUPS/CONSUMERS every MONITOR_INTERVAL seconds and
+derives, per stream and consumer group:
+
+    ingest_rate, consume_rate   entries/s between two samples (entries-added /
+                                entries-read counters)
+    lag                         entries not yet delivered to the group
+    pending                     delivered but not acknowledged
+    oldest_pending_age_ms       age of the oldest unacknowledged entry
+    lag_age_ms                  age of the oldest entry the group has not
+                                finished (pending or undelivered)
+
+and per consumer its pending count and idle time. Ages come from the
+millisecond part of the stream IDs, measured against the Redis server clock.
+
+The latest sample is kept in sentinel:stream_monitor for the API
+(/api/pipeline/streams). When a group's lag age crosses its SLO
+(LAG_AGE_SLO_MS, or <GROUP>_LAG_AGE_SLO_MS) an alert is logged and pushed to
+sentinel:stream_alerts, and again when it recovers.
+
+Usage (from application/):
+    python3 db_redis/monitor_streams.py            # sampler (started by the orchestrator)
+    python3 db_redis/monitor_streams.py --watch    # compact terminal view of the latest sample
+"""
+import sys
+import json
 import time
+import signal
+import logging
+import argparse
+import threading
+import redis
 from db_redis.sentinel_redis_config import *
+from common.readiness import mark_ready
+from common.log import setup_logging
+from common.metrics import start_metrics, counter, gauge
 
-def monitor_streams():
-    """Monitor all Redis streams"""
+log = logging.getLogger("monitor")
+
+# Undelivered entries counted by hand when Redis can't report lag (after XDEL)
+LAG_SCAN_LIMIT = 10000
+
+
+def entry_ms(entry_id):
+    """Milliseconds since the epoch encoded in a stream entry ID"""
+    return int(entry_id.split("-")[0])
+
+
+class StreamMonitor:
+    """Samples stream and consumer group state and turns counter deltas into rates"""
+
+    def __init__(self, r, consumer_groups):
+        """
+        Args:
+            r: Redis connection
+            consumer_groups: Stream -> consumer groups expected on it
+        """
+        self.r = r
+        self.consumer_groups = consumer_groups
+        self.previous = {}      # stream or (stream, group) -> (sampled_at, counter)
+        self.breached = set()   # (stream, group) currently over their SLO
+
+    def rate(self, key, now, value):
+        """Per-second change of a monotonic counter since the last sample, None on the first one"""
+        if value is None:
+            return None
+        previous = self.previous.get(key)
+        self.previous[key] = (now, value)
+        if previous is None or now <= previous[0] or value < previous[1]:
+            return None
+        return round((value - previous[1]) / (now - previous[0]), 2)
+
+    def count_undelivered(self, stream, last_delivered_id):
+        entries = self.r.xrange(stream, min=f"({last_delivered_id}", max="+", count=LAG_SCAN_LIMIT)
+        return len(entries)
+
+    def sample_group(self, stream, group, now_ms):
+        name = group["name"]
+        last_delivered = group["last-delivered-id"]
+        lag = group.get("lag")
+
+        oldest_pending_ms = None
+        if group["pending"]:
+            summary = self.r.xpending(stream, name)
+            if summary.get("min"):
+                oldest_pending_ms = entry_ms(summary["min"])
+
+        first_undelivered = self.r.xrange(stream, min=f"({last_delivered}", max="+", count=1)
+        oldest_undelivered_ms = entry_ms(first_undelivered[0][0]) if first_undelivered else None
+        if lag is None:
+            lag = self.count_undelivered(stream, last_delivered) if first_undelivered else 0
+
+        unfinished = [ms for ms in (oldest_pending_ms, oldest_undelivered_ms) if ms is not None]
+        consumers = {
+            consumer["name"]: {
+                "pending": consumer["pending"],
+                "idle_ms": consumer["idle"],
+                "inactive_ms": consumer.get("inactive")
+            }
+            for consumer in self.r.xinfo_consumers(stream, name)
+        }
+
+        slo_ms = get_lag_age_slo_ms(name)
+        lag_age_ms = max(0, now_ms - min(unfinished)) if unfinished else 0
+        return {
+            "lag": lag,
+            "pending": group["pending"],
+            "consume_rate": self.rate((stream, name), now_ms / 1000, group.get("entries-read")),
+            "oldest_pending_age_ms": max(0, now_ms - oldest_pending_ms) if oldest_pending_ms else 0,
+            "lag_age_ms": lag_age_ms,
+            "slo_ms": slo_ms,
+            "breached": lag_age_ms > slo_ms,
+            "consumers": consumers
+        }
+
+    def sample(self):
+        seconds, microseconds = self.r.time()
+        now_ms = seconds * 1000 + microseconds // 1000
+
+        streams = {}
+        for stream, expected_groups in self.consumer_groups.items():
+            try:
+                info = self.r.xinfo_stream(stream)
+                groups = self.r.xinfo_groups(stream)
+            except redis.ResponseError:
+                streams[stream] = {"exists": False, "groups": {}}
+                continue
+
+            added = info.get("entries-added")
+            streams[stream] = {
+                "exists": True,
+                "length": info["length"],
+                "last_id": info["last-generated-id"],
+                "ingest_rate": self.rate(stream, now_ms / 1000, info["length"] if added is None else added),
+                "groups": {group["name"]: self.sample_group(stream, group, now_ms) for group in groups}
+            }
+            for name in expected_groups:
+                if name not in streams[stream]["groups"]:
+                    log.warning("Consumer group %s missing on %s", name, stream)
+
+        try:
+            dead_letter_length = self.r.xlen(DEAD_LETTER_STREAM)
+        except redis.ResponseError:
+            dead_letter_length = 0
+
+        return {
+            "ts": now_ms / 1000,
+            "interval": MONITOR_INTERVAL,
+            "streams": streams,
+            "dead_letter_length": dead_letter_length
+        }
+
+    def check_slos(self, sample):
+        """Alerts for groups whose lag age crossed their SLO in either direction since the last sample"""
+        alerts = []
+        for stream, stream_info in sample["streams"].items():
+            for group, info in stream_info["groups"].items():
+                key = (stream, group)
+                if info["breached"] == (key in self.breached):
+                    continue
+                if info["breached"]:
+                    self.breached.add(key)
+                else:
+                    self.breached.discard(key)
+                alerts.append({
+                    "ts": sample["ts"],
+                    "state": "firing" if info["breached"] else "resolved",
+                    "stream": stream,
+                    "group": group,
+                    "lag_age_ms": info["lag_age_ms"],
+                    "slo_ms": info["slo_ms"],
+                    "lag": info["lag"],
+                    "pending": info["pending"]
+                })
+        return alerts
+
+    def publish(self, sample, alerts):
+        pipe = self.r.pipeline(transaction=False)
+        pipe.set(STREAM_MONITOR_KEY, json.dumps(sample), ex=int(MONITOR_INTERVAL * 3) + 1)
+        for alert in alerts:
+            pipe.lpush(STREAM_ALERTS_KEY, json.dumps(alert))
+        if alerts:
+            pipe.ltrim(STREAM_ALERTS_KEY, 0, STREAM_ALERTS_LENGTH - 1)
+        pipe.execute()
+
+    def record_metrics(self, sample):
+        for stream, stream_info in sample["streams"].items():
+            if stream_info.get("ingest_rate") is not None:
+                gauge("sentinel_stream_ingest_rate", "Entries added per second", stream=stream).set(stream_info["ingest_rate"])
+            for group, info in stream_info["groups"].items():
+                labels = {"stream": stream, "group": group}
+                if info["consume_rate"] is not None:
+                    gauge("sentinel_group_consume_rate", "Entries read per second by the group", **labels).set(info["consume_rate"])
+                gauge("sentinel_group_lag_age_seconds", "Age of the oldest entry the group has not finished", **labels).set(info["lag_age_ms"] / 1000)
+                gauge("sentinel_group_oldest_pending_age_seconds", "Age of the oldest unacknowledged entry", **labels).set(info["oldest_pending_age_ms"] / 1000)
+
+
+def format_rate(rate):
+    return "-" if rate is None else f"{rate:.1f}"
+
+
+def format_age(ms):
+    if ms < 1000:
+        return f"{ms}ms"
+    if ms < 120000:
+        return f"{ms / 1000:.1f}s"
+    return f"{ms / 60000:.0f}m"
+
+
+def render(stats):
+    """Compact terminal view of a monitor sample and its recent alerts"""
+    sample = stats["sample"]
+    if sample is None:
+        return "No sample: is the stream monitor running?"
+
+    lines = [
+        f"Sentinel streams @ {time.strftime('%H:%M:%S', time.localtime(sample['ts']))}"
+        f"  (every {sample['interval']:.0f}s, dead-letter {sample['dead_letter_length']})",
+        f"{'stream / group':<34} {'len':>7} {'in/s':>7} {'out/s':>7} {'lag':>6} {'pend':>5} {'lag age':>8} {'slo':>7}"
+    ]
+    for stream, stream_info in sample["streams"].items():
+        if not stream_info["exists"]:
+            lines.append(f"{stream:<34} (missing)")
+            continue
+        lines.append(f"{stream:<34} {stream_info['length']:>7} {format_rate(stream_info['ingest_rate']):>7}")
+        for group, info in stream_info["groups"].items():
+            flag = " !" if info["breached"] else ""
+            lines.append(
+                f"  {group:<32} {'':>7} {'':>7} {format_rate(info['consume_rate']):>7} {info['lag']:>6} {info['pending']:>5} "
+                f"{format_age(info['lag_age_ms']):>8} {format_age(info['slo_ms']):>7}{flag}"
+            )
+            if info["consumers"]:
+                lines.append("    " + ", ".join(
+                    f"{name} {c['pending']}p idle {format_age(c['idle_ms'])}" for name, c in info["consumers"].items()
+                ))
+
+    if stats["alerts"]:
+        lines.append("Recent alerts:")
+        for alert in stats["alerts"][:5]:
+            lines.append(
+                f"  {time.strftime('%H:%M:%S', time.localtime(alert['ts']))} {alert['state']:<8} "
+                f"{alert['stream']}/{alert['group']} lag age {format_age(alert['lag_age_ms'])} (slo {format_age(alert['slo_ms'])})"
+            )
+    return "\n".join(lines)
+
+
+def watch(once=False):
     r = get_redis_connection()
-    
-    print("Sentinel Redis Stream Monitor")
-    print("=" * 50)
-    
     while True:
+        view = render(get_stream_monitor_stats(r, alerts=5))
+        if once:
+            print(view)
+            return
+        sys.stdout.write("\033[H\033[J" + view + "\n")
+        sys.stdout.flush()
+        time.sleep(MONITOR_INTERVAL)
+
+
+def monitor_streams():
+    shutdown_event = threading.Event()
+
+    def handle_shutdown(signum, frame):
+        log.info("Received signal %s, shutting down Stream Monitor...", signum)
+        shutdown_event.set()
+
+    signal.signal(signal.SIGINT, handle_shutdown)
+    signal.signal(signal.SIGTERM, handle_shutdown)
+
+    r = get_redis_connection()
+    monitor = StreamMonitor(r, get_consumer_groups())
+    start_metrics("monitor")
+
+    log.info("Sampling %s every %ss, lag-age SLO %d ms", ", ".join(monitor.consumer_groups), MONITOR_INTERVAL, LAG_AGE_SLO_MS)
+    mark_ready("monitor", r)
+
+    while not shutdown_event.is_set():
         try:
-            print(f"\nTimestamp: {time.strftime('%H:%M:%S')}")
-            print("-" * 30)
-            
-            # Monitor each stream
-            for stream in [VEHICLE_JOBS_STREAM, VEHICLE_RESULTS_STREAM, VEHICLE_ACK_STREAM]:
-                try:
-                    info = r.xinfo_stream(stream)
-                    groups_info = r.xinfo_groups(stream)
-                    
-                    print(f"{stream}:")
-                    print(f"  Messages: {info['length']}")
-                    print(f"  Groups: {len(groups_info)}")
-                    
-                    for group in groups_info:
-                        pending = group['pending']
-                        consumers = group['consumers']
-                        print(f"    Group '{group['name']}': {pending} pending, {consumers} consumers")
-                    
-                except redis.ResponseError:
-                    print(f"{stream}: Stream does not exist")
-            
-            time.sleep(20)  # Update every 5 seconds
-            
-        except KeyboardInterrupt:
-            print("\nMonitoring stopped")
-            break
+            sample = monitor.sample()
+            alerts = monitor.check_slos(sample)
+            monitor.publish(sample, alerts)
+            monitor.record_metrics(sample)
+
+            for alert in alerts:
+                if alert["state"] == "firing":
+                    counter("sentinel_stream_slo_alerts_total", "Lag-age SLO breaches", stream=alert["stream"], group=alert["group"]).inc()
+                    log.warning("SLO breach: %s/%s lag age %d ms > %d ms (lag %d, pending %d)",
+                                alert["stream"], alert["group"], alert["lag_age_ms"], alert["slo_ms"], alert["lag"], alert["pending"],
+                                extra={"key": f"slo:{alert['stream']}:{alert['group']}"})
+                else:
+                    log.info("SLO recovered: %s/%s lag age %d ms", alert["stream"], alert["group"], alert["lag_age_ms"])
         except Exception as e:
-            print(f"Error: {e}")
-            time.sleep(5)
+            log.error("Sampling failed: %s", e)
+        shutdown_event.wait(MONITOR_INTERVAL)
+
+    log.info("Shutdown complete.")
+
 
 if __name__ == "__main__":
-    monitor_streams()
+    parser = argparse.ArgumentParser(description="Sentinel stream throughput and lag monitor")
+    parser.add_argument("--watch", action="store_true", help="Show the latest sample in the terminal instead of sampling")
+    parser.add_argument("--once", action="store_true", help="With --watch, print the view once and exit")
+    args = parser.parse_args()
+
+    if args.watch:
+        watch(once=args.once)
+    else:
+        setup_logging("monitor")
+        monitor_streams()
@@ -0,0 +1,167 @@
+import time
+import signal
+import threading
+from db_redis.sentinel_redis_config import *
+from common.readiness import mark_ready
+from common.log import setup_logging
+from common.tracing import job_stamps
+from common.messages import decode_job, encode_result
+
+log = setup_logging("reclaimer")
+
+shutdown_event = threading.Event()
+
+def handle_shutdown(signum, frame):
+    log.info("Received signal %s, shutting down Reclaimer gracefully...", signum)
+    shutdown_event.set()
+
+signal.signal(signal.SIGINT, handle_shutdown)
+signal.signal(signal.SIGTERM, handle_shutdown)
+
+
+class PendingReclaimer:
+    """
+    Reclaims entries that sat unacknowledged in a consumer group's PEL for
+    RECLAIM_IDLE_MS (crashed consumer, failed job) and hands them back to the
+    live consumers by re-publishing them with a retry count. After MAX_RETRIES
+    the entry goes to DEAD_LETTER_STREAM with the last recorded error.
+    """
+
+    def __init__(self, r, consumer_groups):
+        """
+        Args:
+            r: Redis connection
+            consumer_groups: Stream -> list of consumer groups to watch
+        """
+        self.r = r
+        self.consumer_groups = consumer_groups
+
+    def pop_error(self, stream, group, msg_id):
+        key = f"{stream}|{group}|{msg_id}"
+        error = self.r.hget(JOB_ERRORS_KEY, key)
+        if error is not None:
+            self.r.hdel(JOB_ERRORS_KEY, key)
+        return error
+
+    def count(self, stream, group, what, n=1):
+        self.r.hincrby(RECLAIMER_STATS_KEY, f"{stream}|{group}|{what}", n)
+
+    def publish_failed_results(self, group, fields, error):
+        """Report a dead-lettered job as failed so the aggregator does not wait for it forever"""
+        fields = decode_job(fields)
+        vehicle_type = fields.get("vehicle_type", "")
+        manifest = fields.get("workers", "")
+        workers = parse_worker_manifest(manifest) or get_expected_workers(vehicle_type)
+        base = {
+            "job_id": fields.get("job_id", ""),
+            "vehicle_id": fields.get("vehicle_id", ""),
+            "vehicle_type": vehicle_type,
+            "workers": manifest,
+            "location": fields.get("location"),
+            "timestamp": fields.get("timestamp"),
+            "status": "error",
+            "error": error,
+            **job_stamps(fields)
+        }
+
+        if group == FUSED_GROUP:
+            results = {worker: WORKER_FAILED_RESULTS[worker] for worker in workers}
+            self.r.xadd(VEHICLE_RESULTS_STREAM, encode_result({**base, "worker": "fused", "results": results}), **trim_args(VEHICLE_RESULTS_STREAM))
+            return
+
+        for worker, worker_group in WORKER_GROUPS.items():
+            if worker_group == group:
+                self.r.xadd(VEHICLE_RESULTS_STREAM, encode_result({**base, "worker": worker, "result": WORKER_FAILED_RESULTS[worker]}),
+                            **trim_args(VEHICLE_RESULTS_STREAM))
+
+    def handle_entry(self, stream, group, msg_id, fields):
+        retries = int(fields.get("retries", 0)) + 1
+        error = self.pop_error(stream, group, msg_id) or f"idle for over {RECLAIM_IDLE_MS} ms (consumer stalled or crashed)"
+
+        if retries > MAX_RETRIES:
+            dead = {
+                **fields,
+                "source_stream": stream,
+                "source_group": group,
+                "source_id": msg_id,
+                "retries": retries - 1,
+                "error": error,
+                "dead_lettered_at": str(time.time())
+            }
+            pipe = self.r.pipeline()
+            pipe.xadd(DEAD_LETTER_STREAM, dead, **trim_args(DEAD_LETTER_STREAM))
+            pipe.xack(stream, group, msg_id)
+            pipe.xdel(stream, msg_id)
+            pipe.execute()
+            self.count(stream, group, "dead_lettered")
+            log.warning("Dead-lettered %s/%s %s after %d retries: %s", stream, group, msg_id, retries - 1, error)
+
+            if stream not in (VEHICLE_RESULTS_STREAM, VEHICLE_ACK_STREAM):
+                self.publish_failed_results(group, fields, error)
+            return
+
+        # Re-publish as a fresh entry so a live consumer picks it up with '>', then drop the stale one
+        retry = {**fields, "retries": retries, "last_error": error}
+        pipe = self.r.pipeline()
+        pipe.xadd(stream, retry, **trim_args(stream))
+        pipe.xack(stream, group, msg_id)
+        pipe.xdel(stream, msg_id)
+        pipe.execute()
+        self.count(stream, group, "reclaimed")
+        log.info("Retrying %s/%s %s (attempt %d/%d): %s", stream, group, msg_id, retries, MAX_RETRIES, error)
+
+    def reclaim_group(self, stream, group):
+        """Run XAUTOCLAIM over the whole PEL of one group, returning entries handled"""
+        handled = 0
+        cursor = "0-0"
+        while True:
+            response = self.r.xautoclaim(stream, group, RECLAIMER_CONSUMER,
+                                         min_idle_time=RECLAIM_IDLE_MS, start_id=cursor, count=100)
+            cursor, entries = response[0], response[1]
+
+            for msg_id, fields in entries:
+                if fields is None:
+                    # Entry was trimmed/deleted while pending - nothing left to retry
+                    self.r.xack(stream, group, msg_id)
+                    continue
+                self.handle_entry(stream, group, msg_id, fields)
+                handled += 1
+
+            if cursor == "0-0" or shutdown_event.is_set():
+                return handled
+
+    def run_once(self):
+        handled = 0
+        for stream, groups in self.consumer_groups.items():
+            for group in groups:
+                try:
+                    handled += self.reclaim_group(stream, group)
+                except Exception as e:
+                    if "NOGROUP" not in str(e):
+                        log.error("Error reclaiming %s/%s: %s", stream, group, e)
+        return handled
+
+
+def reclaimer():
+    r = get_redis_connection()
+    consumer_groups = get_consumer_groups()
+    pending_reclaimer = PendingReclaimer(r, consumer_groups)
+
+    log.info("Started: idle > %d ms, every %ss, max %d retries", RECLAIM_IDLE_MS, RECLAIM_INTERVAL, MAX_RETRIES)
+    log.info("Watching: %s", ", ".join(f"{s}/{g}" for s, gs in consumer_groups.items() for g in gs))
+    mark_ready("reclaimer", r)
+
+    while not shutdown_event.is_set():
+        try:
+            handled = pending_reclaimer.run_once()
+            if handled:
+                stats = get_reclaimer_stats(r)
+                log.info("Handled %d entries, dead-letter length %d", handled, stats["dead_letter_length"])
+        except Exception as e:
+            log.error("Error: %s", e)
+        shutdown_event.wait(RECLAIM_INTERVAL)
+
+    log.info("Shutdown complete.")
+
+if __name__ == "__main__":
+    reclaimer()
@@ -1,21 +1,129 @@
 # Sentinel Redis Configuration
 import redis
+import redis.asyncio
 import os
+import json
+import time
 
 # Redis Connection
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
 REDIS_DB = int(os.getenv("REDIS_DB", 0))
+REDIS_SOCKET = os.getenv("REDIS_SOCKET", "")                                      # unix socket path; TCP when empty
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 32))                # Per process
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", 30))    # Seconds idle before a PING on reuse
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", 5))
+PIPELINE_MAX_COMMANDS = int(os.getenv("PIPELINE_MAX_COMMANDS", 500))              # Commands per round trip in a batch
+
+try:
+    from redis._parsers import _HiredisParser, _AsyncHiredisParser
+    from redis.utils import HIREDIS_AVAILABLE
+except ImportError:
+    HIREDIS_AVAILABLE = False
+
+_pools = {}
+
+def get_redis_pool(decode_responses=True, socket_path=None):
+    """
+    Connection pool shared by every client in this process with the same
+    settings. Connects over the unix socket in REDIS_SOCKET when set (no TCP
+    stack, lower latency on the same host), uses the hiredis reply parser when
+    the hiredis package is installed, and PINGs connections that sat idle
+    longer than REDIS_HEALTH_CHECK_INTERVAL before reusing them. redis-py
+    resets the pool in a forked child, so pools created before a fork are safe.
+    """
+    socket_path = REDIS_SOCKET if socket_path is None else socket_path
+    key = (decode_responses, socket_path)
+    if key not in _pools:
+        _pools[key] = redis.ConnectionPool(**_pool_options(redis, decode_responses, socket_path))
+    return _pools[key]
+
+def _pool_options(client, decode_responses, socket_path):
+    """ConnectionPool arguments for the redis (sync) or redis.asyncio client module"""
+    options = {
+        "db": REDIS_DB,
+        "decode_responses": decode_responses,
+        "encoding_errors": "surrogateescape",
+        "max_connections": REDIS_MAX_CONNECTIONS,
+        "health_check_interval": REDIS_HEALTH_CHECK_INTERVAL,
+        "socket_connect_timeout": REDIS_CONNECT_TIMEOUT
+    }
+    if HIREDIS_AVAILABLE:
+        options["parser_class"] = _AsyncHiredisParser if client is redis.asyncio else _HiredisParser
+    if socket_path:
+        options.update(connection_class=client.UnixDomainSocketConnection, path=socket_path)
+    else:
+        options.update(host=REDIS_HOST, port=REDIS_PORT, socket_keepalive=True)
+    return options
 
 # Redis connection instance
-def get_redis_connection():
-    """Get Redis connection with decode_responses=True for strings"""
-    return redis.Redis(
-        host=REDIS_HOST, 
-        port=REDIS_PORT, 
-        db=REDIS_DB, 
-        decode_responses=True
-    )
+def get_redis_connection(decode_responses=True, socket_path=None):
+    """
+    Get a Redis client on the shared pool, with decode_responses=True for
+    strings. Binary values (msgpack messages) decode with surrogateescape, so
+    they read as str and are written back as the same bytes. Clients are
+    cheap: a connection is only held while a command (or a blocking
+    XREADGROUP) runs, so threads can share one client or each take their own.
+    """
+    return redis.Redis(connection_pool=get_redis_pool(decode_responses, socket_path))
+
+def get_async_redis_connection(decode_responses=True, socket_path=None):
+    """
+    redis.asyncio client with the same settings as get_redis_connection, on
+    a pool of its own: asyncio connections belong to the event loop that
+    opened them, so create it from the loop that will use it.
+    """
+    socket_path = REDIS_SOCKET if socket_path is None else socket_path
+    return redis.asyncio.Redis(connection_pool=redis.asyncio.ConnectionPool(**_pool_options(redis.asyncio, decode_responses, socket_path)))
+
+def describe_redis_connection():
+    """Transport and parser in use, for startup logs"""
+    transport = f"unix:{REDIS_SOCKET}" if REDIS_SOCKET else f"{REDIS_HOST}:{REDIS_PORT}"
+    return f"{transport}/{REDIS_DB} ({'hiredis' if HIREDIS_AVAILABLE else 'python'} parser)"
+
+class pipelined:
+    """
+    Batches commands into non-transactional pipelines: one round trip for the
+    whole block instead of one per command. Commands are sent when the block
+    exits (also when it raises, so work already done is still acknowledged)
+    and every PIPELINE_MAX_COMMANDS commands before that; replies are
+    collected in `results`. Ordering matches issuing the commands one by one,
+    e.g. an XADD of a result followed by the XACK of its job.
+
+        with pipelined(r) as pipe:
+            for msg_id, result in done:
+                pipe.xadd(VEHICLE_RESULTS_STREAM, result, **trim_args(VEHICLE_RESULTS_STREAM))
+                pipe.xack(stream, group, msg_id)
+    """
+
+    def __init__(self, r, max_commands=PIPELINE_MAX_COMMANDS):
+        self.pipe = r.pipeline(transaction=False)
+        self.max_commands = max_commands
+        self.results = []
+
+    def __getattr__(self, name):
+        command = getattr(self.pipe, name)
+        if not callable(command):
+            return command
+
+        def queue(*args, **kwargs):
+            command(*args, **kwargs)
+            if len(self.pipe) >= self.max_commands:
+                self.execute()
+            return self
+        return queue
+
+    def execute(self):
+        if len(self.pipe):
+            self.results.extend(self.pipe.execute())
+        return self.results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.execute()
+        return False
 
 # Stream Names
 VEHICLE_JOBS_STREAM = "vehicle_jobs"
@@ -28,6 +136,10 @@ COLOR_GROUP = "color_workers"
 LOGO_GROUP = "logo_workers"
 AGGREGATOR_GROUP = "aggregator" 
 INGEST_GROUP = "ingest"
+FUSED_GROUP = "fused_workers"
+
+# Worker layout: "split" runs one process per analysis, "fused" runs all analyses in one process
+WORKER_MODE = os.getenv("WORKER_MODE", "split")
 
 # Processing Configuration
 BATCH_SIZE = 10          # Messages per batch
@@ -35,6 +147,93 @@ BLOCK_TIME = 1000        # ms to block on XREADGROUP
 ACK_TIMEOUT = 30000      # 30 seconds
 MAX_RETRIES = 3
 
+# Pending-entry reclaimer / dead-letter handling
+DEAD_LETTER_STREAM = "vehicle_dead_letter"
+RECLAIMER_CONSUMER = "reclaimer"
+RECLAIM_IDLE_MS = int(os.getenv("RECLAIM_IDLE_MS", ACK_TIMEOUT))   # Entries idle this long are reclaimed
+RECLAIM_INTERVAL = float(os.getenv("RECLAIM_INTERVAL", 5))          # Seconds between reclaim passes
+JOB_ERRORS_KEY = "sentinel:job_errors"                               # Last worker error per pending entry
+RECLAIMER_STATS_KEY = "sentinel:reclaimer_stats"                     # reclaimed/dead_lettered counters
+
+# Ack-driven job lifecycle (db_redis/ack_consumer.py, runs inside ingress)
+ACK_TRACKER_STATS_KEY = "sentinel:ack_tracker"                       # outstanding/acked/republished/abandoned
+ACK_REPORT_INTERVAL = float(os.getenv("ACK_REPORT_INTERVAL", 5))     # Seconds between outstanding-job reports
+
+# Aggregator consumers share vehicle_results and keep partial vehicles in Redis (aggregator/modules/job_state.py)
+AGGREGATOR_CONSUMER = os.getenv("AGGREGATOR_CONSUMER", "aggregator_1")   # Unique per aggregator; reused across restarts
+AGGREGATOR_MODE = os.getenv("AGGREGATOR_MODE", "asyncio")                 # asyncio (tasks on the API's event loop) | thread
+JOB_STATE_PREFIX = "sentinel:job:"                                        # + job_id -> hash of its results so far
+JOB_DEADLINES_KEY = "sentinel:job_deadlines"                              # zset job_id -> next retry deadline
+JOB_STATE_TTL = int(os.getenv("JOB_STATE_TTL", 600))                      # Seconds a job's state outlives its last change
+
+# Aggregator partial vehicles: retry missing results before ingress re-publishes the whole job (ACK_TIMEOUT)
+PENDING_TIMEOUT_MS = int(os.getenv("PENDING_TIMEOUT_MS", ACK_TIMEOUT * 2 // 3))   # From publish, per retry after that
+MAX_PENDING_JOBS = int(os.getenv("MAX_PENDING_JOBS", 10000))                        # In flight across all aggregators; nearest deadlines stored as partial beyond this
+# Upsert and broadcast a vehicle from its first result, then patch in the rest as they arrive ("0": only once complete)
+PROGRESSIVE_RESULTS = os.getenv("PROGRESSIVE_RESULTS", "1") == "1"
+
+# Aggregator database writes (aggregator/modules/db_writer.py)
+DB_WRITE_MODE = os.getenv("DB_WRITE_MODE", "values")          # values (execute_values) | copy (COPY via a temp table)
+DB_BATCH_ROWS = int(os.getenv("DB_BATCH_ROWS", 100))           # Flush once this many vehicles are waiting...
+DB_FLUSH_MS = int(os.getenv("DB_FLUSH_MS", 50))                # ...or the oldest has waited this long
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 4))               # Persistent connections for aggregator writes
+DB_RETRY_SECONDS = float(os.getenv("DB_RETRY_SECONDS", 2))     # Wait before retrying a failed flush
+
+# Local spool for completed vehicles while Postgres is down or slow (aggregator/modules/spool.py)
+SPOOL_DIR = os.getenv("SPOOL_DIR", "spool")                                    # Relative to application/
+SPOOL_SEGMENT_BYTES = int(os.getenv("SPOOL_SEGMENT_BYTES", 4 * 1024 * 1024))    # Segment size before rolling over
+SPOOL_SLOW_FLUSH_MS = int(os.getenv("SPOOL_SLOW_FLUSH_MS", 1000))              # A slower flush switches to spooling
+SPOOL_DRAIN_INTERVAL = float(os.getenv("SPOOL_DRAIN_INTERVAL", 2))            # Seconds between replay attempts
+SPOOL_REPLAY_BATCH = int(os.getenv("SPOOL_REPLAY_BATCH", 1000))                # Rows per replay transaction
+SPOOL_STATS_KEY = "sentinel:spool"                                             # depth/bytes/replay rate (JSON fields)
+
+# API and aggregation process layout (orchestrator.py)
+API_LAYOUT = os.getenv("API_LAYOUT", "combined")       # combined (aggregator.py serves the API and aggregates) | split (see below)
+API_WORKERS = int(os.getenv("API_WORKERS", 4))         # split: uvicorn worker processes for the API (aggregator/api_server.py)
+VEHICLE_UPDATES_CHANNEL = "sentinel:vehicle_updates"   # split: dashboard messages from aggregator/aggregation_service.py to every API worker
+SYSTEM_READY_KEY = "sentinel:system_ready"             # Set once the orchestrator signals ready; WebSocket clients are accepted after that
+
+# WebSocket fan-out to dashboard clients (aggregator/modules/broadcast_hub.py)
+WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", 256))                   # Messages queued per client before the slow-client policy applies
+WS_SLOW_CLIENT_POLICY = os.getenv("WS_SLOW_CLIENT_POLICY", "drop_oldest")  # drop_oldest | coalesce (per vehicle) | disconnect
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", 10))              # A send stalled this long (s) disconnects the client
+
+# Startup readiness probes
+READINESS_KEY = "sentinel:ready"                       # process name -> {"pid", "ready_at"}
+STARTUP_TIMES_KEY = "sentinel:startup_times"           # process name -> seconds to ready (last start)
+STARTUP_HISTORY_KEY = "sentinel:startup_history"       # recent startups, newest first
+STARTUP_HISTORY_LENGTH = 100
+STARTUP_TIMEOUT = float(os.getenv("STARTUP_TIMEOUT", 120))
+
+# Metrics snapshots (common/metrics.py)
+METRICS_KEY_PREFIX = "sentinel:metrics:"               # + process name -> JSON snapshot with TTL
+METRICS_INDEX_KEY = "sentinel:metrics:processes"       # Set of processes that have published
+METRICS_INTERVAL = float(os.getenv("METRICS_INTERVAL", 5))
+
+# Stream throughput / lag monitor (db_redis/monitor_streams.py)
+STREAM_MONITOR_KEY = "sentinel:stream_monitor"         # Latest sample (JSON, expires if the monitor stops)
+STREAM_ALERTS_KEY = "sentinel:stream_alerts"           # Lag-age SLO alerts, newest first
+STREAM_ALERTS_LENGTH = 100
+MONITOR_INTERVAL = float(os.getenv("MONITOR_INTERVAL", 5))         # Seconds between samples
+LAG_AGE_SLO_MS = int(os.getenv("LAG_AGE_SLO_MS", 10000))           # Oldest unfinished entry per group
+
+# Stream retention (db_redis/stream_trimmer.py)
+STREAM_MAXLEN = int(os.getenv("STREAM_MAXLEN", 100000))                      # Approximate cap applied on every XADD
+STREAM_MAX_AGE_SECONDS = float(os.getenv("STREAM_MAX_AGE_SECONDS", 0))       # If set, cap by age (MINID) instead of length
+DEAD_LETTER_MAXLEN = int(os.getenv("DEAD_LETTER_MAXLEN", 10000))
+STREAM_KEEP_ACKED_SECONDS = float(os.getenv("STREAM_KEEP_ACKED_SECONDS", 300))  # Acknowledged entries kept for inspection
+TRIM_INTERVAL = float(os.getenv("TRIM_INTERVAL", 30))                        # Seconds between trimmer passes
+RETENTION_STATS_KEY = "sentinel:retention"                                   # stream -> memory/trimmed counters
+
+# Worker autoscaling (replicas per worker type, driven by consumer group lag + pending)
+WORKER_MIN_REPLICAS = int(os.getenv("WORKER_MIN_REPLICAS", 1))
+WORKER_MAX_REPLICAS = int(os.getenv("WORKER_MAX_REPLICAS", 3))
+SCALE_UP_BACKLOG = int(os.getenv("SCALE_UP_BACKLOG", 20))        # Backlog per replica before adding one
+AUTOSCALE_INTERVAL = float(os.getenv("AUTOSCALE_INTERVAL", 10))  # Seconds between scaling decisions
+AUTOSCALE_COOLDOWN = float(os.getenv("AUTOSCALE_COOLDOWN", 30))  # Seconds between changes to one worker type
+DRAIN_TIMEOUT = float(os.getenv("DRAIN_TIMEOUT", 30))            # Seconds a scaled-down replica gets to finish
+AUTOSCALER_STATS_KEY = "sentinel:autoscaler"
+
 # Worker Types
 WORKER_TYPES = {
     "ocr": ["car", "bus", "motorcycle", "truck"],      # OCR works on all vehicles
@@ -42,13 +241,152 @@ WORKER_TYPES = {
     "logo": ["car"]                              # Logo/model only for cars
 }
 
+# Consumer group per worker type
+WORKER_GROUPS = {
+    "ocr": OCR_GROUP,
+    "color": COLOR_GROUP,
+    "logo": LOGO_GROUP
+}
+
+# Result reported for a worker whose job was dead-lettered, so the aggregator can still finish the vehicle
+WORKER_FAILED_RESULTS = {
+    "ocr": "",
+    "color": "unknown|#000000",
+    "logo": ""
+}
+
 def get_expected_workers(vehicle_type):
     """Get list of workers expected for a vehicle type"""
-    if vehicle_type == "car":
-        return ["ocr", "color", "logo"] 
-    else:
-        return ["ocr"]
+    workers = [worker for worker, vehicle_types in WORKER_TYPES.items() if vehicle_type in vehicle_types]
+    return workers or ["ocr"]
 
 def should_worker_process(worker_type, vehicle_type):
     """Check if worker should process this vehicle type"""
     return vehicle_type in WORKER_TYPES.get(worker_type, [])
+
+def get_job_stream(worker_type):
+    """Per-capability job stream, only carrying jobs this worker type processes"""
+    return f"{VEHICLE_JOBS_STREAM}:{worker_type}"
+
+# Per-capability job streams used in split mode
+JOB_STREAMS = {worker: get_job_stream(worker) for worker in WORKER_TYPES}
+
+def get_job_streams(workers):
+    """Streams a job is published to so that exactly the listed workers receive it"""
+    if WORKER_MODE == "fused":
+        return [VEHICLE_JOBS_STREAM]
+    return [JOB_STREAMS[worker] for worker in workers]
+
+def trim_args(stream):
+    """
+    XADD trimming arguments for a stream. These are safety caps that hold even
+    if a consumer stops: they can drop unprocessed entries, so they are sized
+    well above normal backlog. Removing entries every group has acknowledged
+    is the trimmer's job.
+    """
+    if stream == DEAD_LETTER_STREAM:
+        return {"maxlen": DEAD_LETTER_MAXLEN, "approximate": True}
+    if STREAM_MAX_AGE_SECONDS > 0:
+        return {"minid": f"{int((time.time() - STREAM_MAX_AGE_SECONDS) * 1000)}-0", "approximate": True}
+    return {"maxlen": STREAM_MAXLEN, "approximate": True}
+
+def encode_worker_manifest(workers):
+    """Worker manifest carried on jobs and results: 'ocr,color,logo'"""
+    return ",".join(workers)
+
+def parse_worker_manifest(manifest):
+    """Parse a worker manifest, returning [] when absent"""
+    if not manifest:
+        return []
+    return [worker for worker in manifest.split(",") if worker]
+
+def get_consumer_groups(worker_mode=None):
+    """Stream -> consumer groups for the given worker layout"""
+    if (worker_mode or WORKER_MODE) == "fused":
+        consumer_groups = {VEHICLE_JOBS_STREAM: [FUSED_GROUP]}
+    else:
+        consumer_groups = {JOB_STREAMS[worker]: [group] for worker, group in WORKER_GROUPS.items()}
+
+    consumer_groups.update({
+        VEHICLE_RESULTS_STREAM: [AGGREGATOR_GROUP],
+        VEHICLE_ACK_STREAM: [INGEST_GROUP]
+    })
+    return consumer_groups
+
+def record_job_error(r, stream, group, msg_id, error):
+    """Remember why a pending entry failed; the reclaimer attaches it on retry or dead-lettering"""
+    r.hset(JOB_ERRORS_KEY, f"{stream}|{group}|{msg_id}", str(error))
+
+def get_reclaimer_stats(r):
+    """Reclaim and dead-letter counters per stream/group, plus dead-letter stream length"""
+    stats = {}
+    for key, value in r.hgetall(RECLAIMER_STATS_KEY).items():
+        stream, group, what = key.split("|")
+        stats.setdefault(f"{stream}/{group}", {"reclaimed": 0, "dead_lettered": 0})[what] = int(value)
+    try:
+        dead_letter_length = r.xlen(DEAD_LETTER_STREAM)
+    except Exception:
+        dead_letter_length = 0
+    return {"groups": stats, "dead_letter_length": dead_letter_length}
+
+def get_ack_tracker_stats(r):
+    """Jobs ingress is waiting on (outstanding, oldest age) and its ack/re-publish counters"""
+    stats = r.hgetall(ACK_TRACKER_STATS_KEY)
+    return {field: float(value) if field == "updated_at" else int(value) for field, value in stats.items()}
+
+def get_spool_stats(r):
+    """Vehicles waiting in each aggregator's local spool and how fast they are being replayed"""
+    stats = {}
+    for key, value in r.hgetall(SPOOL_STATS_KEY).items():
+        consumer, field = key.split(":", 1)
+        stats.setdefault(consumer, {})[field] = json.loads(value)
+    return stats
+
+def get_replica_limits(worker):
+    """(min, max) replicas for a worker type, e.g. OCR_MAX_REPLICAS overrides WORKER_MAX_REPLICAS"""
+    low = int(os.getenv(f"{worker.upper()}_MIN_REPLICAS", WORKER_MIN_REPLICAS))
+    high = int(os.getenv(f"{worker.upper()}_MAX_REPLICAS", WORKER_MAX_REPLICAS))
+    return max(1, low), max(low, high)
+
+def get_autoscaler_stats(r):
+    """Replica counts, backlog and scaling decision counters per worker type"""
+    stats = {}
+    for key, value in r.hgetall(AUTOSCALER_STATS_KEY).items():
+        worker, field = key.split(":", 1)
+        stats.setdefault(worker, {})[field] = value if field == "last_decision" else int(value)
+    return stats
+
+def get_startup_stats(r):
+    """Seconds-to-ready per process for the last start, plus recent startup history"""
+    return {
+        "last": {name: float(seconds) for name, seconds in r.hgetall(STARTUP_TIMES_KEY).items()},
+        "history": [json.loads(entry) for entry in r.lrange(STARTUP_HISTORY_KEY, 0, -1)]
+    }
+
+def get_lag_age_slo_ms(group):
+    """Lag-age SLO for a consumer group, e.g. OCR_WORKERS_LAG_AGE_SLO_MS overrides LAG_AGE_SLO_MS"""
+    return int(os.getenv(f"{group.upper()}_LAG_AGE_SLO_MS", LAG_AGE_SLO_MS))
+
+def get_stream_monitor_stats(r, alerts=20):
+    """Latest stream monitor sample (None when the monitor is not running) and recent SLO alerts"""
+    sample = r.get(STREAM_MONITOR_KEY)
+    return {
+        "sample": json.loads(sample) if sample else None,
+        "alerts": [json.loads(entry) for entry in r.lrange(STREAM_ALERTS_KEY, 0, alerts - 1)] if alerts > 0 else []
+    }
+
+def get_retention_stats(r):
+    """Redis memory and entries trimmed per stream (written by the trimmer), plus the retention policy"""
+    streams = {}
+    for key, value in r.hgetall(RETENTION_STATS_KEY).items():
+        stream, field = key.rsplit("|", 1)
+        streams.setdefault(stream, {})[field] = int(value)
+    return {
+        "streams": streams,
+        "policy": {
+            "maxlen": STREAM_MAXLEN,
+            "max_age_seconds": STREAM_MAX_AGE_SECONDS,
+            "dead_letter_maxlen": DEAD_LETTER_MAXLEN,
+            "keep_acked_seconds": STREAM_KEEP_ACKED_SECONDS
+        }
+    }
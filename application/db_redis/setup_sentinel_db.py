@@ -83,16 +83,24 @@ def create_tables():
         """
         CREATE TABLE IF NOT EXISTS processing_jobs (
             id SERIAL PRIMARY KEY,
-            job_id VARCHAR(100) UNIQUE NOT NULL,
+            job_id VARCHAR(100) NOT NULL,
             vehicle_id VARCHAR(100),
-            worker_type VARCHAR(10) NOT NULL CHECK (worker_type IN ('ocr', 'color', 'logo')),
+            worker_type VARCHAR(10) NOT NULL,
+            vehicle_type VARCHAR(20),
             status VARCHAR(20) DEFAULT 'queued' CHECK (status IN ('queued', 'processing', 'completed', 'failed')),
             result JSONB,
+            stages JSONB,
             started_at TIMESTAMP,
             completed_at TIMESTAMP,
             retry_count INTEGER DEFAULT 0
         );
         """,
+        # Job traces: one 'job' row per vehicle plus one row per worker, with stage latencies (ms) in `stages`
+        "ALTER TABLE processing_jobs ADD COLUMN IF NOT EXISTS vehicle_type VARCHAR(20);",
+        "ALTER TABLE processing_jobs ADD COLUMN IF NOT EXISTS stages JSONB;",
+        "ALTER TABLE processing_jobs DROP CONSTRAINT IF EXISTS processing_jobs_job_id_key;",
+        "ALTER TABLE processing_jobs DROP CONSTRAINT IF EXISTS processing_jobs_worker_type_check;",
+        "ALTER TABLE processing_jobs ADD CONSTRAINT processing_jobs_worker_type_check CHECK (worker_type IN ('job', 'ocr', 'color', 'logo', 'fused'));",
         f"GRANT ALL PRIVILEGES ON ALL TABLES IN SCHEMA public TO {DB_USER};",
         f"GRANT ALL PRIVILEGES ON ALL SEQUENCES IN SCHEMA public TO {DB_USER};",
         f"ALTER TABLE vehicles OWNER TO {DB_USER};",
@@ -106,6 +114,8 @@ def create_tables():
         "CREATE INDEX IF NOT EXISTS idx_processing_jobs_job_id ON processing_jobs(job_id);",
         "CREATE INDEX IF NOT EXISTS idx_processing_jobs_vehicle_id ON processing_jobs(vehicle_id);",
         "CREATE INDEX IF NOT EXISTS idx_processing_jobs_status ON processing_jobs(status);",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_processing_jobs_job_worker ON processing_jobs(job_id, worker_type);",
+        "CREATE INDEX IF NOT EXISTS idx_processing_jobs_completed_at ON processing_jobs(completed_at);",
     ]
     
     for sql_cmd in sql_commands:
@@ -4,21 +4,24 @@ import redis
 import sys
 import time
 
-# Configuration
-REDIS_HOST = "localhost"
-REDIS_PORT = 6379
-REDIS_DB = 0
+from db_redis.sentinel_redis_config import get_redis_connection, describe_redis_connection
 
 # Stream names for Sentinel architecture
 STREAMS = {
     "VEHICLE_JOBS": "vehicle_jobs",
+    "OCR_JOBS": "vehicle_jobs:ocr",
+    "COLOR_JOBS": "vehicle_jobs:color",
+    "LOGO_JOBS": "vehicle_jobs:logo",
     "VEHICLE_RESULTS": "vehicle_results", 
     "VEHICLE_ACK": "vehicle_ack"
 }
 
 # Consumer groups
+# Split mode routes each job only to the capability streams of the workers it needs
 CONSUMER_GROUPS = {
-    "vehicle_jobs": ["ocr_workers", "color_workers", "logo_workers"],
+    "vehicle_jobs:ocr": ["ocr_workers"],
+    "vehicle_jobs:color": ["color_workers"],
+    "vehicle_jobs:logo": ["logo_workers"],
     "vehicle_results": ["aggregator"],
     "vehicle_ack": ["ingest"]
 }
@@ -28,7 +31,7 @@ def setup_streams_and_groups():
     print("Setting up Redis streams and consumer groups...")
     
     try:
-        r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=True)
+        r = get_redis_connection()
         
         # Create streams and consumer groups
         for stream_name, groups in CONSUMER_GROUPS.items():
@@ -57,7 +60,7 @@ def cleanup_streams():
     print("Cleaning up test messages and streams...")
 
     try:
-        r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=True)
+        r = get_redis_connection()
 
         # Delete only test messages
         for stream in STREAMS.values():
@@ -80,36 +83,31 @@ def test_streams():
     print("Testing Redis streams...")
     
     try:
-        r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=True)
+        r = get_redis_connection()
         
-        # Test 1: Add a test message to vehicle_jobs
+        # Test 1: Route a test car job to every capability stream
         test_job = {
             "job_id": "test_job_001",
             "vehicle_type": "car", 
             "path": "test/path.jpg",
-            "timestamp": "2025-10-04T16:20:00"
+            "timestamp": "2025-10-04T16:20:00",
+            "workers": "ocr,color,logo"
         }
         
-        msg_id = r.xadd("vehicle_jobs", test_job)
-        print(f"  Added test job to vehicle_jobs: {msg_id}")
+        for stream in ["vehicle_jobs:ocr", "vehicle_jobs:color", "vehicle_jobs:logo"]:
+            msg_id = r.xadd(stream, test_job)
+            print(f"  Added test job to {stream}: {msg_id}")
         
-        # Test 2: Read from OCR consumer group
-        messages = r.xreadgroup("ocr_workers", "test_consumer", {"vehicle_jobs": ">"}, count=1)
-        if messages and len(messages[0][1]) > 0:
-            print("  Successfully read message from ocr_workers group")
-            r.xack("vehicle_jobs", "ocr_workers", messages[0][1][0][0])
-            print("  Message acknowledged")
-        
-        # Test 3: Test that the same job appears in other groups
-        messages = r.xreadgroup("color_workers", "test_consumer", {"vehicle_jobs": ">"}, count=1)
-        if messages and len(messages[0][1]) > 0:
-            print("  Successfully read same message from color_workers group")
-            r.xack("vehicle_jobs", "color_workers", messages[0][1][0][0])
-        
-        messages = r.xreadgroup("logo_workers", "test_consumer", {"vehicle_jobs": ">"}, count=1)
-        if messages and len(messages[0][1]) > 0:
-            print("  Successfully read same message from logo_workers group")
-            r.xack("vehicle_jobs", "logo_workers", messages[0][1][0][0])
+        # Test 2-3: Each worker group reads the job from its own stream
+        for stream, groups in CONSUMER_GROUPS.items():
+            if not stream.startswith("vehicle_jobs:"):
+                continue
+            group = groups[0]
+            messages = r.xreadgroup(group, "test_consumer", {stream: ">"}, count=1)
+            if messages and len(messages[0][1]) > 0:
+                print(f"  Successfully read message from {group} group")
+                r.xack(stream, group, messages[0][1][0][0])
+                print("  Message acknowledged")
         
         # Test 4: Add test result
         test_result = {
@@ -143,7 +141,7 @@ def main():
     
     # Test Redis connection first
     try:
-        r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
+        r = get_redis_connection()
         r.ping()
         print("Redis connection verified")
     except Exception as e:
@@ -166,8 +164,7 @@ def main():
     print("\n" + "="*60)
     print("Redis setup for Sentinel completed successfully!")
     print("="*60)
-    print(f"Redis Server: {REDIS_HOST}:{REDIS_PORT}")
-    print(f"Database: {REDIS_DB}")
+    print(f"Redis Server: {describe_redis_connection()}")
     print("\nStreams created:")
     for name, stream in STREAMS.items():
         print(f"  {name}: {stream}")
@@ -0,0 +1,123 @@
+import signal
+import threading
+from db_redis.sentinel_redis_config import *
+from common.readiness import mark_ready
+from common.log import setup_logging
+from common.metrics import start_metrics, counter, gauge
+
+log = setup_logging("trimmer")
+
+shutdown_event = threading.Event()
+
+def handle_shutdown(signum, frame):
+    log.info("Received signal %s, shutting down Trimmer gracefully...", signum)
+    shutdown_event.set()
+
+signal.signal(signal.SIGINT, handle_shutdown)
+signal.signal(signal.SIGTERM, handle_shutdown)
+
+
+def parse_id(entry_id):
+    ms, seq = entry_id.split("-")
+    return int(ms), int(seq)
+
+
+class StreamTrimmer:
+    """
+    Removes stream entries that every consumer group on the stream has
+    acknowledged, keeping the last STREAM_KEEP_ACKED_SECONDS of them for
+    inspection. For each group the first entry it still needs is the oldest
+    one in its PEL, or the one after its last-delivered-id if nothing is
+    pending; the stream is trimmed (XTRIM MINID ~) to the oldest of those.
+    Consumers only ever move forward, so the boundary stays safe while the
+    trim runs. Streams without consumer groups are left to the XADD caps.
+    """
+
+    def __init__(self, r, streams):
+        """
+        Args:
+            r: Redis connection
+            streams: Streams to trim and report memory for
+        """
+        self.r = r
+        self.streams = streams
+
+    def first_needed_id(self, stream):
+        """Oldest entry ID some consumer group still needs, or None if the stream has no groups"""
+        needed = []
+        for group in self.r.xinfo_groups(stream):
+            if group["pending"]:
+                summary = self.r.xpending(stream, group["name"])
+                if summary.get("min"):
+                    needed.append(parse_id(summary["min"]))
+                    continue
+            ms, seq = parse_id(group["last-delivered-id"])
+            needed.append((ms, seq + 1))
+        return min(needed) if needed else None
+
+    def trim_stream(self, stream, now_ms):
+        needed = self.first_needed_id(stream)
+        if needed is None:
+            return 0
+        minid = min(needed, (now_ms - int(STREAM_KEEP_ACKED_SECONDS * 1000), 0))
+        if minid <= (0, 0):
+            return 0
+        return self.r.xtrim(stream, minid=f"{minid[0]}-{minid[1]}", approximate=True)
+
+    def run_once(self):
+        seconds, microseconds = self.r.time()
+        now_ms = seconds * 1000 + microseconds // 1000
+
+        with pipelined(self.r) as pipe:
+            for stream in self.streams:
+                pipe.exists(stream)
+        streams = [stream for stream, exists in zip(self.streams, pipe.results) if exists]
+
+        trimmed = {}
+        for stream in streams:
+            try:
+                trimmed[stream] = self.trim_stream(stream, now_ms)
+            except Exception as e:
+                log.error("Error trimming %s: %s", stream, e)
+
+        with pipelined(self.r) as pipe:
+            for stream in streams:
+                pipe.memory_usage(stream)
+                pipe.xlen(stream)
+        sizes = pipe.results
+
+        trimmed_total = 0
+        with pipelined(self.r) as pipe:
+            for index, stream in enumerate(streams):
+                memory, length = sizes[2 * index] or 0, sizes[2 * index + 1]
+                pipe.hset(RETENTION_STATS_KEY, mapping={f"{stream}|memory_bytes": memory, f"{stream}|length": length})
+                if trimmed.get(stream):
+                    pipe.hincrby(RETENTION_STATS_KEY, f"{stream}|trimmed", trimmed[stream])
+                    counter("sentinel_stream_trimmed_total", "Acknowledged entries trimmed from the stream", stream=stream).inc(trimmed[stream])
+                    trimmed_total += trimmed[stream]
+                gauge("sentinel_stream_memory_bytes", "Redis memory used by the stream", stream=stream).set(memory)
+        return trimmed_total
+
+def stream_trimmer():
+    r = get_redis_connection()
+    streams = [VEHICLE_JOBS_STREAM, *JOB_STREAMS.values(), VEHICLE_RESULTS_STREAM, VEHICLE_ACK_STREAM, DEAD_LETTER_STREAM]
+    trimmer = StreamTrimmer(r, streams)
+    start_metrics("trimmer")
+
+    log.info("Started: every %ss, keeping %ss of acknowledged entries, XADD cap %s", TRIM_INTERVAL, STREAM_KEEP_ACKED_SECONDS,
+             f"MINID {STREAM_MAX_AGE_SECONDS:.0f}s" if STREAM_MAX_AGE_SECONDS > 0 else f"MAXLEN ~{STREAM_MAXLEN}")
+    mark_ready("trimmer", r)
+
+    while not shutdown_event.is_set():
+        try:
+            trimmed = trimmer.run_once()
+            if trimmed:
+                log.info("Trimmed %d acknowledged entries", trimmed)
+        except Exception as e:
+            log.error("Error: %s", e)
+        shutdown_event.wait(TRIM_INTERVAL)
+
+    log.info("Shutdown complete.")
+
+if __name__ == "__main__":
+    stream_trimmer()
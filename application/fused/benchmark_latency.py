@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+End-to-end worker latency: time from XADD on vehicle_jobs until every expected
+result for the job is visible on vehicle_results.
+
+Run it once with the split workers running and once with WORKER_MODE=fused,
+against a dev stack (the aggregator will store the benchmark vehicles).
+
+Usage (from application/):
+    python3 fused/benchmark_latency.py --frame KEYFRAME.jpg --plate PLATE.jpg [--jobs 50] [--interval 0.2]
+"""
+import argparse
+import datetime
+import time
+import uuid
+
+from db_redis.sentinel_redis_config import *
+from common.messages import encode_job, decode_result
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare split vs fused worker latency")
+    parser.add_argument("--frame", required=True, help="Keyframe image path")
+    parser.add_argument("--plate", default="None", help="Plate image path")
+    parser.add_argument("--jobs", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=0.2, help="Seconds between published jobs")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    r = get_redis_connection()
+    workers = get_expected_workers("car")
+    expected = set(workers)
+
+    # Route jobs the same way ingress does for whichever layout is running
+    try:
+        groups = [g["name"] for g in r.xinfo_groups(VEHICLE_JOBS_STREAM)]
+    except Exception:
+        groups = []
+    mode = "fused" if FUSED_GROUP in groups else "split"
+    streams = [VEHICLE_JOBS_STREAM] if mode == "fused" else [JOB_STREAMS[w] for w in workers]
+
+    # Tail results from now on
+    last_id = r.xinfo_stream(VEHICLE_RESULTS_STREAM)["last-generated-id"]
+
+    published = {}
+    received = {}
+    done = {}
+    run_id = uuid.uuid4().hex[:6]
+    next_publish = time.monotonic()
+    deadline = None
+
+    while len(done) < args.jobs:
+        now = time.monotonic()
+        if len(published) < args.jobs and now >= next_publish:
+            i = len(published)
+            vehicle_id = f"bench{run_id}{i:04d}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}_car_BENCH"
+            job_id = f"car_{i}_bench{run_id}{i:04d}"
+            payload = encode_job({
+                "job_id": job_id,
+                "vehicle_id": vehicle_id,
+                "vehicle_type": "car",
+                "frame_path": args.frame,
+                "plate_path": args.plate,
+                "frame_url": None,
+                "plate_url": None,
+                "timestamp": datetime.datetime.now().astimezone(),
+                "location": "BENCH",
+                "workers": encode_worker_manifest(workers)
+            })
+            pipe = r.pipeline(transaction=False)
+            for stream in streams:
+                pipe.xadd(stream, payload)
+            pipe.execute()
+            published[job_id] = time.monotonic()
+            next_publish += args.interval
+            if len(published) == args.jobs:
+                deadline = time.monotonic() + args.timeout
+
+        if deadline and time.monotonic() > deadline:
+            print(f"Timed out with {args.jobs - len(done)} jobs incomplete")
+            break
+
+        messages = r.xread({VEHICLE_RESULTS_STREAM: last_id}, count=100, block=50)
+        for stream, msgs in messages or []:
+            for msg_id, fields in msgs:
+                last_id = msg_id
+                fields = decode_result(fields)
+                job_id = fields.get("job_id")
+                if job_id not in published or job_id in done:
+                    continue
+                if fields.get("worker") == "fused":
+                    received.setdefault(job_id, set()).update(expected)
+                else:
+                    received.setdefault(job_id, set()).add(fields.get("worker"))
+                if received[job_id] >= expected:
+                    done[job_id] = time.monotonic() - published[job_id]
+
+    latencies = [v * 1000 for v in done.values()]
+
+    print("=" * 60)
+    print(f"Mode: {mode}  jobs: {len(done)}/{args.jobs}")
+    if latencies:
+        print(f"  p50: {percentile(latencies, 50):8.1f} ms")
+        print(f"  p95: {percentile(latencies, 95):8.1f} ms")
+        print(f"  p99: {percentile(latencies, 99):8.1f} ms")
+        print(f"  max: {max(latencies):8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
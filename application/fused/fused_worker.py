@@ -0,0 +1,147 @@
+import os
+import time
+import json
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+
+from db_redis.sentinel_redis_config import *
+from common.cpu_budget import apply_cpu_budget
+from common.readiness import mark_ready
+from common.log import setup_logging
+from common.metrics import start_metrics, counter, histogram
+from common.tracing import stamp, job_stamps
+from common.messages import decode_job, encode_result
+
+log = setup_logging("fused")
+
+# Before the worker imports below, so the fused budget is the one applied
+apply_cpu_budget("fused")
+
+# Importing the worker modules loads their models (RapidOCR, color LUT, logo classifier) once
+from ocr.ocr_worker import process_ocr
+from color_detection.color_worker import process_color_images
+from logo_detection.logo_worker import process_logo_images
+
+shutdown_event = threading.Event()
+
+def handle_shutdown(signum, frame):
+    log.info("Received signal %s, shutting down Fused worker gracefully...", signum)
+    shutdown_event.set()
+
+# Registered after the imports above so these handlers win over the per-worker ones
+signal.signal(signal.SIGINT, handle_shutdown)
+signal.signal(signal.SIGTERM, handle_shutdown)
+
+def run_ocr(frame_path, plate_path):
+    return process_ocr(frame_path, plate_path)
+
+def run_color(image):
+    color_name, hex_code = process_color_images([image])[0]
+    return f"{color_name}|{hex_code}"
+
+def run_logo(image):
+    make, confidence = process_logo_images([image])[0]
+    return make
+
+def process_job(pool, fields):
+    """Run every analysis this vehicle type needs, decoding the keyframe once"""
+    vehicle_type = fields.get("vehicle_type")
+    frame_path = fields.get("frame_path")
+    plate_path = fields.get("plate_path")
+    workers = parse_worker_manifest(fields.get("workers")) or get_expected_workers(vehicle_type)
+
+    image = None
+    if "color" in workers or "logo" in workers:
+        image = cv2.imread(frame_path) if frame_path else None
+        if image is None:
+            log.warning("Could not load image: %s", frame_path)
+
+    futures = {}
+    if "ocr" in workers:
+        futures["ocr"] = pool.submit(run_ocr, frame_path, plate_path)
+    if "color" in workers:
+        futures["color"] = pool.submit(run_color, image)
+    if "logo" in workers:
+        futures["logo"] = pool.submit(run_logo, image)
+
+    results, errors = {}, {}
+    for worker, future in futures.items():
+        try:
+            results[worker] = future.result()
+        except Exception as e:
+            log.error("%s failed: %s", worker, e)
+            results[worker] = WORKER_FAILED_RESULTS[worker]
+            errors[worker] = str(e)
+
+    return results, errors
+
+def fused_worker():
+    r = get_redis_connection()
+    worker_id = os.environ.get('WORKER_ID', 'fused_worker_1')
+
+    start_metrics("fused")
+    service_time = histogram("sentinel_worker_service_seconds", "Per-job worker service time", worker="fused")
+    jobs_ok = counter("sentinel_worker_jobs_total", "Jobs processed by workers", worker="fused", status="ok")
+    jobs_failed = counter("sentinel_worker_jobs_total", "Jobs processed by workers", worker="fused", status="error")
+
+    log.info("Worker started: %s (Redis %s)", worker_id, describe_redis_connection())
+    mark_ready("fused", r)
+
+    with ThreadPoolExecutor(max_workers=len(WORKER_TYPES), thread_name_prefix="fused") as pool:
+        while not shutdown_event.is_set():
+            try:
+                messages = r.xreadgroup(
+                    FUSED_GROUP, worker_id,
+                    {VEHICLE_JOBS_STREAM: ">"},
+                    count=1, block=BLOCK_TIME
+                )
+
+                if not messages:
+                    continue
+
+                for stream, msgs in messages:
+                    for msg_id, fields in msgs:
+                        dequeued = stamp()
+                        fields = decode_job(fields)
+                        job_id = fields.get("job_id")
+                        vehicle_type = fields.get("vehicle_type")
+
+                        log.debug("Processing job: %s (%s)", job_id, vehicle_type, extra={"job_id": job_id})
+
+                        started = time.perf_counter()
+                        results, errors = process_job(pool, fields)
+
+                        payload = {
+                            "job_id": job_id,
+                            "vehicle_id": fields.get("vehicle_id"),
+                            "vehicle_type": vehicle_type,
+                            "workers": fields.get("workers", ""),
+                            "location": fields.get("location"),
+                            "timestamp": fields.get("timestamp"),
+                            "worker": "fused",
+                            "results": results,
+                            "status": "error" if errors else "ok",
+                            **job_stamps(fields),
+                            "t_dequeued": dequeued
+                        }
+                        if errors:
+                            payload["error"] = json.dumps(errors)
+
+                        payload["t_done"] = stamp()
+                        with pipelined(r) as pipe:
+                            pipe.xadd(VEHICLE_RESULTS_STREAM, encode_result(payload), **trim_args(VEHICLE_RESULTS_STREAM))
+                            pipe.xack(VEHICLE_JOBS_STREAM, FUSED_GROUP, msg_id)
+                        log.info("Completed: %s -> %s", job_id, results, extra={"job_id": job_id})
+                        service_time.observe(time.perf_counter() - started)
+                        (jobs_failed if errors else jobs_ok).inc()
+
+            except Exception as e:
+                log.error("Worker error: %s", e)
+                time.sleep(1)
+
+    log.info("Shutdown complete.")
+
+if __name__ == "__main__":
+    fused_worker()
@@ -1,32 +1,45 @@
 import cv2
 import os
+import time
 import numpy as np
 import uuid
 import datetime
 from pathlib import Path
 from ultralytics import YOLO
 from db_redis.sentinel_redis_config import *
+from common.cpu_budget import apply_cpu_budget
+from common.readiness import mark_ready
+from common.log import setup_logging
+from common.metrics import start_metrics, counter, gauge, histogram
+from common.tracing import stamp
+from common.messages import encode_job
+from db_redis.ack_consumer import AckConsumer
 import pytz
 
+log = setup_logging("ingress")
+
 IST = pytz.timezone('Asia/Kolkata')
 
 model = YOLO("yolov8s.pt")
 plate_model = YOLO("license_plate_detector.pt")
 
+# torch/OpenCV thread counts and core affinity from the orchestrator's budget
+apply_cpu_budget("ingress")
+
 # Get configuration from environment
 LOCATION = os.getenv("LOCATION", "DEFAULT_LOCATION")
 rtsp_url = os.getenv("RTSP_STREAM")
 
-print(f"Ingress started for location: {LOCATION}")
+log.info("Ingress started for location: %s", LOCATION)
 
 if not rtsp_url:
-    print("Error: RTSP_STREAM not set in environment variables.")
+    log.error("RTSP_STREAM not set in environment variables.")
     exit(1)
 
 # Initialize video capture
 cap = cv2.VideoCapture(rtsp_url)
 if not cap.isOpened():
-    print(f"Error: Cannot connect to RTSP stream at {rtsp_url}")
+    log.error("Cannot connect to RTSP stream at %s", rtsp_url)
     exit(1)
 
 # Set up storage paths - store directly in web/static structure
@@ -40,7 +53,7 @@ def ensure_storage_structure():
     AGGREGATOR_WEB_ROOT.mkdir(exist_ok=True)
     STATIC_PATH.mkdir(exist_ok=True)
     LOCATION_PATH.mkdir(exist_ok=True)
-    print(f"Storage structure initialized: {LOCATION_PATH}")
+    log.info("Storage structure initialized: %s", LOCATION_PATH)
 
 def get_date_folder():
     """Get or create today's date folder with keyframes and plates subdirectories"""
@@ -68,15 +81,14 @@ def save_keyframe_organized(vehicle_crop, vehicle_id):
         
         if success:
             relative_path = f"static/{LOCATION}/{date_str}/keyframes/{filename}"
-            print(f"Saved keyframe: {relative_path}")
-            print(f"Full path: {file_path}")
+            log.debug("Saved keyframe: %s (%s)", relative_path, file_path)
             return str(file_path), relative_path
         else:
-            print(f"Failed to save keyframe for {vehicle_id}")
+            log.warning("Failed to save keyframe for %s", vehicle_id)
             return None, None
             
     except Exception as e:
-        print(f"Error saving keyframe for {vehicle_id}: {e}")
+        log.error("Error saving keyframe for %s: %s", vehicle_id, e)
         return None, None
 
 
@@ -88,7 +100,8 @@ def detect_and_save_plate(vehicle_crop, vehicle_id):
         return None, None
     
     try:
-        results = plate_model(vehicle_crop, verbose=False)
+        with PLATE_INFERENCE_TIME.time():
+            results = plate_model(vehicle_crop, verbose=False)
         
         if len(results) > 0 and len(results[0].boxes) > 0:
             # Get the first detected plate
@@ -111,14 +124,14 @@ def detect_and_save_plate(vehicle_crop, vehicle_id):
             # Construct relative path for URL
             plate_relative_path = f"static/{LOCATION}/{date_str}/plates/{plate_filename}"
             
-            print(f"  - Saved plate: {plate_relative_path}")
+            log.debug("Saved plate: %s", plate_relative_path)
             return str(plate_path), plate_relative_path
         else:
             # No plate detected, return a tuple of Nones
             return None, None
             
     except Exception as e:
-        print(f"Error during plate detection for {vehicle_id}: {e}")
+        log.error("Error during plate detection for %s: %s", vehicle_id, e)
         # On error, return a tuple of Nones
         return None, None
 
@@ -132,12 +145,15 @@ r = get_redis_connection()
 # Track saved vehicles to avoid duplicates
 saved_ids = set()
 
+# Published jobs awaiting the aggregator's ack; overdue ones are re-published
+ack_consumer = AckConsumer(get_redis_connection(), f"ingress_{LOCATION}")
+
 # Set up video capture
 cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
 FRAME_WIDTH = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
 FRAME_HEIGHT = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
 
-print(f"Connected to RTSP stream: {FRAME_WIDTH}x{FRAME_HEIGHT}")
+log.info("Connected to RTSP stream: %dx%d", FRAME_WIDTH, FRAME_HEIGHT)
 
 # Define keyframe trigger zone
 ZONE_X1 = 0
@@ -146,45 +162,82 @@ ZONE_X2 = 1500
 ZONE_Y2 = 800
 TRIGGER_ZONE = (ZONE_X1, ZONE_Y1, ZONE_X2, ZONE_Y2)
 
-def publish_job(vehicle_type, organized_path, relative_path, track_id, vehicle_id, plate_path=None, plate_relative_path=None):
-    """Publish job with organized file paths"""
+def publish_job(vehicle_type, organized_path, relative_path, track_id, vehicle_id, plate_path=None, plate_relative_path=None, stamps=None):
+    """Publish job with organized file paths, routed only to the workers that process this vehicle type"""
     timestamp = datetime.datetime.now(IST)
     job_id = f"{vehicle_type}_{track_id}_{vehicle_id.split('_')[0]}"  
+    workers = get_expected_workers(vehicle_type)
     
-    payload = {
+    job = {
         "job_id": job_id,
         "vehicle_id": vehicle_id, 
         "vehicle_type": vehicle_type,
         "frame_path": organized_path,   
-        "plate_path": plate_path if plate_path else "None",   
+        "plate_path": plate_path,   
         "frame_url": relative_path,  
-        "plate_url": plate_relative_path if plate_relative_path else "None",
-        "timestamp": timestamp.isoformat(),
-        "location": LOCATION
+        "plate_url": plate_relative_path,
+        "timestamp": timestamp,
+        "location": LOCATION,
+        "workers": encode_worker_manifest(workers),
+        **(stamps or {})
     }
     
-    r.xadd(VEHICLE_JOBS_STREAM, payload)
-    print(f"Published job: {job_id} (Vehicle ID: {vehicle_id}) @ {LOCATION}")
-    print(f"  Keyframe stored: {relative_path}")
+    # One round trip for all capability streams
+    streams = get_job_streams(workers)
+    job["t_published"] = stamp()
+    payload = encode_job(job)
+    with PUBLISH_TIME.time():
+        with pipelined(r) as pipe:
+            for stream in streams:
+                pipe.xadd(stream, payload, **trim_args(stream))
+    ack_consumer.track(job_id, payload, streams, pipe.results)
+    counter("sentinel_ingress_vehicles_total", "Vehicles published by ingress", vehicle_type=vehicle_type).inc()
+    
+    log.info("Published job: %s (Vehicle ID: %s) @ %s -> %s", job_id, vehicle_id, LOCATION, ", ".join(streams),
+             extra={"job_id": job_id, "keyframe": relative_path})
+
+# Metrics
+FRAMES = counter("sentinel_ingress_frames_total", "Frames read from the RTSP stream")
+FRAME_ERRORS = counter("sentinel_ingress_frame_errors_total", "Failed frame grabs (stream reconnects)")
+FPS = gauge("sentinel_ingress_fps", "Frames processed per second over the last second")
+TRACK_INFERENCE_TIME = histogram("sentinel_inference_seconds", "Model inference time per call", model="yolov8s_track")
+PLATE_INFERENCE_TIME = histogram("sentinel_inference_seconds", "Model inference time per call", model="plate_detector")
+KEYFRAME_WRITE_TIME = histogram("sentinel_ingress_keyframe_write_seconds", "Time to write a keyframe to disk")
+PUBLISH_TIME = histogram("sentinel_ingress_publish_seconds", "Time to publish a job to Redis")
+start_metrics("ingress")
 
 # Main processing loop
 frame_num = 0
-print("Starting vehicle detection...")
+fps_window_start = time.monotonic()
+fps_window_frames = 0
+log.info("Starting vehicle detection...")
+
+# Models loaded, stream open, Redis connected
+ack_consumer.start()
+mark_ready("ingress", r)
 
 while True:
     ret, frame = cap.read()
     if not ret:
-        print("Failed to grab frame from RTSP stream")
+        log.warning("Failed to grab frame from RTSP stream")
+        FRAME_ERRORS.inc()
         cap.release()
         cap = cv2.VideoCapture(rtsp_url)
         cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
         continue
         
     frame_num += 1
+    FRAMES.inc()
+    fps_window_frames += 1
+    if time.monotonic() - fps_window_start >= 1.0:
+        FPS.set(round(fps_window_frames / (time.monotonic() - fps_window_start), 2))
+        fps_window_start = time.monotonic()
+        fps_window_frames = 0
     tz_x1, tz_y1, tz_x2, tz_y2 = TRIGGER_ZONE
 
     # Run YOLO tracking
-    results = model.track(frame, classes=[2, 3, 5, 7], verbose=False, tracker="bytetrack.yaml", persist=True)
+    with TRACK_INFERENCE_TIME.time():
+        results = model.track(frame, classes=[2, 3, 5, 7], verbose=False, tracker="bytetrack.yaml", persist=True)
 
     if results[0].boxes is not None and results[0].boxes.id is not None:
         boxes = results[0].boxes.xyxy.cpu().numpy().astype(int)
@@ -215,6 +268,7 @@ while True:
             if (tz_x1 < vehicle_center_x < tz_x2) and (tz_y1 < vehicle_bottom_y < tz_y2):
                 if track_id not in saved_ids:
                     saved_ids.add(track_id)
+                    stamps = {"t_detect": stamp()}
 
                     vehicle_type = model.names[class_id]
                     
@@ -224,21 +278,23 @@ while True:
                     uuid_part = uuid.uuid4().hex[:8]
                     vehicle_id = f"{uuid_part}_{timestamp_str}_{vehicle_type}_{LOCATION}"
                     
-                    print(f"Vehicle '{vehicle_type}' ID {track_id} detected -> {vehicle_id}")
+                    log.debug("Vehicle '%s' ID %s detected -> %s", vehicle_type, track_id, vehicle_id)
 
                     # Extract and save vehicle crop
                     vehicle_crop = frame[y1_padded:y2_padded, x1_padded:x2_padded]
                     if vehicle_crop.size > 0:
                         # Save in organized structure
-                        organized_path, relative_path = save_keyframe_organized(vehicle_crop, vehicle_id)
+                        with KEYFRAME_WRITE_TIME.time():
+                            organized_path, relative_path = save_keyframe_organized(vehicle_crop, vehicle_id)
                         
                         if organized_path and relative_path:
+                            stamps["t_keyframe"] = stamp()
                             # Detect and save plate if model is availabl
                             plate_path, plate_relative_path = detect_and_save_plate(vehicle_crop, vehicle_id)
-                            publish_job(vehicle_type, organized_path, relative_path, track_id, vehicle_id, plate_path, plate_relative_path)
+                            publish_job(vehicle_type, organized_path, relative_path, track_id, vehicle_id, plate_path, plate_relative_path, stamps)
                         else:
-                            print(f"Failed to save keyframe for {vehicle_id}")
+                            log.warning("Failed to save keyframe for %s", vehicle_id)
 
 cap.release()
 cv2.destroyAllWindows()
-print("Ingress stopped")
+log.info("Ingress stopped")
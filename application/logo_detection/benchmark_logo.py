@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the ONNX logo/make classifier.
+
+Usage (from application/):
+    python3 logo_detection/benchmark_logo.py [--images DIR] [--batch-sizes 1,4,8,16] [--iterations 20]
+
+Without --images, random 320x240 keyframes are used. Needs an exported
+model (logo_detection/export_logo_model.py, or LOGO_MODEL_PATH).
+"""
+import argparse
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+
+from logo_detection.logo_classifier import LogoClassifier, LOGO_MODEL_PATH, LOGO_LABELS_PATH
+
+
+def load_images(image_dir, count):
+    if image_dir:
+        paths = []
+        for ext in ("*.jpg", "*.jpeg", "*.png"):
+            paths.extend(glob.glob(os.path.join(image_dir, ext)))
+        images = [img for img in (cv2.imread(p) for p in sorted(paths)[:count]) if img is not None]
+        if images:
+            return images
+        print(f"No readable images in '{image_dir}', using synthetic keyframes")
+
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, (240, 320, 3), dtype=np.uint8) for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark logo classifier throughput")
+    parser.add_argument("--images", help="Directory of keyframes to classify")
+    parser.add_argument("--batch-sizes", default="1,4,8,16")
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+    if not os.path.exists(LOGO_MODEL_PATH) or not os.path.exists(LOGO_LABELS_PATH):
+        raise SystemExit(f"No logo model at {LOGO_MODEL_PATH} / {LOGO_LABELS_PATH}: "
+                         "export one with logo_detection/export_logo_model.py or set LOGO_MODEL_PATH/LOGO_LABELS_PATH")
+    classifier = LogoClassifier()
+    images = load_images(args.images, max(batch_sizes))
+
+    print(f"Model: {LOGO_MODEL_PATH}")
+    print(f"Input: {classifier.input_size[0]}x{classifier.input_size[1]}, max batch {classifier.max_batch}")
+    print("=" * 60)
+    print(f"{'batch':>6} {'images/s':>10} {'ms/batch':>10} {'ms/image':>10}")
+
+    for batch_size in batch_sizes:
+        batch = (images * batch_size)[:batch_size]
+        classifier.predict(batch)  # warm-up
+
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            classifier.predict(batch)
+        elapsed = time.perf_counter() - start
+
+        per_batch = elapsed / args.iterations
+        print(f"{batch_size:>6} {batch_size / per_batch:>10.1f} {per_batch * 1000:>10.2f} {per_batch * 1000 / batch_size:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Export a fine-tuned torchvision make classifier to the ONNX model and labels
+LogoClassifier loads (logo_detection/models/ by default; LOGO_MODEL_PATH and
+LOGO_LABELS_PATH point the worker elsewhere).
+
+The model artifacts are not in the repository (models/*.onnx is ignored).
+Train or obtain a torchvision classifier fine-tuned on grille/badge crops
+(crop_grille_region() of vehicle keyframes, 224x224, ImageNet
+normalization), saved as a state_dict, together with its make names in
+output order: a JSON list or a text file with one make per line. This
+script then writes:
+
+    models/logo_classifier.onnx          NCHW float32 RGB input, dynamic batch
+    models/logo_labels.json              make names in logit order
+    models/logo_classifier.onnx.sha256   checksum of the export
+
+The logo worker logs the SHA-256 of the model it loads at startup; compare
+it with the .sha256 file to confirm which export a deployment runs.
+
+Usage (from application/):
+    python3 logo_detection/export_logo_model.py --checkpoint makes.pt --labels makes.txt [--arch mobilenet_v3_small]
+"""
+import json
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from logo_detection.logo_classifier import LogoClassifier, MODELS_DIR, load_labels, model_checksum
+
+ARCHITECTURES = ("mobilenet_v3_small", "mobilenet_v3_large", "resnet18", "resnet50", "efficientnet_b0")
+
+
+def build_model(arch, num_classes, checkpoint):
+    import torch
+    import torchvision
+
+    model = getattr(torchvision.models, arch)(weights=None, num_classes=num_classes)
+    state = torch.load(checkpoint, map_location="cpu")
+    # Checkpoints saved from a training loop often wrap the weights
+    state = state.get("state_dict", state.get("model", state)) if isinstance(state, dict) else state
+    model.load_state_dict(state)
+    return model.eval()
+
+
+def export(model, output, size, opset):
+    import torch
+
+    dummy = torch.randn(1, 3, size, size)
+    torch.onnx.export(
+        model, dummy, str(output),
+        input_names=["input"], output_names=["logits"],
+        dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+        opset_version=opset
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a torchvision make classifier for the logo worker")
+    parser.add_argument("--checkpoint", required=True, help="state_dict of the fine-tuned classifier")
+    parser.add_argument("--labels", required=True, help="Make names in output order (.json list or one per line)")
+    parser.add_argument("--arch", choices=ARCHITECTURES, default="mobilenet_v3_small")
+    parser.add_argument("--size", type=int, default=224, help="Input height and width the model was trained at")
+    parser.add_argument("--output-dir", default=str(MODELS_DIR))
+    parser.add_argument("--opset", type=int, default=17)
+    args = parser.parse_args()
+
+    labels = load_labels(args.labels)
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    model_path = output_dir / "logo_classifier.onnx"
+    labels_path = output_dir / "logo_labels.json"
+
+    export(build_model(args.arch, len(labels), args.checkpoint), model_path, args.size, args.opset)
+    labels_path.write_text(json.dumps(labels, indent=2))
+
+    # Load it the way the worker does and check one output per make
+    classifier = LogoClassifier(str(model_path), str(labels_path))
+    image = np.random.default_rng(0).integers(0, 256, (240, 320, 3), dtype=np.uint8)
+    logits = classifier.session.run(None, {classifier.input_name: classifier.preprocess(image)[None]})[0]
+    if logits.shape[1] != len(labels):
+        raise SystemExit(f"Model has {logits.shape[1]} outputs but {len(labels)} labels")
+
+    checksum = model_checksum(str(model_path))
+    (output_dir / "logo_classifier.onnx.sha256").write_text(f"{checksum}  logo_classifier.onnx\n")
+    print(f"Exported {args.arch} with {len(labels)} makes")
+    print(f"  model:  {model_path}")
+    print(f"  labels: {labels_path}")
+    print(f"  sha256: {checksum}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import os
+import json
+import hashlib
+from pathlib import Path
+
+import cv2
+import numpy as np
+import onnxruntime as ort
+
+MODELS_DIR = Path(__file__).resolve().parent / "models"
+
+# Swappable model artifacts: point these at a different export to change the classifier.
+# Not in the repository; logo_detection/export_logo_model.py writes them from a trained checkpoint
+LOGO_MODEL_PATH = os.getenv("LOGO_MODEL_PATH", str(MODELS_DIR / "logo_classifier.onnx"))
+LOGO_LABELS_PATH = os.getenv("LOGO_LABELS_PATH", str(MODELS_DIR / "logo_labels.json"))
+LOGO_BATCH_SIZE = int(os.getenv("LOGO_BATCH_SIZE", 8))
+LOGO_MIN_CONFIDENCE = float(os.getenv("LOGO_MIN_CONFIDENCE", 0.35))
+
+UNKNOWN_MAKE = "Unknown"
+
+# ImageNet normalization used by the classifier export
+MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+
+def crop_grille_region(image):
+    """Crop the grille/badge band of a vehicle keyframe (lower-middle of the box)"""
+    h, w = image.shape[:2]
+    top = int(h * 0.40)
+    bottom = int(h * 0.80)
+    left = int(w * 0.20)
+    right = int(w * 0.80)
+    crop = image[top:bottom, left:right]
+    return crop if crop.size > 0 else image
+
+
+_model_bytes = {}
+
+def read_model_bytes(model_path):
+    """Serialized model, cached per process (a fork server loads it once for all workers)"""
+    if model_path not in _model_bytes:
+        with open(model_path, "rb") as f:
+            _model_bytes[model_path] = f.read()
+    return _model_bytes[model_path]
+
+
+def model_checksum(model_path):
+    """SHA-256 of the model file, to tell which export is loaded (see export_logo_model.py)"""
+    return hashlib.sha256(read_model_bytes(model_path)).hexdigest()
+
+
+def load_labels(labels_path):
+    """Labels are a JSON list of make names, or a text file with one make per line"""
+    with open(labels_path) as f:
+        if labels_path.endswith(".json"):
+            return list(json.load(f))
+        return [line.strip() for line in f if line.strip()]
+
+
+class LogoClassifier:
+    """ONNX Runtime make classifier with batched CPU inference"""
+
+    def __init__(self, model_path=LOGO_MODEL_PATH, labels_path=LOGO_LABELS_PATH, session_options=None):
+        """
+        Args:
+            model_path: ONNX classifier taking NCHW float32 RGB input
+            labels_path: Make names in output-logit order
+            session_options: Optional onnxruntime.SessionOptions
+        """
+        options = session_options or ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        self.session = ort.InferenceSession(read_model_bytes(model_path), sess_options=options, providers=["CPUExecutionProvider"])
+        self.labels = load_labels(labels_path)
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        _, _, height, width = model_input.shape
+        self.input_size = (int(width) if isinstance(width, int) else 224,
+                           int(height) if isinstance(height, int) else 224)
+
+        # Exports with a fixed batch dimension are fed in chunks of that size, the last one padded
+        batch_dim = model_input.shape[0]
+        self.fixed_batch = isinstance(batch_dim, int) and batch_dim > 0
+        self.max_batch = batch_dim if self.fixed_batch else LOGO_BATCH_SIZE
+
+    def preprocess(self, image):
+        """BGR keyframe -> normalized CHW float32 tensor of the grille crop"""
+        crop = crop_grille_region(image)
+        resized = cv2.resize(crop, self.input_size, interpolation=cv2.INTER_LINEAR)
+        rgb = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB).astype(np.float32) / 255.0
+        return ((rgb - MEAN) / STD).transpose(2, 0, 1)
+
+    def predict(self, images):
+        """Return a (make, confidence) tuple per BGR image, in one call per chunk"""
+        if not images:
+            return []
+
+        tensors = np.stack([self.preprocess(image) for image in images])
+        predictions = []
+        for start in range(0, len(tensors), self.max_batch):
+            chunk = tensors[start:start + self.max_batch]
+            count = len(chunk)
+            if self.fixed_batch and count < self.max_batch:
+                chunk = np.concatenate([chunk, np.zeros((self.max_batch - count, *chunk.shape[1:]), dtype=chunk.dtype)])
+            logits = self.session.run(None, {self.input_name: chunk})[0][:count]
+
+            # Softmax over classes
+            logits = logits - logits.max(axis=1, keepdims=True)
+            probs = np.exp(logits)
+            probs /= probs.sum(axis=1, keepdims=True)
+
+            top = probs.argmax(axis=1)
+            for idx, p in zip(top, probs[np.arange(len(top)), top]):
+                make = self.labels[idx] if idx < len(self.labels) else UNKNOWN_MAKE
+                if p < LOGO_MIN_CONFIDENCE:
+                    make = UNKNOWN_MAKE
+                predictions.append((make, float(p)))
+
+        return predictions
@@ -1,80 +1,156 @@
+import os
 import time
-import random
 import signal
 import sys
 import threading
+import cv2
 from db_redis.sentinel_redis_config import *
+from logo_detection.logo_classifier import LogoClassifier, LOGO_MODEL_PATH, LOGO_LABELS_PATH, LOGO_BATCH_SIZE, UNKNOWN_MAKE, model_checksum
+from common.cpu_budget import apply_cpu_budget, ort_session_options
+from common.readiness import mark_ready
+from common.log import setup_logging
+from common.metrics import start_metrics, counter, gauge, histogram
+from common.tracing import stamp, job_stamps
+from common.messages import decode_job, encode_result
+
+log = setup_logging("logo")
 
 shutdown_event = threading.Event()
 
 def handle_shutdown(signum, frame):
-    print(f"\nReceived signal {signum}, shutting down Logo worker gracefully...")
+    log.info("Received signal %s, shutting down Logo worker gracefully...", signum)
     shutdown_event.set()
 
 signal.signal(signal.SIGINT, handle_shutdown)
 signal.signal(signal.SIGTERM, handle_shutdown)
 
+apply_cpu_budget("logo")
+
+classifier = None
+if not os.path.exists(LOGO_MODEL_PATH) or not os.path.exists(LOGO_LABELS_PATH):
+    log.error("Logo model missing (%s, %s): export one with logo_detection/export_logo_model.py "
+              "or set LOGO_MODEL_PATH/LOGO_LABELS_PATH", LOGO_MODEL_PATH, LOGO_LABELS_PATH)
+else:
+    try:
+        classifier = LogoClassifier(session_options=ort_session_options())
+        log.info("Logo classifier loaded: %s (%d makes, sha256 %s)", LOGO_MODEL_PATH, len(classifier.labels),
+                 model_checksum(LOGO_MODEL_PATH))
+    except Exception as e:
+        log.error("Could not load classifier from %s: %s", LOGO_MODEL_PATH, e)
+if classifier is None:
+    log.error("Continuing without a model - every make will be reported as '%s'", UNKNOWN_MAKE)
+# 0 on /metrics while makes are only placeholders
+gauge("sentinel_logo_model_loaded", "1 if the logo worker has a make classifier, 0 if it reports every make as unknown").set(int(classifier is not None))
+
+
+def process_logo_images(images):
+    """Classify the make of already-decoded keyframes (None entries -> unknown), one inference call per batch"""
+    if classifier is None:
+        return [(UNKNOWN_MAKE, 0.0)] * len(images)
+
+    with histogram("sentinel_inference_seconds", "Model inference time per call", model="logo_classifier").time():
+        predictions = iter(classifier.predict([image for image in images if image is not None]))
+    return [next(predictions) if image is not None else (UNKNOWN_MAKE, 0.0) for image in images]
+
+def process_logo_batch(frame_paths):
+    """Classify the make of each keyframe on disk"""
+    images = []
+    for frame_path in frame_paths:
+        image = cv2.imread(frame_path) if frame_path else None
+        if image is None:
+            log.warning("Could not load image: %s", frame_path)
+        images.append(image)
+    return process_logo_images(images)
+
 def process_logo(frame_path):
-    """Dummy logo/model detection - replace with real model inference."""
-    time.sleep(random.uniform(1.0, 3.0))
-    models = ["Honda", "Toyota", "BMW", "Mercedes"]
-    return random.choice(models)
+    """Logo/model detection for a single keyframe"""
+    return process_logo_batch([frame_path])[0]
 
 def logo_worker():
     r = get_redis_connection()
-    worker_id = "logo_worker_1"
-    
-    print(f"[Logo] Worker started: {worker_id}")
+    worker_id = os.environ.get('WORKER_ID', 'logo_worker_1')
+
+    start_metrics("logo")
+    service_time = histogram("sentinel_worker_service_seconds", "Per-job worker service time", worker="logo")
+    batch_time = histogram("sentinel_worker_batch_seconds", "Worker time per batch read", worker="logo")
+    jobs_ok = counter("sentinel_worker_jobs_total", "Jobs processed by workers", worker="logo", status="ok")
+    jobs_failed = counter("sentinel_worker_jobs_total", "Jobs processed by workers", worker="logo", status="error")
     
+    log.info("Worker started: %s (Redis %s)", worker_id, describe_redis_connection())
+    mark_ready("logo", r)
+
     while not shutdown_event.is_set():
         try:
             messages = r.xreadgroup(
                 LOGO_GROUP, worker_id,
-                {VEHICLE_JOBS_STREAM: ">"}, 
-                count=1, block=BLOCK_TIME
+                {JOB_STREAMS["logo"]: ">"},
+                count=LOGO_BATCH_SIZE, block=BLOCK_TIME
             )
-            
+
             if not messages:
                 continue
-            
+            dequeued = stamp()
+
+            # Collect the jobs from this read so they share one inference call
+            batch = []
             for stream, msgs in messages:
                 for msg_id, fields in msgs:
+                    fields = decode_job(fields)
                     job_id = fields.get("job_id")
                     vehicle_type = fields.get("vehicle_type")
-                    frame_path = fields.get("frame_path")
-                    
-                    print(f"[Logo] Processing job: {job_id} ({vehicle_type})")
-                    
-                    if should_worker_process("logo", vehicle_type):
-                        try:
-                            result = process_logo(frame_path)
-                            r.xadd(VEHICLE_RESULTS_STREAM, {
-                                "job_id": job_id,
-                                "vehicle_id": fields.get("vehicle_id"),
-                                "worker": "logo",
-                                "result": result,
-                                "status": "ok"
-                            })
-                            print(f"[Logo] Completed: {job_id} -> {result}")
-                            r.xack(VEHICLE_JOBS_STREAM, LOGO_GROUP, msg_id)
-                        except Exception as e:
-                            print(f"[Logo] Failed for {job_id}: {e}")
-                            r.xadd(VEHICLE_RESULTS_STREAM, {
-                                "job_id": job_id,
-                                "worker": "logo",
-                                "result": "",
-                                "status": "error",
-                                "error": str(e)
-                            })
-                    else:
-                        print(f"[Logo] Skipping {vehicle_type} (not in scope)")
-                        r.xack(VEHICLE_JOBS_STREAM, LOGO_GROUP, msg_id)
-                        
+
+                    log.debug("Processing job: %s (%s)", job_id, vehicle_type, extra={"job_id": job_id})
+
+                    batch.append((msg_id, fields))
+
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            try:
+                results = process_logo_batch([fields.get("frame_path") for _, fields in batch])
+            except Exception as e:
+                # Left pending: the reclaimer retries them and dead-letters them after MAX_RETRIES
+                log.error("Batch of %d failed: %s", len(batch), e)
+                for msg_id, fields in batch:
+                    record_job_error(r, JOB_STREAMS["logo"], LOGO_GROUP, msg_id, e)
+                jobs_failed.inc(len(batch))
+                continue
+
+            # Results and acks for the whole batch go out in one round trip
+            with pipelined(r) as pipe:
+                for (msg_id, fields), (make, confidence) in zip(batch, results):
+                    job_id = fields.get("job_id")
+                    pipe.xadd(VEHICLE_RESULTS_STREAM, encode_result({
+                        "job_id": job_id,
+                        "vehicle_id": fields.get("vehicle_id"),
+                        "vehicle_type": fields.get("vehicle_type"),
+                        "workers": fields.get("workers", ""),
+                        "location": fields.get("location"),
+                        "timestamp": fields.get("timestamp"),
+                        "worker": "logo",
+                        "result": make,
+                        "confidence": f"{confidence:.3f}",
+                        "status": "ok",
+                        **job_stamps(fields),
+                        "t_dequeued": dequeued,
+                        "t_done": stamp()
+                    }), **trim_args(VEHICLE_RESULTS_STREAM))
+                    pipe.xack(JOB_STREAMS["logo"], LOGO_GROUP, msg_id)
+                    log.info("Completed: %s -> %s (%.2f)", job_id, make, confidence, extra={"job_id": job_id})
+            
+            # Jobs in a batch share its cost
+            elapsed = time.perf_counter() - started
+            batch_time.observe(elapsed)
+            for _ in batch:
+                service_time.observe(elapsed / len(batch))
+            jobs_ok.inc(len(batch))
+
         except Exception as e:
-            print(f"[Logo] Worker error: {e}")
+            log.error("Worker error: %s", e)
             time.sleep(1)
-    
-    print("[Logo] Shutdown complete.")
+
+    log.info("Shutdown complete.")
 
 if __name__ == "__main__":
     logo_worker()
@@ -7,87 +7,108 @@ import numpy as np
 import cv2
 
 from db_redis.sentinel_redis_config import *
+from common.cpu_budget import apply_cpu_budget, get_thread_budget
+from common.readiness import mark_ready
+from common.log import setup_logging
+from common.metrics import start_metrics, counter, histogram
+from common.tracing import stamp, job_stamps
+from common.messages import decode_job, encode_result
+
+log = setup_logging("ocr")
 
 shutdown_event = threading.Event()
 
 def handle_shutdown(signum, frame):
-    print(f"\nReceived signal {signum}, shutting down OCR worker gracefully...")
+    log.info("Received signal %s, shutting down OCR worker gracefully...", signum)
     shutdown_event.set()
 
 signal.signal(signal.SIGINT, handle_shutdown)
 signal.signal(signal.SIGTERM, handle_shutdown)
 
-# Replaced EasyOCR with RapidOCR
-reader = RapidOCR()
-print("RapidOCR reader initialized.")
+apply_cpu_budget("ocr")
+
+# Replaced EasyOCR with RapidOCR, with ORT sessions sized to the thread budget
+ocr_threads = get_thread_budget()
+if ocr_threads:
+    reader = RapidOCR(intra_op_num_threads=ocr_threads, inter_op_num_threads=1)
+else:
+    reader = RapidOCR()
+log.info("RapidOCR reader initialized.")
 
 
 def process_ocr(frame_path, plate_path):
-    """Actual OCR model, now using RapidOCR without formatting"""
+    """
+    Actual OCR model, now using RapidOCR without formatting. "N/A" when
+    there is no readable plate (none cropped, unreadable image, no text);
+    anything else that goes wrong raises, so the job stays pending for the
+    reclaimer.
+    """
 
     if not plate_path or not os.path.exists(plate_path):
-        print(f"OCR Error: Plate path '{plate_path}' is invalid or does not exist.")
-        return None
+        log.debug("No plate image for this vehicle (%r). Returning N/A.", plate_path)
+        return "N/A"
 
-    try:
-        plate_image = cv2.imread(plate_path)
+    plate_image = cv2.imread(plate_path)
 
-        # actual line of code commented out 
-        
-        if plate_image is None:
-            print(f"OCR Error: Failed to read image from {plate_path}. Returning N/A.")
-            return "N/A"
+    # actual line of code commented out 
+    
+    if plate_image is None:
+        log.warning("Failed to read image from %s. Returning N/A.", plate_path)
+        return "N/A"
 
-        # --- Tuned Parameters ---
-        scale_factor = 3.0
+    # --- Tuned Parameters ---
+    scale_factor = 3.0
 
-        # --- Image Processing Pipeline ---
-        gray_image = cv2.cvtColor(plate_image, cv2.COLOR_BGR2GRAY)
+    # --- Image Processing Pipeline ---
+    gray_image = cv2.cvtColor(plate_image, cv2.COLOR_BGR2GRAY)
 
-        # Resize image 
-        width = int(gray_image.shape[1] * scale_factor)
-        height = int(gray_image.shape[0] * scale_factor)
-        resized_image = cv2.resize(gray_image, (width, height), interpolation=cv2.INTER_CUBIC)
+    # Resize image 
+    width = int(gray_image.shape[1] * scale_factor)
+    height = int(gray_image.shape[0] * scale_factor)
+    resized_image = cv2.resize(gray_image, (width, height), interpolation=cv2.INTER_CUBIC)
 
-        # Sharpening filter
-        kernel = np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]])
-        sharpened_image = cv2.filter2D(resized_image, -1, kernel)
+    # Sharpening filter
+    kernel = np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]])
+    sharpened_image = cv2.filter2D(resized_image, -1, kernel)
 
-        # RapidOCR returns (result, elapse)
+    # RapidOCR returns (result, elapse)
+    with histogram("sentinel_inference_seconds", "Model inference time per call", model="rapidocr").time():
         results, _ = reader(sharpened_image)
 
-        if not results:
-            print("OCR Info: RapidOCR found no text.")
-            return "N/A"
-
-        # Extract text from RapidOCR result tuples
-        raw_text = "".join([res[1] for res in results])
-        cleaned_text = re.sub(r'[^A-Z0-9]', '', raw_text).strip()
+    if not results:
+        log.debug("RapidOCR found no text.")
+        return "N/A"
 
-        # Check length only (no formatting)
-        if 0 < len(cleaned_text) <= 10:
-            print(f"OCR Success: Found plate '{cleaned_text}' from {os.path.basename(plate_path)}")
-            return cleaned_text
-        else:
-            print(f"OCR Validation Failed: Raw text '{cleaned_text}' failed length check. Returning N/A.")
-            return "N/A"
+    # Extract text from RapidOCR result tuples
+    raw_text = "".join([res[1] for res in results])
+    cleaned_text = re.sub(r'[^A-Z0-9]', '', raw_text).strip()
 
-    except Exception as e:
-        print(f"An unexpected error occurred during OCR process for {plate_path}: {e}")
+    # Check length only (no formatting)
+    if 0 < len(cleaned_text) <= 10:
+        log.debug("Found plate '%s' from %s", cleaned_text, os.path.basename(plate_path))
+        return cleaned_text
+    else:
+        log.debug("Raw text '%s' failed length check. Returning N/A.", cleaned_text)
         return "N/A"
 
 
 def ocr_worker():
     r = get_redis_connection()
-    worker_id = "ocr_worker_1"
+    worker_id = os.environ.get('WORKER_ID', 'ocr_worker_1')
+    
+    start_metrics("ocr")
+    service_time = histogram("sentinel_worker_service_seconds", "Per-job worker service time", worker="ocr")
+    jobs_ok = counter("sentinel_worker_jobs_total", "Jobs processed by workers", worker="ocr", status="ok")
+    jobs_failed = counter("sentinel_worker_jobs_total", "Jobs processed by workers", worker="ocr", status="error")
     
-    print(f"[OCR] Worker started: {worker_id}")
+    log.info("Worker started: %s (Redis %s)", worker_id, describe_redis_connection())
+    mark_ready("ocr", r)
     
     while not shutdown_event.is_set():
         try:
             messages = r.xreadgroup(
                 OCR_GROUP, worker_id, 
-                {VEHICLE_JOBS_STREAM: ">"}, 
+                {JOB_STREAMS["ocr"]: ">"}, 
                 count=1, block=BLOCK_TIME
             )
             
@@ -96,43 +117,48 @@ def ocr_worker():
             
             for stream, msgs in messages:
                 for msg_id, fields in msgs:
+                    dequeued = stamp()
+                    fields = decode_job(fields)
                     job_id = fields.get("job_id")
                     vehicle_type = fields.get("vehicle_type")
                     frame_path = fields.get("frame_path")
                     plate_path = fields.get("plate_path")
                     
-                    print(f"[OCR] Processing job: {job_id} ({vehicle_type})")
+                    log.debug("Processing job: %s (%s)", job_id, vehicle_type, extra={"job_id": job_id})
                     
-                    if should_worker_process("ocr", vehicle_type):
-                        try:
-                            result = process_ocr(frame_path, plate_path)
-                            r.xadd(VEHICLE_RESULTS_STREAM, {
+                    started = time.perf_counter()
+                    try:
+                        result = process_ocr(frame_path, plate_path)
+                        with pipelined(r) as pipe:
+                            pipe.xadd(VEHICLE_RESULTS_STREAM, encode_result({
                                 "job_id": job_id,
                                 "vehicle_id": fields.get("vehicle_id"),
+                                "vehicle_type": vehicle_type,
+                                "workers": fields.get("workers", ""),
+                                "location": fields.get("location"),
+                                "timestamp": fields.get("timestamp"),
                                 "worker": "ocr",
                                 "result": result,
-                                "status": "ok"
-                            })
-                            print(f"[OCR] Completed: {job_id} -> {result}")
-                            r.xack(VEHICLE_JOBS_STREAM, OCR_GROUP, msg_id)
-                        except Exception as e:
-                            print(f"[OCR] Failed for {job_id}: {e}")
-                            r.xadd(VEHICLE_RESULTS_STREAM, {
-                                "job_id": job_id,
-                                "worker": "ocr",
-                                "result": "",
-                                "status": "error",
-                                "error": str(e)
-                            })
-                    else:
-                        print(f"[OCR] Skipping {vehicle_type} (not in scope)")
-                        r.xack(VEHICLE_JOBS_STREAM, OCR_GROUP, msg_id)
+                                "status": "ok",
+                                **job_stamps(fields),
+                                "t_dequeued": dequeued,
+                                "t_done": stamp()
+                            }), **trim_args(VEHICLE_RESULTS_STREAM))
+                            pipe.xack(stream, OCR_GROUP, msg_id)
+                        log.info("Completed: %s -> %s", job_id, result, extra={"job_id": job_id})
+                        service_time.observe(time.perf_counter() - started)
+                        jobs_ok.inc()
+                    except Exception as e:
+                        # Left pending: the reclaimer retries it and dead-letters it after MAX_RETRIES
+                        log.error("Failed for %s: %s", job_id, e, extra={"job_id": job_id})
+                        record_job_error(r, stream, OCR_GROUP, msg_id, e)
+                        jobs_failed.inc()
                         
         except Exception as e:
-            print(f"[OCR] Worker error: {e}")
+            log.error("Worker error: %s", e)
             time.sleep(1)
     
-    print("[OCR] Shutdown complete.")
+    log.info("Shutdown complete.")
 
 if __name__ == "__main__":
     ocr_worker()
\ No newline at end of file
@@ -8,23 +8,72 @@ import signal
 import sys
 import threading
 import queue
+import re
+import json
+import logging
+import datetime
 import requests
 import psutil
 from db_redis.sentinel_redis_config import *
+from common.cpu_budget import compute_cpu_budget, budget_env, format_cpus
+from common.readiness import PROCESS_NAME_ENV
+from common.log import parse_log_line, RotatingLogFile, LOG_DIR
+from common.metrics import start_metrics, counter, gauge
+from common.fork_server import ForkServerClient, fork_server_enabled, FORK_SERVER_SOCKET, FORK_SERVER_PRELOAD_ENV
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Worker type -> (process name, script, log color)
+WORKER_SPECS = {
+    "ocr": ("OCR Worker", "ocr/ocr_worker.py", "92"),
+    "color": ("Color Worker", "color_detection/color_worker.py", "94"),
+    "logo": ("Logo Worker", "logo_detection/logo_worker.py", "95"),
+    "fused": ("Fused Worker", "fused/fused_worker.py", "92"),
+}
+
+# Child log handling
+LOG_QUEUE_LINES = 50000      # Lines buffered between the pipe readers and the writer
+LOG_BATCH_SIZE = 500         # Lines per file write
+CONSOLE_QUEUE_BATCHES = 100  # Batches buffered for a slow terminal before they are dropped
+
 class SentinelOrchestrator:
     def __init__(self):
         self.processes = {}
-        self.log_queues = {}
+        self.process_colors = {}
+
+        # Child output: readers only enqueue; one writer batches it to rotating files and the console
+        self.log_queue = queue.Queue(maxsize=LOG_QUEUE_LINES)
+        self.console_queue = queue.Queue(maxsize=CONSOLE_QUEUE_BATCHES)
+        self.log_dropped = 0
+        self.console_dropped = 0
+        self.console_level = logging.getLevelName(os.getenv("LOG_CONSOLE_LEVEL", "INFO").upper())
+        threading.Thread(target=self.log_writer, daemon=True).start()
+        threading.Thread(target=self.console_writer, daemon=True).start()
+
+        # Readiness probes: wall-clock launch time and seconds-to-ready per process name
+        self.launch_times = {}
+        self.ready_times = {}
+
+        # Autoscaling state: replica process names per worker type, replicas being drained
+        self.replicas = {}
+        self.replica_seq = {}
+        self.consumer_names = {}
+        self.draining = {}
+        self.last_scaled = {}
         self.r = get_redis_connection()
         self.shutdown_requested = False
         self.shutdown_lock = threading.Lock()
         
         self.location = os.getenv("LOCATION", "DEFAULT_LOCATION")
         self.rtsp_stream = os.getenv("RTSP_STREAM")
+        self.worker_mode = os.getenv("WORKER_MODE", WORKER_MODE)
+        # combined: aggregator.py serves the API and aggregates; split: headless aggregation + multi-worker API
+        self.api_layout = os.getenv("API_LAYOUT", API_LAYOUT)
+
+        # Optional preloading fork server: workers are forked from it instead of cold-started
+        self.fork_server = fork_server_enabled()
+        self.fork_client = ForkServerClient(os.getenv("FORK_SERVER_SOCKET", FORK_SERVER_SOCKET)) if self.fork_server else None
 
         # DB credentials
         self.db_host = os.getenv("DB_HOST")
@@ -41,26 +90,33 @@ class SentinelOrchestrator:
         print(f"Orchestrator initialized for location: {self.location}")
         print(f"RTSP Stream: {self.rtsp_stream}")
 
-    def cleanup_redis(self):
-        """Flush Redis streams and clean up"""
-        print("Cleaning up Redis streams...")
+        # Per-process thread budget and core affinity, so the ML runtimes don't oversubscribe the box
+        self.cpu_profile = os.getenv("CPU_PROFILE", "balanced")
+        workers = ["fused"] if self.worker_mode == "fused" else ["ocr", "color", "logo"]
+        api = ["api"] if self.api_layout == "split" else []
+        self.cpu_budget = compute_cpu_budget(
+            ["ingress", *workers, "aggregator", *api, "monitor", "reclaimer", "trimmer"],
+            profile=self.cpu_profile,
+            budget_file=os.getenv("CPU_BUDGET_FILE")
+        )
+        print(f"CPU budget ({self.cpu_profile} profile):")
+        for component, entry in self.cpu_budget.items():
+            print(f"  {component:<12} threads={entry['threads']:<3} cpus={format_cpus(entry['cpus'])}")
+
+    def prepare_redis(self):
+        """Create missing streams and consumer groups, resuming whatever is already queued"""
+        print("Preparing Redis streams...")
         
         try:
-            # Delete all streams
-            streams = [VEHICLE_JOBS_STREAM, VEHICLE_RESULTS_STREAM, VEHICLE_ACK_STREAM]
-            for stream in streams:
-                try:
-                    self.r.delete(stream)
-                    print(f"  Deleted stream: {stream}")
-                except Exception as e:
-                    print(f"  Stream {stream} already clean")
+            # RESET_STREAMS=1 restores the old behaviour of starting from empty streams
+            if os.getenv("RESET_STREAMS", "0").lower() in ("1", "true", "yes"):
+                streams = [VEHICLE_JOBS_STREAM, *JOB_STREAMS.values(), VEHICLE_RESULTS_STREAM, VEHICLE_ACK_STREAM]
+                self.r.delete(*streams, JOB_ERRORS_KEY, RECLAIMER_STATS_KEY)
+                print(f"  RESET_STREAMS set: deleted {', '.join(streams)}")
             
-            # Recreate consumer groups
-            consumer_groups = {
-                VEHICLE_JOBS_STREAM: ["ocr_workers", "color_workers", "logo_workers"],
-                VEHICLE_RESULTS_STREAM: ["aggregator"],
-                VEHICLE_ACK_STREAM: ["ingest"]
-            }
+            # Fused mode reads every job from one stream,
+            # split mode gives each worker group its own capability stream
+            consumer_groups = get_consumer_groups(self.worker_mode)
             
             for stream_name, groups in consumer_groups.items():
                 for group in groups:
@@ -70,49 +126,128 @@ class SentinelOrchestrator:
                     except Exception as e:
                         if "BUSYGROUP" not in str(e):
                             print(f"  Error creating group '{group}': {e}")
+                            continue
+                    
+                    # Entries left by the previous run: undelivered ones are read as usual,
+                    # pending ones go back to live consumers through the reclaimer
+                    info = next((g for g in self.r.xinfo_groups(stream_name) if g["name"] == group), {})
+                    lag, pending = info.get("lag") or 0, info.get("pending") or 0
+                    if lag or pending:
+                        print(f"  Resuming '{stream_name}' / '{group}': {lag} undelivered, {pending} pending")
+            
+            # Jobs queued under the other worker layout are not read by this one
+            other_mode = "split" if self.worker_mode == "fused" else "fused"
+            for stream_name in get_consumer_groups(other_mode):
+                if stream_name not in consumer_groups and self.r.exists(stream_name) and self.r.xlen(stream_name):
+                    print(f"  ⚠️ '{stream_name}' holds {self.r.xlen(stream_name)} entries from {other_mode} mode that will not be processed")
             
-            print("  Redis cleanup complete")
+            print(f"  Redis streams ready ({describe_redis_connection()})")
             
         except Exception as e:
-            print(f"Redis cleanup failed: {e}")
+            print(f"Redis preparation failed: {e}")
             return False
         
         return True
     
     def log_reader(self, process, name, color_code):
-        """Read process output and add colored labels"""
+        """Drain a child's output as fast as it is written, so a full pipe never stalls the child"""
         try:
             for line in iter(process.stdout.readline, ''):
-                if line:
-                    timestamp = time.strftime('%H:%M:%S')
-                    labeled_line = f"\033[{color_code}m[{name:>12}]\033[0m \033[90m{timestamp}\033[0m | {line.rstrip()}"
-                    print(labeled_line)
+                try:
+                    self.log_queue.put_nowait((name, line.rstrip("\n")))
+                except queue.Full:
+                    self.log_dropped += 1
         except Exception as e:
             print(f"\033[91m[{name:>12}]\033[0m Log reader error: {e}")
     
-    def start_process(self, name, command, color_code, cwd=None, extra_env=None):
-        """Start a process with colored logging"""
+    def format_console_line(self, name, record):
+        color_code = self.process_colors.get(name, "37")
+        timestamp = time.strftime('%H:%M:%S', time.localtime(record.get("ts", time.time())))
+        level = record.get("level", "INFO")
+        message = record.get("msg", "")
+        if level != "INFO":
+            message = f"\033[{'91' if level in ('ERROR', 'CRITICAL') else '33'}m{level}\033[0m {message}"
+        if record.get("suppressed"):
+            message += f" \033[90m(+{record['suppressed']} similar suppressed)\033[0m"
+        if record.get("dropped"):
+            message += f" \033[90m({record['dropped']} records dropped)\033[0m"
+        if record.get("exc"):
+            message += "\n" + record["exc"]
+        return f"\033[{color_code}m[{name:>12}]\033[0m \033[90m{timestamp}\033[0m | {message}\n"
+    
+    def log_writer(self):
+        """Consume child output in batches: every line to LOG_DIR/<process>.log (JSON lines), console-level records to the terminal"""
+        files = {}
+        while True:
+            batch = [self.log_queue.get()]
+            try:
+                while len(batch) < LOG_BATCH_SIZE:
+                    batch.append(self.log_queue.get_nowait())
+            except queue.Empty:
+                pass
+            
+            by_process = {}
+            console = []
+            for name, line in batch:
+                record = parse_log_line(line)
+                record.setdefault("process", name)
+                by_process.setdefault(name, []).append(json.dumps(record, default=str) + "\n")
+                if logging.getLevelName(record.get("level", "INFO")) >= self.console_level:
+                    console.append(self.format_console_line(name, record))
+            
+            for name, lines in by_process.items():
+                try:
+                    if name not in files:
+                        slug = re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_")
+                        files[name] = RotatingLogFile(os.path.join(LOG_DIR, f"{slug}.log"))
+                    files[name].write(lines)
+                except OSError as e:
+                    print(f"\033[91m[{name:>12}]\033[0m Log write error: {e}")
+            
+            if console:
+                try:
+                    self.console_queue.put_nowait(console)
+                except queue.Full:
+                    self.console_dropped += len(console)
+    
+    def console_writer(self):
+        """Write console batches; a slow terminal only costs dropped console lines, never file logs"""
+        while True:
+            sys.stdout.write("".join(self.console_queue.get()))
+            sys.stdout.flush()
+    
+    def start_process(self, name, command, color_code, cwd=None, extra_env=None, component=None, forked=False):
+        """Start a process with colored logging (forked from the fork server for `python3 script` commands when forked=True)"""
         print(f"Starting {name}...")
         
         try:
             env = os.environ.copy()
             env['PYTHONPATH'] = f"{env.get('PYTHONPATH', '')}:."
             env['PYTHONUNBUFFERED'] = '1'  
+            env[PROCESS_NAME_ENV] = name
+
+            if component in self.cpu_budget:
+                env.update(budget_env(component, self.cpu_budget[component]))
 
             if extra_env:
                 env.update(extra_env)
             
-            process = subprocess.Popen(
-                command,
-                cwd=cwd or ".",
-                env=env,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                universal_newlines=True,
-                bufsize=1
-            )
+            if forked:
+                process = self.fork_client.spawn(command[1], env, cwd=cwd or ".")
+            else:
+                process = subprocess.Popen(
+                    command,
+                    cwd=cwd or ".",
+                    env=env,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    universal_newlines=True,
+                    bufsize=1
+                )
             
             self.processes[name] = process
+            self.process_colors[name] = color_code
+            self.launch_times[name] = time.time()
             
             log_thread = threading.Thread(
                 target=self.log_reader, 
@@ -136,26 +271,152 @@ class SentinelOrchestrator:
                 dead_processes.append(name)
         return dead_processes
     
+    def worker_stream_group(self, worker):
+        """Stream and consumer group a worker type reads from"""
+        if worker == "fused":
+            return VEHICLE_JOBS_STREAM, FUSED_GROUP
+        return JOB_STREAMS[worker], WORKER_GROUPS[worker]
+    
+    def start_worker_replica(self, worker):
+        """Start one more replica of a worker type with a unique consumer name"""
+        self.replica_seq[worker] = self.replica_seq.get(worker, 0) + 1
+        seq = self.replica_seq[worker]
+        base_name, script, color = WORKER_SPECS[worker]
+        name = base_name if seq == 1 else f"{base_name} {seq}"
+        consumer = f"{worker}_worker_{seq}"
+        
+        if not self.start_process(name, ["python3", script], color,
+                                  extra_env={"WORKER_ID": consumer}, component=worker,
+                                  forked=self.fork_server):
+            return False
+        
+        self.replicas.setdefault(worker, []).append(name)
+        self.consumer_names[name] = consumer
+        return True
+    
+    def drain_worker_replica(self, worker):
+        """Stop the newest replica of a worker type: SIGTERM, let it finish in-flight messages, then reap"""
+        name = self.replicas[worker].pop()
+        process = self.processes.pop(name)
+        self.draining[name] = process
+        consumer = self.consumer_names.pop(name)
+        stream, group = self.worker_stream_group(worker)
+        
+        def drain():
+            print(f"  Draining {name} (PID: {process.pid}, consumer {consumer})...")
+            process.terminate()
+            try:
+                process.wait(timeout=DRAIN_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                print(f"  {name} did not drain within {DRAIN_TIMEOUT}s, killing")
+                process.kill()
+                process.wait(timeout=5)
+            
+            # Remove the consumer only if nothing is left in its PEL; otherwise the reclaimer hands it on
+            try:
+                for info in self.r.xinfo_consumers(stream, group):
+                    if info["name"] == consumer and info["pending"] == 0:
+                        self.r.xgroup_delconsumer(stream, group, consumer)
+            except Exception as e:
+                print(f"  Could not clean up consumer {consumer}: {e}")
+            
+            self.draining.pop(name, None)
+            print(f"  {name} drained")
+        
+        threading.Thread(target=drain, daemon=True).start()
+    
+    def get_worker_backlog(self, worker):
+        """(lag, pending) of a worker type's consumer group"""
+        stream, group = self.worker_stream_group(worker)
+        for info in self.r.xinfo_groups(stream):
+            if info["name"] == group:
+                return info.get("lag") or 0, info.get("pending") or 0
+        return 0, 0
+    
+    def autoscale_workers(self):
+        """Scale each worker type one step toward ceil(backlog / SCALE_UP_BACKLOG) replicas"""
+        now = time.monotonic()
+        
+        for worker, names in self.replicas.items():
+            try:
+                lag, pending = self.get_worker_backlog(worker)
+            except Exception as e:
+                print(f"[AUTOSCALE] Could not read backlog for {worker}: {e}")
+                continue
+            
+            low, high = get_replica_limits(worker)
+            current = len(names)
+            desired = min(high, max(low, -(-(lag + pending) // SCALE_UP_BACKLOG)))
+            decision = None
+            
+            if desired != current and now - self.last_scaled.get(worker, 0) >= AUTOSCALE_COOLDOWN:
+                if desired > current:
+                    if self.start_worker_replica(worker):
+                        decision = "up"
+                else:
+                    self.drain_worker_replica(worker)
+                    decision = "down"
+                
+                if decision:
+                    self.last_scaled[worker] = now
+                    print(f"[AUTOSCALE] {worker}: lag={lag} pending={pending} -> scale {decision} "
+                          f"{current} -> {len(self.replicas[worker])} replicas (target {desired})")
+            
+            gauge("sentinel_worker_replicas", "Running replicas per worker type", worker=worker).set(len(self.replicas[worker]))
+            gauge("sentinel_worker_replicas_desired", "Autoscaler target replicas per worker type", worker=worker).set(desired)
+            if decision:
+                counter("sentinel_autoscale_decisions_total", "Worker replicas started or drained by the autoscaler",
+                        worker=worker, direction=decision).inc()
+
+            # Also kept in a hash for the dashboard's /api/pipeline/autoscaler panel
+            try:
+                pipe = self.r.pipeline()
+                pipe.hset(AUTOSCALER_STATS_KEY, mapping={
+                    f"{worker}:replicas": len(self.replicas[worker]),
+                    f"{worker}:desired": desired,
+                    f"{worker}:lag": lag,
+                    f"{worker}:pending": pending,
+                    f"{worker}:min": low,
+                    f"{worker}:max": high,
+                })
+                if decision:
+                    pipe.hincrby(AUTOSCALER_STATS_KEY, f"{worker}:scale_{decision}", 1)
+                    pipe.hset(AUTOSCALER_STATS_KEY, f"{worker}:last_decision", f"{decision} {time.strftime('%H:%M:%S')}")
+                pipe.execute()
+            except Exception as e:
+                print(f"[AUTOSCALE] Could not publish stats: {e}")
+    
     def start_workers(self):
-        """Start all worker processes"""
-        print("\nStarting Workers...")
+        """Start the minimum number of replicas for every worker type"""
+        print(f"\nStarting Workers ({self.worker_mode} mode)...")
         
-        workers = [
-            ("OCR Worker", ["python3", "ocr/ocr_worker.py"], "92"),
-            ("Color Worker", ["python3", "color_detection/color_worker.py"], "94"),
-            ("Logo Worker", ["python3", "logo_detection/logo_worker.py"], "95"),
-        ]
+        workers = ["fused"] if self.worker_mode == "fused" else ["ocr", "color", "logo"]
+        self.r.delete(AUTOSCALER_STATS_KEY)
         
-        for name, command, color in workers:
-            if not self.start_process(name, command, color):
-                return False
-            time.sleep(1)
+        for worker in workers:
+            low, high = get_replica_limits(worker)
+            print(f"  {worker}: {low}-{high} replicas")
+            for _ in range(low):
+                if not self.start_worker_replica(worker):
+                    return False
         
         return True
     
+    def start_fork_server(self):
+        """Start the fork server that preloads libraries and model data for the workers"""
+        print("\nStarting Fork Server...")
+        workers = ["fused"] if self.worker_mode == "fused" else ["ocr", "color", "logo"]
+        return self.start_process(
+            "Fork Server",
+            ["python3", "common/fork_server.py"],
+            "90",
+            extra_env={FORK_SERVER_PRELOAD_ENV: ",".join(workers), "WORKER_MODE": self.worker_mode}
+        )
+    
     def start_aggregator(self):
-        """Start the aggregator + API"""
-        print("\nStarting Aggregator + API...")
+        """Start the aggregator + API, or with API_LAYOUT=split the headless aggregator and the multi-worker API"""
+        split = self.api_layout == "split"
+        print(f"\nStarting {'Aggregator and API (split layout)' if split else 'Aggregator + API'}...")
 
         if not self.rtsp_stream:
             raise Exception("RTSP_STREAM is missing in environment file (.env). Exiting.")
@@ -170,20 +431,54 @@ class SentinelOrchestrator:
             "DB_PORT": self.db_port,
             "DB_NAME": self.db_name,
             "DB_USER": self.db_user,
-            "DB_PASS": self.db_pass
+            "DB_PASS": self.db_pass,
+            "API_LAYOUT": self.api_layout
         }
 
+        if not split:
+            return self.start_process(
+                "Aggregator",
+                ["python3", "aggregator/aggregator.py"],
+                "93",
+                extra_env=aggregator_env,
+                component="aggregator"
+            )
+
+        # Aggregation publishes dashboard messages over Redis pub/sub; each API worker relays them to its clients
         return self.start_process(
             "Aggregator",
-            ["python3", "aggregator/aggregator.py"],
+            ["python3", "aggregator/aggregation_service.py"],
             "93",
-            extra_env=aggregator_env
+            extra_env=aggregator_env,
+            component="aggregator"
+        ) and self.start_process(
+            "API",
+            ["python3", "aggregator/api_server.py"],
+            "33",
+            extra_env=aggregator_env,
+            component="api"
         )
     
     def start_monitor(self):
         """Start the Redis monitor"""
-        print("\nStarting Redis Monitor...")
-        return self.start_process("Monitor", ["python3", "db_redis/monitor_streams.py"], "96")
+        print("\nStarting Stream Monitor...")
+        return self.start_process("Monitor", ["python3", "db_redis/monitor_streams.py"], "96", component="monitor")
+    
+    def start_reclaimer(self):
+        """Start the pending-entry reclaimer"""
+        print("\nStarting Reclaimer...")
+        return self.start_process(
+            "Reclaimer",
+            ["python3", "db_redis/reclaimer.py"],
+            "97",
+            extra_env={"WORKER_MODE": self.worker_mode},
+            component="reclaimer"
+        )
+    
+    def start_trimmer(self):
+        """Start the stream trimmer"""
+        print("\nStarting Trimmer...")
+        return self.start_process("Trimmer", ["python3", "db_redis/stream_trimmer.py"], "36", component="trimmer")
     
     def start_ingress(self):
         """Start the ingress process with location + RTSP stream"""
@@ -191,35 +486,107 @@ class SentinelOrchestrator:
         
         ingress_env = {
             "LOCATION": self.location,
-            "RTSP_STREAM": self.rtsp_stream
+            "RTSP_STREAM": self.rtsp_stream,
+            "WORKER_MODE": self.worker_mode
         }
         
-        success = self.start_process(
+        return self.start_process(
             "Ingress",
             ["python3", "ingress/ingress.py"],
             "91",
-            extra_env=ingress_env
+            extra_env=ingress_env,
+            component="ingress"
         )
     
-        if success:
-            # Wait a moment for ingress to fully initialize
-            time.sleep(4)
-            process = self.processes.get("Ingress")
-            if process and process.poll() is not None:
-                print("Ingress failed to start properly (stream error or crash).")
-                return False
+    def wait_until_ready(self, names, timeout=STARTUP_TIMEOUT):
+        """
+        Poll the readiness hash until every named process has reported ready.
+        Entries are matched on pid so a report from a previous run never counts;
+        a report from a child process counts for its parent (uvicorn workers).
+        Returns False as soon as one of them exits, or when the timeout passes.
+        """
+        pending = set(names)
+        deadline = time.monotonic() + timeout
+        
+        while pending:
+            try:
+                reports = self.r.hgetall(READINESS_KEY)
+            except Exception as e:
+                print(f"  Could not read readiness probes: {e}")
+                reports = {}
             
-            # Signal the aggregator that system is ready
+            for name in sorted(pending):
+                process = self.processes.get(name)
+                if process is None or process.poll() is not None:
+                    print(f"{name} exited before becoming ready.")
+                    return False
+                
+                report = reports.get(name)
+                if not report:
+                    continue
+                report = json.loads(report)
+                if report.get("pid") not in self.process_pids(process):
+                    continue
+                
+                self.ready_times[name] = report["ready_at"] - self.launch_times[name]
+                pending.discard(name)
+                print(f"  ✓ {name} ready in {self.ready_times[name]:.1f}s")
+            
+            if pending and time.monotonic() > deadline:
+                print(f"Timed out after {timeout:.0f}s waiting for: {', '.join(sorted(pending))}")
+                return False
+            if pending:
+                time.sleep(0.1)
+        
+        return True
+    
+    def process_pids(self, process):
+        """The process's pid and its children's"""
+        try:
+            return {process.pid, *(child.pid for child in psutil.Process(process.pid).children())}
+        except psutil.Error:
+            return {process.pid}
+    
+    def record_startup_times(self, total):
+        """Publish time-to-ready per component for the API and keep a short history"""
+        print(f"\nTime to ready ({total:.1f}s total):")
+        for name, seconds in sorted(self.ready_times.items(), key=lambda item: -item[1]):
+            print(f"  {name:<16} {seconds:6.1f}s")
+        
+        try:
+            entry = {
+                "started_at": datetime.datetime.now().isoformat(),
+                "worker_mode": self.worker_mode,
+                "fork_server": self.fork_server,
+                "total": round(total, 3),
+                "components": {name: round(seconds, 3) for name, seconds in self.ready_times.items()}
+            }
+            pipe = self.r.pipeline()
+            pipe.delete(STARTUP_TIMES_KEY)
+            pipe.hset(STARTUP_TIMES_KEY, mapping=entry["components"])
+            pipe.lpush(STARTUP_HISTORY_KEY, json.dumps(entry))
+            pipe.ltrim(STARTUP_HISTORY_KEY, 0, STARTUP_HISTORY_LENGTH - 1)
+            pipe.execute()
+        except Exception as e:
+            print(f"  Could not record startup times: {e}")
+    
+    def signal_system_ready(self):
+        """Tell the aggregator the system is ready for WebSocket clients"""
+        # The aggregator reports ready from its startup event, a moment before uvicorn accepts connections
+        for attempt in range(10):
             try:
                 response = requests.post("http://localhost:8000/internal/system-ready", timeout=5)
                 if response.status_code == 200:
                     print("✓ Signaled aggregator: System READY for WebSocket connections")
                 else:
                     print(f"⚠️ Failed to signal aggregator readiness: {response.status_code}")
+                return
+            except requests.ConnectionError:
+                time.sleep(0.2)
             except Exception as e:
                 print(f"⚠️ Could not signal aggregator readiness: {e}")
-        
-        return success
+                return
+        print("⚠️ Could not reach the aggregator to signal readiness")
 
     def monitor_system(self):
         """Monitor system health and show status"""
@@ -227,10 +594,9 @@ class SentinelOrchestrator:
         print("SENTINEL SYSTEM RUNNING - Press Ctrl+C to stop")
         print(f"{'='*80}")
         
-        status_colors = {
-            "OCR Worker": "92", "Color Worker": "94", "Logo Worker": "95",
-            "Aggregator": "93", "Monitor": "96", "Ingress": "91"
-        }
+        last_autoscale = 0
+        # Replica gauges and scaling decisions, next to every other process's metrics on /metrics
+        start_metrics("orchestrator", name="Orchestrator")
         
         try:
             while True:
@@ -248,17 +614,28 @@ class SentinelOrchestrator:
                     break
                 
                 time.sleep(10)
+                
+                if time.monotonic() - last_autoscale >= AUTOSCALE_INTERVAL:
+                    self.autoscale_workers()
+                    last_autoscale = time.monotonic()
+                
                 alive_count = len([p for p in self.processes.values() if p.poll() is None])
                 total_count = len(self.processes)
                 
                 status_line = f"\033[90m[STATUS]\033[0m {alive_count}/{total_count} processes: "
                 for name, process in self.processes.items():
-                    color = status_colors.get(name, "37")
+                    color = self.process_colors.get(name, "37")
                     if process.poll() is None:
                         status_line += f"\033[{color}m●\033[0m "
                     else:
                         status_line += f"\033[91m●\033[0m "
                 
+                status_line += "| " + " ".join(f"{w}×{len(n)}" for w, n in self.replicas.items())
+                if self.draining:
+                    status_line += f" (draining {len(self.draining)})"
+                if self.log_dropped or self.console_dropped:
+                    status_line += f" | log lines dropped: {self.log_dropped} file, {self.console_dropped} console"
+                
                 print(status_line)
                 
         except KeyboardInterrupt:
@@ -276,7 +653,11 @@ class SentinelOrchestrator:
         print(f"\n{'='*50}")
         print("Stopping all processes...")
 
-        shutdown_order = ["Ingress", "Monitor", "Aggregator", "Logo Worker", "Color Worker", "OCR Worker"]
+        shutdown_order = ["Ingress", "Monitor", "Reclaimer", "Trimmer", "Aggregator"]
+        for worker in ["fused", "logo", "color", "ocr"]:
+            shutdown_order += self.replicas.get(worker, [])
+        # The API (split layout) goes last, so dashboards see every update that is still in flight
+        shutdown_order += [name for name in self.processes if name not in shutdown_order and name != "API"] + ["API"]
 
         for name in shutdown_order:
             process = self.processes.get(name)
@@ -314,6 +695,13 @@ class SentinelOrchestrator:
             else:
                 print(f"{name} (PID {pid}) still running after cleanup")
 
+        # Replicas still draining from a scale-down
+        for name, process in list(self.draining.items()):
+            if process.poll() is None:
+                print(f"  Stopping draining {name} (PID: {process.pid})...")
+                process.kill()
+                process.wait(timeout=5)
+
         print("All processes stopped")
 
     def is_pid_alive(self, pid):
@@ -326,34 +714,42 @@ class SentinelOrchestrator:
         print(f"Location: {self.location}")
         print(f"RTSP Stream: {self.rtsp_stream}")
 
-        if not self.cleanup_redis():
-            print("Redis cleanup failed. Exiting.")
-            return False
-        
-        if not self.start_workers():
-            print("Worker startup failed. Exiting.")
-            self.stop_all()
+        if not self.prepare_redis():
+            print("Redis preparation failed. Exiting.")
             return False
+        self.r.delete(READINESS_KEY, SYSTEM_READY_KEY)
         
-        time.sleep(2)
-        if not self.start_aggregator():
-            print("Aggregator startup failed. Exiting.")
-            self.stop_all()
-            return False
+        # Streams and groups already exist, so nothing depends on another component
+        # being up: launch everything at once and wait on the readiness probes.
+        # Only workers wait, and only for the fork server when it is enabled.
+        startup_began = time.time()
+        startup = [("Aggregator", self.start_aggregator),
+                   ("Monitor", self.start_monitor),
+                   ("Reclaimer", self.start_reclaimer),
+                   ("Trimmer", self.start_trimmer),
+                   ("Ingress", self.start_ingress),
+                   ("Worker", self.start_workers)]
+        if self.fork_server:
+            startup.insert(0, ("Fork Server", self.start_fork_server))
         
-        time.sleep(1)
-        if not self.start_monitor():
-            print("Monitor startup failed. Exiting.")
-            self.stop_all()
-            return False
+        for label, start in startup:
+            if label == "Worker" and self.fork_server and not self.wait_until_ready(["Fork Server"]):
+                print("Fork Server startup failed. Exiting.")
+                self.stop_all()
+                return False
+            if not start():
+                print(f"{label} startup failed. Exiting.")
+                self.stop_all()
+                return False
         
-        time.sleep(3)
-        if not self.start_ingress():
-            print("Ingress startup failed. Exiting.")
+        print(f"\nWaiting for {len(self.processes)} processes to report ready...")
+        if not self.wait_until_ready(list(self.processes)):
+            print("Startup failed. Exiting.")
             self.stop_all()
             return False
         
-        time.sleep(2)
+        self.record_startup_times(time.time() - startup_began)
+        self.signal_system_ready()
         self.monitor_system()
         
         self.stop_all()
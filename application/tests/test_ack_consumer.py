@@ -0,0 +1,76 @@
+import fakeredis
+
+from db_redis import ack_consumer
+from db_redis.ack_consumer import AckConsumer
+from db_redis.sentinel_redis_config import ACK_TRACKER_STATS_KEY, MAX_RETRIES, pipelined
+
+STREAMS = ("test:jobs:color", "test:jobs:ocr")
+JOB_ID = "car_7_a1b2c3"
+
+
+def publish(r, consumer):
+    payload = {"job_id": JOB_ID, "vehicle_type": "car"}
+    entry_ids = [r.xadd(stream, payload) for stream in STREAMS]
+    consumer.track(JOB_ID, payload, STREAMS, entry_ids)
+
+
+def entries(r):
+    return {stream: [fields for _, fields in r.xrange(stream)] for stream in STREAMS}
+
+
+def consumer_for(r):
+    """An ack consumer whose jobs are due as soon as they are tracked"""
+    consumer = AckConsumer(r, "ingress_test")
+    consumer.timeout = 0
+    return consumer
+
+
+def test_unacknowledged_job_is_republished_then_abandoned():
+    r = fakeredis.FakeRedis(decode_responses=True)
+    consumer = consumer_for(r)
+    publish(r, consumer)
+
+    consumer.expire()
+    assert entries(r) == {stream: [{"job_id": JOB_ID, "vehicle_type": "car", "republished": "1"}] for stream in STREAMS}
+
+    for _ in range(MAX_RETRIES):
+        consumer.expire()
+    assert JOB_ID not in consumer.jobs
+    consumer.report()
+    stats = r.hgetall(ACK_TRACKER_STATS_KEY)
+    assert (stats["republished"], stats["abandoned"], stats["outstanding"]) == (str(MAX_RETRIES), "1", "0")
+
+
+def test_ack_deletes_the_republished_entries():
+    r = fakeredis.FakeRedis(decode_responses=True)
+    consumer = consumer_for(r)
+    publish(r, consumer)
+    consumer.expire()
+
+    consumer.handle_acks([("1-0", {"job_id": JOB_ID, "status": "completed"}), ("2-0", {"job_id": "car_8_gone"})])
+
+    assert entries(r) == {stream: [] for stream in STREAMS}
+    assert consumer.totals == {"acked": 1, "unknown_acks": 1, "republished": 1, "abandoned": 0}
+
+
+def test_ack_during_republish_still_deletes_the_new_entries(monkeypatch):
+    r = fakeredis.FakeRedis(decode_responses=True)
+    consumer = consumer_for(r)
+    publish(r, consumer)
+    acks = [("1-0", {"job_id": JOB_ID, "status": "completed"})]
+
+    class AckedMidway(pipelined):
+        """The ack consumer's batches, with the job acknowledged (by another thread) once the first one is sent"""
+
+        def __exit__(self, *exc):
+            super().__exit__(*exc)
+            if acks:
+                consumer.handle_acks([acks.pop()])
+            return False
+
+    monkeypatch.setattr(ack_consumer, "pipelined", AckedMidway)
+    consumer.expire()
+
+    assert JOB_ID not in consumer.jobs
+    assert consumer.deadlines == []
+    assert entries(r) == {stream: [] for stream in STREAMS}
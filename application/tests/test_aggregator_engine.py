@@ -0,0 +1,22 @@
+import json
+
+from modules.aggregator_engine import ResultAggregator
+
+
+def test_trace_rows_leaves_the_jobs_worker_stamps_alone():
+    workers = {
+        "color": {"dequeued": 1.2, "done": 1.4, "received": 1.5, "status": "ok"},
+        "ocr": {"dequeued": 1.3, "done": 1.9, "received": 2.0, "status": "error"}
+    }
+    trace = {
+        "job_id": "car_7_a1b2c3", "vehicle_id": "a1b2c3_20250301_143005_car_GATE1", "vehicle_type": "car",
+        "status": "completed", "results": {"color": "red|#ff0000", "ocr": "N/A"},
+        "stamps": {"detect": 1.0, "published": 1.1, "aggregated": 2.1, "committed": 2.2, "broadcast": 2.3},
+        "workers": workers
+    }
+
+    rows = ResultAggregator.trace_rows(None, trace)
+
+    assert [(row[2], row[4]) for row in rows] == [("job", "completed"), ("color", "completed"), ("ocr", "failed")]
+    assert json.loads(rows[2][6])["service"] == 600
+    assert workers["color"]["status"] == "ok" and workers["ocr"]["status"] == "error"
@@ -0,0 +1,52 @@
+import fakeredis
+
+import orchestrator
+from common.metrics import counter, gauge
+from db_redis.sentinel_redis_config import SCALE_UP_BACKLOG, AUTOSCALER_STATS_KEY, get_autoscaler_stats
+
+
+class ScalingOrchestrator(orchestrator.SentinelOrchestrator):
+    """The autoscaler without processes: replicas are names, the backlog is set by the test"""
+
+    def __init__(self, backlog):
+        self.r = fakeredis.FakeRedis(decode_responses=True)
+        self.replicas = {"ocr": ["OCR Worker"]}
+        self.last_scaled = {}
+        self.backlog = backlog
+
+    def get_worker_backlog(self, worker):
+        return self.backlog, 0
+
+    def start_worker_replica(self, worker):
+        self.replicas[worker].append(f"OCR Worker {len(self.replicas[worker]) + 1}")
+        return True
+
+    def drain_worker_replica(self, worker):
+        self.replicas[worker].pop()
+
+
+def test_scale_up_is_reported_as_metrics_and_stats(monkeypatch):
+    monkeypatch.setenv("OCR_MAX_REPLICAS", "3")
+    scaled_up = counter("sentinel_autoscale_decisions_total", worker="ocr", direction="up")
+    before = scaled_up.value
+    scaler = ScalingOrchestrator(backlog=3 * SCALE_UP_BACKLOG)
+
+    scaler.autoscale_workers()
+
+    assert scaler.replicas["ocr"] == ["OCR Worker", "OCR Worker 2"]
+    assert gauge("sentinel_worker_replicas", worker="ocr").value == 2
+    assert gauge("sentinel_worker_replicas_desired", worker="ocr").value == 3
+    assert scaled_up.value == before + 1
+    stats = get_autoscaler_stats(scaler.r)["ocr"]
+    assert (stats["replicas"], stats["desired"], stats["scale_up"]) == (2, 3, 1)
+
+
+def test_cooldown_holds_replicas(monkeypatch):
+    monkeypatch.setenv("OCR_MAX_REPLICAS", "3")
+    scaler = ScalingOrchestrator(backlog=3 * SCALE_UP_BACKLOG)
+
+    scaler.autoscale_workers()
+    scaler.autoscale_workers()
+
+    assert len(scaler.replicas["ocr"]) == 2
+    assert scaler.r.hget(AUTOSCALER_STATS_KEY, "ocr:scale_up") == "1"
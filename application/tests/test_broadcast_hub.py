@@ -0,0 +1,179 @@
+import json
+import asyncio
+
+import pytest
+
+from common.metrics import counter
+from modules.broadcast_hub import BroadcastHub, SLOW_CLIENT_CLOSE_CODE
+
+
+class Socket:
+    """Enough of a WebSocket for the hub: sends wait on `gate` while it is closed"""
+
+    def __init__(self, fail=False):
+        self.sent = []
+        self.closed = None
+        self.fail = fail
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message):
+        await self.gate.wait()
+        if self.fail:
+            raise ConnectionResetError("client went away")
+        self.sent.append(json.loads(message))
+
+    async def close(self, code=1000, reason=""):
+        self.closed = code
+
+
+def vehicle(vehicle_id, **fields):
+    return json.dumps({"type": "vehicle", "vehicle_id": vehicle_id, **fields})
+
+
+def patch(vehicle_id, **fields):
+    return json.dumps({"type": "vehicle_patch", "vehicle_id": vehicle_id, **fields})
+
+
+def dropped(reason):
+    return counter("sentinel_ws_dropped_total", reason=reason).value
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def stalled_client(hub, messages):
+    """A connected client whose first send never finishes, with `messages` broadcast to it"""
+    socket = Socket()
+    await hub.connect(socket)
+    await hub.broadcast(vehicle("first"))
+    await settle()
+    socket.gate.clear()
+    await hub.broadcast(vehicle("blocked"))
+    await settle()
+    for message in messages:
+        await hub.broadcast(message)
+    return socket
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        BroadcastHub(policy="buffer")
+
+
+def test_broadcast_does_not_wait_for_a_stalled_client():
+    async def scenario():
+        hub = BroadcastHub(queue_size=10, policy="drop_oldest", send_timeout=60)
+        stalled = await stalled_client(hub, [])
+        healthy = Socket()
+        await hub.connect(healthy)
+
+        await asyncio.wait_for(hub.broadcast(vehicle("c")), 1)
+        await settle()
+        assert healthy.sent == [{"type": "vehicle", "vehicle_id": "c"}]
+        assert len(hub.clients[stalled].queue) == 1
+
+        stalled.gate.set()
+        await settle()
+        assert [message["vehicle_id"] for message in stalled.sent] == ["first", "blocked", "c"]
+        for socket in (stalled, healthy):
+            hub.disconnect(socket)
+
+    asyncio.run(scenario())
+
+
+def test_drop_oldest_keeps_the_newest_messages():
+    async def scenario():
+        hub = BroadcastHub(queue_size=2, policy="drop_oldest", send_timeout=60)
+        before = dropped("drop_oldest")
+        socket = await stalled_client(hub, [vehicle("a"), vehicle("b"), vehicle("c")])
+
+        assert [json.loads(message)["vehicle_id"] for _, message in hub.clients[socket].queue] == ["b", "c"]
+        assert dropped("drop_oldest") - before == 1
+        assert socket.closed is None
+        hub.disconnect(socket)
+
+    asyncio.run(scenario())
+
+
+def test_coalesce_folds_updates_into_the_queued_vehicle():
+    async def scenario():
+        hub = BroadcastHub(queue_size=2, policy="coalesce", send_timeout=60)
+        before = {reason: dropped(reason) for reason in ("coalesced", "drop_oldest")}
+        socket = await stalled_client(hub, [
+            vehicle("a", status="in_progress", color="red"),
+            vehicle("b", status="in_progress"),
+            # A patch updates the queued vehicle's fields in place
+            patch("a", status="completed", model="Toyota"),
+            # A whole vehicle replaces it
+            vehicle("b", status="completed", color="blue"),
+            # Nothing queued for this one: the oldest goes
+            patch("c", status="completed")
+        ])
+
+        queued = [json.loads(message) for _, message in hub.clients[socket].queue]
+        assert queued == [
+            {"type": "vehicle", "vehicle_id": "b", "status": "completed", "color": "blue"},
+            {"type": "vehicle_patch", "vehicle_id": "c", "status": "completed"}
+        ]
+        assert dropped("coalesced") - before["coalesced"] == 2
+        assert dropped("drop_oldest") - before["drop_oldest"] == 1
+
+        socket.gate.set()
+        await settle()
+        assert [message["vehicle_id"] for message in socket.sent] == ["first", "blocked", "b", "c"]
+        hub.disconnect(socket)
+
+    asyncio.run(scenario())
+
+
+def test_disconnect_policy_closes_a_client_with_a_full_queue():
+    async def scenario():
+        hub = BroadcastHub(queue_size=2, policy="disconnect", send_timeout=60)
+        before = dropped("disconnected")
+        socket = await stalled_client(hub, [vehicle("a"), vehicle("b"), vehicle("c")])
+        await settle()
+
+        assert socket not in hub.clients
+        assert socket.closed == SLOW_CLIENT_CLOSE_CODE
+        assert dropped("disconnected") - before == 3
+        # The route's own disconnect afterwards is harmless
+        hub.disconnect(socket)
+        await hub.broadcast(vehicle("d"))
+
+    asyncio.run(scenario())
+
+
+def test_stalled_send_is_closed_at_the_next_broadcast_whatever_the_policy():
+    async def scenario():
+        hub = BroadcastHub(queue_size=10, policy="drop_oldest", send_timeout=60)
+        socket = await stalled_client(hub, [])
+        hub.clients[socket].sending_since -= 61
+
+        await hub.broadcast(vehicle("a"))
+        await settle()
+
+        assert socket not in hub.clients
+        assert socket.closed == SLOW_CLIENT_CLOSE_CODE
+
+    asyncio.run(scenario())
+
+
+def test_failed_send_drops_the_client():
+    async def scenario():
+        hub = BroadcastHub(queue_size=10, policy="drop_oldest", send_timeout=60)
+        socket = Socket(fail=True)
+        await hub.connect(socket)
+
+        await hub.broadcast(vehicle("a"))
+        await settle()
+
+        assert socket not in hub.clients
+        await hub.broadcast(vehicle("b"))
+
+    asyncio.run(scenario())
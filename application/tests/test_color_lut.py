@@ -0,0 +1,115 @@
+import numpy as np
+
+from color_detection import color_lut
+from color_detection.color_lut import (
+    CAR_COLORS, CAR_COLOR_MAPPING, build_color_lut, classify_rgb_batch, get_all_css_colors, lut_cache_path
+)
+
+BITS = 4
+
+
+def classify_one(rgb, css_colors):
+    """The worker's per-image classification before the lookup table, for one dominant color"""
+    r, g, b = rgb
+    brightness = np.mean(rgb)
+    if brightness < 30:
+        return "black"
+    if brightness > 220:
+        return "white"
+
+    target = np.array(rgb)
+    closest, min_distance = "gray", float("inf")
+    for name, color in css_colors.items():
+        distance = np.sqrt(np.sum((target - np.array(color)) ** 2))
+        if distance < min_distance:
+            closest, min_distance = name, distance
+
+    car_color = "gray"
+    for category, names in CAR_COLOR_MAPPING.items():
+        if closest in names:
+            car_color = category
+            break
+    else:
+        if "pink" in closest or "violet" in closest or "magenta" in closest or "fuchsia" in closest:
+            car_color = "red"
+        elif "cyan" in closest or "teal" in closest:
+            car_color = "blue"
+
+    if car_color == "gray":
+        if r > g and r > b and r - max(g, b) > 10 and r > 35:
+            car_color = "red"
+        elif b > r and b > g and b - max(r, g) > 10 and b > 35:
+            car_color = "blue"
+    return car_color
+
+
+def bin_centers(bits):
+    step = 1 << (8 - bits)
+    centers = np.arange(1 << bits) * step + (step - 1) / 2.0
+    r, g, b = np.meshgrid(centers, centers, centers, indexing="ij")
+    return np.stack([r.ravel(), g.ravel(), b.ravel()], axis=1)
+
+
+def test_lut_matches_per_image_classifier_at_bin_centers():
+    css_colors = get_all_css_colors()
+    lut = build_color_lut(BITS, css_colors)
+    centers = bin_centers(BITS)
+
+    expected = [classify_one(tuple(rgb), css_colors) for rgb in centers]
+    assert [CAR_COLORS[i] for i in lut.ravel()] == expected
+
+
+def test_classify_rgb_batch_looks_up_each_color_in_its_bin():
+    css_colors = get_all_css_colors()
+    lut = build_color_lut(BITS, css_colors)
+    colors = np.random.default_rng(0).integers(0, 256, (500, 3))
+
+    labels = classify_rgb_batch(colors, lut)
+
+    # Each color is classified as its bin center is
+    step = 1 << (8 - BITS)
+    centers = (colors // step) * step + (step - 1) / 2.0
+    assert labels == [classify_one(tuple(rgb), css_colors) for rgb in centers]
+    # and mostly as the color itself is; a fine enough table agrees more often
+    agree = sum(label == classify_one(tuple(rgb), css_colors) for label, rgb in zip(labels, colors))
+    assert agree / len(colors) > 0.8
+
+
+def test_classify_rgb_batch_clips_and_handles_empty_input():
+    lut = build_color_lut(BITS)
+
+    assert classify_rgb_batch(np.empty((0, 3)), lut) == []
+    assert classify_rgb_batch([[-20, -5, 0], [300, 400, 260]], lut) == ["black", "white"]
+
+
+def test_load_color_lut_builds_once_then_reads_the_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(color_lut, "LUT_CACHE_DIR", tmp_path)
+    monkeypatch.setattr(color_lut, "_loaded_luts", {})
+
+    lut = color_lut.load_color_lut(BITS)
+    assert lut_cache_path(BITS).exists()
+    assert not lut.flags.writeable
+
+    def no_build(*args, **kwargs):
+        raise AssertionError("rebuilt despite the cache")
+
+    monkeypatch.setattr(color_lut, "build_color_lut", no_build)
+    monkeypatch.setattr(color_lut, "_loaded_luts", {})
+    assert np.array_equal(color_lut.load_color_lut(BITS), lut)
+
+
+def test_cache_problems_are_logged_not_printed(tmp_path, monkeypatch, caplog, capsys):
+    monkeypatch.setattr(color_lut, "LUT_CACHE_DIR", tmp_path)
+    lut_cache_path(BITS).write_bytes(b"not a numpy file")
+    # A directory in place of the temporary file, so saving the rebuilt table fails too
+    lut_cache_path(BITS).with_suffix(".tmp.npy").mkdir()
+
+    with caplog.at_level("WARNING", logger=color_lut.__name__):
+        lut = color_lut._load_color_lut(BITS)
+
+    assert lut.shape == (1 << BITS,) * 3
+    messages = [record.getMessage() for record in caplog.records]
+    assert len(messages) == 2
+    assert messages[0].startswith("Ignoring unreadable LUT cache")
+    assert messages[1].startswith("Could not write LUT cache")
+    assert capsys.readouterr().out == ""
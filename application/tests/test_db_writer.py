@@ -0,0 +1,161 @@
+import time
+import asyncio
+
+import pytest
+
+from db_redis.sentinel_redis_config import DB_RETRY_SECONDS
+from modules.db_writer import VehicleWriter, AsyncVehicleWriter, IN_PROGRESS, latest_rows, vehicle_row
+
+
+def job(vehicle_id, status="completed", **fields):
+    return {"vehicle_id": vehicle_id, "vehicle_type": "car", "timestamp": "2025-01-01T00:00:00", "status": status, **fields}
+
+
+class Table:
+    """The vehicles table as the upsert sees it: a row is only rewritten while it is still processing"""
+
+    def __init__(self, fail=0):
+        self.rows = {}
+        self.fail = fail
+
+    def write(self, cursor, rows, table):
+        if self.fail:
+            self.fail -= 1
+            raise ConnectionError("server closed the connection unexpectedly")
+        stored = set()
+        for row in latest_rows(rows):
+            if self.rows.get(row[0], (IN_PROGRESS,))[-1] == IN_PROGRESS:
+                self.rows[row[0]] = row
+                stored.add(row[0])
+        return stored
+
+
+class Conn:
+    closed = 0
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class Pool:
+    def getconn(self):
+        return Conn()
+
+    def putconn(self, conn, close=False):
+        pass
+
+
+def sync_writer(table, **kwargs):
+    writer = VehicleWriter(Pool(), **kwargs)
+    writer.write = table.write
+    return writer
+
+
+class FailingSpool:
+    def append(self, rows):
+        raise OSError("No space left on device")
+
+
+class FailingPool:
+    def acquire(self):
+        raise ConnectionError("database is down")
+
+
+def test_latest_rows_prefers_final_then_later_rows():
+    rows = [vehicle_row(job("a", IN_PROGRESS, color="red")),
+            vehicle_row(job("a", "completed", color="red", model="Toyota")),
+            vehicle_row(job("a", IN_PROGRESS, color="blue")),
+            vehicle_row(job("b", IN_PROGRESS)),
+            vehicle_row(job("b", IN_PROGRESS, model="Honda"))]
+
+    latest = latest_rows(rows)
+
+    assert [row[0] for row in latest] == ["a", "b"]
+    assert latest[0] == rows[1]
+    assert latest[1] == rows[4]
+
+
+def test_flush_reports_each_update_and_only_the_first_completion():
+    table = Table()
+    writer = sync_writer(table, batch_rows=10, flush_ms=50)
+    writer.add(job("a", IN_PROGRESS), "a-first")
+    writer.add(job("a"), "a-done")
+    writer.add(job("a"), "a-again")
+    writer.add(job("b", IN_PROGRESS), "b-first")
+
+    assert writer.flush() == [("a-first", True), ("a-done", True), ("a-again", False), ("b-first", True)]
+    assert table.rows["a"][-1] == "completed"
+    assert len(writer) == 0 and writer.seconds_until_due() is None
+
+    # A re-published job does not rewrite the finished row
+    writer.add(job("a", IN_PROGRESS), "a-republished")
+    assert writer.flush() == [("a-republished", False)]
+    assert table.rows["a"][-1] == "completed"
+
+
+def test_flush_is_due_on_size_or_age():
+    writer = sync_writer(Table(), batch_rows=2, flush_ms=50)
+    writer.add(job("a"))
+    assert 0 < writer.seconds_until_due() <= 0.05
+    writer.add(job("b"))
+    assert writer.due()
+
+    writer = sync_writer(Table(), batch_rows=2, flush_ms=50)
+    writer.add(job("a"))
+    writer.oldest -= 0.05
+    assert writer.due()
+
+
+def test_failed_flush_is_retried_after_the_backoff():
+    table = Table(fail=1)
+    writer = sync_writer(table, batch_rows=1, flush_ms=50)
+    writer.add(job("a"), "ctx-a")
+
+    with pytest.raises(ConnectionError):
+        writer.flush()
+    writer.add(job("b"), "ctx-b")
+
+    assert [context for _, context in writer.pending] == ["ctx-a", "ctx-b"]
+    assert writer.seconds_until_due() == pytest.approx(DB_RETRY_SECONDS, abs=0.5)
+    writer.retry_at = time.monotonic()
+    assert writer.flush() == [("ctx-a", True), ("ctx-b", True)]
+    assert set(table.rows) == {"a", "b"}
+
+
+def test_async_spool_failure_keeps_batch_for_retry():
+    writer = AsyncVehicleWriter(FailingPool(), batch_rows=10, flush_ms=50)
+    writer.add(job("a"), "ctx-a")
+    writer.add(job("b", IN_PROGRESS), "ctx-b")
+
+    with pytest.raises(OSError):
+        asyncio.run(writer.spool(FailingSpool()))
+
+    assert [context for _, context in writer.pending] == ["ctx-a", "ctx-b"]
+    assert writer.oldest is not None
+    # Waits out the retry instead of failing on the cleared oldest time
+    assert writer.seconds_until_due() == pytest.approx(DB_RETRY_SECONDS, abs=0.5)
+
+
+def test_async_flush_failure_keeps_batch_ahead_of_new_rows():
+    writer = AsyncVehicleWriter(FailingPool(), batch_rows=10, flush_ms=50)
+    writer.add(job("a"), "ctx-a")
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(writer.flush())
+    writer.add(job("b"), "ctx-b")
+
+    assert [context for _, context in writer.pending] == ["ctx-a", "ctx-b"]
+    assert writer.retry_at > time.monotonic()
+    assert not writer.due()
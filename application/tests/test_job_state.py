@@ -0,0 +1,150 @@
+import asyncio
+import time
+
+import fakeredis
+
+from db_redis.sentinel_redis_config import JOB_DEADLINES_KEY, JOB_STATE_TTL
+from modules.job_state import (JobStore, AsyncJobStore, job_key,
+                               JOB_PENDING, JOB_COMPLETED, JOB_STORED, JOB_CLAIMED)
+
+JOB_ID = "car_7_a1b2c3"
+DEADLINE = 1000.0
+
+
+def job_fields(**overrides):
+    return {
+        "vehicle_type": "car",
+        "expected": "color,logo,ocr",
+        "vehicle_id": "a1b2c3_20250301_143005_car_GATE1",
+        "location": "GATE1",
+        "timestamp": "2025-03-01T14:30:05",
+        "published_at": None,
+        "keyframe_url": "static/GATE1/2025-03-01/keyframes/a1b2c3_20250301_143005_car_GATE1.jpg",
+        "plate_url": None,
+        **overrides
+    }
+
+
+def merge(store, worker, result, deadline=DEADLINE, **fields):
+    return store.merge(JOB_ID, job_fields(**fields), {worker: result}, {"detect": 1.5}, worker,
+                       {"dequeued": 2.0, "done": 2.5}, deadline)
+
+
+def stores(server, *consumers):
+    return [JobStore(fakeredis.FakeRedis(server=server, decode_responses=True), consumer) for consumer in consumers]
+
+
+def test_merge_reports_first_result_and_keeps_job_fields_from_it():
+    server = fakeredis.FakeServer()
+    store, = stores(server, "aggregator_1")
+
+    state, first, claimed_by, job = merge(store, "color", "red")
+    assert (state, first, claimed_by) == (JOB_PENDING, True, "")
+    assert job["expected_workers"] == ["color", "logo", "ocr"]
+    assert job["results"] == {"color": "red"}
+    assert job["stamps"] == {"detect": 1.5}
+    assert job["worker_stamps"] == {"color": {"dequeued": 2.0, "done": 2.5}}
+    assert job["plate_url"] is None and job["published_at"] is None
+
+    # Later results don't overwrite the job's fields or push its deadline back
+    state, first, _, job = merge(store, "logo", "Toyota", deadline=DEADLINE + 50, location="GATE2")
+    assert (state, first) == (JOB_PENDING, False)
+    assert job["location"] == "GATE1"
+    assert job["results"] == {"color": "red", "logo": "Toyota"}
+    assert store.r.zscore(JOB_DEADLINES_KEY, JOB_ID) == DEADLINE
+    assert 0 < store.r.ttl(job_key(JOB_ID)) <= JOB_STATE_TTL
+
+
+def test_exactly_one_consumer_finalizes_a_completed_job():
+    server = fakeredis.FakeServer()
+    first_store, second_store = stores(server, "aggregator_1", "aggregator_2")
+    merge(first_store, "color", "red")
+    merge(second_store, "logo", "Toyota")
+
+    state, _, claimed_by, job = merge(first_store, "ocr", "KA01AB1234", deadline=DEADLINE + 30)
+    assert (state, claimed_by) == (JOB_COMPLETED, "aggregator_1")
+    assert set(job["results"]) == {"color", "logo", "ocr"}
+    # The deadline stays as the finalizer's lease
+    assert first_store.r.zscore(JOB_DEADLINES_KEY, JOB_ID) == DEADLINE + 30
+
+    # A redelivered result is not merged while the job is being finalized
+    state, _, claimed_by, job = merge(second_store, "ocr", "KA01AB9999")
+    assert (state, claimed_by, job) == (JOB_CLAIMED, "aggregator_1", None)
+    assert not second_store.claim_final(JOB_ID)
+    assert first_store.load(JOB_ID)[0]["results"]["ocr"] == "KA01AB1234"
+
+    pipe = first_store.r.pipeline()
+    first_store.mark_stored(pipe, JOB_ID)
+    pipe.execute()
+    assert merge(second_store, "ocr", "KA01AB9999")[0] == JOB_STORED
+    assert first_store.load(JOB_ID)[2]
+    assert first_store.in_flight() == 0
+
+
+def test_claim_final_takes_a_timed_out_job_once_and_not_an_expired_one():
+    server = fakeredis.FakeServer()
+    first_store, second_store = stores(server, "aggregator_1", "aggregator_2")
+    merge(first_store, "color", "red")
+
+    assert second_store.claim_final(JOB_ID)
+    assert not first_store.claim_final(JOB_ID)
+    assert first_store.load(JOB_ID)[1] == "aggregator_2"
+
+    # The state expired: nothing left to finalize
+    assert not first_store.claim_final("car_8_gone")
+    assert first_store.load("car_8_gone") == (None, None, False)
+
+
+def test_claim_due_hands_each_due_job_to_one_consumer():
+    server = fakeredis.FakeServer()
+    first_store, second_store = stores(server, "aggregator_1", "aggregator_2")
+    for index, deadline in enumerate([10, 20, 30, 500]):
+        first_store.r.zadd(JOB_DEADLINES_KEY, {f"job{index}": deadline})
+
+    assert first_store.claim_due(now=25, next_deadline=100) == ["job0", "job1"]
+    assert second_store.claim_due(now=25, next_deadline=100) == []
+    assert second_store.claim_due(now=100, next_deadline=200, limit=2) == ["job2", "job0"]
+    # A consumer that dies holding a job only delays it until its next deadline
+    assert first_store.r.zscore(JOB_DEADLINES_KEY, "job1") == 100
+    assert first_store.seconds_until_deadline() == 0
+
+
+def test_evict_claims_past_jobs_another_consumer_is_finalizing():
+    server = fakeredis.FakeServer()
+    first_store, second_store = stores(server, "aggregator_1", "aggregator_2")
+    for index, deadline in enumerate([10, 20, 30, 40]):
+        first_store.r.hset(job_key(f"job{index}"), "vehicle_id", f"v{index}")
+        first_store.r.zadd(JOB_DEADLINES_KEY, {f"job{index}": deadline})
+    # The nearest deadline is another consumer's lease; the next job's state expired
+    assert second_store.claim_final("job0")
+    first_store.r.delete(job_key("job1"))
+
+    assert first_store.evict(limit=2) == ["job2"]
+    assert first_store.load("job2")[1] == "aggregator_1"
+    assert first_store.r.zrange(JOB_DEADLINES_KEY, 0, -1) == ["job0", "job2", "job3"]
+    # Already claimed: the next eviction moves on to job3
+    assert second_store.evict(limit=2) == ["job3"]
+    assert first_store.evict(limit=10) == []
+
+
+def test_async_store_merges_like_the_sync_one():
+    async def scenario():
+        r = fakeredis.FakeAsyncRedis(decode_responses=True)
+        store = AsyncJobStore(r, "aggregator_1")
+        assert (await merge(store, "color", "red"))[:2] == (JOB_PENDING, True)
+        assert (await merge(store, "logo", "Toyota"))[:2] == (JOB_PENDING, False)
+        state, _, claimed_by, job = await merge(store, "ocr", "KA01AB1234")
+        assert (state, claimed_by) == (JOB_COMPLETED, "aggregator_1")
+        assert job["results"] == {"color": "red", "logo": "Toyota", "ocr": "KA01AB1234"}
+        assert (await merge(store, "ocr", "again"))[0] == JOB_CLAIMED
+
+        assert await store.retried(JOB_ID) == 1
+        assert (await store.load(JOB_ID))[0]["retries"] == 1
+        assert await store.claim_due(now=time.time(), next_deadline=time.time() + 60) == [JOB_ID]
+        # Already being finalized, so not evicted
+        assert await store.evict(limit=0) == []
+        await store.drop_deadline(JOB_ID)
+        assert await store.in_flight() == 0
+        assert await store.seconds_until_deadline() is None
+
+    asyncio.run(scenario())
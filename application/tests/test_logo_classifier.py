@@ -0,0 +1,62 @@
+import json
+
+import numpy as np
+import pytest
+
+onnx = pytest.importorskip("onnx")
+from onnx import helper, TensorProto
+
+from logo_detection.logo_classifier import LogoClassifier, UNKNOWN_MAKE, model_checksum
+
+MAKES = ["Redline", "Greenway", "Bluebird"]
+
+
+def write_model(tmp_path, weights, batch="batch"):
+    """Average of each RGB channel times `weights`: a solid-color grille scores its color's make"""
+    graph = helper.make_graph(
+        [helper.make_node("ReduceMean", ["input"], ["means"], axes=[2, 3], keepdims=0),
+         helper.make_node("MatMul", ["means", "weights"], ["logits"])],
+        "logo_test",
+        [helper.make_tensor_value_info("input", TensorProto.FLOAT, [batch, 3, 32, 32])],
+        [helper.make_tensor_value_info("logits", TensorProto.FLOAT, [batch, len(MAKES)])],
+        [helper.make_tensor("weights", TensorProto.FLOAT, [3, len(MAKES)], np.asarray(weights, dtype=np.float32).ravel())]
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    model_path, labels_path = tmp_path / "logo.onnx", tmp_path / "labels.json"
+    onnx.save(model, str(model_path))
+    labels_path.write_text(json.dumps(MAKES))
+    return str(model_path), str(labels_path)
+
+
+def solid(bgr):
+    return np.full((120, 160, 3), bgr, dtype=np.uint8)
+
+
+def test_predicts_make_per_image(tmp_path):
+    classifier = LogoClassifier(*write_model(tmp_path, np.eye(3) * 10))
+
+    makes = [make for make, _ in classifier.predict([solid((0, 0, 255)), solid((255, 0, 0)), solid((0, 255, 0))])]
+
+    assert classifier.input_size == (32, 32)
+    assert makes == ["Redline", "Bluebird", "Greenway"]
+
+
+def test_low_confidence_is_unknown(tmp_path):
+    classifier = LogoClassifier(*write_model(tmp_path, np.zeros((3, 3))))
+    [(make, confidence)] = classifier.predict([solid((0, 0, 255))])
+    assert make == UNKNOWN_MAKE
+    assert confidence == pytest.approx(1 / 3)
+
+
+def test_fixed_batch_export_takes_a_partial_last_chunk(tmp_path):
+    classifier = LogoClassifier(*write_model(tmp_path, np.eye(3) * 10, batch=2))
+    images = [solid((0, 0, 255))] * 3 + [solid((255, 0, 0))] * 2
+
+    assert classifier.max_batch == 2
+    assert [make for make, _ in classifier.predict(images)] == ["Redline"] * 3 + ["Bluebird"] * 2
+
+
+def test_checksum_identifies_the_export(tmp_path):
+    model_path, _ = write_model(tmp_path, np.eye(3))
+    assert len(model_checksum(model_path)) == 64
@@ -0,0 +1,98 @@
+import datetime
+
+import fakeredis
+import pytest
+
+from common.messages import (encode_job, decode_job, encode_result, decode_result, MESSAGE_FIELD, WEB_ROOT,
+                             _legacy_fields)
+
+IST = datetime.timezone(datetime.timedelta(hours=5, minutes=30))
+NOW = datetime.datetime(2025, 3, 1, 14, 30, 5, 123456, tzinfo=IST)
+VEHICLE_ID = "a1b2c3_20250301_143005_car_GATE1"
+FRAME_URL = f"static/GATE1/2025-03-01/keyframes/{VEHICLE_ID}.jpg"
+PLATE_URL = f"static/GATE1/2025-03-01/plates/{VEHICLE_ID}_plate.jpg"
+
+
+def job(**overrides):
+    return {
+        "job_id": "car_7_a1b2c3",
+        "vehicle_id": VEHICLE_ID,
+        "vehicle_type": "car",
+        "frame_path": f"{WEB_ROOT}/{FRAME_URL}",
+        "plate_path": f"{WEB_ROOT}/{PLATE_URL}",
+        "frame_url": FRAME_URL,
+        "plate_url": PLATE_URL,
+        "timestamp": NOW,
+        "location": "GATE1",
+        "workers": "ocr,color,logo",
+        "t_detect": 1740820805.5,
+        "t_published": 1740820805.75,
+        **overrides
+    }
+
+
+def through_redis(fields):
+    """Write and read back the fields the way workers do (str replies, surrogateescape for the msgpack blob)"""
+    r = fakeredis.FakeRedis(decode_responses=True, encoding_errors="surrogateescape")
+    r.xadd("stream", fields)
+    [(_, read)] = r.xrange("stream")
+    return read
+
+
+@pytest.mark.parametrize("encoding", ["msgpack", "fields"])
+def test_job_round_trip(encoding):
+    decoded = decode_job(through_redis(encode_job(job(), encoding=encoding)))
+    assert {name: decoded[name] for name in job()} == job()
+
+
+def test_job_packs_derivable_fields():
+    fields = encode_job(job(), encoding="msgpack")
+    assert list(fields) == [MESSAGE_FIELD]
+    assert len(fields[MESSAGE_FIELD]) < len("".join(f"{k}{v}" for k, v in _legacy_fields(job()).items())) / 2
+
+
+def test_job_without_plate_and_with_moved_frame():
+    original = job(plate_path=None, plate_url=None, frame_path="/mnt/frames/car.jpg")
+    decoded = decode_job(through_redis(encode_job(original, encoding="msgpack")))
+    assert (decoded["plate_path"], decoded["plate_url"]) == (None, None)
+    assert decoded["frame_path"] == "/mnt/frames/car.jpg"
+
+
+def test_legacy_job_layout_decodes_typed_values():
+    legacy = {"job_id": "car_1", "vehicle_id": VEHICLE_ID, "plate_path": "None", "frame_path": "/f.jpg",
+              "timestamp": NOW.isoformat(), "t_detect": "1740820805.500000", "workers": "ocr"}
+    decoded = decode_job(legacy)
+    assert decoded["plate_path"] is None
+    assert decoded["timestamp"] == NOW
+    assert decoded["t_detect"] == 1740820805.5
+
+
+@pytest.mark.parametrize("encoding", ["msgpack", "fields"])
+def test_worker_result_round_trip(encoding):
+    result = {"job_id": "car_7_a1b2c3", "vehicle_id": VEHICLE_ID, "vehicle_type": "car", "workers": "ocr,color,logo",
+              "worker": "logo", "result": "Toyota", "status": "ok", "confidence": 0.875, "timestamp": NOW,
+              "location": "GATE1", "t_dequeued": 1740820806.25, "t_done": 1740820806.5}
+    decoded = decode_result(through_redis(encode_result(result, encoding=encoding)))
+    assert {name: decoded[name] for name in result} == result
+
+
+@pytest.mark.parametrize("encoding", ["msgpack", "fields"])
+def test_fused_result_round_trip(encoding):
+    results = {"ocr": "KA01AB1234", "color": "white|#ffffff", "logo": "Unknown"}
+    fields = encode_result({"job_id": "car_7", "worker": "fused", "results": results, "status": "ok",
+                            "workers": "ocr,color,logo", "timestamp": NOW}, encoding=encoding)
+    decoded = decode_result(through_redis(fields))
+    assert decoded["results"] == results
+    assert decoded["workers"] == "ocr,color,logo"
+
+
+def test_fields_added_by_the_reclaimer_are_kept():
+    fields = {**encode_job(job(), encoding="msgpack"), "retries": "2", "last_error": "timeout"}
+    decoded = decode_job(through_redis(fields))
+    assert (decoded["retries"], decoded["last_error"]) == ("2", "timeout")
+
+
+def test_unknown_schema_version_is_rejected():
+    import msgpack
+    with pytest.raises(ValueError):
+        decode_job({MESSAGE_FIELD: msgpack.packb([2, "car_1"])})
@@ -0,0 +1,34 @@
+import json
+
+import fakeredis
+
+from common import metrics
+from db_redis.sentinel_redis_config import METRICS_KEY_PREFIX, METRICS_INDEX_KEY
+
+
+def publish(r, name, component):
+    r.set(METRICS_KEY_PREFIX + name, json.dumps({"component": component, "process": name, "metrics": []}))
+    r.sadd(METRICS_INDEX_KEY, name)
+
+
+def test_serving_api_worker_replaces_its_published_snapshot(monkeypatch):
+    r = fakeredis.FakeRedis(decode_responses=True)
+    publish(r, "API:101", "api")
+    publish(r, "API:102", "api")
+    publish(r, "Aggregator", "aggregator")
+    monkeypatch.setattr(metrics, "_process_name", "API:101")
+
+    snapshots = metrics.collect_snapshots(r, local_component="api")
+
+    assert sorted((s["process"], s["component"]) for s in snapshots) == [
+        ("API:101", "api"), ("API:102", "api"), ("Aggregator", "aggregator")
+    ]
+
+
+def test_expired_snapshots_leave_the_index():
+    r = fakeredis.FakeRedis(decode_responses=True)
+    publish(r, "OCR_1", "ocr")
+    r.sadd(METRICS_INDEX_KEY, "OCR_2")
+
+    assert [s["process"] for s in metrics.collect_snapshots(r)] == ["OCR_1"]
+    assert r.smembers(METRICS_INDEX_KEY) == {"OCR_1"}
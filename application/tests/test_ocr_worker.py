@@ -0,0 +1,16 @@
+import pytest
+
+pytest.importorskip("rapidocr_onnxruntime")
+
+from ocr.ocr_worker import process_ocr
+
+
+@pytest.mark.parametrize("plate_path", [None, "", "/nonexistent/plate.jpg"])
+def test_vehicle_without_plate_is_a_result_not_a_failure(plate_path):
+    assert process_ocr("/frames/car.jpg", plate_path) == "N/A"
+
+
+def test_unreadable_plate_image(tmp_path):
+    plate = tmp_path / "plate.jpg"
+    plate.write_bytes(b"not an image")
+    assert process_ocr("/frames/car.jpg", str(plate)) == "N/A"
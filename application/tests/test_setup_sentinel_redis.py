@@ -0,0 +1,16 @@
+import fakeredis
+
+from db_redis import setup_sentinel_redis
+
+
+def test_setup_creates_every_group(monkeypatch, capsys):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(setup_sentinel_redis, "get_redis_connection",
+                        lambda: fakeredis.FakeRedis(server=server, decode_responses=True))
+
+    setup_sentinel_redis.main()
+
+    r = fakeredis.FakeRedis(server=server, decode_responses=True)
+    for stream, groups in setup_sentinel_redis.CONSUMER_GROUPS.items():
+        assert {group["name"] for group in r.xinfo_groups(stream)} >= set(groups)
+    assert "completed successfully" in capsys.readouterr().out
@@ -0,0 +1,118 @@
+import fakeredis
+
+from db_redis.sentinel_redis_config import RETENTION_STATS_KEY, STREAM_KEEP_ACKED_SECONDS
+from db_redis.stream_trimmer import StreamTrimmer
+
+STREAM = "test:stream"
+# Long after every entry, so the keep window does not hold anything back
+LATER_MS = 10_000 + int(STREAM_KEEP_ACKED_SECONDS * 1000)
+
+
+def exact(r):
+    """
+    Trim exactly at the MINID the trimmer asks for: with ~ Redis only drops
+    whole macro nodes (100 entries), so a short stream would keep them all.
+    MEMORY USAGE, which fakeredis lacks, reads as 0 (STRLEN of a missing key).
+    """
+    xtrim, pipeline = r.xtrim, r.pipeline
+    r.minids = []
+
+    def trim(name, minid=None, approximate=True, **kwargs):
+        r.minids.append(minid)
+        return xtrim(name, minid=minid, approximate=False, **kwargs)
+
+    def memory_pipeline(*args, **kwargs):
+        pipe = pipeline(*args, **kwargs)
+        pipe.memory_usage = lambda key: pipe.strlen("test:no-such-key")
+        return pipe
+
+    r.xtrim = trim
+    r.pipeline = memory_pipeline
+    return r
+
+
+def stream_with_groups():
+    """Entries 1-0 .. 5-0; "slow" has read them all and acked 1 and 2, "fast" has read up to 2 and acked both"""
+    r = exact(fakeredis.FakeRedis(decode_responses=True))
+    for ms in range(1, 6):
+        r.xadd(STREAM, {"n": ms}, id=f"{ms}-0")
+    r.xgroup_create(STREAM, "slow", id="0")
+    r.xgroup_create(STREAM, "fast", id="0")
+    r.xreadgroup("slow", "c1", {STREAM: ">"})
+    r.xack(STREAM, "slow", "1-0", "2-0")
+    r.xreadgroup("fast", "c1", {STREAM: ">"}, count=2)
+    r.xack(STREAM, "fast", "1-0", "2-0")
+    return r
+
+
+def ids(r):
+    return [entry_id for entry_id, _ in r.xrange(STREAM)]
+
+
+def test_boundary_is_the_oldest_entry_any_group_still_needs():
+    r = stream_with_groups()
+    trimmer = StreamTrimmer(r, [STREAM])
+
+    # "fast" needs 3-0 next (after its last-delivered 2-0), "slow" still has 3-0 pending
+    assert trimmer.first_needed_id(STREAM) == (2, 1)
+    assert trimmer.trim_stream(STREAM, LATER_MS) == 2
+    assert r.minids == ["2-1"]
+    assert ids(r) == ["3-0", "4-0", "5-0"]
+
+
+def test_pending_entry_holds_the_boundary_back():
+    r = stream_with_groups()
+    r.xreadgroup("fast", "c1", {STREAM: ">"})
+    r.xack(STREAM, "fast", "3-0", "4-0", "5-0")
+    r.xack(STREAM, "slow", "3-0", "5-0")
+    trimmer = StreamTrimmer(r, [STREAM])
+
+    # 4-0 is the only entry left unacknowledged, by "slow"
+    assert trimmer.first_needed_id(STREAM) == (4, 0)
+    trimmer.trim_stream(STREAM, LATER_MS)
+    assert ids(r) == ["4-0", "5-0"]
+
+    r.xack(STREAM, "slow", "4-0")
+    assert trimmer.first_needed_id(STREAM) == (5, 1)
+    trimmer.trim_stream(STREAM, LATER_MS)
+    assert ids(r) == []
+    assert r.minids == ["4-0", "5-1"]
+
+
+def test_recent_acknowledged_entries_are_kept():
+    r = stream_with_groups()
+    trimmer = StreamTrimmer(r, [STREAM])
+
+    # Only entries older than the keep window go, here just 1-0
+    now_ms = 2 + int(STREAM_KEEP_ACKED_SECONDS * 1000)
+    assert trimmer.trim_stream(STREAM, now_ms) == 1
+    assert r.minids == ["2-0"]
+    assert ids(r) == ["2-0", "3-0", "4-0", "5-0"]
+    # Nothing is old enough yet
+    assert trimmer.trim_stream(STREAM, 1000) == 0
+    assert r.minids == ["2-0"]
+
+
+def test_streams_without_groups_are_left_alone():
+    r = exact(fakeredis.FakeRedis(decode_responses=True))
+    for ms in range(1, 4):
+        r.xadd(STREAM, {"n": ms}, id=f"{ms}-0")
+    trimmer = StreamTrimmer(r, [STREAM, "test:missing"])
+
+    assert trimmer.first_needed_id(STREAM) is None
+    assert trimmer.run_once() == 0
+    assert len(ids(r)) == 3
+    assert r.minids == []
+    assert r.hget(RETENTION_STATS_KEY, f"{STREAM}|length") == "3"
+    assert r.hget(RETENTION_STATS_KEY, f"{STREAM}|memory_bytes") == "0"
+
+
+def test_run_once_records_what_it_trimmed():
+    r = stream_with_groups()
+    trimmer = StreamTrimmer(r, [STREAM, "test:missing"])
+    r.time = lambda: (LATER_MS // 1000, 0)
+
+    assert trimmer.run_once() == 2
+    assert r.hget(RETENTION_STATS_KEY, f"{STREAM}|trimmed") == "2"
+    assert r.hget(RETENTION_STATS_KEY, f"{STREAM}|length") == "3"
+    assert not r.hexists(RETENTION_STATS_KEY, "test:missing|length")
@@ -9,6 +9,27 @@ import Loader from "@/components/Loader/Loader";
 
 const MAX_VEHICLES = 100;
 
+// "vehicle" messages add a vehicle (or replace it if already listed); "vehicle_patch" messages
+// carry only the fields that changed as more worker results came in
+const applyVehicleMessages = (vehicles, messages) => {
+  let updated = vehicles;
+  for (const message of messages) {
+    const { type, ...fields } = message;
+    const index = updated.findIndex((v) => v.vehicle_id === fields.vehicle_id);
+
+    if (type === "vehicle_patch") {
+      if (index !== -1) {
+        updated = updated.map((v, i) => (i === index ? { ...v, ...fields } : v));
+      }
+    } else if (index !== -1) {
+      updated = updated.map((v, i) => (i === index ? fields : v));
+    } else {
+      updated = [fields, ...updated];
+    }
+  }
+  return updated.length > MAX_VEHICLES ? updated.slice(0, MAX_VEHICLES) : updated;
+};
+
 export default function Home() {
   const [activeView, setActiveView] = useState("dashboard");
   const [vehicles, setVehicles] = useState([]);
@@ -23,6 +44,7 @@ export default function Home() {
   const wsRef = useRef(null);
   const reconnectTimeoutRef = useRef(null);
   const updateTimeoutRef = useRef(null);
+  const pendingMessagesRef = useRef([]);
   const reconnectAttemptsRef = useRef(0);
   const autoSelectEnabledRef = useRef(true);
 
@@ -99,7 +121,8 @@ export default function Home() {
       };
 
       ws.onmessage = (event) => {
-        const newVehicle = JSON.parse(event.data);
+        // Queued so none are lost when several arrive within one update window
+        pendingMessagesRef.current.push(JSON.parse(event.data));
 
         if (updateTimeoutRef.current) {
           clearTimeout(updateTimeoutRef.current);
@@ -109,22 +132,27 @@ export default function Home() {
         const shouldAutoSelect = autoSelectEnabledRef.current;
 
         updateTimeoutRef.current = setTimeout(() => {
-          setVehicles((prevVehicles) => {
-            const updatedVehicles = [newVehicle, ...prevVehicles];
+          const messages = pendingMessagesRef.current;
+          pendingMessagesRef.current = [];
+          const newest = messages.filter((m) => m.type !== "vehicle_patch").pop();
 
-            if (updatedVehicles.length > MAX_VEHICLES) {
-              return updatedVehicles.slice(0, MAX_VEHICLES);
-            }
-
-            return updatedVehicles;
-          });
+          setVehicles((prevVehicles) => applyVehicleMessages(prevVehicles, messages));
 
           // Use captured value
-          if (shouldAutoSelect) {
-            setSelectedVehicle(newVehicle);
-            console.log("✓ Auto-selected new vehicle:", newVehicle.vehicle_id);
+          if (shouldAutoSelect && newest) {
+            const { vehicle_id } = newest;
+            setSelectedVehicle(applyVehicleMessages([], messages.filter((m) => m.vehicle_id === vehicle_id))[0]);
+            console.log("✓ Auto-selected new vehicle:", vehicle_id);
           } else {
-            console.log("✗ Auto-select disabled, keeping current selection");
+            // Keep the current selection, with any fields that arrived for it
+            setSelectedVehicle((selected) =>
+              selected
+                ? applyVehicleMessages([selected], messages.filter((m) => m.vehicle_id === selected.vehicle_id))[0]
+                : selected
+            );
+            if (newest) {
+              console.log("✗ Auto-select disabled, keeping current selection");
+            }
           }
         }, 500);
       };